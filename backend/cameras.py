@@ -46,8 +46,8 @@ class CameraManager:
             del self.cameras[cam_id]
             self.save_config()
 
-    def get_snapshot(self, cam_id: str) -> Optional[str]:
-        """Holt ein Standbild von einer RTSP Kamera für die KI-Analyse."""
+    def get_frame(self, cam_id: str):
+        """Holt ein Standbild (BGR-Frame im Speicher) von einer RTSP Kamera für die KI-Analyse."""
         cam = self.cameras.get(cam_id)
         if not cam:
             print(f"[CAM] Kamera {cam_id} nicht gefunden.")
@@ -69,14 +69,19 @@ class CameraManager:
         cap.release()
 
         if ret:
-            filename = f"snapshot_{cam_id}.jpg"
-            path = os.path.join(TEMP_DIR, filename)
-            cv2.imwrite(path, frame)
-            print(f"[CAM] Snapshot gespeichert: {path}")
-            return path
-        else:
-            print("[CAM] Fehler: Konnte Frame nicht lesen.")
+            return frame
+        print("[CAM] Fehler: Konnte Frame nicht lesen.")
+        return None
+
+    def get_snapshot(self, cam_id: str) -> Optional[str]:
+        """Standbild als JPEG-Datei (für Downloads/Telegram). Gibt den Pfad zurück."""
+        frame = self.get_frame(cam_id)
+        if frame is None:
             return None
+        path = os.path.join(TEMP_DIR, f"snapshot_{cam_id}.jpg")
+        cv2.imwrite(path, frame)
+        print(f"[CAM] Snapshot gespeichert: {path}")
+        return path
 
     def generate_mjpeg_stream(self, cam_id: str):
         """Generator für MJPEG Stream (für Frontend Live-View)."""
@@ -0,0 +1,150 @@
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque
+
+# Abbruch pro Anfrage statt globalem stop_signal.
+# Jede Generierung bekommt ein CancelToken (Schlüssel = Session-ID oder Request-ID).
+# /stop mit session_id bricht nur diese Sitzung ab, ohne ID wie bisher alle.
+# Beim Abbruch laufen die registrierten Callbacks sofort: llm_stream schließt so den
+# Upstream-HTTP-Stream, statt auf den nächsten Chunk zu warten (Free-Tier-Kontingent, CPU).
+# Gemessen wird, wie lange es vom Abbruch bis zum Ende der Generierung bzw. bis
+# zum Schließen des Upstreams dauert.
+
+LATENCY_SAMPLES = 200
+
+_current = contextvars.ContextVar("haruko_cancel", default=None)
+
+
+class Cancelled(Exception):
+    """Raised when work is started for an already cancelled request."""
+
+
+class CancelToken:
+    def __init__(self, key, registry=None):
+        self.key = key
+        self.reason = None
+        self.requested_at = None
+        self._registry = registry
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._upstream_noted = False
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="stop"):
+        """Cancels the request; callbacks run immediately (in the calling thread)."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.requested_at = time.monotonic()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"[CANCEL] Callback-Fehler: {e}")
+        return True
+
+    def on_cancel(self, fn):
+        """Registers `fn` to run on cancel (runs at once if already cancelled)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+    def upstream_closed(self):
+        """Called by the stream worker once the upstream connection is really gone."""
+        with self._lock:
+            if self.requested_at is None or self._upstream_noted:
+                return
+            self._upstream_noted = True
+        if self._registry:
+            self._registry._observe("upstream_ms", time.monotonic() - self.requested_at)
+
+
+class CancellationRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}   # key -> set of tokens (eine Sitzung kann mehrere Anfragen haben)
+        self._latency = {"stop_ms": deque(maxlen=LATENCY_SAMPLES), "upstream_ms": deque(maxlen=LATENCY_SAMPLES)}
+        self.counters = {"requests": 0, "cancelled": 0, "disconnects": 0}
+
+    def open(self, key=None):
+        """New token for a request and makes it current (for llm_stream / router)."""
+        token = CancelToken(key or f"req:{uuid.uuid4().hex[:8]}", registry=self)
+        with self._lock:
+            self._active.setdefault(token.key, set()).add(token)
+            self.counters["requests"] += 1
+        _current.set(token)
+        return token
+
+    def close(self, token):
+        """Request finished; records the stop latency if it was cancelled."""
+        with self._lock:
+            tokens = self._active.get(token.key)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._active[token.key]
+        if token.cancelled:
+            self._observe("stop_ms", time.monotonic() - token.requested_at)
+        if _current.get() is token:
+            _current.set(None)
+
+    def cancel(self, key=None, reason="stop", exclude=None):
+        """Cancels all requests of `key` (all requests if None) except `exclude`. Returns the number cancelled."""
+        with self._lock:
+            if key is None:
+                tokens = [t for group in self._active.values() for t in group]
+            else:
+                tokens = list(self._active.get(key, ()))
+        return self._cancel([t for t in tokens if t is not exclude], reason, key)
+
+    def cancel_token(self, token, reason="stop"):
+        return self._cancel([token], reason, token.key)
+
+    def _cancel(self, tokens, reason, key):
+        count = sum(1 for t in tokens if t.cancel(reason))
+        with self._lock:
+            self.counters["cancelled"] += count
+            if reason == "disconnect":
+                self.counters["disconnects"] += count
+        if count:
+            print(f"[CANCEL] {count} Generierung(en) abgebrochen ({reason}, {key or 'alle'}).")
+        return count
+
+    def _observe(self, name, seconds):
+        with self._lock:
+            self._latency[name].append(seconds * 1000)
+
+    def stats(self):
+        def pct(ordered, q):
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1) if ordered else None
+
+        with self._lock:
+            c = dict(self.counters)
+            c["active"] = sum(len(group) for group in self._active.values())
+            latency = {name: sorted(values) for name, values in self._latency.items()}
+        for name, ordered in latency.items():
+            c[name] = {"count": len(ordered), "p50": pct(ordered, 0.5), "p95": pct(ordered, 0.95)}
+        return c
+
+
+def current():
+    return _current.get()
+
+
+# Singleton instance
+cancellations = CancellationRegistry()
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+
+# Gesprächsverlauf auf dem Server statt in jedem Request.
+# Pro Client/Chat (Web-Tab, Telegram-Chat) eine Sitzung:
+#  - die letzten Nachrichten bleiben wörtlich erhalten,
+#  - ältere werden im Hintergrund zu einer laufenden Zusammenfassung verdichtet.
+# Der Prompt bleibt so auch in langen Gesprächen begrenzt. Aktive Sitzungen liegen
+# im Speicher; verdrängte (LRU) und beim Herunterfahren werden in SQLite ausgelagert.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_FILE = os.path.join(BASE_DIR, "chat_sessions.db")
+# Anzahl Nachrichten (User + Bot), die wörtlich im Prompt bleiben
+SESSION_KEEP = int(os.getenv("SESSION_KEEP_MESSAGES", "8"))
+# So viele ältere Nachrichten sammeln sich an, bevor zusammengefasst wird
+SESSION_BATCH = int(os.getenv("SESSION_SUMMARY_BATCH", "8"))
+SESSION_MAX_CHARS = int(os.getenv("SESSION_MAX_CHARS", "2000"))
+MAX_ACTIVE = 50
+
+
+class Session:
+    def __init__(self, session_id, summary="", turns=None, updated_at=None):
+        self.id = session_id
+        self.summary = summary
+        self.turns = turns or []
+        self.updated_at = updated_at or time.time()
+        self.summarizing = False
+
+
+def _clip(text, limit):
+    return text if len(text) <= limit else text[:limit] + " [...]"
+
+
+def prompt_messages(system_msg, history, user_msg):
+    """[system, *history, user] for the LLM router.
+
+    System entries of the history (the session summary) are appended to the one system
+    message: Gemini only takes a single system instruction, a second one would replace the prompt.
+    """
+    system = dict(system_msg)
+    turns = []
+    for h in history:
+        if h['role'] == "system":
+            system['content'] += "\n\n" + h['content']
+            continue
+        role = "assistant" if h['role'] == "bot" else h['role']
+        turns.append({"role": role, "content": h['content']})
+    return [system] + turns + [user_msg]
+
+
+class SessionStore:
+    def __init__(self, db_file=SESSION_FILE, summarize_fn=None, keep=SESSION_KEEP, batch=SESSION_BATCH):
+        self.summarize_fn = summarize_fn  # async (previous_summary, turns) -> str
+        self.keep = keep
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._active = OrderedDict()
+        self._tasks = set()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                id TEXT PRIMARY KEY,
+                summary TEXT,
+                turns TEXT,
+                updated_at REAL
+            )
+        ''')
+        self.conn.commit()
+        self.counters = {"summaries": 0, "summary_errors": 0, "spilled": 0, "restored": 0}
+
+    def _save(self, session):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO chat_sessions (id, summary, turns, updated_at) VALUES (?, ?, ?, ?)",
+                              (session.id, session.summary, json.dumps(session.turns, ensure_ascii=False),
+                               session.updated_at))
+            self.conn.commit()
+
+    def _get(self, session_id):
+        session = self._active.get(session_id)
+        if session is not None:
+            self._active.move_to_end(session_id)
+            return session
+        with self._lock:
+            row = self.conn.execute("SELECT summary, turns, updated_at FROM chat_sessions WHERE id = ?",
+                                    (session_id,)).fetchone()
+        if row:
+            session = Session(session_id, row[0] or "", json.loads(row[1] or "[]"), row[2])
+            self.counters["restored"] += 1
+        else:
+            session = Session(session_id)
+        self._active[session_id] = session
+        while len(self._active) > MAX_ACTIVE:
+            _, old = self._active.popitem(last=False)
+            self._save(old)
+            self.counters["spilled"] += 1
+        return session
+
+    def history(self, session_id):
+        """Prompt history: summary of older turns (if any) + the recent turns verbatim."""
+        session = self._get(session_id)
+        messages = []
+        if session.summary:
+            messages.append({"role": "system",
+                             "content": f"Bisheriger Gesprächsverlauf (Zusammenfassung): {session.summary}"})
+        # Während eine Zusammenfassung läuft, höchstens keep + batch Nachrichten
+        for turn in session.turns[-(self.keep + self.batch):]:
+            messages.append({"role": turn["role"], "content": _clip(turn["content"], SESSION_MAX_CHARS)})
+        return messages
+
+    def append(self, session_id, user_message, reply):
+        """Records one exchange and schedules a summary when enough older turns piled up."""
+        session = self._get(session_id)
+        session.turns.append({"role": "user", "content": user_message})
+        session.turns.append({"role": "assistant", "content": reply})
+        session.updated_at = time.time()
+        if len(session.turns) >= self.keep + self.batch and not session.summarizing and self.summarize_fn:
+            session.summarizing = True
+            task = asyncio.get_running_loop().create_task(self._summarize(session))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session):
+        chunk = session.turns[:len(session.turns) - self.keep]
+        try:
+            summary = await self.summarize_fn(session.summary, chunk)
+            if summary and summary.strip():
+                session.summary = summary.strip()
+                # Nur Nachrichten entfernen, die in der Zusammenfassung stecken
+                # (in der Zwischenzeit angehängte bleiben erhalten)
+                session.turns = session.turns[len(chunk):]
+                self.counters["summaries"] += 1
+                print(f"[SESSION] {session.id}: {len(chunk)} Nachrichten zusammengefasst.")
+                await asyncio.to_thread(self._save, session)
+        except Exception as e:
+            self.counters["summary_errors"] += 1
+            print(f"[SESSION] Zusammenfassung fehlgeschlagen ({session.id}): {e}")
+        finally:
+            session.summarizing = False
+
+    def reset(self, session_id):
+        self._active.pop(session_id, None)
+        with self._lock:
+            self.conn.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+            self.conn.commit()
+
+    def flush(self):
+        """Writes all active sessions to SQLite (shutdown)."""
+        for session in list(self._active.values()):
+            self._save(session)
+
+    def stats(self):
+        c = dict(self.counters)
+        c["active"] = len(self._active)
+        c["summarizing"] = sum(1 for s in self._active.values() if s.summarizing)
+        with self._lock:
+            c["stored"] = self.conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+        return c
+
+
+# Singleton instance
+chat_sessions = SessionStore()
@@ -0,0 +1,230 @@
+import os
+import re
+
+# Struktur-bewusstes Chunking für die Wissensbasis.
+# Vorher: text[i:i+1500] - Sätze, Markdown-Abschnitte und Funktionen wurden mitten
+# durchgeschnitten, ohne Überlappung.
+# Jetzt wird der Text zuerst in kleine Einheiten mit einer "Trennstärke" zerlegt:
+#   Prosa (PDF, TXT, MD):  Überschrift 4 > Absatz 2 > Satz/Zeile 1
+#   Code (CODE_EXTS):      Top-Level def/class/function 4 > Methode (.py/.rs) 3 > Leerzeile 2 > Zeile 1
+#   Zu lange Einheiten:    am letzten Leerzeichen vor der Grenze (Stärke 0)
+# Danach werden Einheiten bis KB_CHUNK_TOKENS zusammengelegt; geschnitten wird an der
+# stärksten Grenze in der hinteren Hälfte, eine neue Überschrift/Definition beginnt einen
+# neuen Chunk. Der nächste Chunk wiederholt die letzten Sätze/Zeilen (bis KB_CHUNK_OVERLAP
+# Tokens), außer er beginnt selbst mit einer Überschrift/Definition/Methode.
+# Jeder Chunk ist (start, end, text) mit Offsets in den Quelltext (Datei-Inhalt bzw.
+# extrahierter PDF-Text).
+# Für den Prompt werden Treffer als ganze Chunks eingefügt, bis KB_RAG_TOKENS erreicht ist
+# (fit_passages), statt jeden Chunk nach festen 500 Zeichen abzuschneiden.
+
+KB_CHUNK_TOKENS = int(os.getenv("KB_CHUNK_TOKENS", "350"))
+KB_CHUNK_OVERLAP = int(os.getenv("KB_CHUNK_OVERLAP", "50"))
+# Token-Budget der RAG-Treffer im System-Prompt (reicht für die top_k=3 Chunks voller Größe)
+KB_RAG_TOKENS = int(os.getenv("KB_RAG_TOKENS", "1100"))
+# Ändert sich die Chunk-Konfiguration, liest die Wissensbasis alle Dateien neu ein
+CHUNKER_ID = f"struct-v1/{KB_CHUNK_TOKENS}/{KB_CHUNK_OVERLAP}"
+# Wie fact_selector.estimate_tokens: ~4 Zeichen pro Token
+CHARS_PER_TOKEN = 4
+# Supported extensions for code/technical docs
+CODE_EXTS = {'.py', '.js', '.ts', '.html', '.css', '.json', '.sh', '.bat', '.cpp', '.c', '.h', '.java', '.go', '.rs'}
+
+HEADING, BLOCK, PARAGRAPH, LINE, HARD = 4, 3, 2, 1, 0
+
+_HEADING_RE = re.compile(r"^#{1,6}\s+\S", re.MULTILINE)
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE_RE = re.compile(r"[.!?…][\"'»“”)\]]*\s+")
+_NEWLINE_RE = re.compile(r"\n")
+
+# Beginn einer Top-Level-Definition (Zeile ohne Einrückung)
+_C_LIKE = r"(?![\s{}#/*])\S"
+_DEF_RE = {
+    ".py": r"(?:@|def |async def |class )",
+    ".js": r"(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:function|class|const|let|var)\b",
+    ".ts": r"(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:async\s+)?(?:function|class|const|let|var|interface|type|enum|namespace)\b",
+    ".go": r"(?:func|type|var|const)\b",
+    ".rs": r"(?:#\[|(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:fn|struct|enum|impl|trait|mod|const|static|type|macro_rules!))",
+    ".c": _C_LIKE, ".h": _C_LIKE, ".cpp": _C_LIKE, ".java": _C_LIKE,
+    ".sh": r"(?:function\s+\w+|\w+\s*\(\)\s*\{?)",
+    ".bat": r":\w+",
+    ".css": r"[^\s}]",
+    ".html": r"<(?:head|body|section|article|script|style|h[1-6])\b",
+}
+_DEF_RE = {ext: re.compile(pattern) for ext, pattern in _DEF_RE.items()}
+# Eingerückte Definitionen (Methoden)
+_NESTED_RE = {
+    ".py": re.compile(r"[ \t]+(?:@|def |async def |class )"),
+    ".rs": re.compile(r"[ \t]+(?:#\[|(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?fn\b)"),
+}
+# Kommentar-/Dekorator-Zeilen direkt über einer Definition gehören zu ihr
+_LEADING_RE = re.compile(r"(?:#(?!include|define|if|endif|pragma)|//|/\*| ?\*|@|--|rem\b|::)", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+# --- Einheiten ---
+def _units(text, boundaries, max_chars):
+    """Splits `text` at the boundary positions ({pos: strength}) into [(start, end, strength)].
+
+    The strength belongs to the boundary at a unit's start; units longer than max_chars are split
+    at whitespace (HARD).
+    """
+    cuts = sorted(p for p in boundaries if 0 < p < len(text))
+    units = []
+    start, strength = 0, HEADING
+    for pos in cuts + [len(text)]:
+        while pos - start > max_chars:
+            space = text.rfind(" ", start + max_chars // 2, start + max_chars)
+            split = space + 1 if space > 0 else start + max_chars
+            units.append((start, split, strength))
+            start, strength = split, HARD
+        if pos > start:
+            units.append((start, pos, strength))
+            start = pos
+        strength = boundaries.get(pos, HARD)
+    return units
+
+
+def _mark(boundaries, pos, strength):
+    if boundaries.get(pos, -1) < strength:
+        boundaries[pos] = strength
+
+
+def prose_units(text, max_chars):
+    boundaries = {}
+    for m in _NEWLINE_RE.finditer(text):
+        _mark(boundaries, m.end(), LINE)
+    for m in _SENTENCE_RE.finditer(text):
+        _mark(boundaries, m.end(), LINE)
+    for m in _PARAGRAPH_RE.finditer(text):
+        _mark(boundaries, m.end(), PARAGRAPH)
+    for m in _HEADING_RE.finditer(text):
+        _mark(boundaries, m.start(), HEADING)
+    return _units(text, boundaries, max_chars)
+
+
+def code_units(text, ext, max_chars):
+    def_re = _DEF_RE.get(ext)
+    nested_re = _NESTED_RE.get(ext)
+    lines = text.splitlines(keepends=True)
+    starts, pos = [], 0
+    for line in lines:
+        starts.append(pos)
+        pos += len(line)
+    boundaries = {}
+    for i, line in enumerate(lines):
+        if i == 0:
+            continue
+        for pattern, strength in ((def_re, HEADING), (nested_re, BLOCK)):
+            if pattern is not None and pattern.match(line):
+                # Kommentare/Dekoratoren direkt darüber mitnehmen
+                j = i
+                while j > 0 and lines[j - 1].strip() and _LEADING_RE.match(lines[j - 1].lstrip(" \t")):
+                    j -= 1
+                if j > 0:
+                    _mark(boundaries, starts[j], strength)
+                break
+        if not lines[i - 1].strip():
+            _mark(boundaries, starts[i], PARAGRAPH)
+        else:
+            _mark(boundaries, starts[i], LINE)
+    return _units(text, boundaries, max_chars)
+
+
+# --- Zusammenlegen ---
+def pack(units, max_chars, overlap_chars):
+    """Greedily merges units into (start, end) spans of at most max_chars, with overlap."""
+    spans = []
+    n = len(units)
+    min_chars = max_chars // 2
+    i = 0
+    while i < n:
+        start = units[i][0]
+        k = i + 1
+        while k < n and units[k][1] - start <= max_chars:
+            if units[k][2] == HEADING and units[k][0] - start >= min_chars // 2:
+                # Neuer Abschnitt / neue Definition -> eigener Chunk
+                break
+            k += 1
+        cut = k
+        if k < n:
+            # Stärkste Grenze in der hinteren Hälfte, bei Gleichstand die späteste
+            best = None
+            for c in range(i + 1, k + 1):
+                size = units[c - 1][1] - start
+                if size >= min_chars or (units[c][2] == HEADING and size >= min_chars // 2):
+                    if best is None or units[c][2] >= units[best][2]:
+                        best = c
+            cut = best or k
+        spans.append((start, units[cut - 1][1]))
+        if cut >= n:
+            break
+        # Überlappung: ganze Sätze/Zeilen vom Ende, nie über eine Überschrift/Definition hinweg
+        nxt = cut
+        if units[cut][2] < BLOCK:
+            end = units[cut - 1][1]
+            while nxt - 1 > i and end - units[nxt - 1][0] <= overlap_chars and units[nxt][2] < BLOCK:
+                nxt -= 1
+        i = nxt
+    return spans
+
+
+def _trim(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def chunk_spans(text, path="", max_tokens=None, overlap_tokens=None):
+    """[(start, end)] offsets into `text` of its chunks (code or prose rules depending on the extension)."""
+    max_chars = (max_tokens or KB_CHUNK_TOKENS) * CHARS_PER_TOKEN
+    overlap_chars = (KB_CHUNK_OVERLAP if overlap_tokens is None else overlap_tokens) * CHARS_PER_TOKEN
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CODE_EXTS:
+        units = code_units(text, ext, max_chars)
+    else:
+        units = prose_units(text, max_chars)
+    spans = []
+    for start, end in pack(units, max_chars, overlap_chars):
+        start, end = _trim(text, start, end)
+        if end > start:
+            spans.append((start, end))
+    return spans
+
+
+def chunk_document(text, path="", max_tokens=None, overlap_tokens=None):
+    """[(start, end, chunk_text)] for one extracted file.
+
+    Code chunks are wrapped in a markdown block with the file name (better LLM context);
+    the offsets always point into `text` itself.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    chunks = []
+    for start, end in chunk_spans(text, path, max_tokens, overlap_tokens):
+        body = text[start:end]
+        if ext in CODE_EXTS:
+            body = f"File: {os.path.basename(path)}\n```{ext[1:]}\n{body}\n```"
+        chunks.append((start, end, body))
+    return chunks
+
+
+def fit_passages(texts, max_tokens=None):
+    """The ranked chunk texts that fit into max_tokens (KB_RAG_TOKENS), each one whole.
+
+    A chunk that does not fit is skipped (a smaller one further down may still fit); the best
+    hit is always kept, cut at its last sentence or line end if it alone exceeds the budget.
+    """
+    budget = (max_tokens or KB_RAG_TOKENS) * CHARS_PER_TOKEN
+    selected, used = [], 0
+    for text in texts:
+        if used + len(text) <= budget:
+            selected.append(text)
+            used += len(text)
+        elif not selected:
+            cut = max(text.rfind(". ", 0, budget), text.rfind("\n", 0, budget))
+            selected.append(text[:cut + 1] if cut > budget // 2 else text[:budget])
+            used = budget
+    return selected
@@ -0,0 +1,65 @@
+import threading
+
+# Versionierter Cache für die Bausteine des System-Prompts.
+# Jede Quelle (Fakten, Geräte-Config, Smart-Home-Zustand, Profile, Persönlichkeit, Standort)
+# hat einen Versionszähler. Schreibzugriffe (MemoryDB, devices_config, Phygital-Poll, Wetter-Standort)
+# erhöhen ihn via bump(); solange sich nichts ändert, liefert get() den bereits
+# formatierten Text ohne Datei- oder DB-Zugriff.
+
+FACTS = "facts"
+DEVICES = "devices"
+HOME_STATUS = "home_status"
+PROFILE = "profile"
+PERSONALITY = "personality"
+NOTES = "notes"
+LOCATION = "location"
+
+
+class ContextCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._entries = {}  # name -> (stamp, value)
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self, section):
+        """Marks a section as changed; every cached entry depending on it is rebuilt on next use."""
+        with self._lock:
+            self._versions[section] = self._versions.get(section, 0) + 1
+
+    def version(self, section):
+        return self._versions.get(section, 0)
+
+    def stamp(self, deps):
+        """Current versions of `deps` (compare two stamps to detect a change)."""
+        with self._lock:
+            return tuple(self._versions.get(d, 0) for d in deps)
+
+    def get(self, name, builder, deps, key=None):
+        """Returns the memoized value of `name`, rebuilding it if a dependency version or `key` changed."""
+        with self._lock:
+            # Stempel VOR dem Bauen lesen: ein bump() während builder() läuft führt beim nächsten Mal zum Rebuild
+            stamp = (tuple(self._versions.get(d, 0) for d in deps), key)
+            entry = self._entries.get(name)
+            if entry and entry[0] == stamp:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = builder()
+        with self._lock:
+            self._entries[name] = (stamp, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "versions": dict(self._versions),
+                "entries": len(self._entries),
+            }
+
+
+# Singleton instance
+context_cache = ContextCache()
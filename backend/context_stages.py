@@ -0,0 +1,65 @@
+import os
+import time
+import asyncio
+import tracing
+
+# Parallele Kontext-Beschaffung vor dem ersten LLM-Aufruf.
+# Profil, Fakten-Auswahl, RAG-Embedding, Web-Suche, Kamera-Snapshot und
+# Phygital-Kontext sind voneinander unabhängig und blockierend (DB, Ollama,
+# DuckDuckGo, OpenCV). Jede Stufe läuft in einem Worker-Thread mit eigener
+# Deadline; wer zu spät kommt, liefert "kein Kontext" statt die Antwort aufzuhalten.
+
+DEFAULT_DEADLINES = {
+    "profile": 1.0,
+    "facts": 1.5,
+    "rag": 1.5,
+    "search": 4.0,
+    "vision": 6.0,
+    "phygital": 1.0,
+}
+
+
+def stage_deadline(name):
+    """Deadline in seconds for a stage, overridable via CONTEXT_DEADLINE_<NAME>."""
+    return float(os.getenv(f"CONTEXT_DEADLINE_{name.upper()}", DEFAULT_DEADLINES.get(name, 2.0)))
+
+
+async def _run_stage(name, fn, timeout):
+    start = time.monotonic()
+    try:
+        result = await asyncio.wait_for(asyncio.to_thread(fn), timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        # Der Thread läuft im Hintergrund zu Ende, sein Ergebnis wird verworfen
+        result, status = None, "timeout"
+    except Exception as e:
+        result, status = None, f"error ({e})"
+    tracing.record(f"context.{name}", start, status=status)
+    return name, result, time.monotonic() - start, status
+
+
+async def run_stages(stages):
+    """Runs blocking context stages concurrently.
+
+    `stages` maps a name to a callable (or None to skip the stage). A stage that misses its
+    deadline keeps running in its thread, so stages must not record stats themselves; the
+    caller accounts for the results it actually uses. Returns
+    ({name: result or None}, {name: (seconds, status)}) and logs a timing breakdown.
+    """
+    start = time.monotonic()
+    active = {name: fn for name, fn in stages.items() if fn is not None}
+    outcomes = await asyncio.gather(*(_run_stage(name, fn, stage_deadline(name)) for name, fn in active.items()))
+
+    results = {name: None for name in stages}
+    timings = {}
+    for name, result, seconds, status in outcomes:
+        results[name] = result
+        timings[name] = (seconds, status)
+
+    total = time.monotonic() - start
+    breakdown = " | ".join(
+        f"{name} {seconds * 1000:.0f}ms" + ("" if status == "ok" else f" {status.upper() if status == 'timeout' else status}")
+        for name, (seconds, status) in timings.items()
+    )
+    print(f"[CONTEXT] {breakdown} | gesamt {total * 1000:.0f}ms")
+    return results, timings
@@ -0,0 +1,99 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# Dauerhafter Cache: sha256(Embedding-Modell + Chunk-Text) -> Vektor.
+# Vorher hat jede mtime-Änderung alle _partN einer Datei neu eingebettet, auch wenn nur
+# ein Absatz anders war (Librarian-Updates, erneut gespeicherte Dateien).
+# Jetzt fragt der Scan zuerst hier nach; eingebettet werden nur Chunks mit neuem Inhalt.
+# Gleiche Chunks in verschiedenen Dateien teilen sich einen Eintrag. Der Modellname ist
+# Teil des Schlüssels, ein Modellwechsel trifft also nie alte Vektoren.
+# Einträge, die am längsten nicht gebraucht wurden, fliegen über KB_EMBED_CACHE_MAX raus.
+
+CACHE_FILE = "embed_cache.db"
+KB_EMBED_CACHE_MAX = int(os.getenv("KB_EMBED_CACHE_MAX", "50000"))
+
+
+def cache_key(text, model):
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, db_file, model, max_entries=KB_EMBED_CACHE_MAX):
+        self.model = model
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._init_db()
+        self.counters = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    def _init_db(self):
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vec BLOB,
+                    used_at REAL
+                )
+            ''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_used ON embeddings (used_at)")
+            self.conn.commit()
+
+    def key(self, text):
+        return cache_key(text, self.model)
+
+    def lookup(self, texts):
+        """Cached vectors for `texts` (None where missing); hits are marked as recently used."""
+        keys = [self.key(t) for t in texts]
+        found = {}
+        with self._lock:
+            # SQLite erlaubt max. 999 Parameter pro Abfrage
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self.conn.execute(f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                                         part).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE embeddings SET used_at = ? WHERE key = ?", [(now, k) for k in found])
+                self.conn.commit()
+            self.counters["hits"] += sum(1 for k in keys if k in found)
+            self.counters["misses"] += sum(1 for k in keys if k not in found)
+        return [np.frombuffer(found[k], dtype=np.float32).copy() if k in found else None for k in keys]
+
+    def get(self, text):
+        return self.lookup([text])[0]
+
+    def store(self, texts, vectors):
+        """Saves the (normalized) vectors of `texts`; one commit, then evicts beyond max_entries."""
+        now = time.time()
+        rows = [(self.key(t), np.asarray(v, dtype=np.float32).tobytes(), now) for t, v in zip(texts, vectors)]
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vec, used_at) VALUES (?, ?, ?)", rows)
+            self.counters["stored"] += len(rows)
+            excess = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute("DELETE FROM embeddings WHERE key IN "
+                                  "(SELECT key FROM embeddings ORDER BY used_at LIMIT ?)", (excess,))
+                self.counters["evicted"] += excess
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM embeddings")
+            self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            c = dict(self.counters)
+        total = c["hits"] + c["misses"]
+        c.update(entries=entries, model=self.model, hit_rate=round(c["hits"] / total, 3) if total else 0.0)
+        return c
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,198 @@
+import os
+import re
+import math
+import time
+import threading
+from datetime import datetime
+import numpy as np
+from scheduler import scheduler
+from model_residency import model_residency, ollama_client
+
+# Auswahl der Langzeit-Fakten für den System-Prompt.
+# Statt ALLE gespeicherten Fakten bei jedem Turn einzufügen, werden sie gegen die
+# aktuelle Nachricht bewertet (Embedding-Ähnlichkeit + Aktualität) und bis zu einem
+# Token-Budget aufgefüllt. Angepinnte Fakten (z.B. Name, Allergien) sind immer dabei.
+
+FACT_TOKEN_BUDGET = int(os.getenv("FACT_TOKEN_BUDGET", "400"))
+FACT_RECENCY_HALFLIFE_DAYS = float(os.getenv("FACT_RECENCY_HALFLIFE_DAYS", "30"))
+RELEVANCE_WEIGHT = 0.75
+RECENCY_WEIGHT = 0.25
+EMBED_RETRY_SECONDS = 60.0
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return max(1, len(text) // 4)
+
+
+def _fact_line(text):
+    return f"- {text}"
+
+
+def ollama_embed(text):
+    model = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    with scheduler.slot("embed"), model_residency.use(model):
+        res = ollama_client().embeddings(model=model, prompt=text, keep_alive=model_residency.keep_alive(model))
+    return res["embedding"]
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace(" ", "T")).timestamp()
+    except ValueError:
+        return None
+
+
+class FactSelector:
+    def __init__(self, budget=None, embed_fn=None, halflife_days=None):
+        self.budget = budget if budget is not None else FACT_TOKEN_BUDGET
+        self.halflife_days = halflife_days if halflife_days is not None else FACT_RECENCY_HALFLIFE_DAYS
+        self._embed_fn = embed_fn or ollama_embed
+        self._lock = threading.Lock()
+        self._vectors = {}  # fact text -> normalisierter Vektor
+        self._embed_disabled_until = 0.0
+        self.requests = 0
+        self.tokens_saved = 0
+        self.last_report = None
+
+    # --- Embeddings ---
+    def _embed(self, text):
+        if time.time() < self._embed_disabled_until:
+            return None
+        try:
+            vec = np.asarray(self._embed_fn(text), dtype=np.float32)
+        except Exception as e:
+            # Embedding-Modell fehlt / Ollama aus -> eine Weile nur Stichwort-Vergleich
+            print(f"[MEMORY] Fakten-Embedding nicht verfügbar ({e}). Nutze Stichwort-Abgleich.")
+            self._embed_disabled_until = time.time() + EMBED_RETRY_SECONDS
+            return None
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else None
+
+    def _fact_vector(self, text):
+        with self._lock:
+            vec = self._vectors.get(text)
+        if vec is None:
+            vec = self._embed(text)
+            if vec is not None:
+                with self._lock:
+                    self._vectors[text] = vec
+        return vec
+
+    def warmup(self, facts):
+        """Embeds all facts up front (called in the background so the first chat turn stays fast)."""
+        for fact in facts:
+            if self._fact_vector(fact["text"]) is None and time.time() < self._embed_disabled_until:
+                break
+
+    def forget_missing(self, facts):
+        """Drops cached vectors of facts that no longer exist (after delete/consolidation)."""
+        alive = {f["text"] for f in facts}
+        with self._lock:
+            for text in list(self._vectors):
+                if text not in alive:
+                    del self._vectors[text]
+
+    # --- Scoring ---
+    def _recency(self, created_at, now):
+        ts = _parse_time(created_at)
+        if ts is None:
+            return 0.0
+        age_days = max(0.0, (now - ts) / 86400.0)
+        return math.exp(-math.log(2) * age_days / self.halflife_days)
+
+    @staticmethod
+    def _keyword_overlap(query_words, text):
+        words = set(_WORD_RE.findall(text.lower()))
+        if not words or not query_words:
+            return 0.0
+        return len(query_words & words) / math.sqrt(len(query_words) * len(words))
+
+    def score(self, message, facts, embed=True):
+        """Returns [(score, fact)] for the non-pinned facts (keyword overlap only with embed=False)."""
+        now = time.time()
+        query_vec = self._embed(message) if embed else None
+        query_words = set(_WORD_RE.findall(message.lower()))
+        scored = []
+        for fact in facts:
+            vec = self._fact_vector(fact["text"]) if query_vec is not None else None
+            if vec is not None:
+                relevance = float(np.dot(query_vec, vec))
+            else:
+                relevance = self._keyword_overlap(query_words, fact["text"])
+            recency = self._recency(fact.get("created_at"), now)
+            scored.append((RELEVANCE_WEIGHT * relevance + RECENCY_WEIGHT * recency, fact))
+        return scored
+
+    # --- Selection ---
+    def needs_ranking(self, facts):
+        """False if all facts fit the budget (select() then needs no embeddings)."""
+        return sum(estimate_tokens(_fact_line(f["text"])) for f in facts) > self.budget
+
+    def select(self, message, facts, embed=True):
+        """Picks the facts to inject for `message`.
+
+        `facts` are dicts with 'text', 'created_at' and 'pinned'. Pinned facts always go in,
+        the rest is filled by score until the token budget is used up. With embed=False the
+        ranking uses keyword overlap only (no Ollama call, e.g. when the chat cannot wait).
+        Returns (selected fact texts, report dict); pass the report that is actually used to record().
+        """
+        total_tokens = sum(estimate_tokens(_fact_line(f["text"])) for f in facts)
+        if total_tokens <= self.budget:
+            # Alles passt -> kein Embedding-Aufwand
+            selected = [f["text"] for f in facts]
+            return selected, self._report(len(facts), len(selected), total_tokens, total_tokens)
+
+        pinned = [f for f in facts if f.get("pinned")]
+        rest = [f for f in facts if not f.get("pinned")]
+
+        selected = [f["text"] for f in pinned]
+        used = sum(estimate_tokens(_fact_line(t)) for t in selected)
+        for _, fact in sorted(self.score(message, rest, embed), key=lambda sf: sf[0], reverse=True):
+            cost = estimate_tokens(_fact_line(fact["text"]))
+            if used + cost > self.budget:
+                continue  # kleinere Fakten weiter unten passen evtl. noch
+            selected.append(fact["text"])
+            used += cost
+        return selected, self._report(len(facts), len(selected), total_tokens, used)
+
+    @staticmethod
+    def _report(total, selected, total_tokens, used_tokens):
+        return {
+            "facts_total": total,
+            "facts_selected": selected,
+            "tokens_all": total_tokens,
+            "tokens_used": used_tokens,
+            "tokens_saved": total_tokens - used_tokens,
+        }
+
+    def record(self, report):
+        """Counts a selection in the stats (only the one injected, not a late one abandoned at its deadline)."""
+        with self._lock:
+            self.requests += 1
+            self.tokens_saved += report["tokens_saved"]
+            self.last_report = report
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "requests": self.requests,
+                "tokens_saved_total": self.tokens_saved,
+                "embedded_facts": len(self._vectors),
+                "last": self.last_report,
+            }
+
+
+def format_facts(selected):
+    if not selected:
+        return ""
+    return "\n\n### LANGZEITGEDÄCHTNIS (Fakten über den User):\n" + "\n".join(_fact_line(f) for f in selected)
+
+
+# Singleton instance
+fact_selector = FactSelector()
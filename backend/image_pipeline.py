@@ -0,0 +1,145 @@
+import os
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Bilder für Vision-Turns bleiben im Speicher.
+# Vorher: Webcam/Screenshot/RTSP-Snapshot -> JPEG auf Platte, danach liest NIM die volle
+# Auflösung erneut und kodiert base64, Gemini öffnet die Datei mit PIL, llava bekommt den Pfad.
+# Jetzt: ein Snapshot (BGR-Frame oder JPEG-Bytes) wird pro Provider-Profil genau einmal
+# verkleinert und neu kodiert; das Ergebnis liegt im LRU-Cache (Schlüssel: Inhalts-Hash + Profil).
+# Ein 1080p-Screenshot schrumpft so auf einen Bruchteil der Upload-Bytes; die Datei wird
+# nur noch geschrieben, wenn jemand wirklich einen Pfad braucht (Telegram, FileResponse).
+
+# Längste Bildseite pro Profil (llava arbeitet intern mit 336/672 px, Gemini kachelt mit 768 px)
+PROFILES = {
+    "openai": {"max_side": int(os.getenv("VISION_MAX_SIDE_OPENAI", "1024")), "quality": 85},
+    "gemini": {"max_side": int(os.getenv("VISION_MAX_SIDE_GEMINI", "1024")), "quality": 85},
+    "ollama": {"max_side": int(os.getenv("VISION_MAX_SIDE_OLLAMA", "672")), "quality": 85},
+}
+IMAGE_CACHE_SIZE = 32
+
+
+class Snapshot:
+    """One captured image in memory: a BGR frame (OpenCV) or encoded JPEG bytes."""
+
+    def __init__(self, frame=None, data=None, source="image"):
+        self.frame = frame
+        self.data = data
+        self.source = source
+        self._digest = None
+
+    @classmethod
+    def from_path(cls, path):
+        with open(path, "rb") as f:
+            return cls(data=f.read(), source=os.path.basename(path))
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            h = hashlib.blake2b(digest_size=16)
+            if self.data is not None:
+                h.update(self.data)
+            else:
+                h.update(str(self.frame.shape).encode())
+                h.update(self.frame.tobytes())
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def save(self, path):
+        """Writes the full-resolution JPEG (only for consumers that need a file)."""
+        if self.data is not None:
+            with open(path, "wb") as f:
+                f.write(self.data)
+        else:
+            import cv2
+            cv2.imwrite(path, self.frame)
+        return path
+
+    def __repr__(self):
+        return f"<Snapshot {self.source} {self.digest[:8]}>"
+
+
+def as_snapshot(image):
+    """Accepts a Snapshot or (legacy) a file path."""
+    return image if isinstance(image, Snapshot) else Snapshot.from_path(image)
+
+
+def jpeg_encode(snapshot, max_side, quality):
+    """Downscales to `max_side` (longest side) and re-encodes as JPEG. Small JPEGs are passed through unchanged."""
+    import cv2
+    import numpy as np
+    frame = snapshot.frame
+    if frame is None:
+        frame = cv2.imdecode(np.frombuffer(snapshot.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError(f"Bild nicht lesbar: {snapshot}")
+    h, w = frame.shape[:2]
+    scale = max_side / max(h, w)
+    if scale < 1:
+        frame = cv2.resize(frame, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    elif snapshot.data is not None:
+        return snapshot.data
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"JPEG-Kodierung fehlgeschlagen: {snapshot}")
+    return buf.tobytes()
+
+
+class ImagePipeline:
+    def __init__(self, encoder=None, profiles=None, cache_size=IMAGE_CACHE_SIZE):
+        self._encoder = encoder or jpeg_encode
+        self.profiles = profiles or PROFILES
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # (digest, profile) -> {"bytes": ..., "b64": ...}
+        self.counters = {"hits": 0, "misses": 0, "encode_ms": 0.0}
+        self.bytes_out = {name: 0 for name in self.profiles}
+
+    def _entry(self, image, profile):
+        snapshot = as_snapshot(image)
+        key = (snapshot.digest, profile)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry
+        settings = self.profiles[profile]
+        start = time.perf_counter()
+        data = self._encoder(snapshot, settings["max_side"], settings["quality"])
+        elapsed = (time.perf_counter() - start) * 1000
+        entry = {"bytes": data, "b64": None}
+        with self._lock:
+            self.counters["misses"] += 1
+            self.counters["encode_ms"] += elapsed
+            self.bytes_out[profile] = self.bytes_out.get(profile, 0) + len(data)
+            self._cache[key] = entry
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def encode(self, image, profile):
+        """JPEG bytes of `image` at the resolution of `profile` (encoded once, then cached)."""
+        return self._entry(image, profile)["bytes"]
+
+    def b64(self, image, profile):
+        """Base64 string of encode(image, profile) (cached as well)."""
+        entry = self._entry(image, profile)
+        if entry["b64"] is None:
+            entry["b64"] = base64.b64encode(entry["bytes"]).decode("ascii")
+        return entry["b64"]
+
+    def stats(self):
+        with self._lock:
+            c = dict(self.counters)
+            c["cached"] = len(self._cache)
+            c["bytes_out"] = dict(self.bytes_out)
+        c["encode_ms"] = round(c["encode_ms"], 1)
+        return c
+
+
+# Singleton instance
+image_pipeline = ImagePipeline()
@@ -0,0 +1,225 @@
+import os
+import re
+import threading
+from collections import namedtuple
+import numpy as np
+from fact_selector import ollama_embed
+
+# Ein Router für alle Absichten einer Chat-Nachricht statt vieler verstreuter
+# any(t in msg_low ...) Prüfungen (Stop, Webcam, Bildschirm, Sensor, Suche, Lernen, Kamera-Namen).
+# Stufe 1: ein vorkompilierter Regex über alle Schlüsselwörter, ein Durchlauf über den Text.
+#          Wörter werden an Wortgrenzen erkannt ("ist" oder "app" in "happy" lösen nichts mehr aus).
+# Stufe 2 (optional, INTENT_EMBEDDINGS=True): Embedding-Klassifikator mit gecachtem Label-Index.
+#          Schwache Vision-Treffer ("guck mal", "prüfe die Küche") lösen die Kamera nur aus,
+#          wenn auch die Bedeutung passt.
+# Ergebnis ist ein einziges Intent-Objekt; teure Seiteneffekte (Webcam) hängen nur daran.
+
+INTENT_EMBEDDINGS = os.getenv("INTENT_EMBEDDINGS", "False").lower() == "true"
+INTENT_SIMILARITY = float(os.getenv("INTENT_SIMILARITY", "0.6"))
+
+STOP_WORDS = ("stop", "halt", "ruhe", "sei still", "schnauze", "aufhören", "stop!", "stopp")
+
+# label -> Schlüsselwörter. "*" am Ende = Wortanfang genügt ("kamera*" trifft "kameras").
+KEYWORDS = {
+    # Eindeutige Kamera-/Blick-Wünsche
+    "vision": ["sieh mich an", "schau mich an", "was siehst du", "kamera*", "webcam*", "foto*", "cam"],
+    # Schwache Signale: nur zusammen mit einem Ort (Bildschirm-Spiegel) oder nach Embedding-Prüfung
+    "vision_weak": ["guck mal", "check mal", "prüf*"],
+    "explicit": ["kamera*", "foto*", "bild", "bilder", "screenshot*", "cam", "webcam*", "sieh*", "schau*", "guck*"],
+    "cam": ["kamera*", "cam"],
+    "screen": ["bildschirm*", "screenshot*", "screen", "desktop"],
+    # Orte, die über die Kamera-App auf dem Bildschirm zu sehen sind
+    "monitor": ["küche*", "herd", "sauber", "wohnzimmer", "yi iot", "app", "fenster*", "tür", "türe", "türen"],
+    "sensor": ["warm*", "kalt*", "temperatur*", "grad", "heizung*", "luftfeuchtigkeit", "wetter*"],
+    "search": ["such*", "google*", "recherchier*", "infos zu", "was gibt es neues", "aktuell*", "wetter*"],
+    "no_learn": ["bild*"],
+}
+
+LEARN_PATTERNS = [
+    re.compile(r'(?:lern|studier|schreib|erstelle)\s+(?:mir\s+)?(?:einen\s+)?(?:guide|anleitung|wissen|infos?)\s+(?:über|zu|für)\s+(.+)'),
+    re.compile(r'lern\s+mir\s+(.+)'),  # Dialekt "lern mir [Thema]"
+]
+SEARCH_CLEANUP = ("suche nach", "suche", "google", "bitte")
+
+# Beispielsätze für den Embedding-Klassifikator
+EXAMPLES = {
+    "webcam": ["schau mich an", "was siehst du gerade", "guck mal was ich in der hand habe", "wie sehe ich aus",
+               "erkennst du mich", "sieh dir das mal an"],
+    "screen": ["guck mal auf den bildschirm", "prüfe ob der herd aus ist", "check mal die küche",
+               "schau was in der kamera app los ist", "ist die tür zu"],
+    "chat": ["wie warm ist es im wohnzimmer", "ist die heizung an", "prüfe meine termine", "check mal das wetter",
+             "wie geht es dir", "guck mal ob ich neue notizen habe", "ist alles in ordnung"],
+}
+
+class KeywordMatcher:
+    """One precompiled regex for {label: [keywords]}; keywords match at word boundaries.
+
+    "*" at the end of a keyword means the word only has to start with it.
+    """
+
+    def __init__(self, keywords):
+        self._words = {}
+        for label, words in keywords.items():
+            for kw in words:
+                entry = self._words.setdefault(kw.rstrip("*"), [set(), False])
+                entry[0].add(label)
+                entry[1] = entry[1] or kw.endswith("*")
+        # Längste zuerst, damit "sieh mich an" vor "sieh" greift
+        alternatives = "|".join(re.escape(w) for w in sorted(self._words, key=len, reverse=True))
+        self._regex = re.compile(rf"(?<!\w)({alternatives})(\w*)") if alternatives else None
+
+    def labels(self, text):
+        """All labels whose keywords occur in `text` (lower case)."""
+        found = set()
+        if self._regex is None:
+            return found
+        for m in self._regex.finditer(text):
+            labels, prefix = self._words[m.group(1)]
+            if m.group(2) and not prefix:
+                continue
+            found |= labels
+        return found
+
+
+Intent = namedtuple("Intent", ["kind", "vision", "search_query", "learn_topic", "labels", "source"])
+
+
+class IntentRouter:
+    def __init__(self, cameras_fn=None, embed_fn=None, use_embeddings=None, threshold=INTENT_SIMILARITY):
+        self.cameras_fn = cameras_fn or (lambda: {})  # () -> {cam_id: {"name": ...}}
+        self._embed_fn = embed_fn or ollama_embed
+        self.use_embeddings = INTENT_EMBEDDINGS if use_embeddings is None else use_embeddings
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._compiled = None   # (camera-Namen, KeywordMatcher)
+        self._index = None      # (Labels, normierte Matrix)
+        self.counters = {"routed": 0, "embedding_checks": 0, "vetoed": 0}
+
+    # --- Stufe 1: ein Regex für alle Schlüsselwörter ---
+    def _matcher(self):
+        cameras = tuple(sorted((cid, data["name"].lower()) for cid, data in self.cameras_fn().items()
+                               if data.get("name")))
+        with self._lock:
+            if self._compiled is None or self._compiled[0] != cameras:
+                extra = {f"camera:{cid}": [name] for cid, name in cameras}
+                self._compiled = (cameras, KeywordMatcher(dict(KEYWORDS, **extra)))
+            return self._compiled[1]
+
+    def labels(self, text):
+        """All labels of the text in one pass."""
+        return self._matcher().labels(text)
+
+    # --- Stufe 2: Embedding-Klassifikator ---
+    def _label_index(self):
+        with self._lock:
+            if self._index is not None:
+                return self._index
+        names, vectors = [], []
+        for label, sentences in EXAMPLES.items():
+            for sentence in sentences:
+                vec = np.asarray(self._embed_fn(sentence), dtype=np.float32)
+                names.append(label)
+                vectors.append(vec / (np.linalg.norm(vec) or 1.0))
+        index = (names, np.vstack(vectors))
+        with self._lock:
+            self._index = index
+        return index
+
+    def classify(self, text):
+        """(label, similarity) of the closest example sentence, or (None, 0.0) if embeddings fail."""
+        try:
+            names, matrix = self._label_index()
+            vec = np.asarray(self._embed_fn(text), dtype=np.float32)
+            scores = matrix @ (vec / (np.linalg.norm(vec) or 1.0))
+            best = int(np.argmax(scores))
+            return names[best], float(scores[best])
+        except Exception as e:
+            print(f"[INTENT] Embedding-Klassifikator nicht verfügbar: {e}")
+            return None, 0.0
+
+    def _confirm(self, text, kind):
+        """Second opinion for weak vision triggers. True = side effect may fire.
+
+        The rules pick the target; the embedding only decides "look at something" vs. plain chat.
+        """
+        self.counters["embedding_checks"] += 1
+        label, score = self.classify(text)
+        if label is None or (label != "chat" and score >= self.threshold):
+            return True
+        self.counters["vetoed"] += 1
+        print(f"[INTENT] {kind} verworfen (Embedding: {label} {score:.2f}).")
+        return False
+
+    # --- Entscheidung ---
+    def is_stop(self, message):
+        return message.strip().lower() in STOP_WORDS
+
+    def route(self, message):
+        """One structured intent for the message."""
+        self.counters["routed"] += 1
+        text = message.lower()
+        if self.is_stop(message):
+            return Intent("stop", None, None, None, frozenset(), "rules")
+
+        labels = self.labels(text)
+        source = "rules"
+        vision = None
+        suppressed = "sensor" in labels and "explicit" not in labels
+
+        # Bestimmte Kamera ("Schau auf Kamera Garten")
+        if "cam" in labels:
+            cameras = sorted(label.split(":", 1)[1] for label in labels if label.startswith("camera:"))
+            if cameras:
+                vision = ("camera", cameras[0])
+
+        if vision is None and not suppressed:
+            # Küche/Herd/Tür + Blick-Wort -> Kamera-App auf dem Bildschirm spiegeln
+            target = "screen" if "screen" in labels or "monitor" in labels else "webcam"
+            if "screen" in labels or "vision" in labels:
+                vision = (target, None)
+            elif "vision_weak" in labels:
+                # "prüfe meine Termine" ist kein Kamera-Wunsch: ohne Ort nur mit Embedding-Bestätigung
+                if self.use_embeddings:
+                    source = "embedding"
+                    if self._confirm(text, target):
+                        vision = (target, None)
+                elif target == "screen":
+                    vision = (target, None)
+        elif vision is None and ("vision" in labels or "screen" in labels):
+            print("[INTENT] Vision unterdrückt, da Sensor-Abfrage vermutet.")
+
+        learn_topic = None
+        if "no_learn" not in labels and vision is None:
+            for pattern in LEARN_PATTERNS:
+                match = pattern.search(text)
+                if match:
+                    topic = match.group(1).strip()
+                    learn_topic = topic if len(topic) > 2 else None
+                    break
+
+        search_query = None
+        if "search" in labels and len(message) > 5 and vision is None:
+            search_query = message
+            for t in SEARCH_CLEANUP:
+                search_query = search_query.replace(t, "", 1)
+            search_query = search_query.strip()
+
+        if learn_topic:
+            kind = "learn"
+        elif vision:
+            kind = "vision"
+        elif search_query:
+            kind = "search"
+        else:
+            kind = "chat"
+        return Intent(kind, vision, search_query, learn_topic, frozenset(labels), source)
+
+    def stats(self):
+        c = dict(self.counters)
+        c["embeddings"] = self.use_embeddings
+        c["label_index"] = len(self._index[0]) if self._index else 0
+        return c
+
+
+# Singleton instance (camera names are wired up in main)
+intent_router = IntentRouter()
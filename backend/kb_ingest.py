@@ -0,0 +1,249 @@
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from scheduler import scheduler
+from model_residency import model_residency, ollama_client
+from chunker import chunk_document, CODE_EXTS
+
+# Einlesen der Wissensbasis als Pipeline.
+# Vorher: pro Datei lesen, in 1500-Zeichen-Stücke schneiden und jedes Stück einzeln
+# mit ollama.embeddings einbetten, streng nacheinander.
+# Jetzt drei Stufen:
+#  1. Extraktion + Chunking (siehe chunker) in einem kleinen Thread-Pool (PDF-Parsing läuft nur
+#     wenige Dateien voraus)
+#  2. Einbetten in Batches über /api/embed (mehrere Texte pro Aufruf), KB_EMBED_WORKERS Batches
+#     gleichzeitig unterwegs. Die Aufrufe laufen über scheduler.slot("embed") mit der Priorität
+#     des Aufrufers (Scan = background): ein Platz bleibt für Chat-Anfragen frei, der zweite
+#     Batch wartet schon in der Queue, damit Ollama zwischen zwei Batches nicht leerläuft.
+#  3. Übernehmen: sobald alle Chunks einer Datei eingebettet sind, ruft run() commit_fn genau
+#     einmal für diese Datei auf (im Thread des Aufrufers -> ein Store-Commit pro Datei).
+# Mit embed_cache gehen nur Chunks mit neuem Inhalt an Ollama; gleiche Texte innerhalb eines
+# Laufs werden einmal eingebettet und an alle Stellen verteilt.
+
+KB_EMBED_BATCH = int(os.getenv("KB_EMBED_BATCH", "16"))
+KB_EMBED_WORKERS = int(os.getenv("KB_EMBED_WORKERS", "2"))
+KB_EXTRACT_WORKERS = int(os.getenv("KB_EXTRACT_WORKERS", "2"))
+
+
+def extract_text(file_path):
+    """Plain text of a PDF, TXT/MD or code file ("" for unsupported types); chunk offsets refer to it."""
+    filename = os.path.basename(file_path)
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".pdf":
+        from pypdf import PdfReader
+        print(f"[KB] Lese PDF: {filename}...")
+        text = ""
+        for page in PdfReader(file_path).pages:
+            extract = page.extract_text()
+            if extract: text += extract + "\n"
+        return text
+    if ext in (".txt", ".md"):
+        print(f"[KB] Lese Text/MD: {filename}...")
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    if ext in CODE_EXTS:
+        print(f"[KB] Lese Code ({ext}): {filename}...")
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    return ""
+
+
+def doc_id_for(rel):
+    """Doc id of a file in the knowledge folder, from its relative path (a/notes.md and b/notes.md differ)."""
+    return "doc_" + rel.replace(os.sep, "/")
+
+
+def chunk_ids(doc_id, count):
+    """Ids of a file's chunks: the plain doc id for a single chunk, otherwise doc_id_part1..N."""
+    if count == 1:
+        return [doc_id]
+    return [f"{doc_id}_part{i + 1}" for i in range(count)]
+
+
+def ollama_embed_batch(texts, model=None):
+    """Embeds `texts` with one /api/embed call (one /api/embeddings call per text on older clients)."""
+    client = ollama_client()
+    model = model or os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    keep_alive = model_residency.keep_alive(model)
+    with scheduler.slot("embed"), model_residency.use(model) as info:
+        if hasattr(client, "embed"):
+            res = client.embed(model=model, input=list(texts), keep_alive=keep_alive)
+            info["load_ns"] = res.get('load_duration')
+            return res["embeddings"]
+        return [client.embeddings(model=model, prompt=t, keep_alive=keep_alive)["embedding"] for t in texts]
+
+
+def _submit(pool, fn, *args):
+    # Priorität (scheduler) und Abbruch-Token sind ContextVars -> in den Worker mitnehmen
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+class _File:
+    def __init__(self, job, chunks):
+        self.job = job
+        self.chunks = chunks
+        self.vectors = [None] * len(chunks)
+        self.remaining = len(chunks)
+        self.failed = False
+
+
+class Ingestor:
+    def __init__(self, embed_fn=None, extract_fn=None, chunk_fn=None, cache=None,
+                 batch_size=KB_EMBED_BATCH, workers=KB_EMBED_WORKERS, extract_workers=KB_EXTRACT_WORKERS):
+        self._embed_fn = embed_fn or ollama_embed_batch
+        self.cache = cache
+        self._extract_fn = extract_fn or extract_text
+        self._chunk_fn = chunk_fn or chunk_document
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.extract_workers = max(1, extract_workers)
+        self._lock = threading.Lock()
+        self.counters = {"runs": 0, "files": 0, "chunks": 0, "embedded": 0, "cached": 0, "deduped": 0,
+                         "batches": 0, "failed_files": 0, "seconds": 0.0}
+        self.last_run = None
+
+    def _prepare(self, job):
+        text = self._extract_fn(job["path"])
+        if not text.strip():
+            print(f"[KB] WARNUNG: Kein Text aus '{os.path.basename(job['path'])}' extrahiert. (Eventuell gescanntes PDF oder leer?)")
+            return [], []
+        chunks = self._chunk_fn(text, job["path"])
+        if self.cache is None:
+            return chunks, [None] * len(chunks)
+        return chunks, self.cache.lookup([c[2] for c in chunks])
+
+    def _prepared(self, pool, jobs):
+        """Yields (job, future of (chunks, cached vectors)) in order; extraction runs at most a few files ahead."""
+        ahead = deque()
+        for job in jobs:
+            ahead.append((job, _submit(pool, self._prepare, job)))
+            if len(ahead) > self.extract_workers:
+                yield ahead.popleft()
+        while ahead:
+            yield ahead.popleft()
+
+    def _embed(self, texts):
+        vectors = np.asarray(self._embed_fn(texts), dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(texts):
+            raise ValueError(f"{len(texts)} Texte gesendet, {len(vectors)} Embeddings erhalten")
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-10)
+        if self.cache is not None:
+            try:
+                self.cache.store(texts, vectors)
+            except Exception as e:
+                print(f"[KB] Embedding-Cache nicht beschreibbar: {e}")
+        return vectors
+
+    def run(self, jobs, commit_fn):
+        """Extracts, chunks and embeds the files in `jobs` ({"path", "doc_id", ...}).
+
+        Calls commit_fn(job, chunks, vectors) once per file in the calling thread; chunks are
+        (start, end, text) tuples. Files with a failed extraction or embedding are not committed.
+        """
+        start = time.perf_counter()
+        run = {"files": 0, "chunks": 0, "embedded": 0, "cached": 0, "deduped": 0, "batches": 0, "failed_files": 0}
+        pending = {}   # future -> [text]
+        waiting = {}   # text -> [(file, chunk index)], bis das Embedding da ist
+
+        def fail(f, e):
+            if not f.failed:
+                f.failed = True
+                run["failed_files"] += 1
+                print(f"[KB] Fehler bei {os.path.basename(f.job['path'])}: {e}")
+
+        def commit(f):
+            try:
+                commit_fn(f.job, f.chunks, f.vectors)
+            except Exception as e:
+                fail(f, e)
+                return
+            run["files"] += 1
+            run["chunks"] += len(f.chunks)
+
+        def collect(done):
+            for future in done:
+                texts = pending.pop(future)
+                try:
+                    vectors = future.result()
+                except Exception as e:
+                    for text in texts:
+                        for f, _ in waiting.pop(text):
+                            fail(f, e)
+                    continue
+                for text, vec in zip(texts, vectors):
+                    for f, i in waiting.pop(text):
+                        f.vectors[i] = vec
+                        f.remaining -= 1
+                        if f.remaining == 0 and not f.failed:
+                            commit(f)
+
+        def flush(batch):
+            # Höchstens zwei Batches pro Worker unterwegs, sonst liegt der halbe Ordner im RAM
+            while len(pending) >= 2 * self.workers:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            pending[_submit(embed_pool, self._embed, batch)] = batch
+            run["batches"] += 1
+            run["embedded"] += len(batch)
+
+        with ThreadPoolExecutor(self.extract_workers, thread_name_prefix="kb-extract") as extract_pool, \
+             ThreadPoolExecutor(self.workers, thread_name_prefix="kb-embed") as embed_pool:
+            batch = []
+            for job, future in self._prepared(extract_pool, jobs):
+                try:
+                    chunks, cached = future.result()
+                except Exception as e:
+                    print(f"[KB] Fehler beim Lesen von {os.path.basename(job['path'])}: {e}")
+                    run["failed_files"] += 1
+                    continue
+                f = _File(job, chunks)
+                for i, vec in enumerate(cached):
+                    if vec is not None:
+                        f.vectors[i] = vec
+                        f.remaining -= 1
+                        run["cached"] += 1
+                        continue
+                    text = chunks[i][2]
+                    if text in waiting:
+                        # Gleicher Text schon unterwegs -> Ergebnis teilen
+                        waiting[text].append((f, i))
+                        run["deduped"] += 1
+                        continue
+                    waiting[text] = [(f, i)]
+                    batch.append(text)
+                    if len(batch) >= self.batch_size:
+                        flush(batch)
+                        batch = []
+                if f.remaining == 0:
+                    commit(f)
+            if batch:
+                flush(batch)
+            while pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+
+        elapsed = time.perf_counter() - start
+        run["seconds"] = round(elapsed, 2)
+        run["chunks_per_s"] = round(run["chunks"] / elapsed, 1) if elapsed else 0.0
+        with self._lock:
+            self.counters["runs"] += 1
+            for key in ("files", "chunks", "embedded", "cached", "deduped", "batches", "failed_files"):
+                self.counters[key] += run[key]
+            self.counters["seconds"] += elapsed
+            self.last_run = run
+        if run["chunks"] or run["failed_files"]:
+            print(f"[KB] {run['chunks']} Chunks aus {run['files']} Dateien in {run['seconds']:.1f}s übernommen "
+                  f"({run['chunks_per_s']} Chunks/s; {run['embedded']} eingebettet in {run['batches']} Batches, "
+                  f"{run['cached']} aus Cache, {run['deduped']} doppelt; {run['failed_files']} Fehler).")
+        return run
+
+    def stats(self):
+        with self._lock:
+            c = dict(self.counters)
+            c["last_run"] = dict(self.last_run) if self.last_run else None
+        c["seconds"] = round(c["seconds"], 2)
+        c["chunks_per_s"] = round(c["chunks"] / c["seconds"], 1) if c["seconds"] else 0.0
+        c.update(batch_size=self.batch_size, workers=self.workers)
+        return c
@@ -0,0 +1,339 @@
+import os
+import re
+import pickle
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+# Persistenz der Wissensbasis ohne Pickle-Neuschreiben.
+# Vorher hat jedes upsert die komplette Liste inkl. Embeddings neu gepickelt
+# (ein PDF mit N Chunks = N komplette Schreibvorgänge, O(N²) I/O) und der Start
+# hat alles in Python-Objekte zurückverwandelt.
+# Jetzt:
+#  - kb_vectors.f32: flache float32-Datei, nur Anhängen (Zeile = ein Embedding).
+#    Gelesen wird sie per np.memmap, erst wenn der Index geladen oder kompaktiert wird.
+#  - kb_meta.db (SQLite): id, Quelldatei, mtime, Offsets, Text und die Zeile in der Vektordatei.
+#  - Geschrieben wird in Batches (ein Commit pro Batch, z.B. pro Datei beim Scan).
+#    Ersetzte/gelöschte Zeilen bleiben als "tot" in der Datei, bis die Kompaktierung
+#    im Hintergrund sie entfernt.
+#  - Ein vorhandenes kb_index.pkl wird beim ersten Start importiert (danach *.migrated).
+#  - Tabelle files: Manifest des knowledge-Ordners (Pfad, Größe, mtime, Hash) für kb_watcher,
+#    geschrieben im selben Commit wie die Chunks der Datei.
+#  - Die Kompaktierung schreibt eine neue Generation (kb_vectors.<n>.f32). Welche Datei gilt,
+#    steht in meta.vector_file und wechselt im selben Commit wie die neu nummerierten Zeilen;
+#    die alte Datei wird erst danach gelöscht. Nach einem Absturz räumt _recover() übrig
+#    gebliebene Generationen weg.
+
+VECTOR_FILE = "kb_vectors.f32"
+_VECTOR_FILE_RE = re.compile(r"kb_vectors(?:\.(\d+))?\.f32")
+META_FILE = "kb_meta.db"
+LEGACY_INDEX = "kb_index.pkl"
+# Kompaktieren, wenn mehr als dieser Anteil der Zeilen tot ist (und mindestens COMPACT_MIN_DEAD)
+COMPACT_RATIO = 0.3
+COMPACT_MIN_DEAD = 64
+
+
+class KBStore:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.conn = sqlite3.connect(os.path.join(base_dir, META_FILE), check_same_thread=False)
+        self._lock = threading.RLock()
+        self._depth = 0          # verschachtelte batch()-Blöcke
+        self._vectors = None     # Anhänge-Handle der Vektordatei
+        self._compacting = None
+        self._compact_pending = False   # Kompaktierung wartet auf das Ende des äußersten batch()
+        self._init_db()
+        self.vector_path = os.path.join(base_dir, self._meta("vector_file") or VECTOR_FILE)
+        self.dim = self._meta("dim", int)
+        self.rows = self._meta("rows", int) or 0
+        self._recover()
+        self.counters = {"commits": 0, "appended": 0, "compactions": 0}
+
+    def _init_db(self):
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    row INTEGER,
+                    source TEXT,
+                    mtime REAL,
+                    start_offset INTEGER,
+                    end_offset INTEGER,
+                    text TEXT
+                )
+            ''')
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime REAL,
+                    hash TEXT
+                )
+            ''')
+            self.conn.commit()
+
+    def _meta(self, key, cast=str):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return cast(row[0]) if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _recover(self):
+        """Repairs the state after a crash.
+
+        Removes vector files of other generations (compaction crashed before its commit, or
+        after it but before deleting the old file) and cuts vectors that were appended but
+        never committed.
+        """
+        current = os.path.basename(self.vector_path)
+        for name in os.listdir(self.base_dir):
+            if name != current and _VECTOR_FILE_RE.fullmatch(name):
+                print(f"[KB] Entferne veraltete Vektordatei {name}.")
+                os.remove(os.path.join(self.base_dir, name))
+        if not self.dim or not os.path.exists(self.vector_path):
+            return
+        committed = self.rows * self.dim * 4
+        if os.path.getsize(self.vector_path) > committed:
+            print("[KB] Nicht übernommene Vektoren gefunden, kürze Datei.")
+            with open(self.vector_path, "r+b") as f:
+                f.truncate(committed)
+
+    # --- Lesen ---
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def load(self):
+        """(ids, texts, mtimes, matrix) of all live chunks; the matrix is read through a memmap of the vector file."""
+        with self._lock:
+            rows = self.conn.execute("SELECT id, text, mtime, row FROM chunks ORDER BY row").fetchall()
+            if not rows or not self.dim:
+                return [], [], [], None
+            mm = np.memmap(self.vector_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+            try:
+                # Kopie in den RAM: ein geöffnetes Mapping würde unter Windows das Kompaktieren blockieren
+                matrix = np.array(mm[[r[3] for r in rows]])
+            finally:
+                del mm
+        return [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], matrix
+
+    def span(self, doc_id):
+        """(source, mtime, start, end, text) of one chunk, or None."""
+        with self._lock:
+            return self.conn.execute("SELECT source, mtime, start_offset, end_offset, text FROM chunks WHERE id = ?",
+                                     (doc_id,)).fetchone()
+
+    def file_chunks(self, source, doc_id):
+        """Ids of a file's chunks: rows stored for `source`, plus rows without a source named doc_id / doc_id_partN.
+
+        The source match also finds chunks of older id schemes (basename ids, see kb_ingest.doc_id_for);
+        the id match covers chunks imported from kb_index.pkl.
+        """
+        pattern = re.compile(re.escape(doc_id) + r"(?:_part\d+)?")
+        with self._lock:
+            ids = {r[0] for r in self.conn.execute("SELECT id FROM chunks WHERE source = ?", (source,))}
+            legacy = self.conn.execute("SELECT id FROM chunks WHERE source IS NULL AND id >= ? AND id < ?",
+                                       (doc_id, doc_id + "\uffff"))
+            ids.update(r[0] for r in legacy if pattern.fullmatch(r[0]))
+        return sorted(ids)
+
+    def meta(self, key):
+        with self._lock:
+            return self._meta(key)
+
+    def set_meta(self, key, value):
+        with self._lock, self.batch():
+            self._set_meta(key, value)
+
+    def dead_rows(self):
+        return self.rows - len(self)
+
+    # --- Schreiben ---
+    @contextmanager
+    def batch(self):
+        """Groups writes; the vector file is flushed and SQLite committed once at the end of the outermost batch.
+
+        The lock is only held per write, not for the whole batch (embedding a file takes a while).
+        """
+        with self._lock:
+            self._depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._commit()
+                    if self._compact_pending:
+                        # Der zurückgestellte Kompaktierungs-Thread ist schon fertig oder beendet sich gerade
+                        self._compact_pending = False
+                        self._start_compaction(force=True)
+
+    def _commit(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._set_meta("rows", self.rows)
+        if self.dim:
+            self._set_meta("dim", self.dim)
+        self.conn.commit()
+        self.counters["commits"] += 1
+
+    def put(self, doc_id, text, emb, mtime=0, source=None, start=None, end=None):
+        """Appends the embedding and (re)points the chunk's metadata to it."""
+        emb = np.asarray(emb, dtype=np.float32).ravel()
+        with self._lock, self.batch():
+            if self.dim != emb.shape[0]:
+                if self.dim is not None and len(self):
+                    raise ValueError(f"Embedding-Dimension {emb.shape[0]} passt nicht zur Vektordatei ({self.dim})")
+                self._reset_vectors(emb.shape[0])
+            if self._vectors is None:
+                self._vectors = open(self.vector_path, "ab")
+            self._vectors.write(emb.tobytes())
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO chunks (id, row, source, mtime, start_offset, end_offset, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc_id, self.rows, source, mtime, start, end, text))
+            except Exception:
+                # Zeile und Datei müssen deckungsgleich bleiben
+                self._vectors.flush()
+                self._vectors.truncate(self.rows * self.dim * 4)
+                raise
+            self.rows += 1
+            self.counters["appended"] += 1
+
+    def delete(self, doc_ids):
+        with self._lock, self.batch():
+            self.conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in doc_ids])
+
+    def clear(self):
+        with self._lock, self.batch():
+            self.conn.execute("DELETE FROM chunks")
+            self.conn.execute("DELETE FROM files")
+            self._reset_vectors(None)
+
+    def _reset_vectors(self, dim):
+        """Empty vector file (first chunk or a new embedding model on an empty store)."""
+        if self._vectors is not None:
+            self._vectors.close()
+            self._vectors = None
+        open(self.vector_path, "wb").close()
+        self.rows = 0
+        self.dim = dim
+        if dim is None:
+            self.conn.execute("DELETE FROM meta WHERE key = 'dim'")
+
+    # --- Datei-Manifest ---
+    def files(self):
+        """{relative path: {"size", "mtime", "hash"}} of all indexed files."""
+        with self._lock:
+            rows = self.conn.execute("SELECT path, size, mtime, hash FROM files").fetchall()
+        return {r[0]: {"size": r[1], "mtime": r[2], "hash": r[3]} for r in rows}
+
+    def put_file(self, path, size, mtime, digest):
+        with self._lock, self.batch():
+            self.conn.execute("INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)",
+                              (path, size, mtime, digest))
+
+    def delete_file(self, path):
+        with self._lock, self.batch():
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    # --- Kompaktierung ---
+    def maybe_compact(self):
+        """Starts a background compaction if enough dead rows have piled up."""
+        dead = self.dead_rows()
+        if dead < COMPACT_MIN_DEAD or dead < COMPACT_RATIO * self.rows:
+            return False
+        with self._lock:
+            return self._start_compaction()
+
+    def _start_compaction(self, force=False):
+        if not force and self._compacting is not None and self._compacting.is_alive():
+            return False
+        self._compacting = threading.Thread(target=self.compact, daemon=True, name="kb-compact")
+        self._compacting.start()
+        return True
+
+    def _next_vector_path(self):
+        match = _VECTOR_FILE_RE.fullmatch(os.path.basename(self.vector_path))
+        generation = int(match.group(1) or 0) + 1 if match else 1
+        return os.path.join(self.base_dir, f"kb_vectors.{generation}.f32")
+
+    def compact(self):
+        """Writes the live rows to a new vector file generation and renumbers the rows in SQLite.
+
+        The switch to the new file is part of the same commit as the renumbering, so a crash at
+        any point leaves a consistent store (see _recover). Inside an open batch() (another thread
+        is between writes of one file) it only marks itself pending and runs when the outermost
+        batch commits.
+        """
+        with self._lock:
+            if self._depth > 0:
+                self._compact_pending = True
+                return
+            if not self.dim or not self.rows:
+                return
+            live = self.conn.execute("SELECT id, row FROM chunks ORDER BY row").fetchall()
+            if self._vectors is not None:
+                self._vectors.close()
+                self._vectors = None
+            before, old_path = self.rows, self.vector_path
+            new_path = self._next_vector_path()
+            mm = np.memmap(old_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+            try:
+                with open(new_path, "wb") as out:
+                    for i in range(0, len(live), 4096):
+                        out.write(np.ascontiguousarray(mm[[r[1] for r in live[i:i + 4096]]]).tobytes())
+                    out.flush()
+                    os.fsync(out.fileno())
+            finally:
+                del mm
+            try:
+                self.conn.executemany("UPDATE chunks SET row = ? WHERE id = ?", [(n, r[0]) for n, r in enumerate(live)])
+                self._set_meta("vector_file", os.path.basename(new_path))
+                self.vector_path, self.rows = new_path, len(live)
+                self._commit()
+            except Exception:
+                # Alte Datei und alte Nummerierung bleiben gültig
+                self.conn.rollback()
+                self.vector_path, self.rows = old_path, before
+                os.remove(new_path)
+                raise
+            try:
+                os.remove(old_path)
+            except OSError as e:
+                # z.B. unter Windows noch geöffnet -> _recover() räumt beim nächsten Start auf
+                print(f"[KB] Alte Vektordatei bleibt vorerst liegen: {e}")
+            self.counters["compactions"] += 1
+        print(f"[KB] Vektordatei kompaktiert: {before} -> {self.rows} Zeilen.")
+
+    # --- Migration ---
+    def migrate_pickle(self, path=None):
+        """Imports a legacy kb_index.pkl into an empty store and renames it to *.migrated. Returns the count."""
+        path = path or os.path.join(self.base_dir, LEGACY_INDEX)
+        if not os.path.exists(path) or len(self):
+            return 0
+        with open(path, "rb") as f:
+            docs = pickle.load(f)
+        with self.batch():
+            for d in docs:
+                self.put(d["id"], d["text"], d["emb"], d.get("mtime", 0))
+        os.replace(path, path + ".migrated")
+        print(f"[KB] {len(docs)} Einträge aus {os.path.basename(path)} übernommen.")
+        return len(docs)
+
+    def stats(self):
+        with self._lock:
+            live = len(self)
+            return dict(self.counters, chunks=live, rows=self.rows, dead_rows=self.rows - live, dim=self.dim,
+                        vector_bytes=os.path.getsize(self.vector_path) if os.path.exists(self.vector_path) else 0)
+
+    def close(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.close()
+                self._vectors = None
+            self.conn.close()
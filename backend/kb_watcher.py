@@ -0,0 +1,242 @@
+import os
+import time
+import hashlib
+import threading
+from collections import deque
+from chunker import CODE_EXTS
+
+# Beobachtet den knowledge-Ordner im Hintergrund.
+# Vorher: KnowledgeBase() lief beim Import einmal komplett durch os.walk + mtime-Vergleich
+# (Backend-Start wartet darauf), neue Dateien kamen erst nach einem Neustart oder
+# "lern mir" in den Index.
+# Jetzt:
+#  - Manifest (Pfad, Größe, mtime, Hash) liegt in kb_meta.db (kb_store, Tabelle files).
+#  - Ein Poll-Thread vergleicht alle KB_WATCH_INTERVAL Sekunden nur os.stat mit dem Manifest.
+#    Gehasht wird erst bei anderer Größe/mtime; gleicher Hash = nur angefasst, kein Neu-Einbetten.
+#  - Geänderte Dateien gehen in eine Queue, ein Index-Thread arbeitet sie gesammelt ab
+#    (index_fn, z.B. die Ingest-Pipeline). Gelöschte Dateien gehen an remove_fn.
+#  - Dateien, die gerade noch geschrieben werden (mtime jünger als KB_WATCH_SETTLE), warten
+#    einen Poll; fehlgeschlagene Dateien erst nach KB_WATCH_RETRY Sekunden wieder.
+# Die Suche bedient währenddessen den vorhandenen Index.
+
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "2.0"))
+KB_WATCH_SETTLE = float(os.getenv("KB_WATCH_SETTLE", "1.0"))
+KB_WATCH_RETRY = float(os.getenv("KB_WATCH_RETRY", "60"))
+SUPPORTED_EXTS = {".pdf", ".txt", ".md"} | CODE_EXTS
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class KBWatcher:
+    def __init__(self, directory, store, index_fn, remove_fn, interval=None, settle=None, retry=None):
+        """index_fn(entries) indexes changed files and returns the set of rel paths that failed;
+        remove_fn(entries) drops deleted files. Entries are dicts with rel, path, size, mtime, hash, new."""
+        self.directory = os.path.abspath(directory)
+        self.store = store
+        self._index_fn = index_fn
+        self._remove_fn = remove_fn
+        self.interval = KB_WATCH_INTERVAL if interval is None else interval
+        self.settle = KB_WATCH_SETTLE if settle is None else settle
+        self.retry = KB_WATCH_RETRY if retry is None else retry
+        self._manifest = store.files()
+        self._queue = deque()
+        self._queued = {}        # rel -> entry (wartend oder in Arbeit)
+        self._retry_at = {}      # rel -> ((size, mtime), Zeitpunkt)
+        self._busy = False
+        self._force = False
+        self._cond = threading.Condition()
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self.counters = {"polls": 0, "queued": 0, "indexed": 0, "touched": 0, "removed": 0, "failed": 0}
+        self.last_poll_ms = 0.0
+
+    # --- Erkennen ---
+    def force_rescan(self):
+        """The next poll queues every file, even unchanged ones (e.g. after a chunker change)."""
+        self._force = True
+
+    def reset(self):
+        """Reloads the manifest from the store (after the KB was cleared)."""
+        with self._poll_lock, self._cond:
+            self._manifest = self.store.files()
+
+    def poll(self, settle=None):
+        """One pass over the folder: queues changed files, removes deleted ones. Returns the number queued."""
+        settle = self.settle if settle is None else settle
+        with self._poll_lock:
+            start = time.perf_counter()
+            force, self._force = self._force, False
+            now = time.time()
+            seen, changed = set(), []
+            for root, dirs, files in os.walk(self.directory):
+                for filename in files:
+                    if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTS:
+                        continue
+                    path = os.path.join(root, filename)
+                    rel = os.path.relpath(path, self.directory)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    seen.add(rel)
+                    entry = self._check(rel, path, st, now, force, settle)
+                    if entry is not None:
+                        changed.append(entry)
+
+            with self._cond:
+                deleted = [dict(self._manifest[rel], rel=rel, path=os.path.join(self.directory, rel))
+                           for rel in self._manifest if rel not in seen and rel not in self._queued]
+            if deleted:
+                self._remove(deleted)
+            if changed:
+                self._enqueue(changed)
+            self.counters["polls"] += 1
+            self.last_poll_ms = round((time.perf_counter() - start) * 1000, 1)
+            return len(changed)
+
+    def _check(self, rel, path, st, now, force, settle):
+        with self._cond:
+            known = self._manifest.get(rel)
+            if rel in self._queued:
+                return None
+        if not force and known and known["size"] == st.st_size and known["mtime"] == st.st_mtime:
+            return None
+        if now - st.st_mtime < settle:
+            return None   # wird evtl. noch geschrieben
+        retry = self._retry_at.get(rel)
+        if retry and retry[0] == (st.st_size, st.st_mtime) and now < retry[1]:
+            return None
+        try:
+            digest = file_hash(path)
+        except OSError:
+            return None
+        entry = {"rel": rel, "path": path, "size": st.st_size, "mtime": st.st_mtime, "hash": digest,
+                 "new": known is None}
+        if not force and known and known["hash"] == digest:
+            # Nur angefasst, Inhalt gleich -> Manifest nachziehen, nicht neu einbetten
+            self.store.put_file(rel, st.st_size, st.st_mtime, digest)
+            with self._cond:
+                self._manifest[rel] = {"size": st.st_size, "mtime": st.st_mtime, "hash": digest}
+            self.counters["touched"] += 1
+            return None
+        return entry
+
+    def _remove(self, entries):
+        try:
+            self._remove_fn(entries)
+        except Exception as e:
+            print(f"[KB] Entfernen gelöschter Dateien fehlgeschlagen: {e}")
+            return
+        with self._cond:
+            for e in entries:
+                self._manifest.pop(e["rel"], None)
+        self.counters["removed"] += len(entries)
+
+    def _enqueue(self, entries):
+        with self._cond:
+            for e in entries:
+                self._queued[e["rel"]] = e
+            self._queue.append(entries)
+            self.counters["queued"] += len(entries)
+            self._cond.notify_all()
+
+    # --- Abarbeiten ---
+    def _take(self):
+        """All queued entries as one batch (the ingest pipeline batches across files)."""
+        batch = []
+        while self._queue:
+            batch.extend(self._queue.popleft())
+        self._busy = True
+        return batch
+
+    def _process(self, batch):
+        try:
+            failed = self._index_fn(batch) or set()
+        except Exception as err:
+            print(f"[KB] Indizierung fehlgeschlagen: {err}")
+            failed = {e["rel"] for e in batch}
+        now = time.time()
+        with self._cond:
+            for e in batch:
+                if e["rel"] in failed:
+                    self._retry_at[e["rel"]] = ((e["size"], e["mtime"]), now + self.retry)
+                    self.counters["failed"] += 1
+                else:
+                    self._retry_at.pop(e["rel"], None)
+                    self._manifest[e["rel"]] = {"size": e["size"], "mtime": e["mtime"], "hash": e["hash"]}
+                    self.counters["indexed"] += 1
+                self._queued.pop(e["rel"], None)
+            self._busy = False
+            self._cond.notify_all()
+
+    def _index_loop(self):
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stop.is_set())
+                if self._stop.is_set():
+                    return
+                batch = self._take()
+            self._process(batch)
+
+    def _poll_loop(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[KB] Watcher-Fehler: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        if self.running():
+            return
+        self._stop.clear()
+        os.makedirs(self.directory, exist_ok=True)
+        self._threads = [threading.Thread(target=self._index_loop, daemon=True, name="kb-index"),
+                         threading.Thread(target=self._poll_loop, daemon=True, name="kb-watch")]
+        for t in self._threads:
+            t.start()
+        print(f"[KB] Beobachte '{self.directory}' (alle {self.interval:g}s).")
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+
+    def wait_idle(self, timeout=None):
+        """Blocks until the queue is empty and nothing is being indexed. Returns False on timeout."""
+        if not self.running():
+            # Ohne Threads (Tests, Tools): Queue direkt hier abarbeiten
+            with self._cond:
+                batch = self._take() if self._queue else None
+            if batch is not None:
+                self._process(batch)
+            return True
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def sync(self, timeout=None):
+        """Polls now and waits until everything found is indexed (e.g. right after writing a file)."""
+        self.poll(settle=0)
+        return self.wait_idle(timeout)
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._queued)
+            busy = self._busy
+            files = len(self._manifest)
+        return dict(self.counters, files=files, pending=pending, indexing=busy,
+                    running=self.running(), last_poll_ms=self.last_poll_ms, interval=self.interval)
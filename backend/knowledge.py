@@ -1,120 +1,149 @@
 import os
-import pickle
 import numpy as np
 from typing import List, Optional
-import ollama
-from pypdf import PdfReader
+from scheduler import scheduler
+from model_residency import model_residency, ollama_client
+from vector_index import VectorIndex
+from kb_store import KBStore
+from kb_ingest import Ingestor, ollama_embed_batch, chunk_ids, doc_id_for, extract_text
+from embed_cache import EmbeddingCache, CACHE_FILE
+from chunker import CHUNKER_ID
+from kb_watcher import KBWatcher
+
+# Doc-Ids aus dem relativen Pfad statt dem Dateinamen (gleiche Namen in Unterordnern kollidierten)
+DOC_ID_SCHEME = "rel-v1"
 
 class KnowledgeBase:
-    def __init__(self, base_dir=None):
-        self.base_dir = base_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb")
+    def __init__(self, base_dir=None, knowledge_dir=None):
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.base_dir = base_dir or os.path.join(here, "kb")
         os.makedirs(self.base_dir, exist_ok=True)
-        self.index_path = os.path.join(self.base_dir, "kb_index.pkl")
-        self.docs = []
+        # Persistenz: Vektordatei (memmap) + SQLite-Metadaten, Anhängen pro Batch (siehe kb_store)
+        self.store = KBStore(self.base_dir)
+        # Embeddings als float32-Matrix mit parallelen id/text-Listen (siehe vector_index)
+        self.index = VectorIndex()
         # Use a good default embedding model
         self.embed_model = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+        # sha256(Modell + Text) -> Vektor: nur geänderte Chunks werden neu eingebettet (siehe embed_cache)
+        self.embed_cache = EmbeddingCache(os.path.join(self.base_dir, CACHE_FILE), self.embed_model)
+        self.ingestor = Ingestor(lambda texts: ollama_embed_batch(texts, self.embed_model), cache=self.embed_cache)
         self._load()
-        # Auto-scan knowledge folder on init
-        self.scan_directory()
-
-    def scan_directory(self, directory="knowledge"):
-        """Scans the directory for PDF, TXT, MD and Code files."""
-        if not os.path.exists(directory):
-            try:
-                os.makedirs(directory, exist_ok=True)
-            except: pass
-            return
-
-        print(f"[KB] Scanne '{directory}' nach Dokumenten...")
-        
-        # Supported extensions for code/technical docs
-        code_exts = {'.py', '.js', '.ts', '.html', '.css', '.json', '.sh', '.bat', '.cpp', '.c', '.h', '.java', '.go', '.rs'}
-        
-        for root, dirs, files in os.walk(directory):
-            for filename in files:
-                file_path = os.path.join(root, filename)
-                doc_id = f"doc_{filename}"
-                
-                # Check if already indexed and up-to-date
-                file_mtime = os.path.getmtime(file_path)
+        # Der knowledge-Ordner wird im Hintergrund beobachtet (siehe kb_watcher), der Start
+        # wartet nicht mehr auf einen kompletten Scan. Gleicher Ordner wie Librarian/"lern mir".
+        self.watcher = KBWatcher(knowledge_dir or os.path.join(here, "knowledge"), self.store,
+                                 self._index_files, self._remove_files)
+        # Anderer Chunker / andere Chunk-Größe / altes Id-Schema -> alles neu schneiden
+        # (Embeddings kommen großteils aus dem Cache)
+        self._rechunk = self.store.meta("chunker") != CHUNKER_ID or self.store.meta("doc_ids") != DOC_ID_SCHEME
+        if self._rechunk:
+            if len(self.index):
+                print(f"[KB] Chunk-Konfiguration geändert ({CHUNKER_ID}, {DOC_ID_SCHEME}), lese alle Dateien neu ein...")
+                self.watcher.force_rescan()
+            else:
+                self._rechunk_done()
+
+    def _rechunk_done(self):
+        with self.store.batch():
+            self.store.set_meta("chunker", CHUNKER_ID)
+            self.store.set_meta("doc_ids", DOC_ID_SCHEME)
+        self._rechunk = False
+
+    def start_watcher(self):
+        """Starts the background watcher; the existing index serves searches while it catches up."""
+        self.watcher.start()
+
+    def stop_watcher(self):
+        self.watcher.stop()
+
+    def scan_directory(self, timeout=120):
+        """Picks up changes in the knowledge folder right now and waits until they are indexed."""
+        return self.watcher.sync(timeout)
+
+    def _index_files(self, entries):
+        """index_fn of the watcher: runs the ingest pipeline over changed files. Returns the failed rel paths."""
+        with scheduler.priority("background"):
+            jobs = []
+            for entry in entries:
+                filename = os.path.basename(entry["path"])
+                doc_id = doc_id_for(entry["rel"])
                 
                 # Check for exact match or parts (chunked files)
-                existing_parts = [d for d in self.docs if d.get('id') == doc_id or d.get('id', '').startswith(doc_id + "_part")]
+                existing_parts = self.store.file_chunks(entry["path"], doc_id)
                 
                 if existing_parts:
                     # Check mtime of the first found part
-                    last_mtime = existing_parts[0].get('mtime', 0)
-                    if file_mtime <= last_mtime:
-                        continue # Skip if up-to-date
+                    last_mtime = (self.index.get(existing_parts[0]) or {}).get("mtime") or 0
+                    if entry["new"] and not self._rechunk and entry["mtime"] <= last_mtime:
+                        # Schon indiziert, nur noch nicht im Manifest (Index von vor dem Watcher)
+                        self.store.put_file(entry["rel"], entry["size"], entry["mtime"], entry["hash"])
+                        continue
                     print(f"[KB] Datei aktualisiert: {filename} (Re-Indiziere...)")
-                    
-                    # Remove old parts before re-indexing to avoid duplicates
-                    self.docs = [d for d in self.docs if d.get('id') != doc_id and not d.get('id', '').startswith(doc_id + "_part")]
-                
-                text = ""
-                ext = os.path.splitext(filename)[1].lower()
                 
-                try:
-                    if ext == ".pdf":
-                        print(f"[KB] Lese PDF: {filename}...")
-                        reader = PdfReader(file_path)
-                        for page in reader.pages:
-                            extract = page.extract_text()
-                            if extract: text += extract + "\n"
-                    
-                    elif ext == ".txt" or ext == ".md":
-                        print(f"[KB] Lese Text/MD: {filename}...")
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            text = f.read()
-                            
-                    elif ext in code_exts:
-                        print(f"[KB] Lese Code ({ext}): {filename}...")
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                            # Wrap code in markdown block for better LLM context
-                            text = f"File: {filename}\n```{ext[1:]}\n{content}\n```"
-
-                    if not text.strip():
-                        print(f"[KB] WARNUNG: Kein Text aus '{filename}' extrahiert. (Eventuell gescanntes PDF oder leer?)")
-                    
-                    else:
-                        # Chunking for large files (Optimized for Embeddings)
-                        # 1500 chars is approx 300-400 tokens, safe for most models (2048/8192 limit)
-                        CHUNK_SIZE = 1500
-                        
-                        if len(text) > CHUNK_SIZE:
-                            chunks = [text[i:i+CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
-                            for i, chunk in enumerate(chunks):
-                                chunk_id = f"{doc_id}_part{i+1}"
-                                print(f"[KB] Indiziere Part {i+1}/{len(chunks)} von {filename}...")
-                                self.upsert(chunk, doc_id=chunk_id, mtime=file_mtime)
-                        else:
-                            print(f"[KB] Indiziere: {filename} ({len(text)} Zeichen)...")
-                            self.upsert(text, doc_id=doc_id, mtime=file_mtime)
-                            
-                except Exception as e:
-                    print(f"[KB] Fehler beim Lesen von {filename}: {e}")
+                jobs.append({"path": entry["path"], "doc_id": doc_id, "mtime": entry["mtime"], "file": entry})
+
+            # Extraktion, Chunking und Batch-Embedding laufen als Pipeline (siehe kb_ingest)
+            committed = set()
+
+            def commit(job, chunks, vectors):
+                self._commit_file(job, chunks, vectors)
+                committed.add(job["file"]["rel"])
+
+            if jobs:
+                self.ingestor.run(jobs, commit)
+            failed = {job["file"]["rel"] for job in jobs} - committed
+            if self._rechunk and not failed:
+                self._rechunk_done()
+            self.store.maybe_compact()
+            return failed
+
+    def _remove_files(self, entries):
+        """remove_fn of the watcher: drops the chunks of deleted files."""
+        with self.store.batch():
+            for entry in entries:
+                parts = self.store.file_chunks(entry["path"], doc_id_for(entry["rel"]))
+                for part_id in parts:
+                    self.index.delete(part_id)
+                if parts:
+                    self.store.delete(parts)
+                self.store.delete_file(entry["rel"])
+                print(f"[KB] Datei entfernt: {entry['rel']} ({len(parts)} Chunks)")
+
+    def _commit_file(self, job, chunks, vectors):
+        """Replaces a file's old chunks with the new ones (and its manifest entry); one store commit per file."""
+        with self.store.batch():
+            # Remove old parts before re-indexing to avoid duplicates
+            # (looked up now, not when the job was planned: another file of this run may have taken an old id)
+            old_ids = self.store.file_chunks(job["path"], job["doc_id"])
+            for part_id in old_ids:
+                self.index.delete(part_id)
+            if old_ids:
+                self.store.delete(old_ids)
+            for chunk_id, (start, end, text), emb in zip(chunk_ids(job["doc_id"], len(chunks)), chunks, vectors):
+                self.index.upsert(chunk_id, text, emb, job["mtime"])
+                self.store.put(chunk_id, text, emb, job["mtime"], source=job["path"], start=start, end=end)
+            entry = job.get("file")
+            if entry:
+                self.store.put_file(entry["rel"], entry["size"], entry["mtime"], entry["hash"])
 
     def _load(self):
         try:
-            if os.path.exists(self.index_path):
-                with open(self.index_path, "rb") as f:
-                    self.docs = pickle.load(f)
+            # Einmalig: altes kb_index.pkl übernehmen
+            self.store.migrate_pickle()
         except Exception as e:
-            print(f"[KB] Lade-Fehler: {e}")
-            self.docs = []
-
-    def _save(self):
+            print(f"[KB] Migration von kb_index.pkl fehlgeschlagen: {e}")
         try:
-            with open(self.index_path, "wb") as f:
-                pickle.dump(self.docs, f)
+            self.index.load(*self.store.load())
+            print(f"[KB] {len(self.index)} Chunks geladen.")
         except Exception as e:
-            print(f"[KB] Speicher-Fehler: {e}")
+            print(f"[KB] Lade-Fehler: {e}")
+            self.index.clear()
 
     def _embed(self, text: str):
         try:
             # Use Ollama for local embeddings (free & private)
-            res = ollama.embeddings(model=self.embed_model, prompt=text)
+            with scheduler.slot("embed"), model_residency.use(self.embed_model):
+                res = ollama_client().embeddings(model=self.embed_model, prompt=text,
+                                                 keep_alive=model_residency.keep_alive(self.embed_model))
             vec = np.array(res["embedding"], dtype=np.float32)
             norm = np.linalg.norm(vec) + 1e-10
             return vec / norm
@@ -123,49 +152,75 @@ class KnowledgeBase:
             print(f"[KB] Embedding-Fehler (Modell '{self.embed_model}' vorhanden?): {e}")
             return None
 
-    def upsert(self, text: str, doc_id: Optional[str] = None, mtime: float = 0):
-        emb = self._embed(text)
+    def upsert(self, text: str, doc_id: Optional[str] = None, mtime: float = 0,
+               source: Optional[str] = None, span: Optional[tuple] = None):
+        emb = self.embed_cache.get(text)
         if emb is None:
-            return {"status": "failed", "reason": "embedding_error"}
+            emb = self._embed(text)
+            if emb is None:
+                return {"status": "failed", "reason": "embedding_error"}
+            self.embed_cache.store([text], [emb])
         
         if doc_id is None:
-            doc_id = f"doc_{len(self.docs)+1}"
+            doc_id = f"doc_{len(self.index)+1}"
             
-        # Check replace
-        replaced = False
-        new_entry = {"id": doc_id, "text": text, "emb": emb, "mtime": mtime}
-        
-        for i, d in enumerate(self.docs):
-            if d["id"] == doc_id:
-                self.docs[i] = new_entry
-                replaced = True
-                break
-        
-        if not replaced:
-            self.docs.append(new_entry)
+        try:
+            replaced = self.index.upsert(doc_id, text, emb, mtime)
+        except ValueError as e:
+            # Anderes Embedding-Modell als beim Aufbau des Index
+            print(f"[KB] {e}")
+            return {"status": "failed", "reason": "dimension_mismatch"}
             
-        self._save()
+        start, end = span or (None, None)
+        self.store.put(doc_id, text, emb, mtime, source=source, start=start, end=end)
         return {"status": "ok", "id": doc_id, "replaced": replaced}
 
+    def delete(self, doc_id: str):
+        deleted = self.index.delete(doc_id)
+        if deleted:
+            self.store.delete([doc_id])
+        return {"status": "ok" if deleted else "not_found", "id": doc_id}
+
+    def passage(self, doc_id: str):
+        """Exact source passage of a chunk (re-read from the file via the stored offsets).
+
+        Falls back to the stored chunk text if the file changed or has no offsets (marked as stale).
+        """
+        row = self.store.span(doc_id)
+        if row is None:
+            return {"status": "not_found", "id": doc_id}
+        source, mtime, start, end, text = row
+        result = {"status": "ok", "id": doc_id, "source": source, "start": start, "end": end}
+        try:
+            if source and start is not None and os.path.getmtime(source) <= (mtime or 0):
+                result["text"] = extract_text(source)[start:end]
+                return result
+        except OSError:
+            pass
+        result.update(text=text, stale=bool(source))
+        return result
+
     def clear(self):
-        self.docs = []
-        self._save()
+        self.index.clear()
+        self.store.clear()
+        # Manifest ist mit geleert -> der Watcher liest den Ordner beim nächsten Poll neu ein
+        self.watcher.reset()
         return {"status": "ok"}
 
+    def stats(self):
+        return dict(self.store.stats(), indexed=len(self.index), ingest=self.ingestor.stats(),
+                    embed_cache=self.embed_cache.stats(), watcher=self.watcher.stats())
+
     def search(self, query: str, top_k: int = 3):
-        if not self.docs:
+        """Top-k chunks for the query: one matrix-vector product + argpartition (see vector_index)."""
+        if not len(self.index):
             return []
         
         q = self._embed(query)
         if q is None:
             return []
-            
-        sims = []
-        for d in self.docs:
-            sims.append((d, float(np.dot(q, d["emb"]))))
-            
-        # Sort by similarity desc
-        sims.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top K docs
-        return [item[0] for item in sims[:top_k]]
\ No newline at end of file
+        try:
+            return self.index.search(q, top_k)
+        except ValueError as e:
+            print(f"[KB] {e}")
+            return []
\ No newline at end of file
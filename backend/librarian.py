@@ -5,8 +5,9 @@ import json
 import threading
 import random
 import requests
-import google.generativeai as genai
-from duckduckgo_search import DDGS
+from llm_clients import llm_clients
+from web_search import web_search
+from scheduler import scheduler
 from datetime import datetime, timedelta
 import shutil
 
@@ -35,8 +36,7 @@ class Librarian(threading.Thread):
         os.makedirs(self.knowledge_dir, exist_ok=True)
         
         if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+            self.model = llm_clients.gemini_model(self.api_key, 'gemini-1.5-flash')
         else:
             print("[LIBRARIAN] WARNUNG: Kein GEMINI_API_KEY. Bibliothekar ist eingeschränkt (nur Suche, keine Synthese).")
             self.model = None
@@ -79,16 +79,16 @@ class Librarian(threading.Thread):
         print(f"[LIBRARIAN] Suche nach: '{query}'...")
         results = []
         try:
-            with DDGS() as ddgs:
-                search_results = list(ddgs.text(query, max_results=max_results))
-                for r in search_results:
-                    try:
-                        resp = requests.get(r['href'], timeout=5, headers={'User-Agent': 'HarukoBot/1.0'})
-                        if resp.status_code == 200:
-                            content = self.clean_html(resp.text)
-                            results.append(f"Quelle: {r['title']} ({r['href']})\nInhalt:\n{content[:4000]}")
-                    except:
-                        results.append(f"Quelle: {r['title']} ({r['href']})\nInhalt (Snippet):\n{r['body']}")
+            # Gleicher Cache wie die Chat-Suche
+            search_results = web_search.search(query, max_results=max_results)
+            for r in search_results:
+                try:
+                    resp = requests.get(r['href'], timeout=5, headers={'User-Agent': 'HarukoBot/1.0'})
+                    if resp.status_code == 200:
+                        content = self.clean_html(resp.text)
+                        results.append(f"Quelle: {r['title']} ({r['href']})\nInhalt:\n{content[:4000]}")
+                except:
+                    results.append(f"Quelle: {r['title']} ({r['href']})\nInhalt (Snippet):\n{r['body']}")
         except Exception as e:
             print(f"[LIBRARIAN] Such-Fehler: {e}")
         return results
@@ -97,6 +97,7 @@ class Librarian(threading.Thread):
         if not self.model: return "Fehler: Kein LLM verfügbar."
         
         print(f"[LIBRARIAN] Synthetisiere Wissen für '{topic}'...")
+        sources = "\n\n".join(raw_data)
         
         prompt = f"""
         Du bist der Bibliothekar des KI-Systems Haruko.
@@ -106,7 +107,7 @@ class Librarian(threading.Thread):
         
         NEUE QUELLDATEN (Web):
         {'-'*20}
-        {"\n\n".join(raw_data)}
+        {sources}
         {'-'*20}
         
         ALTE DATEN (Existierender Eintrag):
@@ -124,7 +125,8 @@ class Librarian(threading.Thread):
         """
         
         try:
-            response = self.model.generate_content(prompt)
+            with scheduler.slot("cloud", priority="background"):
+                response = self.model.generate_content(prompt)
             return response.text
         except Exception as e:
             return f"Fehler bei der Generierung: {e}"
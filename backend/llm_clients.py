@@ -0,0 +1,171 @@
+import os
+import threading
+from llm_stream import on_close
+
+# Zentrale Registry für langlebige Provider-Clients.
+# Jeder Client wird genau einmal gebaut und wiederverwendet: ein gemeinsamer
+# httpx-Pool hält die TLS-Verbindungen zu NIM/Groq/OpenRouter offen (Keep-Alive),
+# so dass ein Chat-Turn keinen neuen Handshake braucht. Gemini bekommt pro API-Key
+# einen eigenen Service-Client, statt über genai.configure() den globalen
+# SDK-Zustand umzuschalten (Free/Paid liefen sonst gegenseitig in die Quere).
+# Die SDKs (httpx, openai, google, ollama) werden erst beim Bauen eines Clients importiert,
+# Router und Provider-Adapter lassen sich so auch ohne sie laden (Tests, Tools).
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))  # Fallback übernimmt der Router
+
+# name -> (env-Variable des Keys, Standard-URL). Die URL lässt sich per
+# <NAME>_BASE_URL überschreiben (z.B. für lokale Stub-Server).
+OPENAI_COMPAT_ENDPOINTS = {
+    "nvidia_nim": ("NVIDIA_API_KEY", "https://integrate.api.nvidia.com/v1"),
+    "groq": ("GROQ_API_KEY", "https://api.groq.com/openai/v1"),
+    "openrouter": ("OPENROUTER_API_KEY", "https://openrouter.ai/api/v1"),
+    "deepseek": ("DEEPSEEK_API_KEY", "https://api.deepseek.com"),
+}
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._http = None
+        self._openai = {}   # (name, key, url) -> openai.Client
+        self._gemini = {}   # (key, endpoint) -> GenerativeServiceClient
+        self._ollama = None
+
+    def timeout(self):
+        import httpx
+        return httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+    def http_client(self):
+        """Shared keep-alive connection pool for all OpenAI-compatible providers."""
+        import httpx
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    timeout=self.timeout(),
+                    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=300),
+                )
+            return self._http
+
+    def base_url(self, name):
+        return os.getenv(f"{name.upper()}_BASE_URL") or OPENAI_COMPAT_ENDPOINTS[name][1]
+
+    def openai(self, name):
+        """Pooled openai.Client for an OpenAI-compatible endpoint, or None without API key."""
+        key_env = OPENAI_COMPAT_ENDPOINTS[name][0]
+        api_key = os.getenv(key_env, "")
+        if not api_key:
+            return None
+        url = self.base_url(name)
+        cache_key = (name, api_key, url)
+        client = self._openai.get(cache_key)
+        if client is None:
+            http = self.http_client()
+            import openai
+            with self._lock:
+                client = self._openai.get(cache_key)
+                if client is None:
+                    client = openai.Client(api_key=api_key, base_url=url, http_client=http,
+                                           timeout=self.timeout(), max_retries=LLM_MAX_RETRIES)
+                    self._openai[cache_key] = client
+        return client
+
+    def _gemini_service(self, api_key):
+        from google.ai import generativelanguage as glm
+        from google.api_core import client_options
+        # GEMINI_BASE_URL (z.B. lokaler Stub-Server) -> REST statt gRPC
+        endpoint = os.getenv("GEMINI_BASE_URL")
+        with self._lock:
+            service = self._gemini.get((api_key, endpoint))
+            if service is None:
+                if endpoint:
+                    options = client_options.ClientOptions(api_key=api_key, api_endpoint=endpoint)
+                    service = glm.GenerativeServiceClient(client_options=options, transport="rest")
+                else:
+                    service = glm.GenerativeServiceClient(client_options=client_options.ClientOptions(api_key=api_key))
+                self._gemini[(api_key, endpoint)] = service
+            return service
+
+    def gemini_model(self, api_key, model_name, system_instruction=None):
+        """GeminiModel bound to `api_key` without touching genai.configure().
+
+        The model reuses one long-lived service client (and its channel) per key.
+        """
+        return GeminiModel(self._gemini_service(api_key), model_name, system_instruction)
+
+    def ollama(self):
+        """Ollama client (OLLAMA_HOST) with its own keep-alive pool."""
+        import httpx
+        import ollama
+        with self._lock:
+            if self._ollama is None:
+                self._ollama = ollama.Client(host=os.getenv("OLLAMA_HOST") or None,
+                                             timeout=httpx.Timeout(None, connect=LLM_CONNECT_TIMEOUT))
+            return self._ollama
+
+    def close(self):
+        """Closes the pooled connections (shutdown)."""
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+            self._openai.clear()
+            for service in self._gemini.values():
+                try:
+                    service.transport.close()
+                except Exception as e:
+                    print(f"[LLM] Gemini-Client ließ sich nicht schließen: {e}")
+            self._gemini.clear()
+            if self._ollama is not None:
+                # ollama.Client.close() gibt es erst in neueren Versionen
+                close = getattr(self._ollama, "close", None)
+                if close:
+                    close()
+                self._ollama = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "openai_clients": sorted({name for name, _, _ in self._openai}),
+                "gemini_keys": len(self._gemini),
+                "ollama": self._ollama is not None,
+            }
+
+
+class GeminiModel:
+    """generate_content() like genai.GenerativeModel, but on our own service client.
+
+    GenerativeModel always talks through the SDK's global client (last genai.configure() key),
+    so requests are built with the SDK's public type helpers and sent through the pooled client.
+    """
+
+    def __init__(self, service, model_name, system_instruction=None):
+        from google.generativeai.types import content_types
+        self._service = service
+        self.model_name = model_name if "/" in model_name else f"models/{model_name}"
+        self.system_instruction = content_types.to_content(system_instruction) if system_instruction else None
+
+    def generate_content(self, contents, stream=False, generation_config=None, request_options=None):
+        from google.ai import generativelanguage as glm
+        from google.generativeai.types import content_types, generation_types
+        request = glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=content_types.to_contents(contents),
+            system_instruction=self.system_instruction,
+            generation_config=generation_types.to_generation_config_dict(generation_config or {}),
+        )
+        request_options = request_options or {}
+        if not stream:
+            return generation_types.GenerateContentResponse.from_response(
+                self._service.generate_content(request, **request_options))
+        iterator = self._service.stream_generate_content(request, **request_options)
+        # Abbruch der Anfrage beendet den gRPC-Stream sofort (nur innerhalb eines llm_stream-Workers)
+        cancel = getattr(iterator, "cancel", None)
+        if cancel:
+            on_close(cancel)
+        return generation_types.GenerateContentResponse.from_iterator(iterator)
+
+
+# Singleton instance
+llm_clients = ClientRegistry()
@@ -0,0 +1,207 @@
+import os
+from llm_clients import llm_clients, LLM_READ_TIMEOUT
+from llm_stream import on_close
+from scheduler import scheduler
+from model_residency import model_residency
+from image_pipeline import image_pipeline
+
+# Provider-Adapter für den ProviderRouter.
+# Jeder Provider übersetzt die gemeinsame `messages`-Liste (OpenAI/Ollama-Format,
+# Bilder als image_pipeline.Snapshot unter 'images') in sein eigenes Format und liefert eine
+# Factory, die im Worker-Thread (llm_stream) den blockierenden Stream öffnet
+# und reine Text-Chunks liefert. Die Clients selbst kommen aus der llm_clients-Registry.
+# Jeder Stream hält für seine ganze Dauer einen Platz seines Scheduler-Backends.
+
+
+def has_images(messages):
+    return any(m.get('images') for m in messages)
+
+
+def strip_images(messages):
+    """Text-only copy of the messages (used for follow-up answers after tools/search)."""
+    return [{k: v for k, v in m.items() if k != 'images'} for m in messages]
+
+
+class LLMProvider:
+    """Base class: name, capabilities and a stream factory for the router."""
+    supports_images = False
+    backend = "cloud"  # Scheduler-Backend (Platz-Limit)
+
+    def __init__(self, name, enabled=None, prior_ttft=2.0, first_token_timeout=20.0):
+        self.name = name
+        self._enabled = enabled
+        # Erwartete TTFT solange noch keine Messwerte vorliegen (bestimmt die Start-Reihenfolge)
+        self.prior_ttft = prior_ttft
+        self.first_token_timeout = first_token_timeout
+
+    def available(self):
+        return self._enabled() if self._enabled else True
+
+    def factory(self, messages, options=None):
+        """Returns a callable that opens the upstream stream and yields text parts."""
+        raise NotImplementedError
+
+    def admitted(self, open_):
+        """Wraps a stream factory so the upstream is only opened with a scheduler slot (held until the stream ends)."""
+        def run():
+            with scheduler.slot(self.backend):
+                yield from open_()
+        return run
+
+    def probe(self):
+        """Tiny blocking request used by the router to re-check an open circuit."""
+        for part in self.factory([{"role": "user", "content": "ping"}], {"max_tokens": 1})():
+            if part:
+                return True
+        return True
+
+
+class OpenAIChatProvider(LLMProvider):
+    """NVIDIA NIM, Groq and OpenRouter (all OpenAI-compatible)."""
+
+    def __init__(self, name, client, model, vision_model=None, max_tokens=None, extra_headers=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.client = client  # callable -> openai.Client
+        self.model = model
+        self.vision_model = vision_model
+        self.max_tokens = max_tokens
+        self.extra_headers = extra_headers
+        self.supports_images = vision_model is not None
+
+    def available(self):
+        return self.client() is not None and super().available()
+
+    def _convert(self, messages):
+        model = self.model
+        out = []
+        for m in messages:
+            if m['role'] == 'user' and m.get('images') and self.vision_model:
+                model = self.vision_model
+                content_list = [{"type": "text", "text": m['content']}]
+                for image in m['images']:
+                    try:
+                        b64 = image_pipeline.b64(image, "openai")
+                        content_list.append({
+                            "type": "image_url",
+                            "image_url": {"url": f"data:image/jpeg;base64,{b64}"}
+                        })
+                    except Exception as ie:
+                        print(f"[{self.name.upper()} ERROR] Image load failed: {ie}")
+                out.append({"role": m['role'], "content": content_list})
+            else:
+                out.append({"role": m['role'], "content": m['content']})
+        return model, out
+
+    def factory(self, messages, options=None):
+        options = options or {}
+        max_tokens = options.get("max_tokens", self.max_tokens)
+
+        def open_():
+            # Bild-Kodierung (image_pipeline) im Worker-Thread, nicht im Event-Loop
+            model, msgs = self._convert(messages)
+            kwargs = {"model": model, "messages": msgs, "stream": True}
+            if max_tokens:
+                kwargs["max_tokens"] = max_tokens
+            if self.extra_headers:
+                kwargs["extra_headers"] = self.extra_headers
+            stream = self.client().chat.completions.create(**kwargs)
+            on_close(stream.close)  # Abbruch schließt die HTTP-Antwort sofort
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        return self.admitted(open_)
+
+
+class GeminiProvider(LLMProvider):
+    """Gemini Flash via google.generativeai (Free/Paid key from env)."""
+    supports_images = True
+
+    def __init__(self, name, key_env, model="gemini-2.0-flash", **kwargs):
+        super().__init__(name, **kwargs)
+        self.key_env = key_env
+        self.model = model
+
+    def available(self):
+        return bool(os.getenv(self.key_env)) and super().available()
+
+    def _convert(self, messages):
+        """(system instruction, contents). Gemini has one system instruction, so several system messages are joined."""
+        system_parts = []
+        history = []
+        for m in messages:
+            if m['role'] == 'system':
+                system_parts.append(m['content'])
+                continue
+            role = "model" if m['role'] in ["assistant", "bot"] else "user"
+            content_parts = [m['content']]
+            for image in m.get('images') or []:
+                try:
+                    content_parts.append({"mime_type": "image/jpeg", "data": image_pipeline.encode(image, "gemini")})
+                except Exception as ie:
+                    print(f"[{self.name.upper()} ERROR] Image load failed: {ie}")
+            history.append({"role": role, "parts": content_parts})
+        return "\n\n".join(system_parts) or None, history
+
+    def factory(self, messages, options=None):
+        options = options or {}
+        config = {"max_output_tokens": options["max_tokens"]} if options.get("max_tokens") else None
+
+        def open_():
+            sys_instr, history = self._convert(messages)
+            g_model = llm_clients.gemini_model(os.getenv(self.key_env), self.model, system_instruction=sys_instr)
+            resp = g_model.generate_content(history, stream=True, generation_config=config,
+                                            request_options={"timeout": LLM_READ_TIMEOUT})
+            for chunk in resp:
+                if chunk.text:
+                    yield chunk.text
+        return self.admitted(open_)
+
+
+class OllamaProvider(LLMProvider):
+    """Local Ollama (text + llava vision). Always the last resort."""
+    supports_images = True
+    backend = "ollama"
+
+    def __init__(self, name="ollama", **kwargs):
+        kwargs.setdefault("prior_ttft", 8.0)
+        kwargs.setdefault("first_token_timeout", 120.0)
+        super().__init__(name, **kwargs)
+
+    def _convert(self, messages):
+        """Images as downscaled JPEG bytes (llava does not need more than its own input resolution)."""
+        return [dict(m, images=[image_pipeline.encode(img, "ollama") for img in m['images']]) if m.get('images') else m
+                for m in messages]
+
+    def factory(self, messages, options=None):
+        options = options or {}
+        text_model = options.get("ollama_model") or os.getenv("OLLAMA_MODEL", "llama3")
+        if text_model == "llava":
+            text_model = os.getenv("OLLAMA_MODEL", "llama3")
+        model = "llava" if has_images(messages) else text_model
+
+        def chat(name, msgs):
+            # keep_alive + Ladeprotokoll über model_residency (Ollama meldet die Ladezeit im letzten Chunk)
+            with model_residency.use(name) as info:
+                for chunk in llm_clients.ollama().chat(model=name, messages=msgs, stream=True,
+                                                       keep_alive=model_residency.keep_alive(name)):
+                    if chunk.get('done'):
+                        info["load_ns"] = chunk.get('load_duration')
+                    yield chunk['message']['content']
+
+        def open_():
+            try:
+                yield from chat(model, self._convert(messages))
+            except Exception as e:
+                import ollama
+                if not isinstance(e, ollama.ResponseError) or "not found" not in str(e) or model != "llava":
+                    raise
+                # Llava fehlt -> ohne Bild mit Text-Modell antworten
+                fallback_model = os.getenv("OLLAMA_MODEL", "llama3.2")
+                print(f"[BACKEND] Fehler: Llava Modell nicht gefunden. Fallback auf {fallback_model}.")
+                yield from chat(fallback_model, strip_images(messages))
+                yield "\n\n(Ich kann meine Augen (Llava) noch nicht finden. Ich lade sie wohl noch herunter. Aber ich höre dich.)"
+        return self.admitted(open_)
+
+    def probe(self):
+        llm_clients.ollama().list()
+        return True
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import contextvars
+from cancellation import Cancelled, current as current_cancel
+
+# Die Provider-SDKs (openai, google.generativeai, ollama) liefern blockierende
+# Generatoren. Direkt in einer async-Funktion iteriert, blockieren sie den
+# Event-Loop für die gesamte Antwortdauer (Phygital-Polls, Vision-Frames,
+# Telegram und weitere /chat_stream Aufrufe stehen still).
+# ThreadedStream verschiebt Aufbau + Iteration in einen Worker-Thread und
+# reicht die Chunks über eine asyncio.Queue an den Loop weiter.
+# Beim Abbruch (CancelToken der Anfrage) schließt close() die Upstream-Verbindung
+# sofort über die von der Factory registrierten Closer (on_close).
+# Der Worker läuft im Kontext der Anfrage (CancelToken, Trace, Scheduler-Priorität).
+
+_END = object()
+_worker = threading.local()
+
+
+def on_close(fn):
+    """Called from inside a stream factory: `fn` closes the upstream connection (e.g. the HTTP response).
+
+    It runs as soon as the stream is closed, so a cancelled request does not wait for the next chunk.
+    """
+    stream = getattr(_worker, "stream", None)
+    if stream is not None:
+        stream.add_closer(fn)
+
+
+class _StreamError:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class ThreadedStream:
+    """Async iterator over a blocking stream that is created and consumed in a worker thread.
+
+    `factory` is called inside the thread and must return a (sync) iterable of text parts.
+    Errors raised by the factory are re-raised from `start()`, errors during iteration
+    from `__anext__`, so callers can keep their existing fallback logic.
+    """
+
+    def __init__(self, factory, name="stream"):
+        self.factory = factory
+        self.name = name
+        self._loop = None
+        self._queue = None
+        self._started = None
+        self._thread = None
+        self._closed = threading.Event()
+        self._closers = []
+        self._closers_lock = threading.Lock()
+        self.token = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._started = self._loop.create_future()
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._run,), daemon=True,
+                                        name=f"llm-stream-{self.name}")
+        self._thread.start()
+        try:
+            await self._started
+        except asyncio.CancelledError:
+            self.close()
+            raise
+        return self
+
+    # --- Worker-Thread ---
+    def _call_in_loop(self, fn, *args):
+        try:
+            self._loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            # Loop bereits geschlossen (Shutdown) -> Chunk verwerfen
+            self._closed.set()
+
+    def _signal_started(self, exc=None):
+        def _set():
+            if self._started.done():
+                return
+            if exc is not None:
+                self._started.set_exception(exc)
+            else:
+                self._started.set_result(True)
+        self._call_in_loop(_set)
+
+    def _run(self):
+        _worker.stream = self
+        try:
+            upstream = self.factory()
+        except Exception as e:
+            self._signal_started(e)
+            return
+        self._signal_started()
+
+        try:
+            for part in upstream:
+                if self._closed.is_set():
+                    break
+                if part:
+                    self._call_in_loop(self._queue.put_nowait, part)
+        except Exception as e:
+            if not self._closed.is_set():
+                self._call_in_loop(self._queue.put_nowait, _StreamError(e))
+        finally:
+            close = getattr(upstream, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+            self._call_in_loop(self._queue.put_nowait, _END)
+            if self._closed.is_set() and self.token is not None:
+                self.token.upstream_closed()
+
+    # --- Loop-Seite ---
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._queue is None:
+            await self.start()
+        item = await self._queue.get()
+        if item is _END:
+            raise StopAsyncIteration
+        if isinstance(item, _StreamError):
+            raise item.exc
+        return item
+
+    def add_closer(self, fn):
+        with self._closers_lock:
+            if not self._closed.is_set():
+                self._closers.append(fn)
+                return
+        fn()
+
+    def close(self):
+        """Stops consuming the upstream stream and closes the upstream connection if the factory registered a closer.
+
+        Without a closer the worker exits at the next chunk. A waiting consumer is woken up immediately.
+        """
+        with self._closers_lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+            closers, self._closers = self._closers, []
+        for fn in closers:
+            try:
+                fn()
+            except Exception:
+                pass
+        if self._loop is not None:
+            if self._started is not None:
+                self._signal_started(Cancelled("stream closed"))
+            self._call_in_loop(self._queue.put_nowait, _END)
+
+    async def aclose(self):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+
+async def open_stream(factory, name="stream"):
+    """Creates the upstream stream off the event loop and returns an async iterator over its parts.
+
+    The stream is tied to the cancel token of the current request (if any).
+    """
+    token = current_cancel()
+    if token is not None:
+        token.raise_if_cancelled()
+    stream = ThreadedStream(factory, name)
+    if token is not None:
+        stream.token = token
+        token.on_cancel(stream.close)
+    return await stream.start()
@@ -9,14 +9,12 @@ import threading
 import psutil
 import time
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, File, UploadFile, BackgroundTasks
+from fastapi import FastAPI, HTTPException, File, UploadFile, BackgroundTasks, Request
 from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from dotenv import load_dotenv
-import ollama
-import google.generativeai as genai
 import speech_recognition as sr
 from personality import SYSTEM_PROMPT
 import vosk
@@ -40,10 +38,28 @@ import phygital
 import secretary
 import network_tools
 from knowledge import KnowledgeBase
+from chunker import fit_passages
 from librarian import Librarian
 from user_profiler import UserProfiler
+from context_cache import context_cache, FACTS, DEVICES, HOME_STATUS, PROFILE, PERSONALITY
+from fact_selector import fact_selector, format_facts
+from context_stages import run_stages
+from tool_executor import build_plan, run_plan, format_results, is_read_only, tool_name
+from response_cache import response_cache
+from web_search import web_search
+from chat_sessions import chat_sessions, prompt_messages
+import tracing
+from tracing import tracer
+from cancellation import cancellations, Cancelled, CancelToken
+from intent_router import intent_router
+from scheduler import scheduler
+from model_residency import model_residency
+from image_pipeline import image_pipeline, Snapshot
+from stream_filter import TagTokenizer, render, tokenize, speech_text, CLIENT_TAGS, TEXT, SEARCH, MEMORY, EXECUTE, TUYA
+from llm_clients import llm_clients
+from llm_providers import OpenAIChatProvider, GeminiProvider, OllamaProvider, strip_images
+from provider_router import ProviderRouter
 
-import openai
 # Global Phygital Manager
 phygital_manager = None
 librarian_service = None
@@ -94,10 +110,7 @@ TUYA_REGION = os.getenv("TUYA_REGION", "eu") # 'eu' for Europe
 
 # GEMINI CONFIG
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    print(f"[GEMINI] Config Error: {e}")
+# Kein globales genai.configure(): Modelle kommen pro Key aus llm_clients.gemini_model()
 
 # DEEPSEEK CONFIG
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "")
@@ -109,40 +122,46 @@ NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY", "")
 USE_NVIDIA_NIM = os.getenv("USE_NVIDIA_NIM", "True").lower() == "true"
 print(f"[NVIDIA] API Key Loaded: {'Yes' if NVIDIA_API_KEY else 'No'}, Enabled: {USE_NVIDIA_NIM}")
 
-client_nim = None
-if NVIDIA_API_KEY:
-    try:
-        client_nim = openai.Client(
-            base_url="https://integrate.api.nvidia.com/v1",
-            api_key=NVIDIA_API_KEY
-        )
-    except Exception as e:
-        print(f"[NVIDIA] Client Init Error: {e}")
-
-DEEPSEEK_BASE_URL = "https://api.deepseek.com"
-try:
-    deepseek_client = openai.Client(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
-except Exception as e:
-    print(f"[DEEPSEEK] Config Error: {e}")
-
 # GROQ CONFIG
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-try:
-    groq_client = openai.Client(api_key=GROQ_API_KEY, base_url="https://api.groq.com/openai/v1")
-except Exception as e:
-    print(f"[GROQ] Config Error: {e}")
 
 # NVIDIA NIM CONFIG
 NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY", "")
 USE_NVIDIA_NIM = os.getenv("USE_NVIDIA_NIM", "False").lower() == "true"
 print(f"[NIM] API Key Loaded: {'Yes' if NVIDIA_API_KEY else 'No'}, Enabled: {USE_NVIDIA_NIM}")
-try:
-    client_nim = openai.Client(
-        base_url="https://integrate.api.nvidia.com/v1",
-        api_key=NVIDIA_API_KEY
-    )
-except Exception as e:
-    print(f"[NIM] Config Error: {e}")
+
+# OPENROUTER CONFIG (Free Models)
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
+
+# Die Clients selbst (Keep-Alive-Pool, Timeouts) liefert die llm_clients-Registry, einmal pro Key gebaut.
+
+# List of free models (each one is tracked as its own provider)
+OPENROUTER_FREE_MODELS = [
+    "google/gemini-2.0-flash-exp:free",
+    "deepseek/deepseek-r1:free",
+    "meta-llama/llama-3.3-70b-instruct:free",
+    "qwen/qwen-2.5-coder-32b-instruct:free"
+]
+
+# LLM PROVIDER ROUTER
+# Reihenfolge = Startpriorität, danach entscheidet die gemessene Gesundheit (TTFT/Fehlerquote)
+llm_router = ProviderRouter([
+    OpenAIChatProvider("nvidia_nim", lambda: llm_clients.openai("nvidia_nim"), "meta/llama-3.1-70b-instruct",
+                       vision_model="meta/llama-3.2-90b-vision-instruct", max_tokens=1024,
+                       enabled=lambda: USE_NVIDIA_NIM and bool(NVIDIA_API_KEY)),
+    GeminiProvider("gemini_free", "GEMINI_API_KEY_FREE"),
+    OpenAIChatProvider("groq", lambda: llm_clients.openai("groq"), "llama-3.3-70b-versatile",
+                       enabled=lambda: bool(os.getenv("GROQ_API_KEY"))),
+    *[OpenAIChatProvider(f"openrouter/{m}", lambda: llm_clients.openai("openrouter"), m,
+                         extra_headers={"HTTP-Referer": "https://moltbot.ai", "X-Title": "MoltBot"})
+      for m in OPENROUTER_FREE_MODELS],
+    GeminiProvider("gemini_paid", "GEMINI_API_KEY_PAID"),
+    OllamaProvider("ollama"),
+])
+
+# Race-Modus: gleiche Anfrage an die zwei gesündesten Provider, der erste Chunk gewinnt.
+# Kostet doppeltes Kontingent -> Opt-in (global per .env oder pro Anfrage, z.B. Sprachsteuerung)
+LLM_RACE_MODE = os.getenv("LLM_RACE_MODE", "False").lower() == "true"
 
 
 class TuyaManager:
@@ -184,6 +203,7 @@ class TuyaManager:
                          }
                          count += 1
                  print(f"[TUYA] {count} Geräte aus Config geladen.")
+                 context_cache.bump(DEVICES)
         except Exception as e:
              print(f"[TUYA] Config Load Error: {e}")
 
@@ -191,6 +211,7 @@ class TuyaManager:
         try:
             with open(self.config_path, "w", encoding='utf-8') as f:
                 json.dump(self.config_data, f, indent=2, ensure_ascii=False)
+            context_cache.bump(DEVICES)
             print("[TUYA] devices_config.json erfolgreich aktualisiert.")
         except Exception as e:
             print(f"[TUYA] Fehler beim Speichern der Config: {e}")
@@ -278,23 +299,31 @@ class TuyaManager:
         print("[TUYA] Cloud-Sync: Keine Geräte gefunden oder Fehler (Trial expired?).")
 
 
-    def control(self, device_name, state="on"):
+    def resolve(self, device_name):
+        """Name of the cached device that `device_name` refers to (exact or partial match), or None."""
         name = device_name.lower()
         
         # Falls Cache leer, versuche zu laden
         if not self.devices_cache:
             self.load_from_config()
             
-        if name not in self.devices_cache:
-            # Suche nach Teilübereinstimmung (z.B. "Licht" in "Licht Wohnzimmer")
-            found = False
-            for cached_name in self.devices_cache:
-                if name in cached_name:
-                    name = cached_name
-                    found = True
-                    break
-            if not found:
-                return f"Fehler: Gerät '{device_name}' nicht im Tuya-Account gefunden."
+        if name in self.devices_cache:
+            return name
+        # Suche nach Teilübereinstimmung (z.B. "Licht" in "Licht Wohnzimmer")
+        for cached_name in self.devices_cache:
+            if name in cached_name:
+                return cached_name
+        return None
+
+    def device_id(self, device_name):
+        """Tuya id of the device `device_name` resolves to (lane key for the tool executor), or None."""
+        info = self.devices_cache.get(self.resolve(device_name))
+        return info["id"] if info else None
+
+    def control(self, device_name, state="on"):
+        name = self.resolve(device_name)
+        if name is None:
+            return f"Fehler: Gerät '{device_name}' nicht im Tuya-Account gefunden."
         
         dev_info = self.devices_cache[name]
         
@@ -514,7 +543,9 @@ def trigger_action(listener=None):
                 
                 # Da process_chat async ist, müssen wir es synchron ausführen
                 import asyncio
-                asyncio.run(process_chat(text, []))
+                # Sprache: Zeit bis zum ersten Wort zählt -> Race-Modus, höchste Priorität im Scheduler
+                with scheduler.priority("voice"):
+                    asyncio.run(process_chat(text, [], race=True))
                 
             except sr.WaitTimeoutError:
                 print("[TRIGGER] Timeout - nichts gehört.")
@@ -540,6 +571,8 @@ async def lifespan(app: FastAPI):
     global telegram_bot, phygital_manager, librarian_service, user_profiler_service
     print("[SYSTEM] Haruko Backend startet (Lifespan)...")
 
+    chat_sessions.summarize_fn = summarize_conversation
+
     # Init Memory DB (ensure it's ready)
     from memory_db import MemoryDB
     db_instance = MemoryDB()
@@ -559,6 +592,18 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"[SYSTEM] Fehler beim Init des Profilers: {e}")
 
+    # LLM Router: Hintergrund-Probes für geöffnete Circuits
+    llm_router.start_probing()
+
+    # Wissensbasis: knowledge-Ordner im Hintergrund einlesen/beobachten (Suche nutzt sofort den vorhandenen Index)
+    kb.start_watcher()
+
+    # Ollama: Chat- und Embedding-Modell mit langer keep_alive vorladen (model_residency)
+    threading.Thread(target=model_residency.warmup, daemon=True, name="ollama-warmup").start()
+
+    # Fakten-Embeddings vorwärmen (erster Chat-Turn bleibt schnell)
+    threading.Thread(target=lambda: fact_selector.warmup(load_facts()), daemon=True).start()
+
     # Init Phygital Manager
     try:
         phygital_manager = phygital.PhygitalManager()
@@ -570,11 +615,13 @@ async def lifespan(app: FastAPI):
     if HarukoTelegramBot and TELEGRAM_TOKEN and "HIER_" not in TELEGRAM_TOKEN:
         print("[TELEGRAM] Konfiguriere Bot-Integration...")
         
-        async def tele_llm(text, source="telegram"):
+        async def tele_llm(text, source="telegram", chat_id=None):
             full_res = ""
-            # Wir nutzen einen leeren History-Kontext für Telegram
-            async for chunk in process_chat_generator(text, []):
-                full_res += chunk
+            # Verlauf pro Telegram-Chat über chat_sessions
+            session_id = f"telegram:{chat_id}" if chat_id is not None else None
+            with scheduler.priority("telegram"):
+                async for chunk in process_chat_generator(text, [], session_id=session_id):
+                    full_res += chunk
             return full_res
             
         async def tele_vision(target):
@@ -596,6 +643,9 @@ async def lifespan(app: FastAPI):
         phygital_manager.stop()
     if telegram_bot:
         await telegram_bot.stop()
+    kb.stop_watcher()
+    chat_sessions.flush()
+    llm_clients.close()
 
 app = FastAPI(title="Haruko Backend", lifespan=lifespan)
 
@@ -612,12 +662,13 @@ class KBUpsert(BaseModel):
 
 @app.post("/kb/upsert")
 async def kb_upsert_endpoint(req: KBUpsert):
-    res = kb.upsert(req.text, req.id)
+    # Embedding wartet ggf. auf einen Scheduler-Platz -> nicht im Event-Loop
+    res = await asyncio.to_thread(kb.upsert, req.text, req.id)
     return res
 
 @app.get("/kb/search")
 async def kb_search_endpoint(query: str, k: int = 3):
-    results = kb.search(query, top_k=k)
+    results = await asyncio.to_thread(kb.search, query, top_k=k)
     return [{"id": d["id"], "text": d["text"]} for d in results]
 
 # --- SETTINGS ENDPOINTS ---
@@ -652,10 +703,88 @@ async def set_nim_status(req: NimRequest):
     print(f"[SETTINGS] NVIDIA NIM set to: {USE_NVIDIA_NIM}")
     return {"status": "updated", "enabled": USE_NVIDIA_NIM}
 
+@app.get("/debug/providers")
+async def debug_providers_endpoint():
+    """Live health of all LLM providers (TTFT average, error rate, circuit state) and p50/p95 TTFT per mode."""
+    return {"providers": llm_router.snapshot(), "modes": llm_router.mode_stats(), "clients": llm_clients.stats()}
+
+@app.get("/debug/context_cache")
+async def debug_context_cache_endpoint():
+    """Hit/miss counters and section versions of the system-prompt cache."""
+    return context_cache.stats()
+
+@app.get("/debug/response_cache")
+async def debug_response_cache_endpoint():
+    """Hit rate, stale evictions and latency saved by the response cache."""
+    return response_cache.stats()
+
+@app.get("/debug/web_search")
+async def debug_web_search_endpoint():
+    """Cache hits, joined (deduplicated) requests and errors of the web search."""
+    return web_search.stats()
+
+@app.get("/debug/traces")
+async def debug_traces_endpoint(limit: int = 20):
+    """Recent per-request waterfalls and per-stage latency histograms."""
+    return {"traces": tracer.recent(limit), "histograms": tracer.histograms()}
+
+@app.get("/debug/images")
+async def debug_images_endpoint():
+    """Vision image pipeline: encode cache hits and upload bytes per provider profile."""
+    return image_pipeline.stats()
+
+@app.get("/debug/models")
+async def debug_models_endpoint():
+    """Resident Ollama models, load events (warmup/demand/restore) and their cost."""
+    return model_residency.stats()
+
+@app.get("/debug/scheduler")
+async def debug_scheduler_endpoint():
+    """Slots, queue depth per priority class and wait times per LLM backend."""
+    return scheduler.stats()
+
+@app.get("/debug/intents")
+async def debug_intents_endpoint(message: Optional[str] = None):
+    """Router counters; with ?message=... the intent that message would get."""
+    result = intent_router.stats()
+    if message:
+        intent = intent_router.route(message)
+        result["intent"] = dict(intent._asdict(), labels=sorted(intent.labels))
+    return result
+
+@app.get("/debug/cancellation")
+async def debug_cancellation_endpoint():
+    """Active requests, stops/disconnects and cancellation latency (generation stop and upstream close)."""
+    return cancellations.stats()
+
+@app.get("/debug/sessions")
+async def debug_sessions_endpoint():
+    """Active/stored chat sessions and background summaries."""
+    return chat_sessions.stats()
+
+@app.get("/debug/facts")
+async def debug_facts_endpoint():
+    """Token budget of the fact selector and how many prompt tokens it saved."""
+    return fact_selector.stats()
+
 @app.post("/kb/clear")
 async def kb_clear_endpoint():
     return kb.clear()
 
+@app.get("/debug/kb")
+async def debug_kb_endpoint():
+    """KB store: live chunks, dead rows awaiting compaction, commits, watcher queue."""
+    return kb.stats()
+
+@app.delete("/kb/{doc_id}")
+async def kb_delete_endpoint(doc_id: str):
+    return kb.delete(doc_id)
+
+@app.get("/kb/passage/{doc_id}")
+async def kb_passage_endpoint(doc_id: str):
+    """Exact source passage of a KB chunk (file + character offsets recorded by the chunker)."""
+    return await asyncio.to_thread(kb.passage, doc_id)
+
 # Enable CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -667,6 +796,9 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     message: str
     history: List[dict] = []
+    race: Optional[bool] = None # None = LLM_RACE_MODE aus .env
+    session_id: Optional[str] = None # Verlauf liegt auf dem Server, history wird dann ignoriert
+    voice: bool = False # Spracheingabe im Browser -> Scheduler-Priorität "voice" statt "chat"
 
 class SpeakRequest(BaseModel):
     text: str
@@ -693,7 +825,6 @@ import asyncio
 
 # Global Control Variables
 current_tts_process = None
-stop_signal = False
 last_interaction_time = 0.0 # Track last user interaction timestamp
 
 def speak(text):
@@ -731,16 +862,37 @@ def speak(text):
     except Exception as e:
         print(f"[TTS ERROR] Subprocess failed: {e}")
 
-async def execute_tool_command(cmd: str):
-    """Executes a single tool command and returns the output string."""
-    print(f"[BACKEND] Führe Shell-Befehl aus: {cmd}")
-    
-    # Cleaning
+def clean_tool_command(cmd: str):
     cmd = cmd.strip()
     if (cmd.startswith('"') and cmd.endswith('"')) or (cmd.startswith("'") and cmd.endswith("'")):
         cmd = cmd[1:-1]
-    cmd = cmd.lstrip('(').rstrip(')')
-    
+    return cmd.lstrip('(').rstrip(')')
+
+async def execute_tool_command(cmd: str):
+    """Executes a single tool command and returns the output string.
+
+    Blocking tools (Tuya, PowerShell, ...) run in a worker thread so that several
+    commands of one answer can run concurrently (see tool_executor).
+    """
+    cmd = clean_tool_command(cmd)
+
+    with tracing.span(f"tool.{tool_name(cmd)}"):
+        # --- WAIT TOOL ---
+        if cmd.lower().startswith("wait"):
+            print(f"[BACKEND] Führe Shell-Befehl aus: {cmd}")
+            match = re.search(r'--seconds\s+(\d+)', cmd, re.IGNORECASE)
+            if match:
+                sec = int(match.group(1))
+                if sec > 60: sec = 60
+                await asyncio.sleep(sec)
+                return f"Habe {sec} Sekunden gewartet."
+            return "Fehler: Sekunden fehlen (nutze --seconds X)."
+
+        return await asyncio.to_thread(run_tool_command, cmd)
+
+def run_tool_command(cmd: str):
+    """Blocking part of execute_tool_command (runs in a worker thread)."""
+    print(f"[BACKEND] Führe Shell-Befehl aus: {cmd}")
     tool_output = ""
     
     # Check for Tuya command (Case Insensitive & Permissive)
@@ -757,17 +909,6 @@ async def execute_tool_command(cmd: str):
         else:
             tool_output = f"Fehler: Ungültiges Tuya-Format (Cmd: {cmd})"
     
-    # --- WAIT TOOL ---
-    elif cmd.lower().startswith("wait"):
-        match = re.search(r'--seconds\s+(\d+)', cmd, re.IGNORECASE)
-        if match:
-            sec = int(match.group(1))
-            if sec > 60: sec = 60
-            await asyncio.sleep(sec)
-            tool_output = f"Habe {sec} Sekunden gewartet."
-        else:
-            tool_output = "Fehler: Sekunden fehlen (nutze --seconds X)."
-            
     # --- PC CONTROL ---
     elif cmd.lower().startswith("volume"):
         import pc_control
@@ -845,11 +986,17 @@ async def execute_tool_command(cmd: str):
                  tool_output = secretary.secretary_service.delete_fact(text_match.group(1))
             else:
                 tool_output = "Fehler: Kein Text für --delete."
+        elif "--pin" in cmd:
+            text_match = re.search(r'--pin\s+["\']?([^"\']+)["\']?', cmd, re.IGNORECASE)
+            if text_match:
+                tool_output = secretary.secretary_service.pin_fact(text_match.group(1))
+            else:
+                tool_output = "Fehler: Kein Text für --pin."
         elif "--read" in cmd:
              facts = secretary.secretary_service.get_facts()
              tool_output = "Gespeicherte Fakten:\n" + "\n".join(facts)
         else:
-            tool_output = "Fehler: Nutze --add, --delete oder --read."
+            tool_output = "Fehler: Nutze --add, --delete, --pin oder --read."
 
     elif cmd.lower().startswith("note"):
         if "--add" in cmd:
@@ -890,11 +1037,16 @@ async def execute_tool_command(cmd: str):
             if cams: cam_id = list(cams.keys())[0]
 
         if cam_id:
-            snap_path = camera_manager.get_snapshot(cam_id)
-            if snap_path:
+            frame = camera_manager.get_frame(cam_id)
+            if frame is not None:
                 try:
-                    print(f"[VISION] Sende Bild an Llava: {snap_path}")
-                    res = ollama.chat(model='llava', messages=[{'role': 'user', 'content': 'Beschreibe detailliert was du auf diesem Bild siehst.', 'images': [snap_path]}])
+                    snapshot = Snapshot(frame=frame, source=f"camera:{cam_id}")
+                    print(f"[VISION] Sende Bild an Llava: {snapshot}")
+                    image = image_pipeline.encode(snapshot, "ollama")
+                    with scheduler.slot("ollama"), model_residency.use('llava') as info:
+                        res = llm_clients.ollama().chat(model='llava', messages=[{'role': 'user', 'content': 'Beschreibe detailliert was du auf diesem Bild siehst.', 'images': [image]}],
+                                                        keep_alive=model_residency.keep_alive('llava'))
+                        info["load_ns"] = res.get('load_duration')
                     desc = res['message']['content']
                     tool_output = f"BILD-ANALYSE ({cams[cam_id]['name']}): {desc}"
                 except Exception as e:
@@ -922,72 +1074,51 @@ async def execute_tool_command(cmd: str):
     
     return tool_output
 
-async def process_chat_generator(message: str, history: List[dict]):
-    global stop_signal, current_tts_process
-    stop_signal = False # Reset stop signal
-    
-    # Check for Stop command immediately
-    if message.strip().lower() in ["stop", "halt", "ruhe", "sei still", "schnauze", "aufhören", "stop!", "stopp"]:
-        print("[BACKEND] Stop-Befehl per Sprache/Text erkannt.")
-        if current_tts_process and current_tts_process.poll() is None:
-            try:
-                current_tts_process.terminate()
-                print("[BACKEND] TTS Prozess beendet.")
-            except: pass
-        yield "Okay."
-        return
+# --- SYSTEM PROMPT SECTIONS (memoized via context_cache) ---
 
-    print(f"\n[BACKEND] Verarbeite Nachricht (Stream): '{message}'")
-    global last_interaction_time
-    import time
-    last_interaction_time = time.time() # Update interaction timestamp
+AUTO_MEMORY_INSTRUCTIONS = """
+\n# AUTO-MEMORY (Lernen):
+Wenn der User eine wichtige persönliche Tatsache nennt, die du dir merken sollst, füge am Ende deiner Antwort einen Tag hinzu: [MEMORY: Der Fakt]
+Beispiel: "Verstanden, ich merke mir das. [MEMORY: User mag Pizza]"
+Der Tag wird dem User nicht angezeigt.
+"""
+
+def build_profile_text(face_id):
+    """Returns (profile name or None, formatted profile section) for a FaceID."""
     try:
-        # --- IDENTIFY USER ---
-        # Default to Master if no FaceID context
-        current_face_id = "master" 
-        current_user_name = "Master"
-        
-        # Check Vision Context (set by FaceID)
-        if LATEST_VISION_CONTEXT.get("person"):
-             current_face_id = LATEST_VISION_CONTEXT["person"]
-             # If it's a known face like 'Jenny', use it
-             if current_face_id.lower() not in ["unknown", "none"]:
-                 current_user_name = current_face_id
-        
-        # Load Profile from DB
-        user_profile_text = ""
-        from memory_db import MemoryDB
-        # We need a quick instance here or use a global one if available. 
-        # Since we initialized one in lifespan but didn't make it global, let's just make a new connection or use secretary's.
-        # Ideally, we should have a global db instance.
-        # For now, let's use secretary's db if possible, or just create one (sqlite handles concurrency well enough for this)
-        try:
-             temp_db = MemoryDB()
-             profile = temp_db.get_user_profile(current_face_id)
-             if profile:
-                 current_user_name = profile.get("name", current_user_name)
-                 attrs = profile.get("attributes", {})
-                 if attrs:
-                     user_profile_text = f"\n\n### USER PROFILE ({current_user_name}):\n" + json.dumps(attrs, indent=2, ensure_ascii=False)
-             temp_db.close()
-        except: pass
+        profile = secretary.secretary_service.db.get_user_profile(face_id)
+    except Exception:
+        return None, ""
+    if not profile:
+        return None, ""
+    name = profile.get("name")
+    attrs = profile.get("attributes", {})
+    if not attrs:
+        return name, ""
+    return name, f"\n\n### USER PROFILE ({name}):\n" + json.dumps(attrs, indent=2, ensure_ascii=False)
+
+def load_facts():
+    facts = secretary.secretary_service.get_facts_detailed()
+    fact_selector.forget_missing(facts)
+    return facts
+
+def build_tools_section():
+    # Get Phygital Status
+    home_status = ""
+    if phygital_manager:
+        home_status = phygital_manager.get_home_status_summary()
+    
+    if not home_status:
+        home_status = "Sensoren verbunden, warte auf erste Daten (ca. 60s)..."
 
-        # Get Phygital Status
-        home_status = ""
-        if phygital_manager:
-            home_status = phygital_manager.get_home_status_summary()
+    # Dynamically inject available devices into the prompt
+    device_list = "Keine Geräte gefunden"
+    if phygital_manager:
+        device_list = phygital_manager.get_device_control_list()
+    elif tuya and tuya.devices_cache:
+        device_list = ", ".join(tuya.devices_cache.keys())
         
-        if not home_status:
-            home_status = "Sensoren verbunden, warte auf erste Daten (ca. 60s)..."
-
-        # Dynamically inject available devices into the prompt
-        device_list = "Keine Geräte gefunden"
-        if phygital_manager:
-            device_list = phygital_manager.get_device_control_list()
-        elif tuya and tuya.devices_cache:
-            device_list = ", ".join(tuya.devices_cache.keys())
-            
-        tuya_instructions = f"""
+    return f"""
 \n# SMART HOME STATUS (ECHTZEIT):
 {home_status}
 
@@ -1014,29 +1145,196 @@ WICHTIGE REGELN FÜR TOOLS:
 3. Zitiere NIEMALS die technische Rückgabe (z.B. "Resultat der Ausführung", "Unable to find device"). Sag stattdessen: "Das hat nicht geklappt." oder "Erledigt."
 """
 
-        auto_memory_instructions = """
-\n# AUTO-MEMORY (Lernen):
-Wenn der User eine wichtige persönliche Tatsache nennt, die du dir merken sollst, füge am Ende deiner Antwort einen Tag hinzu: [MEMORY: Der Fakt]
-Beispiel: "Verstanden, ich merke mir das. [MEMORY: User mag Pizza]"
-Der Tag wird dem User nicht angezeigt.
-"""
+def build_personality_section():
+    return (
+        "\n\n### YOUR PERSONALITY (ABSOLUTE PRIORITY - OVERRIDES ALL PREVIOUS PERSONAS):\n" + SYSTEM_PROMPT + 
+        "\n\n# WICHTIG: Wenn du ein Tool nutzen willst, füge 'EXECUTE: ...' einfach in deine Antwort ein. \n" +
+        "# SPRECH-REGELN (STRIKT EINHALTEN): \n" +
+        "1. Bleib IMMER in deiner Anime-Rolle (Haruko). Sei frech, lebendig, emotional.\n" +
+        "2. Lies NIEMALS technische Fehlermeldungen (z.B. 'Unable to find device', 'Resultat: ...') oder Code vor. Übersetze Fehler in Charakter-Sprache (z.B. 'Mist, das geht gerade nicht.').\n" +
+        "3. Wiederhole NIEMALS den Befehl 'EXECUTE: ...' im gesprochenen Text.\n" +
+        "4. Wenn du Hilfe anbietest, tue nichts, bis der User 'Ja' sagt.\n" +
+        "5. ACHTUNG: Der Befehl heißt 'tuya_control', NICHT 'uya_control'. Schreibe ihn immer korrekt mit 't' am Anfang!\n" +
+        "6. Um Geräte kurz an- und auszuschalten, nutze 'wait':\n" +
+        "   EXECUTE: tuya_control --device X --state on\n" +
+        "   EXECUTE: wait --seconds 10\n" +
+        "   EXECUTE: tuya_control --device X --state off"
+    )
+
+def build_phygital_context():
+    # Basic State
+    p_state = phygital_manager.get_current_state()
+    p_temp = getattr(phygital_manager, 'last_temp', 'N/A')
+
+    # Device-ID -> "Raum Name" einmal pro Config-Version statt pro Gerät die ganze Config zu durchsuchen
+    names = {}
+    for r_name, room in getattr(phygital_manager, 'config', {}).get('rooms', {}).items():
+        for d in room.get('devices', []):
+            if d.get('id'):
+                names[d['id']] = f"{r_name} {d.get('name')}"
+
+    # Format Device States
+    dev_status = ""
+    for dev_id, dps in getattr(phygital_manager, 'device_states', {}).items():
+        dev_status += f"- {names.get(dev_id, dev_id)}: {dps}\n"
+
+    phygital_context = f"\n\n### SMART HOME STATUS (AKTUELLE DATEN):\n"
+    phygital_context += f"- Raum-Klima: {p_state} (Temp: {p_temp}°C)\n"
+    if dev_status:
+        phygital_context += f"Geräte-Status:\n{dev_status}"
+    phygital_context += "HINWEIS: Nutze diese Daten DIREKT. Führe KEINE 'room' oder 'status' Befehle aus, um sie zu prüfen. Du hast sie bereits hier.\n### ENDE STATUS\n"
+    return phygital_context
+
+def build_rag_text(message):
+    """RAG: Wissensbasis-Treffer für die Nachricht als Prompt-Abschnitt."""
+    rag_results = kb.search(message, top_k=3)
+    if not rag_results:
+        return ""
+    # Ganze Chunks (Satz-/Definitionsgrenzen aus dem Chunker) bis zum Token-Budget
+    passages = fit_passages([d['text'] for d in rag_results])
+    return "\n\n### WISSEN AUS DEM GEDÄCHTNIS (RAG):\n" + "\n".join([f"- {i+1}. {text}" for i, text in enumerate(passages)]) + "\n### ENDE GEDÄCHTNIS\n"
+
+# Kamera-Namen ("Schau auf Kamera Garten") kennt der Intent-Router über den camera_manager
+intent_router.cameras_fn = camera_manager.get_cameras
+
+def capture_vision(plan):
+    """Takes the snapshot chosen by the intent router (intent.vision).
+
+    Returns an in-memory Snapshot (no temp file; see image_pipeline) or None.
+    """
+    kind, cam_id = plan
+    if kind == "camera":
+        frame = camera_manager.get_frame(cam_id)
+        if frame is None:
+             print("[ERROR] Konnte Snapshot nicht erstellen.")
+             return None
+        return Snapshot(frame=frame, source=f"camera:{cam_id}")
+    try:
+        import vision
+        if kind == "screen":
+            frame = vision.grab_screen()
+        else:
+            frame = vision.grab_webcam()
+            if frame is None:
+                print("[ERROR] vision.grab_webcam() returned None")
+        return Snapshot(frame=frame, source=kind) if frame is not None else None
+    except Exception as e:
+        print(f"[ERROR] Fehler beim Aufruf von vision ({kind}): {e}")
+        return None
 
-        # --- VAULT INSTRUCTIONS INJECTION ---
-        vault_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge", "Instructions_for_Vault.txt")
-        vault_content = ""
-        if os.path.exists(vault_file):
+def run_pre_search(search_query):
+    """Web search for the pre-search stage (cached, see web_search). Returns the formatted results."""
+    print(f"[BACKEND] Führe Web-Suche durch: {search_query}")
+    try:
+        results = web_search.search(search_query, max_results=3)
+    except ImportError:
+        return ""
+    except Exception as ex:
+        return f"Such-Fehler: {ex}"
+    if not results:
+        return "Keine Ergebnisse gefunden."
+    return "".join(f"- {r['title']}: {r['body']} (URL: {r['href']})\n" for r in results)
+
+async def summarize_conversation(previous_summary, turns):
+    """Rolling summary for chat_sessions (runs in the background via the provider router)."""
+    transcript = "\n".join(f"{'User' if t['role'] == 'user' else 'Haruko'}: {t['content'][:1000]}" for t in turns)
+    prompt = (
+        "Fasse den bisherigen Gesprächsverlauf zwischen User und Haruko in höchstens 8 Sätzen auf DEUTSCH zusammen. "
+        "Behalte Namen, Zahlen, offene Fragen und Vereinbarungen. Nur die Zusammenfassung ausgeben.\n\n"
+        f"BISHERIGE ZUSAMMENFASSUNG:\n{previous_summary or '-'}\n\nNEUE NACHRICHTEN:\n{transcript}"
+    )
+    with scheduler.priority("background"):
+        _, stream = await llm_router.stream([{"role": "user", "content": prompt}], {"ollama_model": os.getenv("OLLAMA_MODEL", "llama3")})
+    if stream is None:
+        raise RuntimeError("Kein Provider für die Zusammenfassung verfügbar.")
+    text = ""
+    async for part in stream:
+        text += part
+    return render(tokenize(text))
+
+async def process_chat_generator(message: str, history: List[dict], race: Optional[bool] = None,
+                                 session_id: Optional[str] = None, cancel: Optional[CancelToken] = None):
+    """Chat answer as a stream of text parts; repeated household questions come from the response cache.
+
+    With a `session_id` the history comes from chat_sessions and the exchange is recorded there.
+    `cancel` is the request's cancel token (opened here if the caller has none).
+    """
+    global last_interaction_time
+    owns_token = cancel is None
+    if owns_token:
+        cancel = cancellations.open(session_id)
+    if intent_router.is_stop(message):
+        # "Stop" beendet die laufende Antwort dieser Sitzung (ohne Sitzung wie früher alle)
+        cancellations.cancel(session_id, reason="stop", exclude=cancel)
+    # Wasserfall pro Anfrage (Kontext-Stufen, Provider-Versuche, erstes Token, Tools, Folgeantwort)
+    trace = tracer.begin("chat", chars=len(message), session=session_id)
+    outcome = {"cached": False}
+    try:
+        if session_id:
+            history = chat_sessions.history(session_id)
+        scope = LATEST_VISION_CONTEXT.get("person") or "master"
+        with tracing.span("response_cache"):
+            lookup = response_cache.prepare(message, scope=scope)
+            cached = await response_cache.find(lookup)
+        if cached:
+            last_interaction_time = time.time()
+            if session_id:
+                chat_sessions.append(session_id, message, render(tokenize(cached)))
+            outcome["cached"] = True
+            tracing.mark("first_chunk")
+            yield cached
+            return
+
+        turn = {"cacheable": False}
+        parts = []
+        async for chunk in _generate_reply(message, history, race, turn, cancel):
+            if not parts:
+                tracing.mark("first_chunk")
+            parts.append(chunk)
+            yield chunk
+        reply = "".join(parts)
+        outcome["reply_chars"] = len(reply)
+        if session_id:
+            chat_sessions.append(session_id, message, render(tokenize(reply)))
+        if lookup and turn["cacheable"]:
+            await asyncio.to_thread(response_cache.store, lookup, reply)
+    finally:
+        if cancel.cancelled:
+            outcome["cancelled"] = cancel.reason
+        tracer.finish(trace, **outcome)
+        if owns_token:
+            cancellations.close(cancel)
+
+async def _generate_reply(message: str, history: List[dict], race: Optional[bool], turn: dict, cancel: CancelToken):
+    global current_tts_process
+    
+    # Check for Stop command immediately
+    if intent_router.is_stop(message):
+        print("[BACKEND] Stop-Befehl per Sprache/Text erkannt.")
+        if current_tts_process and current_tts_process.poll() is None:
             try:
-                with open(vault_file, "r", encoding="utf-8", errors="ignore") as f:
-                    vault_content = f.read()
-                print("[SYSTEM] Vault-Instruktionen geladen und injiziert.")
-            except Exception as e:
-                print(f"[SYSTEM] Fehler beim Laden der Vault-Instruktionen: {e}")
+                current_tts_process.terminate()
+                print("[BACKEND] TTS Prozess beendet.")
+            except: pass
+        yield "Okay."
+        return
 
-        # MEMORY INJECTION
-        facts = secretary.secretary_service.get_facts()
-        facts_text = ""
-        if facts:
-            facts_text = "\n\n### LANGZEITGEDÄCHTNIS (Fakten über den User):\n" + "\n".join([f"- {f}" for f in facts])
+    print(f"\n[BACKEND] Verarbeite Nachricht (Stream): '{message}'")
+    global last_interaction_time
+    import time
+    last_interaction_time = time.time() # Update interaction timestamp
+    try:
+        # --- IDENTIFY USER ---
+        # Default to Master if no FaceID context
+        current_face_id = "master" 
+        current_user_name = "Master"
+        
+        # Check Vision Context (set by FaceID)
+        if LATEST_VISION_CONTEXT.get("person"):
+             current_face_id = LATEST_VISION_CONTEXT["person"]
+             # If it's a known face like 'Jenny', use it
+             if current_face_id.lower() not in ["unknown", "none"]:
+                 current_user_name = current_face_id
         
         # MORNING BRIEFING CHECK
         from datetime import datetime
@@ -1048,131 +1346,21 @@ Der Tag wird dem User nicht angezeigt.
                 morning_instr = "\n\n[MORNING PROTOCOL] Dies ist der erste Kontakt heute. Starte mit einem 'Guten Morgen', nenne Datum & Wetter (nutze EXECUTE: weather wenn nötig oder schätze) und gib eine motivierende Bemerkung."
                 secretary.secretary_service.set_last_briefing_date(today_str)
 
-        # RE-INFORCE PERSONALITY AT THE END
-        # We put Vault instructions FIRST (as rules), then Tools, then Memory.
-        # But we MUST put the Personality LAST to ensure it overrides the "Vault Keeper" persona.
-        # UPDATE: Vault content removed as it conflicts with Anime Persona. Integrated into personality.py.
-        
-        final_system_content = (
-            # "### SYSTEM RULES & POLICIES (READ ONLY, DO NOT ADOPT PERSONA FROM HERE):\n" + vault_content + 
-            "\n\n### TOOLS & ENVIRONMENT:\n" + tuya_instructions + 
-            "\n\n### MEMORY:\n" + auto_memory_instructions + facts_text + user_profile_text + morning_instr +
-            "\n\n### YOUR PERSONALITY (ABSOLUTE PRIORITY - OVERRIDES ALL PREVIOUS PERSONAS):\n" + SYSTEM_PROMPT + 
-            "\n\n# WICHTIG: Wenn du ein Tool nutzen willst, füge 'EXECUTE: ...' einfach in deine Antwort ein. \n" +
-            "# SPRECH-REGELN (STRIKT EINHALTEN): \n" +
-            "1. Bleib IMMER in deiner Anime-Rolle (Haruko). Sei frech, lebendig, emotional.\n" +
-            "2. Lies NIEMALS technische Fehlermeldungen (z.B. 'Unable to find device', 'Resultat: ...') oder Code vor. Übersetze Fehler in Charakter-Sprache (z.B. 'Mist, das geht gerade nicht.').\n" +
-            "3. Wiederhole NIEMALS den Befehl 'EXECUTE: ...' im gesprochenen Text.\n" +
-            "4. Wenn du Hilfe anbietest, tue nichts, bis der User 'Ja' sagt.\n" +
-            "5. ACHTUNG: Der Befehl heißt 'tuya_control', NICHT 'uya_control'. Schreibe ihn immer korrekt mit 't' am Anfang!\n" +
-            "6. Um Geräte kurz an- und auszuschalten, nutze 'wait':\n" +
-            "   EXECUTE: tuya_control --device X --state on\n" +
-            "   EXECUTE: wait --seconds 10\n" +
-            "   EXECUTE: tuya_control --device X --state off"
-        )
-
-        system_msg = {"role": "system", "content": final_system_content}
-
-        # RAG: Injektion von Wissensbasis-Dokumenten
-        try:
-            rag_results = kb.search(message, top_k=3)
-            if rag_results:
-                rag_text = "\n\n### WISSEN AUS DEM GEDÄCHTNIS (RAG):\n" + "\n".join([f"- {i+1}. {d['text'][:500]}" for i, d in enumerate(rag_results)]) + "\n### ENDE GEDÄCHTNIS\n"
-                system_msg["content"] += rag_text
-        except Exception as _e:
-            print(f"[KB] RAG-Injektion Fehler: {_e}")
-        
-        formatted_history = []
-        for h in history:
-            role = "assistant" if h['role'] == "bot" else h['role']
-            formatted_history.append({"role": role, "content": h['content']})
-        
-        # VISION LOGIC
-        image_path = None
-        # Default model (can be overridden by ENV)
-        # Default model selection
-        target_model = os.getenv("OLLAMA_MODEL", "llama3")
-        
-        msg_low = message.lower()
-        print(f"[DEBUG] Prüfe Vision-Trigger für Nachricht: '{msg_low}'")
-        
-        # Expanded triggers for webcam
-        vision_triggers = ["sieh mich an", "kamera", "webcam", "foto", "guck mal", "schau mich an", "was siehst du", "cam", "check mal", "prüfe", "ist"]
-        screen_triggers = ["bildschirm", "screenshot", "screen", "desktop"]
-        
-        # Keywords that imply we should look at the screen (because the camera app is there)
-        # Removed 'katzenklo' to prefer Phygital Sensor Data over Vision
-        screen_monitoring_keywords = ["küche", "herd", "sauber", "wohnzimmer", "yi iot", "app", "fenster", "tür"]
-        
-        # SENSOR EXCLUSION: If user asks about temperature, ignore vision unless explicitly asked for camera
-        sensor_keywords = ["warm", "kalt", "temperatur", "grad", "heizung", "luftfeuchtigkeit", "wetter"]
-        is_sensor_query = any(k in msg_low for k in sensor_keywords)
-        is_explicit_vision = any(k in msg_low for k in ["kamera", "foto", "bild", "screenshot", "cam", "webcam", "sieh", "schau", "guck"])
-
-        # Check for specific camera request "Schau auf Kamera X"
-        specific_cam_match = None
-        if "kamera" in msg_low or "cam" in msg_low:
-             # Match "Kamera Wohnzimmer" or "Cam Garten"
-             for cam_id, cam_data in camera_manager.get_cameras().items():
-                if cam_data['name'].lower() in msg_low:
-                    specific_cam_match = cam_id
-                    break
-
-        if specific_cam_match:
-            print(f"[DEBUG] Spezifische Kamera erkannt: {specific_cam_match}")
-            image_path = camera_manager.get_snapshot(specific_cam_match)
-            if not image_path:
-                 print("[ERROR] Konnte Snapshot nicht erstellen.")
-        
-        # Logic update: If "Kitchen/Stove" etc. is mentioned with a vision word, use SCREEN capture (Mirroring)
-        elif (any(t in msg_low for t in vision_triggers) and any(k in msg_low for k in screen_monitoring_keywords)) or any(t in msg_low for t in screen_triggers):
-            # NEW: Check if this is actually a sensor query
-            if is_sensor_query and not is_explicit_vision:
-                 print(f"[DEBUG] Vision Trigger unterdrückt, da Sensor-Abfrage vermutet (Keywords: {sensor_keywords})")
+        # INTENT: Vision, Lernen und Pre-Search in einem Durchlauf (intent_router)
+        with tracing.span("intent") as sp:
+            if intent_router.use_embeddings:
+                intent = await asyncio.to_thread(intent_router.route, message)
             else:
-                print(f"[DEBUG] Screen-Monitoring Trigger erkannt! (Keywords: {screen_monitoring_keywords})")
-                try:
-                    import vision
-                    image_path = vision.capture_screen()
-                except Exception as e:
-                     print(f"[ERROR] Fehler beim Screenshot: {e}")
-
-        elif any(t in msg_low for t in vision_triggers):
-            # NEW: Check if this is actually a sensor query
-            if is_sensor_query and not is_explicit_vision:
-                 print(f"[DEBUG] Webcam Trigger unterdrückt, da Sensor-Abfrage vermutet.")
-            else:
-                print("[DEBUG] Webcam-Trigger erkannt!")
-                try:
-                    import vision
-                    image_path = vision.capture_webcam()
-                    if not image_path:
-                        print("[ERROR] vision.capture_webcam() returned None")
-                except Exception as e:
-                    print(f"[ERROR] Fehler beim Import oder Aufruf von vision: {e}")
-            
-        if image_path:
-            print(f"[BACKEND] Vision aktiviert (Model: llava). Bild: {image_path}")
-            target_model = 'llava'
-            # OVERRIDE System Prompt for Vision to avoid "I am text based" refusal
-            lang = os.getenv("LANGUAGE", "DE").upper()
-            if lang == "EN":
-                system_msg = {"role": "system", "content": "You are an AI assistant with vision capabilities. You are likely seeing a screenshot of the desktop, showing camera feeds (e.g. kitchen, living room). Describe the image precisely in English and answer the user's question based on the image."}
-                # Add instruction for Vision
-                message += " (ANALYZE THE IMAGE: What do you see? Answer the user's question based on the image content.)"
-            else:
-                system_msg = {"role": "system", "content": "Du bist ein KI-Assistent mit der Fähigkeit, Bilder zu sehen (Vision). Du siehst vermutlich einen Screenshot des Desktops, auf dem Kamera-Feeds (z.B. Küche, Wohnzimmer) zu sehen sind. Beschreibe das Bild präzise auf Deutsch und beantworte die Frage des Users anhand des Bildes."}
-                # Add instruction for Vision
-                message += " (ANALYSIERE DAS BILD: Was siehst du? Beantworte die Frage des Users basierend auf dem Bildinhalt.)"
+                intent = intent_router.route(message)
+            sp["kind"] = intent.kind
+        # VISION LOGIC (nur Entscheidung, die Aufnahme läuft parallel zu den anderen Stufen)
+        vision_plan = intent.vision
+        if vision_plan:
+            print(f"[BACKEND] Vision-Intent: {vision_plan[0]} ({intent.source})")
 
         # --- SELF-LEARNING (AUTO-KNOWLEDGE) ---
-        learn_match = re.search(r'(?:lern|studier|schreib|erstelle)\s+(?:mir\s+)?(?:einen\s+)?(?:guide|anleitung|wissen|infos?)\s+(?:über|zu|für)\s+(.+)', msg_low)
-        # Fallback for dialect "lern mir [Thema]"
-        if not learn_match:
-             learn_match = re.search(r'lern\s+mir\s+(.+)', msg_low)
-             
-        if learn_match and "bild" not in msg_low and not image_path:
-            topic = learn_match.group(1).strip()
+        if intent.learn_topic:
+            topic = intent.learn_topic
             # Ignore if topic is too short or generic
             if len(topic) > 2:
                 print(f"[LEARNING] User will Wissen über: {topic}")
@@ -1180,7 +1368,7 @@ Der Tag wird dem User nicht angezeigt.
                 
                 try:
                     # 1. Generate Content via Gemini
-                    model = genai.GenerativeModel('gemini-pro')
+                    model = llm_clients.gemini_model(GEMINI_API_KEY, 'gemini-pro')
                     prompt = f"""
                     Erstelle einen ausführlichen, strukturierten Leitfaden zum Thema: '{topic}'.
                     Zielgruppe: Ein technischer oder interessierter Nutzer (Master).
@@ -1195,7 +1383,8 @@ Der Tag wird dem User nicht angezeigt.
                     
                     Sei präzise, informativ und nützlich.
                     """
-                    response = model.generate_content(prompt)
+                    # Blockierender Gemini-Aufruf im Worker-Thread, der Event-Loop bedient weiter andere Streams
+                    response = await asyncio.to_thread(model.generate_content, prompt)
                     content = response.text
                     
                     # 2. Save to Knowledge Base
@@ -1211,7 +1400,7 @@ Der Tag wird dem User nicht angezeigt.
                         
                     # 3. Trigger Re-Scan
                     print(f"[LEARNING] Speichere '{filename}' und aktualisiere Index...")
-                    kb.scan_directory()
+                    await asyncio.to_thread(kb.scan_directory)
                     
                     yield f"\n\n[FERTIG] Ich habe das Wissen über '{topic}' in '{filename}' gespeichert und verinnerlicht. Fragen Sie mich nun danach!"
                     return # End processing here
@@ -1221,91 +1410,82 @@ Der Tag wird dem User nicht angezeigt.
                     yield f"\n\n[FEHLER] Das hat leider nicht geklappt: {e}"
                     return
 
-        # --- PRE-SEARCH LOGIC (Auto-Search based on User Input) ---
-        # Forces search if user asks for it, bypassing LLM decision
-        search_triggers = ["suche", "google", "recherchiere", "infos zu", "was gibt es neues", "aktuell", "wetter"]
-        # Don't search if it's a vision/camera request or simple greeting
-        if any(t in msg_low for t in search_triggers) and not image_path and len(message) > 5:
+        # --- CONTEXT GATHERING ---
+        # Profil, Fakten, RAG, Pre-Search, Kamera und Phygital laufen parallel, jede Stufe mit eigener Deadline.
+        # Wer zu spät kommt, liefert keinen Kontext statt die Antwort aufzuhalten.
+        search_query = intent.search_query
+        if search_query:
             print(f"[BACKEND] Pre-Search Trigger erkannt für: '{message}'")
-            try:
-                # Try to import ddgs (handling rename)
-                try:
-                    from ddgs import DDGS
-                except ImportError:
-                    try:
-                        from duckduckgo_search import DDGS
-                    except ImportError:
-                        DDGS = None
-                
-                if DDGS:
-                    search_query = message # Use full message for context search
-                    # Clean query slightly
-                    for t in ["suche nach", "suche", "google", "bitte"]:
-                        search_query = search_query.replace(t, "", 1)
-                    
-                    print(f"[BACKEND] Führe Web-Suche durch: {search_query.strip()}")
-                    search_res = ""
-                    with DDGS() as ddgs:
-                        try:
-                            # Retry loop
-                            results = None
-                            for attempt in range(2):
-                                try:
-                                    results = list(ddgs.text(search_query.strip(), max_results=3))
-                                    break
-                                except Exception:
-                                    import time
-                                    time.sleep(1)
-                            
-                            if results:
-                                for i, r in enumerate(results):
-                                    search_res += f"- {r['title']}: {r['body']} (URL: {r['href']})\n"
-                            else:
-                                search_res = "Keine Ergebnisse gefunden."
-                        except Exception as ex:
-                            search_res = f"Such-Fehler: {ex}"
-                    
-                    # Inject into System Prompt
-                    if search_res:
-                        print(f"[BACKEND] Suchergebnisse erhalten. Injiziere in Kontext.")
-                        system_msg['content'] += f"\n\n### ECHTZEIT-INTERNET-WISSEN (Nutz dies für deine Antwort!):\n{search_res}\n### ENDE WISSEN\n"
-            except Exception as e:
-                print(f"[PRE-SEARCH ERROR] {e}")
+        all_facts = context_cache.get("facts", load_facts, deps=(FACTS,))
+        context, _ = await run_stages({
+            # Load Profile from DB (cached per face_id, invalidated by update_user_profile)
+            "profile": lambda: context_cache.get("profile", lambda: build_profile_text(current_face_id), deps=(PROFILE,), key=current_face_id),
+            # Nur relevante Fakten (Embedding + Aktualität, angepinnte immer) bis zum Token-Budget
+            "facts": (lambda: fact_selector.select(message, all_facts)) if fact_selector.needs_ranking(all_facts) else None,
+            "rag": lambda: build_rag_text(message),
+            "search": (lambda: run_pre_search(search_query)) if search_query else None,
+            "vision": (lambda: capture_vision(vision_plan)) if vision_plan else None,
+            "phygital": (lambda: context_cache.get("phygital_context", build_phygital_context, deps=(DEVICES, HOME_STATUS))) if phygital_manager else None,
+        })
+
+        profile_name, user_profile_text = context["profile"] or (None, "")
+        if profile_name:
+            current_user_name = profile_name
+
+        # Alles passt ins Budget, oder die Stufe kam zu spät (Embed-Slot belegt) ->
+        # ohne Embedding auswählen: angepinnte Fakten immer, der Rest per Stichwort-Abgleich
+        selected_facts, fact_report = context["facts"] or fact_selector.select(message, all_facts, embed=False)
+        fact_selector.record(fact_report)
+        if fact_report["tokens_saved"]:
+            print(f"[MEMORY] {fact_report['facts_selected']}/{fact_report['facts_total']} Fakten injiziert "
+                  f"(~{fact_report['tokens_used']} Tokens, ~{fact_report['tokens_saved']} gespart).")
+
+        # RE-INFORCE PERSONALITY AT THE END
+        # We put Vault instructions FIRST (as rules), then Tools, then Memory.
+        # But we MUST put the Personality LAST to ensure it overrides the "Vault Keeper" persona.
+        # UPDATE: Vault content removed as it conflicts with Anime Persona. Integrated into personality.py.
+        # Alle Abschnitte kommen aus dem context_cache (nur bei Änderungen neu gebaut).
+        final_system_content = (
+            "\n\n### TOOLS & ENVIRONMENT:\n" + context_cache.get("tools", build_tools_section, deps=(DEVICES, HOME_STATUS)) +
+            "\n\n### MEMORY:\n" + AUTO_MEMORY_INSTRUCTIONS + format_facts(selected_facts) + user_profile_text + morning_instr +
+            context_cache.get("personality", build_personality_section, deps=(PERSONALITY,))
+        )
+
+        system_msg = {"role": "system", "content": final_system_content}
+
+        # RAG: Injektion von Wissensbasis-Dokumenten
+        if context["rag"]:
+            system_msg["content"] += context["rag"]
+        
+        # Default model (can be overridden by ENV)
+        target_model = os.getenv("OLLAMA_MODEL", "llama3")
+        image = context["vision"]
+            
+        if image:
+            print(f"[BACKEND] Vision aktiviert (Model: llava). Bild: {image}")
+            target_model = 'llava'
+            # OVERRIDE System Prompt for Vision to avoid "I am text based" refusal
+            lang = os.getenv("LANGUAGE", "DE").upper()
+            if lang == "EN":
+                system_msg = {"role": "system", "content": "You are an AI assistant with vision capabilities. You are likely seeing a screenshot of the desktop, showing camera feeds (e.g. kitchen, living room). Describe the image precisely in English and answer the user's question based on the image."}
+                # Add instruction for Vision
+                message += " (ANALYZE THE IMAGE: What do you see? Answer the user's question based on the image content.)"
+            else:
+                system_msg = {"role": "system", "content": "Du bist ein KI-Assistent mit der Fähigkeit, Bilder zu sehen (Vision). Du siehst vermutlich einen Screenshot des Desktops, auf dem Kamera-Feeds (z.B. Küche, Wohnzimmer) zu sehen sind. Beschreibe das Bild präzise auf Deutsch und beantworte die Frage des Users anhand des Bildes."}
+                # Add instruction for Vision
+                message += " (ANALYSIERE DAS BILD: Was siehst du? Beantworte die Frage des Users basierend auf dem Bildinhalt.)"
+
+        # --- PRE-SEARCH RESULT (Auto-Search based on User Input) ---
+        if context["search"]:
+            print(f"[BACKEND] Suchergebnisse erhalten. Injiziere in Kontext.")
+            system_msg['content'] += f"\n\n### ECHTZEIT-INTERNET-WISSEN (Nutz dies für deine Antwort!):\n{context['search']}\n### ENDE WISSEN\n"
 
         # --- PHYGITAL CONTEXT INJECTION (Fix for 'room' command) ---
-        if phygital_manager:
-            try:
-                # Basic State
-                p_state = phygital_manager.get_current_state()
-                p_temp = getattr(phygital_manager, 'last_temp', 'N/A')
-                
-                # Format Device States
-                dev_status = ""
-                if hasattr(phygital_manager, 'device_states'):
-                     for dev_id, dps in phygital_manager.device_states.items():
-                         # Try to find name in config
-                         name = dev_id
-                         if hasattr(phygital_manager, 'config'):
-                             for r_name, room in phygital_manager.config.get('rooms', {}).items():
-                                 for d in room.get('devices', []):
-                                     if d.get('id') == dev_id:
-                                         name = f"{r_name} {d.get('name')}"
-                         dev_status += f"- {name}: {dps}\n"
-                
-                phygital_context = f"\n\n### SMART HOME STATUS (AKTUELLE DATEN):\n"
-                phygital_context += f"- Raum-Klima: {p_state} (Temp: {p_temp}°C)\n"
-                if dev_status:
-                    phygital_context += f"Geräte-Status:\n{dev_status}"
-                phygital_context += "HINWEIS: Nutze diese Daten DIREKT. Führe KEINE 'room' oder 'status' Befehle aus, um sie zu prüfen. Du hast sie bereits hier.\n### ENDE STATUS\n"
-                
-                system_msg['content'] += phygital_context
-                # print(f"[BACKEND] Phygital Context injiziert: Temp={p_temp}")
-            except Exception as pe:
-                print(f"[BACKEND] Fehler bei Phygital Context Injection: {pe}")
+        if context["phygital"]:
+            system_msg['content'] += context["phygital"]
         
         # --- VISION CONTEXT INJECTION (FaceID) ---
         try:
-            global LATEST_VISION_CONTEXT
             # Context valid for 2 minutes
             if LATEST_VISION_CONTEXT.get("person") and (time.time() - LATEST_VISION_CONTEXT.get("timestamp", 0) < 120):
                 person_seen = LATEST_VISION_CONTEXT["person"]
@@ -1329,281 +1509,38 @@ Der Tag wird dem User nicht angezeigt.
 
         user_msg = {"role": "user", "content": f"{message} (ANTWORTE AUF DEUTSCH. BEI TOOLS: 'EXECUTE: ...')"}
         
-        if image_path:
-            user_msg['images'] = [image_path]
+        if image:
+            user_msg['images'] = [image]
 
-        messages = [system_msg] + formatted_history + [user_msg]
+        # Zusammenfassung älterer Turns (chat_sessions) landet im System-Prompt, nicht als zweite System-Nachricht
+        messages = prompt_messages(system_msg, history, user_msg)
         
-        # --- HYBRID LLM GENERATION (DeepSeek -> Groq -> Gemini -> Ollama) ---
+        # --- HYBRID LLM GENERATION (ProviderRouter: gesündester Provider zuerst) ---
         print(f"[BACKEND] Generiere Antwort (Ziel: {target_model})...")
         
         full_content_part1 = ""
         is_tool_call_detected = False
-        buffer = ""
-        BUFFER_SIZE = 1000 # Increased buffer to catch split commands
-        buffer_flushed = False
-        
-        active_stream = None
-        using_provider = "none"
+        # Befehle/Tags werden inkrementell erkannt; sauberer Text geht sofort raus
+        tag_filter = TagTokenizer()
+        part1_tags = []
 
-        # Check for Image (Vision Requirement)
-        has_image = False
-        for m in messages:
-            if 'images' in m and m['images']: has_image = True
-        
-        # ---------------------------------------------------------
-        # PRIORITY 0: NVIDIA NIM (Cloud)
-        # ---------------------------------------------------------
-        if active_stream is None and USE_NVIDIA_NIM and NVIDIA_API_KEY:
-            try:
-                print(f"[BACKEND] Versuche NVIDIA NIM...")
-                
-                # Model Selection
-                nim_model = "meta/llama-3.1-70b-instruct"
-                
-                nim_messages = []
-                # Inject System Prompt (Personality/Context)
-                if system_msg:
-                    nim_messages.append(system_msg)
-
-                for m in messages:
-                    role = m['role']
-                    content = m['content']
-                    
-                    # Handle Vision
-                    if role == 'user' and 'images' in m and m['images']:
-                         nim_model = "meta/llama-3.2-90b-vision-instruct"
-                         print(f"[BACKEND] NIM Vision Modus: {nim_model}")
-                         
-                         content_list = [{"type": "text", "text": content}]
-                         import base64
-                         for img_path in m['images']:
-                             try:
-                                 with open(img_path, "rb") as image_file:
-                                     b64 = base64.b64encode(image_file.read()).decode('utf-8')
-                                     content_list.append({
-                                         "type": "image_url",
-                                         "image_url": {"url": f"data:image/jpeg;base64,{b64}"}
-                                     })
-                             except Exception as ie:
-                                 print(f"[NIM ERROR] Image load failed: {ie}")
-                         
-                         nim_messages.append({"role": role, "content": content_list})
-                    else:
-                         nim_messages.append({"role": role, "content": content})
-
-                stream = client_nim.chat.completions.create(
-                    model=nim_model,
-                    messages=nim_messages,
-                    stream=True,
-                    max_tokens=1024
-                )
-
-                def nim_adapter(gen):
-                    for chunk in gen:
-                        if chunk.choices[0].delta.content:
-                            yield chunk.choices[0].delta.content
-                            
-                active_stream = nim_adapter(stream)
-                using_provider = "nvidia_nim"
-                print(f"[BACKEND] NVIDIA NIM ({nim_model}) antwortet.")
-                
-            except Exception as e:
-                print(f"[BACKEND] Fehler bei NVIDIA NIM: {e}. Fallback...")
-
-        # ---------------------------------------------------------
-        # PRIORITY 1: GEMINI FREE (Flash 2.0) - KEY D
-        # ---------------------------------------------------------
-        gemini_free_key = os.getenv("GEMINI_API_KEY_FREE")
-        
-        if active_stream is None and gemini_free_key:
-            try:
-                print(f"[BACKEND] Versuche Gemini FREE (Flash 2.0)...")
-                genai.configure(api_key=gemini_free_key)
-                
-                gemini_history = []
-                sys_instr = system_msg['content']
-                
-                for m in messages:
-                    if m['role'] == 'system': continue
-                    role = "model" if m['role'] in ["assistant", "bot"] else "user"
-                    content_parts = [m['content']]
-                    if 'images' in m and m['images']:
-                        import PIL.Image
-                        for img_path in m['images']:
-                            try:
-                                img = PIL.Image.open(img_path)
-                                content_parts.append(img)
-                            except: pass
-                    gemini_history.append({"role": role, "parts": content_parts})
-                
-                g_model = genai.GenerativeModel('gemini-2.0-flash', system_instruction=sys_instr)
-                g_response = g_model.generate_content(gemini_history, stream=True)
-                
-                def gemini_adapter(resp):
-                    for chunk in resp:
-                        if chunk.text: yield chunk.text
-                        
-                active_stream = gemini_adapter(g_response)
-                using_provider = "gemini_free"
-                print(f"[BACKEND] Gemini FREE antwortet.")
-                
-            except Exception as e:
-                print(f"[BACKEND] Fehler bei Gemini FREE: {e}. Fallback...")
-
-        # ---------------------------------------------------------
-        # PRIORITY 2: GROQ (Text Only)
-        # ---------------------------------------------------------
-        if active_stream is None and not has_image and os.getenv("GROQ_API_KEY"):
-            try:
-                print(f"[BACKEND] Versuche Groq (Llama 3.3 70B)...")
-                # Use global groq_client
-                g_client = groq_client if 'groq_client' in globals() else openai.Client(api_key=os.getenv("GROQ_API_KEY"), base_url="https://api.groq.com/openai/v1")
-                
-                groq_msgs = []
-                for m in messages:
-                    role = m['role']
-                    content = m['content']
-                    groq_msgs.append({"role": role, "content": content})
-
-                stream = g_client.chat.completions.create(
-                    model="llama-3.3-70b-versatile",
-                    messages=groq_msgs,
-                    stream=True
-                )
-                
-                def groq_adapter(gen):
-                    for chunk in gen:
-                        if chunk.choices[0].delta.content:
-                            yield chunk.choices[0].delta.content
-
-                active_stream = groq_adapter(stream)
-                using_provider = "groq"
-                print(f"[BACKEND] Groq antwortet.")
-                
-            except Exception as e:
-                print(f"[BACKEND] Fehler bei Groq: {e}. Fallback...")
-
-        # ---------------------------------------------------------
-        # PRIORITY 3: OPENROUTER (Free Models)
-        # ---------------------------------------------------------
-        if active_stream is None and not has_image and os.getenv("OPENROUTER_API_KEY"):
-            try:
-                print(f"[BACKEND] Versuche OpenRouter (Free Models)...")
-                or_client = openai.Client(api_key=os.getenv("OPENROUTER_API_KEY"), base_url="https://openrouter.ai/api/v1")
-                
-                # List of free models to try in order
-                free_models = [
-                    "google/gemini-2.0-flash-exp:free",
-                    "deepseek/deepseek-r1:free",
-                    "meta-llama/llama-3.3-70b-instruct:free",
-                    "qwen/qwen-2.5-coder-32b-instruct:free"
-                ]
-                
-                or_msgs = []
-                for m in messages:
-                    or_msgs.append({"role": m['role'], "content": m['content']})
-
-                for model_name in free_models:
-                    try:
-                        print(f"[BACKEND] OpenRouter Versuch: {model_name}...")
-                        stream = or_client.chat.completions.create(
-                            model=model_name,
-                            messages=or_msgs,
-                            stream=True,
-                            extra_headers={
-                                "HTTP-Referer": "https://moltbot.ai", 
-                                "X-Title": "MoltBot"
-                            }
-                        )
-                        
-                        def openrouter_adapter(gen):
-                            for chunk in gen:
-                                if chunk.choices and chunk.choices[0].delta.content:
-                                    yield chunk.choices[0].delta.content
-                        
-                        active_stream = openrouter_adapter(stream)
-                        using_provider = f"openrouter/{model_name}"
-                        print(f"[BACKEND] OpenRouter ({model_name}) antwortet.")
-                        break # Success, stop trying models
-                    except Exception as me:
-                        print(f"[BACKEND] OpenRouter {model_name} fehlgeschlagen: {me}")
-                        continue
-
-            except Exception as e:
-                print(f"[BACKEND] Fehler bei OpenRouter: {e}. Fallback...")
-
-        # ---------------------------------------------------------
-        # PRIORITY 4: GEMINI PAID (Key C) - Fallback
-        # ---------------------------------------------------------
-        gemini_paid_key = os.getenv("GEMINI_API_KEY_PAID")
-        
-        if active_stream is None and gemini_paid_key:
-            try:
-                print(f"[BACKEND] Versuche Gemini PAID (Flash 2.0)...")
-                genai.configure(api_key=gemini_paid_key)
-                
-                # Re-build history only if not built (code dup but safe)
-                gemini_history = []
-                sys_instr = system_msg['content']
-                
-                for m in messages:
-                    if m['role'] == 'system': continue
-                    role = "model" if m['role'] in ["assistant", "bot"] else "user"
-                    content_parts = [m['content']]
-                    if 'images' in m and m['images']:
-                        import PIL.Image
-                        for img_path in m['images']:
-                            try:
-                                img = PIL.Image.open(img_path)
-                                content_parts.append(img)
-                            except: pass
-                    gemini_history.append({"role": role, "parts": content_parts})
-                
-                g_model = genai.GenerativeModel('gemini-2.0-flash', system_instruction=sys_instr)
-                g_response = g_model.generate_content(gemini_history, stream=True)
-                
-                def gemini_adapter(resp):
-                    for chunk in resp:
-                        if chunk.text: yield chunk.text
-                        
-                active_stream = gemini_adapter(g_response)
-                using_provider = "gemini_paid"
-                print(f"[BACKEND] Gemini PAID antwortet.")
-                
-            except Exception as e:
-                print(f"[BACKEND] Fehler bei Gemini PAID: {e}. Fallback...")
-
-        # ---------------------------------------------------------
-        # PRIORITY 4: OLLAMA (Local - Text & Vision)
-        # ---------------------------------------------------------
-        if active_stream is None:
-            try:
-                print(f"[BACKEND] Versuche lokales Modell (Ollama)...")
-                target_model_final = "llava" if has_image else target_model
-                
-                active_stream_gen = ollama.chat(model=target_model_final, messages=messages, stream=True)
-                def ollama_adapter(gen):
-                    for chunk in gen:
-                        yield chunk['message']['content']
-                active_stream = ollama_adapter(active_stream_gen)
-                using_provider = "ollama"
-                print(f"[BACKEND] Ollama ({target_model_final}) antwortet.")
-                
-            except Exception as e:
-                print(f"[BACKEND] Fehler bei Ollama: {e}.")
+        with tracing.span("llm.open") as sp:
+            if race if race is not None else LLM_RACE_MODE:
+                using_provider, active_stream = await llm_router.race(messages, {"ollama_model": target_model})
+            else:
+                using_provider, active_stream = await llm_router.stream(messages, {"ollama_model": target_model})
+            sp["provider"] = using_provider
 
         if active_stream is None:
              print("[BACKEND] CRITICAL: Alle Provider fehlgeschlagen.")
-             yield "Fehler: Ich konnte keine Verbindung zu meinen Gehirn-Modulen herstellen (DeepSeek, Groq, Gemini, Ollama alle tot)."
+             yield "Fehler: Ich konnte keine Verbindung zu meinen Gehirn-Modulen herstellen (NIM, Gemini, Groq, OpenRouter, Ollama alle tot)."
              return
 
+        stream1_start = time.monotonic()
         try:
-            for part in active_stream:
-                if stop_signal:
-                    print("[BACKEND] Stop-Signal empfangen. Breche Generierung ab.")
-                    yield "\n[ABGEBROCHEN]"
-                    return
+            async for part in active_stream:
+                if cancel.cancelled:
+                    break
 
                 # part is already the text string
                 full_content_part1 += part
@@ -1614,41 +1551,25 @@ Der Tag wird dem User nicht angezeigt.
                 
                 # FIX: Do not suppress output for tool calls. 
                 # We want Haruko to speak while executing.
-                # We just filter the command string out of the buffer below.
-                
-                # Buffering Logic to prevent "Preamble Leak" and hide Tags
-                if not buffer_flushed:
-                    buffer += part
-                    # Clean buffer from tags dynamically (including MEMORY and EXECUTE commands)
-                    buffer = re.sub(r'\[(wave|execute|love|angry|laugh|cry|blush|wink|MEMORY:[^\]]*)\]', '', buffer, flags=re.IGNORECASE)
-                    # Hide raw EXECUTE lines (keep text after command on new line)
-                    buffer = re.sub(r'EXECUTE:\s*.*?(?=(\n|$))', '', buffer, flags=re.IGNORECASE)
-                    # Hide raw commands like (uya_control ...) or tuya_control ... 
-                    buffer = re.sub(r'\(?t?uya_control.*?(?=(\)|$|\n))', '', buffer, flags=re.IGNORECASE)
-                    # Hide stray technical flags like --device ... --state ...
-                    buffer = re.sub(r'--device\s+.*?(?=(\n|$))', '', buffer, flags=re.IGNORECASE)
-                    
-                    if len(buffer) >= BUFFER_SIZE:
-                        # Buffer full -> Flush
-                        yield buffer
-                        buffer_flushed = True
-                        buffer = "" # clear buffer
-                else:
-                    # Already flushed, just stream directly
-                    # Also clean part here
-                    part = re.sub(r'\[(wave|execute|love|angry|laugh|cry|blush|wink|MEMORY:[^\]]*)\]', '', part, flags=re.IGNORECASE)
-                    part = re.sub(r'EXECUTE:\s*.*?(?=(\n|$))', '', part, flags=re.IGNORECASE)
-                    part = re.sub(r'\(?t?uya_control.*?(?=(\)|$|\n))', '', part, flags=re.IGNORECASE)
-                    part = re.sub(r'--device\s+.*?(?=(\n|$))', '', part, flags=re.IGNORECASE)
-                    yield part
+                # The tokenizer only holds back a possible tag start at the chunk end.
+                events = tag_filter.feed(part)
+                part1_tags.extend(e for e in events if e.kind != TEXT)
+                visible = render(events, keep=CLIENT_TAGS)
+                if visible:
+                    yield visible
             
-            # End of stream. If we have leftover buffer, yield it.
-            if not buffer_flushed and buffer:
-                buffer = re.sub(r'\[(wave|execute|love|angry|laugh|cry|blush|wink|MEMORY:[^\]]*)\]', '', buffer, flags=re.IGNORECASE)
-                buffer = re.sub(r'EXECUTE:\s*.*?(?=(\n|$))', '', buffer, flags=re.IGNORECASE)
-                buffer = re.sub(r'\(?t?uya_control.*?(?=(\)|$|\n))', '', buffer, flags=re.IGNORECASE)
-                buffer = re.sub(r'--device\s+.*?(?=(\n|$))', '', buffer, flags=re.IGNORECASE)
-                yield buffer
+            if cancel.cancelled:
+                # Upstream wurde schon beim Abbruch geschlossen (llm_stream)
+                print(f"[BACKEND] Generierung abgebrochen ({cancel.reason}).")
+                yield "\n[ABGEBROCHEN]"
+                return
+
+            # End of stream: incomplete tags at the very end are resolved now
+            events = tag_filter.flush()
+            part1_tags.extend(e for e in events if e.kind != TEXT)
+            visible = render(events, keep=CLIENT_TAGS)
+            if visible:
+                yield visible
                 
         except Exception as e:
             # Check for Connection Reset / WinError 10054
@@ -1656,50 +1577,19 @@ Der Tag wird dem User nicht angezeigt.
                 print(f"[STREAM ERROR] Client hat Verbindung getrennt (Stream 1): {e}")
                 return # Stop generator gracefully
 
-            # Check for Llava not found error
-            is_llava_error = False
-            # Check safely for ResponseError if available
-            try:
-                if isinstance(e, ollama.ResponseError) and "not found" in str(e) and "llava" in str(target_model):
-                     is_llava_error = True
-            except: pass
-            
-            if not is_llava_error and "not found" in str(e) and target_model == 'llava':
-                 is_llava_error = True
-
-            if is_llava_error:
-                print(f"[BACKEND] Fehler: Llava Modell nicht gefunden. Fallback auf {os.getenv('OLLAMA_MODEL', 'llama3.2')}.")
-                try:
-                    # Fallback: Remove image and retry
-                    if 'images' in user_msg: del user_msg['images']
-                    target_model = os.getenv("OLLAMA_MODEL", "llama3.2")
-                    full_content_part1 = ""
-                    stream = ollama.chat(model=target_model, messages=messages, stream=True)
-                    for chunk in stream:
-                        part = chunk['message']['content']
-                        full_content_part1 += part
-                        yield part
-                    yield "\n\n(Ich kann meine Augen (Llava) noch nicht finden. Ich lade sie wohl noch herunter. Aber ich höre dich.)"
-                except Exception as ex:
-                    print(f"[STREAM ERROR] Fehler im Fallback-Stream: {ex}")
-                    return
-            else:
-                print(f"[STREAM ERROR] Unbekannter Fehler: {e}")
-                return
+            print(f"[STREAM ERROR] Abbruch während Stream 1 ({using_provider}): {e}")
+            return
 
+        tracing.record("llm.stream1", stream1_start, provider=using_provider)
         print(f"[BACKEND] Antwort 1 von {using_provider} erhalten.")
         print(f"[DEBUG] Content 1: {full_content_part1}")
         
         # Strict Command Parsing to avoid hallucinations
-        # re module is already imported globally
-        # Look for SEARCH: until end of line
-        search_match = re.search(r'SEARCH:\s*([^\n\r]+)', full_content_part1)
-
-        # Look for EXECUTE: until end of line
-        cmd_match = re.search(r'EXECUTE:\s*([^\n\r]+)', full_content_part1)
+        # Die Befehle kommen als strukturierte Events aus dem Stream-Tokenizer
+        search_queries = [e.value for e in part1_tags if e.kind == SEARCH and e.value]
         
         # Look for MEMORY tags
-        memory_matches = re.findall(r'\[MEMORY:\s*([^\]]+)\]', full_content_part1, flags=re.IGNORECASE)
+        memory_matches = [e.value for e in part1_tags if e.kind == MEMORY and e.value]
         for fact in memory_matches:
             try:
                 print(f"[BACKEND] Auto-Memory: Speichere Fakt '{fact.strip()}'")
@@ -1707,34 +1597,37 @@ Der Tag wird dem User nicht angezeigt.
             except Exception as me:
                 print(f"[MEMORY ERROR] {me}")
         
-        if search_match:
-            query = search_match.group(1).strip().strip('`')
+        # Check if we found a command (either strict EXECUTE or loose detection)
+        
+        # 1. Explicit EXECUTE commands
+        explicit_matches = [e.value for e in part1_tags if e.kind == EXECUTE and e.value]
+        
+        # 2. Loose Detection (fallback): tuya_control ohne EXECUTE davor
+        loose_matches = [e.value for e in part1_tags if e.kind == TUYA]
+        
+        # Combine findings
+        has_commands = bool(explicit_matches) or bool(loose_matches)
+
+        # Nur Antworten ohne Seiteneffekte (keine Aktionen, kein Bild, kein neues Wissen) dürfen in den Antwort-Cache
+        # (vor der Suche bestimmt, damit ein Abbruch der Folgeantwort nicht überschrieben wird)
+        cacheable = (not image and not morning_instr and not memory_matches
+                     and all(is_read_only(c) for c in explicit_matches + loose_matches))
+
+        # Nach einem Abbruch keine Suche und keine Tools mehr starten
+        cancel.raise_if_cancelled()
+
+        if search_queries:
+            query = search_queries[0].strip('`')
             print(f"[BACKEND] Starte Internet-Suche: {query}")
             
             try:
-                # Try new package name first to avoid warnings
-                try:
-                    from ddgs import DDGS
-                except ImportError:
-                    from duckduckgo_search import DDGS
-
-                results_text = ""
-                with DDGS() as ddgs:
-                    # Retry logic for stability
-                    try:
-                        results = list(ddgs.text(query, max_results=3))
-                    except Exception as e:
-                        print(f"[SEARCH ERROR] Erster Versuch fehlgeschlagen: {e}. Warte kurz...")
-                        import time
-                        time.sleep(1)
-                        results = list(ddgs.text(query, max_results=3))
-
-                    if not results:
-                        results_text = "Keine Ergebnisse gefunden."
-                    else:
-                        for i, r in enumerate(results):
-                            results_text += f"{i+1}. {r['title']}: {r['body']} (URL: {r['href']})\n"
-                
+                with tracing.span("web_search"):
+                    results = await web_search.asearch(query, max_results=3)
+                if not results:
+                    results_text = "Keine Ergebnisse gefunden."
+                else:
+                    results_text = "".join(f"{i+1}. {r['title']}: {r['body']} (URL: {r['href']})\n"
+                                           for i, r in enumerate(results))
                 tool_output = f"Suchergebnisse für '{query}':\n{results_text}"
             except Exception as e:
                 tool_output = f"Fehler bei der Internet-Suche: {e}"
@@ -1747,71 +1640,33 @@ Der Tag wird dem User nicht angezeigt.
             
             full_content_part2 = ""
             try:
-                # Reuse the provider logic? Or simple fallback.
-                # For simplicity and stability, we try Gemini again if it was used, or fallback.
-                # Since we don't have the reusable block as a function yet, let's copy the Gemini/Ollama logic briefly or just use Ollama for the follow-up (simpler).
-                # Actually, better to use Gemini if available.
-                
-                stream2 = None
-                if using_provider == "gemini":
-                    try:
-                        # Re-build Gemini history with new messages
-                        # (Optimized: Just append to previous context if we had a session object, but we used generate_content)
-                        # So we rebuild:
-                        gem_hist_2 = []
-                        sys_instr_2 = system_msg['content']
-                        for m in messages:
-                            if m['role'] == 'system': continue
-                            r = "model" if m['role'] in ["assistant", "bot"] else "user"
-                            gem_hist_2.append({"role": r, "parts": [m['content']]}) # No images in search follow-up usually
-                        
-                        g_model_2 = genai.GenerativeModel('gemini-2.0-flash', system_instruction=sys_instr_2)
-                        resp2 = g_model_2.generate_content(gem_hist_2, stream=True)
-                        def g_adapt_2(r):
-                            for c in r: 
-                                if c.text: yield c.text
-                        stream2 = g_adapt_2(resp2)
-                    except:
-                        pass # Fallback to Ollama below
-                
-                if stream2 is None:
-                    s2_gen = ollama.chat(model=target_model, messages=messages, stream=True)
-                    def o_adapt_2(g):
-                        for c in g: yield c['message']['content']
-                    stream2 = o_adapt_2(s2_gen)
-
-                for part in stream2:
-                    full_content_part2 += part
-                    yield part
+                # Folgeantwort über denselben Router (bevorzugt der Provider der ersten Antwort)
+                with tracing.span("llm.followup", kind="search"):
+                    _, stream2 = await llm_router.stream(strip_images(messages), {"ollama_model": target_model}, prefer=using_provider)
+                    if stream2 is None:
+                        raise RuntimeError("Kein Provider für die Folgeantwort verfügbar.")
+                    async for part in stream2:
+                        if cancel.cancelled:
+                            break
+                        full_content_part2 += part
+                        yield part
             except Exception as e:
                 print(f"[STREAM ERROR] Abbruch während Search Stream 2: {e}")
+                cacheable = False
 
         # --- MAIN TOOL EXECUTION LOGIC ---
         # Moved outside the search block to ensure it runs even if search didn't trigger
-        # Check if we found a command (either strict EXECUTE or loose detection)
-        
-        # 1. Explicit EXECUTE commands
-        explicit_matches = list(re.finditer(r'EXECUTE:\s*(.*?)(?:\n|$)', full_content_part1, re.IGNORECASE))
-        
-        # 2. Loose Detection (fallback)
-        loose_matches = list(re.finditer(r'\(?(t?uya_control)\s+.*?\)?', full_content_part1, re.IGNORECASE))
-        
-        # Combine findings
-        has_commands = bool(explicit_matches) or bool(loose_matches) or (cmd_match is not None)
-
         if has_commands:
+            cancel.raise_if_cancelled()
             # --- MULTI-COMMAND EXECUTION LOGIC ---
             print("[BACKEND] Starte Multi-Command-Analyse...")
             commands_to_run = []
             
             # 1. Add Explicit EXECUTE commands
-            if explicit_matches:
-                for m in explicit_matches:
-                    commands_to_run.append(m.group(1).strip())
+            commands_to_run.extend(explicit_matches)
                 
             # 2. Add Loose Detection
-            for m in loose_matches:
-                 raw_loose = m.group(0).strip().strip('()')
+            for raw_loose in loose_matches:
                  # Only add if not already covered (simple check)
                  is_covered = False
                  for exc in commands_to_run:
@@ -1822,29 +1677,27 @@ Der Tag wird dem User nicht angezeigt.
                      print(f"[BACKEND] Loose Command Detection: {raw_loose}")
                      commands_to_run.append(raw_loose)
             
-            # If still empty but cmd_match was explicitly true from the top regex (legacy fallback)
-            if not commands_to_run and cmd_match and hasattr(cmd_match, 'group'):
-                 commands_to_run.append(cmd_match.group(1).strip())
-
             tool_output = ""
             if commands_to_run:
                 print(f"[BACKEND] Gefundene Befehle ({len(commands_to_run)}): {commands_to_run}")
-                tool_outputs = []
+                cleaned_commands = []
                 
                 for cmd in commands_to_run:
                     # Clean command
-                    cmd = cmd.strip()
+                    cmd = clean_tool_command(cmd)
                     # Check for " - " hallucination
                     if " - " in cmd:
                         parts = cmd.split(" - ", 1)
                         if len(parts[1]) > 15:
                             cmd = parts[0]
+                    cleaned_commands.append(cmd)
                     
-                    # Execute via helper
-                    output = await execute_tool_command(cmd)
-                    tool_outputs.append(f"CMD: {cmd}\nRESULT: {output}")
-                    
-                tool_output = "\n---\n".join(tool_outputs)
+                # Unabhängige Befehle parallel, "wait" als Barriere, Timeout pro Tool
+                with tracing.span("tools", commands=len(cleaned_commands)):
+                    tool_results = await run_plan(build_plan(cleaned_commands, tuya.device_id), execute_tool_command)
+                tool_output = format_results(tool_results)
+                if any(r.status != "ok" for r in tool_results):
+                    cacheable = False
             else:
                  tool_output = "Fehler: Befehl erkannt aber nicht extrahierbar."
 
@@ -1859,112 +1712,73 @@ Der Tag wird dem User nicht angezeigt.
             
             full_content_part2 = ""
             try:
-                stream2 = None
-                
-                # 0. Try NVIDIA NIM for follow-up
-                if using_provider == "nvidia_nim" and USE_NVIDIA_NIM and NVIDIA_API_KEY:
-                    try:
-                        print("[BACKEND] Nutze NVIDIA NIM für Folgeantwort (Tool Result)...")
-                        # Re-build NIM messages
-                        nim_msgs_2 = []
-                        if system_msg: nim_msgs_2.append(system_msg)
-                        
-                        for m in messages:
-                            if m['role'] == 'system': continue
-                            # Simplified content handling for text-only follow up
-                            nim_msgs_2.append({"role": m['role'], "content": m['content']})
-
-                        stream = client_nim.chat.completions.create(
-                            model="meta/llama-3.1-70b-instruct",
-                            messages=nim_msgs_2,
-                            stream=True,
-                            max_tokens=1024
-                        )
-                        def nim_adapter_2(gen):
-                            for chunk in gen:
-                                if chunk.choices[0].delta.content:
-                                    yield chunk.choices[0].delta.content
-                        stream2 = nim_adapter_2(stream)
-                    except Exception as ne:
-                        print(f"[BACKEND] NIM Folgeantwort fehlgeschlagen: {ne}. Fallback...")
-
-                # 1. Try Groq for follow-up (if used previously or available)
-                if using_provider == "groq":
-                    try:
-                        from groq import Groq
-                        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-                        # Re-build Groq messages
-                        groq_msgs_2 = []
-                        for m in messages:
-                                if m['role'] == 'system':
-                                    groq_msgs_2.append({"role": "system", "content": m['content']})
-                                elif m['role'] in ["user", "assistant"]:
-                                    groq_msgs_2.append({"role": m['role'], "content": m['content']})
-                        
-                        stream = client.chat.completions.create(
-                            messages=groq_msgs_2,
-                            model="llama-3.3-70b-versatile",
-                            stream=True,
-                        )
-                        def groq_adapter_2(gen):
-                            for chunk in gen:
-                                if chunk.choices[0].delta.content:
-                                    yield chunk.choices[0].delta.content
-                        stream2 = groq_adapter_2(stream)
-                    except Exception as ge:
-                            print(f"[BACKEND] Groq Folgeantwort fehlgeschlagen: {ge}. Fallback auf Ollama.")
-
-                # 2. Try Gemini for follow-up
-                if stream2 is None and using_provider == "gemini":
-                    try:
-                        # Re-build Gemini history for follow-up with tool output
-                        gem_hist_2 = []
-                        sys_instr_2 = system_msg['content']
-                        for m in messages:
-                            if m['role'] == 'system':
-                                continue
-                            r = "model" if m['role'] in ["assistant", "bot"] else "user"
-                            gem_hist_2.append({"role": r, "parts": [m['content']]})
-                        g_model_2 = genai.GenerativeModel('gemini-2.0-flash', system_instruction=sys_instr_2)
-                        resp2 = g_model_2.generate_content(gem_hist_2, stream=True)
-                        def g_adapt_2(r):
-                            for c in r:
-                                if c.text:
-                                    yield c.text
-                        stream2 = g_adapt_2(resp2)
-                    except Exception as _ge:
-                        print(f"[BACKEND] Gemini Folgeantwort fehlgeschlagen: {_ge}. Fallback auf Ollama.")
-                if stream2 is None:
-                    s2_gen = ollama.chat(model=target_model, messages=messages, stream=True)
-                    def o_adapt_2(g):
-                        for c in g:
-                            yield c['message']['content']
-                    stream2 = o_adapt_2(s2_gen)
-                for part in stream2:
-                    full_content_part2 += part
-                    yield part
+                # Folgeantwort über denselben Router (bevorzugt der Provider der ersten Antwort)
+                with tracing.span("llm.followup", kind="tools"):
+                    _, stream2 = await llm_router.stream(strip_images(messages), {"ollama_model": target_model}, prefer=using_provider)
+                    if stream2 is None:
+                        raise RuntimeError("Kein Provider für die Folgeantwort verfügbar.")
+                    async for part in stream2:
+                        if cancel.cancelled:
+                            break
+                        full_content_part2 += part
+                        yield part
             except Exception as e:
                 print(f"[STREAM ERROR] Abbruch während Stream 2: {e}")
+                cacheable = False
             
             # REMOVED: speak(full_content_part2) - Client triggers TTS now
 
+        turn["cacheable"] = cacheable and not cancel.cancelled
+
+    except Cancelled:
+        print(f"[BACKEND] Generierung abgebrochen ({cancel.reason}).")
+        yield "\n[ABGEBROCHEN]"
     except Exception as e:
         print(f"Fehler in process_chat_generator: {e}")
         yield f"Entschuldigung, Master, mein Gehirn hat gerade einen Schluckauf: {e}"
 
-async def process_chat(message: str, history: List[dict]):
+async def process_chat(message: str, history: List[dict], race: Optional[bool] = None, session_id: Optional[str] = None):
     full_text = ""
-    async for chunk in process_chat_generator(message, history):
+    async for chunk in process_chat_generator(message, history, race, session_id):
         full_text += chunk
     return full_text
 
+DISCONNECT_POLL = float(os.getenv("DISCONNECT_POLL", "0.5"))
+
+async def stream_with_disconnect(request: ChatRequest, http_request: Request):
+    """Relays the chat stream and cancels it (incl. upstream) as soon as the client disconnects."""
+    cancel = cancellations.open(request.session_id)
+
+    async def watch():
+        while not cancel.cancelled:
+            if await http_request.is_disconnected():
+                print("[BACKEND] Client hat Verbindung getrennt. Breche Generierung ab.")
+                cancellations.cancel_token(cancel, reason="disconnect")
+                return
+            await asyncio.sleep(DISCONNECT_POLL)
+
+    watcher = asyncio.create_task(watch())
+    finished = False
+    try:
+        with scheduler.priority("voice" if request.voice else "chat"):
+            async for chunk in process_chat_generator(request.message, request.history, request.race, request.session_id, cancel):
+                yield chunk
+        finished = True
+    finally:
+        watcher.cancel()
+        if not finished:
+            # StreamingResponse bricht den Generator ab, wenn das Senden scheitert
+            cancellations.cancel_token(cancel, reason="disconnect")
+        cancellations.close(cancel)
+
 @app.post("/chat_stream")
-async def chat_stream_endpoint(request: ChatRequest):
-    return StreamingResponse(process_chat_generator(request.message, request.history), media_type="text/plain")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    return StreamingResponse(stream_with_disconnect(request, http_request), media_type="text/plain")
 
 @app.post("/chat")
 async def chat(request: ChatRequest):
-    content = await process_chat(request.message, request.history)
+    with scheduler.priority("voice" if request.voice else "chat"):
+        content = await process_chat(request.message, request.history, request.race, request.session_id)
     return {"response": content}
 
 async def generate_tts_file(text: str):
@@ -1974,36 +1788,16 @@ async def generate_tts_file(text: str):
     RATE = "+20%"  # Schneller = Energetischer
     PITCH = "+35Hz" # Höher = Jünger/Weiblicher
     
-    # 1. Strip EXECUTE commands
-    clean_text = text.split("EXECUTE:")[0]
-    
-    # 2. Strip Action Tags [ACTION: ...] and Mood Tags [MOOD: ...]
-    clean_text = re.sub(r'\[ACTION:.*?\]', '', clean_text, flags=re.IGNORECASE)
-    clean_text = re.sub(r'\[MOOD:.*?\]', '', clean_text, flags=re.IGNORECASE)
-    
-    # 3. Strip unwanted tags like [wave], [execute], etc.
-    clean_text = re.sub(r'\[(wave|execute|love|angry|laugh|cry|blush|wink)\]', '', clean_text, flags=re.IGNORECASE)
-
-    # 4. Strip Emojis (Regex based on Unicode ranges)
-    # Block Emoticons, Misc Symbols, Transport, Supplemental, Misc Symbols, Dingbats
-    clean_text = re.sub(r'[\U0001F600-\U0001F64F]', '', clean_text) 
-    clean_text = re.sub(r'[\U0001F300-\U0001F5FF]', '', clean_text)
-    clean_text = re.sub(r'[\U0001F680-\U0001F6FF]', '', clean_text)
-    clean_text = re.sub(r'[\U0001F900-\U0001F9FF]', '', clean_text)
-    clean_text = re.sub(r'[\U00002600-\U000026FF]', '', clean_text)
-    clean_text = re.sub(r'[\U00002700-\U000027BF]', '', clean_text)
-
-    # 5. Strip Technical Artifacts & Common Errors (AGGRESSIVE)
-    # Remove things like "uya_control --device ...", "(tuya_control ...)", "Unable to find device..."
-    clean_text = re.sub(r'\(?t?uya_control.*', '', clean_text, flags=re.IGNORECASE) # Catch entire line/rest of sentence
-    clean_text = re.sub(r'--device.*', '', clean_text, flags=re.IGNORECASE)
-    clean_text = re.sub(r'--state.*', '', clean_text, flags=re.IGNORECASE)
+    # 1. Strip all tags & commands (EXECUTE, SEARCH, [ACTION/MOOD/MEMORY], [wave], tuya_control, --device)
+    #    and emojis via the shared stream tokenizer
+    clean_text = speech_text(text)
+
+    # 2. Strip Technical Artifacts & Common Errors (AGGRESSIVE)
     clean_text = re.sub(r'Unable to find device.*', '', clean_text, flags=re.IGNORECASE)
     clean_text = re.sub(r'Resultat der Ausführung:.*', '', clean_text, flags=re.IGNORECASE)
-    clean_text = re.sub(r'EXECUTE:.*', '', clean_text, flags=re.IGNORECASE) 
     clean_text = re.sub(r'Error:.*', '', clean_text, flags=re.IGNORECASE)
     
-    # 6. Sanitize text: remove surrogate characters (broken emojis)
+    # 3. Sanitize text: remove surrogate characters (broken emojis)
     try:
         clean_text = clean_text.encode('utf-8', 'ignore').decode('utf-8')
     except:
@@ -2050,13 +1844,16 @@ async def speak_endpoint(request: SpeakRequest):
     speak(request.text)
     return {"status": "speaking"}
 
+class StopRequest(BaseModel):
+    session_id: Optional[str] = None # None = alle laufenden Generierungen
+
 @app.post("/stop")
-async def stop_endpoint():
-    global stop_signal, current_tts_process
+async def stop_endpoint(request: Optional[StopRequest] = None):
+    global current_tts_process
     print("[BACKEND] Stop-Befehl erhalten!")
     
-    # 1. Stop Text Generation
-    stop_signal = True
+    # 1. Stop Text Generation (nur die Sitzung, falls angegeben; Upstream wird sofort geschlossen)
+    cancelled = cancellations.cancel(request.session_id if request else None, reason="stop")
     
     # 2. Stop TTS Process (Server Side)
     if current_tts_process and current_tts_process.poll() is None:
@@ -2066,7 +1863,7 @@ async def stop_endpoint():
         except Exception as e:
             print(f"[BACKEND] Fehler beim Beenden von TTS: {e}")
             
-    return {"status": "stopped"}
+    return {"status": "stopped", "cancelled": cancelled}
 
 # --- CAMERA ENDPOINTS ---
 
@@ -2469,7 +2266,6 @@ def perform_memory_reflection():
     Runs periodically (e.g. every 24h).
     """
     import secretary
-    import google.generativeai as genai
     import json
     from datetime import datetime
     import os
@@ -2496,15 +2292,13 @@ def perform_memory_reflection():
     print(f"[MEMORY] Starte Konsolidierung von {len(facts)} Fakten...")
 
     try:
-        # Nutzung des globalen API Keys
-        # genai sollte schon konfiguriert sein durch main startup, aber sicherheitshalber:
+        # Nutzung des globalen API Keys (eigener Client pro Key aus der Registry)
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             print("[MEMORY] Kein API Key gefunden. Überspringe.")
             return
             
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-pro')
+        model = llm_clients.gemini_model(api_key, 'gemini-pro')
         
         facts_list = "\n".join([f"- {f}" for f in facts])
         
@@ -2524,7 +2318,8 @@ def perform_memory_reflection():
         Antworte NUR mit dem JSON-Array.
         """
         
-        response = model.generate_content(prompt)
+        with scheduler.slot("cloud", priority="background"):
+            response = model.generate_content(prompt)
         text = response.text.strip()
         
         # Cleanup Markdown
@@ -3,6 +3,7 @@ import json
 import os
 from datetime import datetime
 import threading
+from context_cache import context_cache, FACTS, PROFILE, NOTES
 
 # Use paths relative to this file to ensure consistency
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -68,6 +69,11 @@ class MemoryDB:
                     interaction_count INTEGER DEFAULT 0
                 )
             ''')
+
+            # Migration: pinned facts are always injected into the prompt
+            self.cursor.execute("PRAGMA table_info(facts)")
+            if "pinned" not in [row[1] for row in self.cursor.fetchall()]:
+                self.cursor.execute("ALTER TABLE facts ADD COLUMN pinned INTEGER DEFAULT 0")
             self.conn.commit()
 
     def _migrate_from_json(self):
@@ -133,6 +139,7 @@ class MemoryDB:
             try:
                 self.cursor.execute("INSERT INTO facts (content) VALUES (?)", (text,))
                 self.conn.commit()
+                context_cache.bump(FACTS)
                 return True
             except sqlite3.IntegrityError:
                 return False # Already exists
@@ -142,21 +149,42 @@ class MemoryDB:
             self.cursor.execute("SELECT content FROM facts ORDER BY created_at DESC")
             return [row[0] for row in self.cursor.fetchall()]
 
+    def get_facts_detailed(self):
+        """Facts with creation time and pin flag (used by the fact selector)."""
+        with self.lock:
+            self.cursor.execute("SELECT content, created_at, pinned FROM facts ORDER BY created_at DESC")
+            return [{"text": row[0], "created_at": row[1], "pinned": bool(row[2])} for row in self.cursor.fetchall()]
+
+    def set_fact_pinned(self, text, pinned=True):
+        with self.lock:
+            self.cursor.execute("UPDATE facts SET pinned = ? WHERE content = ?", (1 if pinned else 0, text))
+            changed = self.cursor.rowcount > 0
+            self.conn.commit()
+            if changed:
+                context_cache.bump(FACTS)
+            return changed
+
     def delete_fact(self, text):
         with self.lock:
             self.cursor.execute("DELETE FROM facts WHERE content = ?", (text,))
             changed = self.cursor.rowcount > 0
             self.conn.commit()
+            if changed:
+                context_cache.bump(FACTS)
             return changed
 
     def replace_facts(self, new_facts_list):
         """Replaces all facts with a new consolidated list."""
         with self.lock:
             try:
+                # Pins von unverändert übernommenen Fakten behalten
+                self.cursor.execute("SELECT content FROM facts WHERE pinned = 1")
+                pinned = {row[0] for row in self.cursor.fetchall()}
                 self.cursor.execute("DELETE FROM facts")
                 for fact in new_facts_list:
-                    self.cursor.execute("INSERT INTO facts (content) VALUES (?)", (fact,))
+                    self.cursor.execute("INSERT INTO facts (content, pinned) VALUES (?, ?)", (fact, 1 if fact in pinned else 0))
                 self.conn.commit()
+                context_cache.bump(FACTS)
                 return True
             except Exception as e:
                 print(f"[MEMORY DB ERROR] Failed to replace facts: {e}")
@@ -185,6 +213,7 @@ class MemoryDB:
         with self.lock:
             self.cursor.execute("INSERT INTO notes (content, created_at) VALUES (?, ?)", (text, datetime.now()))
             self.conn.commit()
+            context_cache.bump(NOTES)
 
     def get_notes(self, limit=5):
         with self.lock:
@@ -245,6 +274,7 @@ class MemoryDB:
                 ''', (face_id, name or "Unknown", attrs))
             
             self.conn.commit()
+            context_cache.bump(PROFILE)
 
     def get_all_users(self):
         with self.lock:
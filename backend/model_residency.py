@@ -0,0 +1,198 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from collections import deque
+from scheduler import scheduler
+
+# Welche Ollama-Modelle liegen im RAM?
+# Chat (llama3/llama3.2), Vision (llava) und Embeddings (nomic-embed-text) wechseln sich ab;
+# auf 16GB ohne GPU kostet jeder Wechsel mehrere Sekunden Laden (und Swap).
+# - Chat- und Embedding-Modell sind "gepinnt": lange keep_alive, Vorwärmen beim Start.
+# - Alles andere (llava) ist "transient": kurze keep_alive. Aufeinanderfolgende Vision-Anfragen
+#   laufen so gegen das noch geladene Modell; erst wenn OLLAMA_RESTORE_DELAY lang keine mehr
+#   kommt, werden verdrängte gepinnte Modelle im Hintergrund wieder geladen
+#   (statt dass der nächste Chat-Turn das Nachladen bezahlt).
+# Jeder Ladevorgang wird mit Dauer und Anlass (warmup/demand/restore) protokolliert.
+
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_TRANSIENT_KEEP_ALIVE = os.getenv("OLLAMA_TRANSIENT_KEEP_ALIVE", "2m")
+OLLAMA_RESTORE_DELAY = float(os.getenv("OLLAMA_RESTORE_DELAY", "20"))
+RESIDENCY_REFRESH = 5.0  # Sekunden, so lange gilt die /api/ps-Antwort
+EVENT_BUFFER = 100
+
+
+def model_key(name):
+    """'llama3:latest' and 'llama3' are the same model."""
+    return name[:-len(":latest")] if name and name.endswith(":latest") else name
+
+
+def ollama_client():
+    from llm_clients import llm_clients
+    return llm_clients.ollama()
+
+
+def chat_model():
+    return os.getenv("OLLAMA_MODEL", "llama3")
+
+
+def embed_model():
+    return os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+
+
+class ModelResidency:
+    def __init__(self, client_fn=None, restore_delay=OLLAMA_RESTORE_DELAY, refresh=RESIDENCY_REFRESH):
+        self._client_fn = client_fn or ollama_client
+        self.restore_delay = restore_delay
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._resident = set()
+        self._checked_at = 0.0
+        self._in_use = {}          # Modell -> laufende Anfragen
+        self._restore_timer = None
+        self.events = deque(maxlen=EVENT_BUFFER)
+        self.counters = {"requests": 0, "hits": 0, "loads": 0, "load_ms": 0.0, "restores": 0}
+
+    # --- Konfiguration ---
+    def pinned(self):
+        return {model_key(chat_model()), model_key(embed_model())}
+
+    def keep_alive(self, model):
+        """keep_alive to send with every Ollama call for `model`."""
+        return OLLAMA_KEEP_ALIVE if model_key(model) in self.pinned() else OLLAMA_TRANSIENT_KEEP_ALIVE
+
+    # --- Zustand ---
+    def resident(self, refresh=False):
+        """Models currently loaded in Ollama (/api/ps, cached for a few seconds)."""
+        with self._lock:
+            fresh = time.monotonic() - self._checked_at < self.refresh
+            if fresh and not refresh:
+                return set(self._resident)
+        try:
+            models = self._client_fn().ps().get("models", [])
+            loaded = {model_key(m.get("name") or m.get("model")) for m in models}
+        except Exception as e:
+            print(f"[MODELS] Status nicht abrufbar: {e}")
+            with self._lock:
+                self._checked_at = time.monotonic()  # nicht bei jedem Aufruf erneut versuchen
+                return set(self._resident)
+        with self._lock:
+            self._resident = loaded
+            self._checked_at = time.monotonic()
+        return set(loaded)
+
+    def _record_load(self, model, ms, reason):
+        with self._lock:
+            self.counters["loads"] += 1
+            self.counters["load_ms"] += ms
+            self.events.append({"model": model, "ms": round(ms, 1), "reason": reason, "at": time.time()})
+            self._resident.add(model)
+        print(f"[MODELS] {model} geladen ({reason}, {ms:.0f}ms).")
+
+    # --- Nutzung ---
+    @contextmanager
+    def use(self, model):
+        """Wraps one Ollama call for `model`; records a load event if the model was not resident.
+
+        The block may put Ollama's `load_duration` (ns) into the yielded dict as "load_ns" for an exact cost.
+        """
+        model = model_key(model)
+        was_resident = model in self.resident()
+        with self._lock:
+            self.counters["requests"] += 1
+            self._in_use[model] = self._in_use.get(model, 0) + 1
+            if self._restore_timer is not None:
+                # Weitere Anfrage kam rechtzeitig -> Rückwechsel verschieben (Coalescing)
+                self._restore_timer.cancel()
+                self._restore_timer = None
+        info = {}
+        start = time.monotonic()
+        try:
+            yield info
+            self._observe(model, was_resident, info.get("load_ns"), time.monotonic() - start)
+        finally:
+            self._release(model)
+
+    def _observe(self, model, was_resident, load_ns, elapsed):
+        if load_ns and load_ns > 100_000_000:
+            # Ollama meldet auch für geladene Modelle ein paar ms load_duration
+            self._record_load(model, load_ns / 1e6, "demand")
+        elif not was_resident and not load_ns:
+            self._record_load(model, elapsed * 1000, "demand")
+        else:
+            with self._lock:
+                self.counters["hits"] += 1
+                self._resident.add(model)
+
+    def _transient_in_use(self):
+        pinned = self.pinned()
+        return any(m not in pinned for m in self._in_use)
+
+    def _release(self, model):
+        with self._lock:
+            self._in_use[model] -= 1
+            if self._in_use[model]:
+                return
+            del self._in_use[model]
+            if model in self.pinned() or self._transient_in_use():
+                return
+            # Letzte transiente Anfrage fertig -> nach kurzer Pause gepinnte Modelle zurückholen
+            self._checked_at = 0.0
+            self._restore_timer = threading.Timer(self.restore_delay, self.restore)
+            self._restore_timer.daemon = True
+            self._restore_timer.start()
+
+    # --- Laden ---
+    def _load(self, model, reason):
+        """Loads `model` with an empty request (generate for chat models, embeddings for the embed model)."""
+        start = time.monotonic()
+        client = self._client_fn()
+        keep_alive = self.keep_alive(model)
+        if model == model_key(embed_model()):
+            with scheduler.slot("embed", priority="background"):
+                client.embeddings(model=model, prompt="warmup", keep_alive=keep_alive)
+        else:
+            with scheduler.slot("ollama", priority="background"):
+                client.generate(model=model, prompt="", keep_alive=keep_alive)
+        self._record_load(model, (time.monotonic() - start) * 1000, reason)
+
+    def warmup(self):
+        """Loads the pinned models at startup (with their long keep_alive)."""
+        loaded = self.resident(refresh=True)
+        for model in sorted(self.pinned() - loaded):
+            try:
+                self._load(model, "warmup")
+            except Exception as e:
+                print(f"[MODELS] Vorwärmen von {model} fehlgeschlagen: {e}")
+
+    def restore(self):
+        """Reloads pinned models that a transient model pushed out."""
+        with self._lock:
+            self._restore_timer = None
+            if self._transient_in_use():
+                return
+        missing = self.pinned() - self.resident(refresh=True)
+        for model in sorted(missing):
+            try:
+                self._load(model, "restore")
+                with self._lock:
+                    self.counters["restores"] += 1
+            except Exception as e:
+                print(f"[MODELS] Zurückladen von {model} fehlgeschlagen: {e}")
+
+    def stats(self):
+        with self._lock:
+            c = dict(self.counters)
+            events = list(self.events)
+            resident = sorted(self._resident)
+        c["load_ms"] = round(c["load_ms"], 1)
+        hour_ago = time.time() - 3600
+        c["demand_loads_last_hour"] = sum(1 for e in events if e["reason"] == "demand" and e["at"] >= hour_ago)
+        c["resident"] = resident
+        c["pinned"] = sorted(self.pinned())
+        c["recent_loads"] = events[-20:]
+        return c
+
+
+# Singleton instance
+model_residency = ModelResidency()
@@ -5,6 +5,7 @@ import os
 import tinytuya
 import uuid
 from dotenv import load_dotenv
+from context_cache import context_cache, HOME_STATUS, DEVICES
 
 load_dotenv()
 
@@ -73,6 +74,7 @@ class PhygitalManager:
             with open(config_path, "r", encoding='utf-8') as f:
                 self.config = json.load(f)
             print(f"[PHYGITAL] Config loaded: {len(self.config.get('rooms', {}))} rooms")
+            context_cache.bump(DEVICES)
         except Exception as e:
             print(f"[PHYGITAL] Warning: devices_config.json missing or invalid ({e})")
             self.config = {}
@@ -115,7 +117,9 @@ class PhygitalManager:
                     if status and 'result' in status:
                         # Parse result list into dict
                         dps_dict = {item['code']: item['value'] for item in status['result']}
-                        self.device_states[dev_id] = dps_dict
+                        if self.device_states.get(dev_id) != dps_dict:
+                            self.device_states[dev_id] = dps_dict
+                            context_cache.bump(HOME_STATUS)
                         
                         # Special Logic: Avatar State based on Temperature
                         if device.get('type') == 'sensor' and 'va_temperature' in dps_dict:
@@ -139,6 +143,7 @@ class PhygitalManager:
         # Update State
         if new_state != self.current_avatar_state:
             self.current_avatar_state = new_state
+            context_cache.bump(HOME_STATUS)
             print(f"[PHYGITAL] Temp: {temp}°C -> State: {new_state}")
             if self.callback:
                 self.callback(new_state, temp)
@@ -0,0 +1,317 @@
+import time
+import asyncio
+import threading
+from collections import deque
+import tracing
+from llm_stream import open_stream
+from cancellation import Cancelled
+from scheduler import scheduler, QueueTimeout
+from llm_providers import has_images
+
+# Latenz-basierter LLM-Router mit Circuit Breakern.
+# Statt der festen Kette (NIM -> Gemini -> Groq -> OpenRouter -> Ollama) wird
+# pro Anfrage nach Live-Gesundheit sortiert: gleitender Mittelwert der
+# Time-to-first-token (TTFT) und der Fehlerquote. Nach mehreren Fehlern in Folge
+# (oder einem Rate-Limit) wird ein Provider "geöffnet" und übersprungen, bis ein
+# Hintergrund-Probe ihn wieder freigibt.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderStats:
+    def __init__(self, prior_ttft, alpha):
+        self.alpha = alpha
+        self.ttft = None            # EWMA in Sekunden
+        self.prior_ttft = prior_ttft
+        self.error_rate = 0.0       # EWMA 0..1
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.last_error = None
+
+    def expected_ttft(self):
+        return self.ttft if self.ttft is not None else self.prior_ttft
+
+    def record_success(self, ttft):
+        self.ttft = ttft if self.ttft is None else (self.alpha * ttft + (1 - self.alpha) * self.ttft)
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self.consecutive_failures = 0
+        self.successes += 1
+        self.state = CLOSED
+
+    def record_failure(self, error):
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_failures += 1
+        self.failures += 1
+        self.last_error = str(error)[:200]
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "ttft_avg": round(self.ttft, 3) if self.ttft is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "retry_in": max(0.0, round(self.opened_at + self.cooldown - time.time(), 1)) if self.state == OPEN else 0,
+        }
+
+
+def _is_rate_limit(error):
+    text = str(error).lower()
+    return "429" in text or "rate limit" in text or "rate_limit" in text or "quota" in text or "resource_exhausted" in text
+
+
+class ProviderRouter:
+    def __init__(self, providers, alpha=0.3, failure_threshold=3, base_cooldown=30.0,
+                 max_cooldown=600.0, error_penalty=4.0, probe_interval=15.0):
+        self.providers = list(providers)
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.error_penalty = error_penalty
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self.stats = {p.name: ProviderStats(p.prior_ttft, alpha) for p in self.providers}
+        # Gesamte Zeit bis zum ersten Chunk (inkl. Fallbacks) pro Modus
+        self.mode_ttft = {"sequential": deque(maxlen=500), "race": deque(maxlen=500)}
+        self.race_wins = {}
+
+    # --- Health Bookkeeping ---
+    def record_success(self, name, ttft):
+        with self._lock:
+            self.stats[name].record_success(ttft)
+
+    def record_failure(self, name, error):
+        with self._lock:
+            st = self.stats[name]
+            st.record_failure(error)
+            rate_limited = _is_rate_limit(error)
+            if st.state == HALF_OPEN or rate_limited or st.consecutive_failures >= self.failure_threshold:
+                # Wiederholtes Öffnen verdoppelt die Wartezeit
+                st.cooldown = min(self.max_cooldown, st.cooldown * 2 if st.state != CLOSED else self.base_cooldown)
+                st.state = OPEN
+                st.opened_at = time.time()
+                reason = "Rate-Limit" if rate_limited else f"{st.consecutive_failures} Fehler"
+                print(f"[ROUTER] Circuit für {name} geöffnet ({reason}). Pause {st.cooldown:.0f}s.")
+
+    def _allow(self, name):
+        st = self.stats[name]
+        if st.state != OPEN:
+            return True
+        # Ohne Probe-Thread: nach Ablauf der Pause genau einen Versuch erlauben
+        if self._probe_thread is None and time.time() - st.opened_at >= st.cooldown:
+            st.state = HALF_OPEN
+            return True
+        return False
+
+    def _score(self, provider):
+        st = self.stats[provider.name]
+        return st.expected_ttft() * (1 + self.error_penalty * st.error_rate)
+
+    def candidates(self, messages, prefer=None):
+        """Available providers for these messages, healthiest (lowest expected TTFT) first."""
+        needs_image = has_images(messages)
+        with self._lock:
+            usable = [p for p in self.providers
+                      if (p.supports_images or not needs_image) and p.available() and self._allow(p.name)]
+        order = {p.name: i for i, p in enumerate(self.providers)}
+        usable.sort(key=lambda p: (self._score(p), order[p.name]))
+        if prefer:
+            # Folgeantworten bleiben (wenn gesund) beim Provider der ersten Antwort
+            usable.sort(key=lambda p: p.name != prefer)
+        return usable
+
+    # --- Streaming ---
+    async def _open_first(self, provider, messages, options):
+        """Opens one provider and waits for its first chunk. Returns (first, stream) or None on failure."""
+        start = time.monotonic()
+        stream = None
+        try:
+            stream = await open_stream(provider.factory(messages, options), provider.name)
+            first = await asyncio.wait_for(stream.__anext__(), provider.first_token_timeout)
+        except StopAsyncIteration:
+            if stream.closed:
+                # Anfrage wurde abgebrochen, kein Fehler des Providers
+                tracing.record(f"provider.{provider.name}", start, status="cancelled")
+                raise Cancelled("stream closed")
+            self.record_failure(provider.name, "leere Antwort")
+            tracing.record(f"provider.{provider.name}", start, status="empty")
+            print(f"[ROUTER] {provider.name} lieferte keine Antwort. Fallback...")
+            return None
+        except asyncio.TimeoutError:
+            stream.close()
+            self.record_failure(provider.name, f"Timeout nach {provider.first_token_timeout}s")
+            tracing.record(f"provider.{provider.name}", start, status="timeout")
+            print(f"[ROUTER] {provider.name} Timeout (kein erstes Token). Fallback...")
+            return None
+        except QueueTimeout as e:
+            # Backend ausgelastet (Scheduler), kein Fehler des Providers -> nächster Kandidat
+            stream.close()
+            tracing.record(f"provider.{provider.name}", start, status="queue_timeout")
+            print(f"[ROUTER] {provider.name}: {e}. Fallback...")
+            return None
+        except (asyncio.CancelledError, Cancelled):
+            # Race verloren / Anfrage abgebrochen -> Upstream sofort schließen, kein Fehler für die Statistik
+            if stream:
+                stream.close()
+            tracing.record(f"provider.{provider.name}", start, status="cancelled")
+            raise
+        except Exception as e:
+            if stream:
+                stream.close()
+            self.record_failure(provider.name, e)
+            tracing.record(f"provider.{provider.name}", start, status=f"error ({e})")
+            print(f"[ROUTER] Fehler bei {provider.name}: {e}. Fallback...")
+            return None
+
+        ttft = time.monotonic() - start
+        self.record_success(provider.name, ttft)
+        tracing.record(f"provider.{provider.name}", start)
+        print(f"[ROUTER] {provider.name} antwortet (TTFT {ttft:.2f}s).")
+        return first, stream
+
+    async def _sequential(self, candidates, messages, options):
+        for provider in candidates:
+            print(f"[ROUTER] Versuche {provider.name}...")
+            opened = await self._open_first(provider, messages, options)
+            if opened:
+                return provider.name, opened
+        return None, None
+
+    async def stream(self, messages, options=None, prefer=None):
+        """Opens the healthiest provider that delivers a first chunk.
+
+        Returns (provider_name, async iterator of text parts) or (None, None) if all failed.
+        """
+        start = time.monotonic()
+        name, opened = await self._sequential(self.candidates(messages, prefer), messages, options)
+        if not opened:
+            return None, None
+        self._record_mode("sequential", time.monotonic() - start)
+        return name, self._relay(name, *opened)
+
+    async def race(self, messages, options=None, width=2):
+        """Sends the same messages to the `width` healthiest providers and keeps the first one that yields content.
+
+        The losing streams are closed immediately. Falls back to the sequential chain if all contenders fail.
+        """
+        start = time.monotonic()
+        candidates = self.candidates(messages)
+        contenders, rest = candidates[:width], candidates[width:]
+        if len(contenders) < 2:
+            return await self.stream(messages, options)
+
+        print(f"[ROUTER] Race: {' vs. '.join(p.name for p in contenders)}")
+        tasks = {asyncio.create_task(self._open_first(p, messages, options)): p for p in contenders}
+        pending = set(tasks)
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    opened = task.result()
+                    if opened and winner is None:
+                        winner = (tasks[task].name, opened)
+                    elif opened:
+                        opened[1].close()  # gleichzeitig fertig -> zweiten Stream verwerfen
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Ein Verlierer kann zwischen wait() und cancel() noch fertig geworden sein
+                for result in await asyncio.gather(*pending, return_exceptions=True):
+                    if isinstance(result, tuple):
+                        result[1].close()
+
+        if winner is None:
+            name, opened = await self._sequential(rest, messages, options)
+            if not opened:
+                return None, None
+            winner = (name, opened)
+
+        name, opened = winner
+        with self._lock:
+            self.race_wins[name] = self.race_wins.get(name, 0) + 1
+        self._record_mode("race", time.monotonic() - start)
+        return name, self._relay(name, *opened)
+
+    # --- Mode Statistics (Sequential vs. Race) ---
+    def _record_mode(self, mode, ttft):
+        with self._lock:
+            self.mode_ttft[mode].append(ttft)
+
+    def mode_stats(self):
+        def pct(values, q):
+            if not values:
+                return None
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+        with self._lock:
+            data = {mode: list(values) for mode, values in self.mode_ttft.items()}
+            wins = dict(self.race_wins)
+        result = {mode: {"count": len(v), "p50": pct(v, 0.5), "p95": pct(v, 0.95)} for mode, v in data.items()}
+        seq, race = result["sequential"], result["race"]
+        if seq["count"] and race["count"]:
+            result["race_gain"] = {
+                "p50": round(seq["p50"] - race["p50"], 3),
+                "p95": round(seq["p95"] - race["p95"], 3),
+            }
+        result["race_wins"] = wins
+        return result
+
+    async def _relay(self, name, first, stream):
+        try:
+            yield first
+            async for part in stream:
+                yield part
+        except Exception as e:
+            self.record_failure(name, e)
+            raise
+        finally:
+            stream.close()
+
+    # --- Background Re-Probe ---
+    def start_probing(self):
+        if self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True, name="llm-router-probe")
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        with scheduler.priority("background"):
+            self._probe_forever()
+
+    def _probe_forever(self):
+        while True:
+            time.sleep(self.probe_interval)
+            for provider in self.providers:
+                st = self.stats[provider.name]
+                if st.state != OPEN or time.time() - st.opened_at < st.cooldown:
+                    continue
+                if not provider.available():
+                    continue
+                with self._lock:
+                    st.state = HALF_OPEN
+                try:
+                    provider.probe()
+                    with self._lock:
+                        # TTFT-Mittel nicht mit Probe-Zeiten verfälschen, nur Circuit schließen
+                        st.state = CLOSED
+                        st.consecutive_failures = 0
+                    print(f"[ROUTER] Probe erfolgreich: {provider.name} wieder aktiv.")
+                except Exception as e:
+                    self.record_failure(provider.name, e)
+
+    def snapshot(self):
+        with self._lock:
+            return {p.name: dict(self.stats[p.name].snapshot(), score=round(self._score(p), 3))
+                    for p in self.providers}
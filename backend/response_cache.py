@@ -0,0 +1,214 @@
+import os
+import re
+import time
+import asyncio
+import threading
+import numpy as np
+from context_cache import context_cache, FACTS, HOME_STATUS, DEVICES, PROFILE, PERSONALITY, NOTES, LOCATION
+from fact_selector import ollama_embed
+from intent_router import KeywordMatcher
+
+# Antwort-Cache für wiederkehrende Haushaltsfragen ("wie ist das Wetter",
+# "wie warm ist es im Wohnzimmer", "was habe ich notiert").
+# Schlüssel = normalisierte Nachricht + Versionen der relevanten Kontext-Abschnitte
+# (context_cache). Ändert sich der Zustand (neuer Fakt, Gerät schaltet, neue Notiz),
+# passt der Stempel nicht mehr und der Eintrag ist ungültig. Ähnlich formulierte
+# Fragen werden per Embedding gefunden (nur bis RESPONSE_CACHE_DEADLINE, sonst zählt
+# nur der exakte Schlüssel). Jede Absicht hat ihre eigene TTL.
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "True").lower() == "true"
+# Allgemeiner Smalltalk hängt stark vom Gesprächsverlauf ab -> nur auf Wunsch cachen
+RESPONSE_CACHE_GENERAL = os.getenv("RESPONSE_CACHE_GENERAL", "False").lower() == "true"
+SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+# Länger wartet der Chat nicht auf das Embedding der Nachricht (Embed-Slot evtl. vom KB-Ingest belegt)
+RESPONSE_CACHE_DEADLINE = float(os.getenv("RESPONSE_CACHE_DEADLINE", "0.25"))
+MAX_ENTRIES = 200
+
+# intent -> (TTL in Sekunden, abhängige Kontext-Abschnitte, Schlüsselwörter wie in intent_router)
+INTENTS = {
+    "weather": (float(os.getenv("RESPONSE_CACHE_TTL_WEATHER", "600")), (PROFILE, LOCATION),
+                ["wetter*", "regnet", "regen", "schnee*", "sonnig", "weather"]),
+    "home": (float(os.getenv("RESPONSE_CACHE_TTL_HOME", "120")), (HOME_STATUS, DEVICES),
+             ["wohnzimmer", "küche", "schlafzimmer", "warm*", "kalt*", "temperatur*", "luftfeuchtigkeit", "grad"]),
+    "notes": (float(os.getenv("RESPONSE_CACHE_TTL_NOTES", "600")), (NOTES,),
+              ["notiz*", "notiert", "aufgeschrieben"]),
+    "general": (float(os.getenv("RESPONSE_CACHE_TTL_GENERAL", "180")), (FACTS, PROFILE, PERSONALITY, HOME_STATUS),
+                []),
+}
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACE_RE = re.compile(r"\s+")
+_FILLER = {"bitte", "mal", "doch", "eigentlich", "haruko", "hey", "hallo", "denn"}
+# Aufforderungen lösen Aktionen aus -> nie aus dem Cache beantworten
+# ("mach das Licht an" ist semantisch nah an "ist das Licht an")
+_ACTION_WORDS = {"mach", "mache", "schalt", "schalte", "stell", "stelle", "dreh", "drehe", "start", "starte",
+                 "öffne", "speicher", "speichere", "merk", "merke", "notiere", "lösch", "lösche", "spiel",
+                 "spiele", "setz", "setze", "weck", "wecke", "erinnere", "schreib", "schreibe", "turn", "switch"}
+
+
+def normalize(message):
+    text = _PUNCT_RE.sub(" ", message.lower())
+    words = [w for w in _SPACE_RE.split(text) if w and w not in _FILLER]
+    return " ".join(words)
+
+
+def is_action(normalized):
+    return any(w in _ACTION_WORDS for w in normalized.split())
+
+
+# Wortgrenzen: "regen" trifft nicht "anregen", "grad" nicht "Upgrade"
+_MATCHER = KeywordMatcher({intent: keywords for intent, (_, _, keywords) in INTENTS.items()})
+
+
+def classify(message):
+    found = _MATCHER.labels(message.lower())
+    return next((intent for intent in INTENTS if intent in found), "general")
+
+
+class CacheEntry:
+    def __init__(self, key, intent, scope, stamp, vector, response, latency):
+        self.key = key
+        self.intent = intent
+        self.scope = scope
+        self.stamp = stamp
+        self.vector = vector
+        self.response = response
+        self.latency = latency
+        self.created = time.time()
+
+
+class ResponseCache:
+    def __init__(self, embed_fn=None, enabled=None, cache_general=None):
+        self.enabled = RESPONSE_CACHE_ENABLED if enabled is None else enabled
+        self.cache_general = RESPONSE_CACHE_GENERAL if cache_general is None else cache_general
+        self._embed_fn = embed_fn or ollama_embed
+        self._lock = threading.Lock()
+        self._entries = []
+        self.counters = {"lookups": 0, "exact_hits": 0, "semantic_hits": 0, "misses": 0,
+                         "semantic_timeouts": 0, "stale": 0, "stores": 0, "saved_seconds": 0.0}
+
+    def _embed(self, text):
+        try:
+            vec = np.asarray(self._embed_fn(text), dtype=np.float32)
+            norm = np.linalg.norm(vec)
+            return vec / norm if norm else None
+        except Exception:
+            return None
+
+    def prepare(self, message, scope=""):
+        """Lookup key for a message (None if this kind of message is not cached).
+
+        `scope` separates users (face id); the stamp is taken now so that state changes
+        during generation invalidate the stored answer.
+        """
+        if not self.enabled:
+            return None
+        key = normalize(message)
+        intent = classify(message)
+        if not key or is_action(key) or (intent == "general" and not self.cache_general):
+            return None
+        deps = INTENTS[intent][1]
+        return {"key": key, "intent": intent, "scope": scope,
+                "stamp": context_cache.stamp(deps), "vector": None, "start": time.monotonic()}
+
+    def _valid(self, entry, lookup, now):
+        ttl = INTENTS[entry.intent][0]
+        return (entry.intent == lookup["intent"] and entry.scope == lookup["scope"]
+                and entry.stamp == lookup["stamp"] and now - entry.created < ttl)
+
+    def _exact(self, lookup):
+        """(exact entry or None, valid entries with a vector for the semantic comparison)."""
+        now = time.time()
+        with self._lock:
+            self.counters["lookups"] += 1
+            # Abgelaufene / durch Zustandsänderung ungültige Einträge entfernen
+            alive = []
+            for e in self._entries:
+                if now - e.created < INTENTS[e.intent][0] and e.stamp == context_cache.stamp(INTENTS[e.intent][1]):
+                    alive.append(e)
+                else:
+                    self.counters["stale"] += 1
+            self._entries = alive
+            for e in self._entries:
+                if e.key == lookup["key"] and self._valid(e, lookup, now):
+                    return e, []
+            return None, [e for e in self._entries if e.vector is not None and self._valid(e, lookup, now)]
+
+    def _similar(self, lookup, candidates):
+        """Closest candidate above the similarity threshold (embeds the message), or None."""
+        # Ähnliche Formulierung? ("wie warm ist es im wohnzimmer" ~ "wohnzimmer temperatur")
+        vector = self._embed(lookup["key"])
+        lookup["vector"] = vector
+        if vector is None:
+            return None
+        best = max(candidates, key=lambda e: float(np.dot(e.vector, vector)))
+        return best if float(np.dot(best.vector, vector)) >= SIMILARITY_THRESHOLD else None
+
+    def _result(self, entry, counter):
+        with self._lock:
+            if entry is not None:
+                return self._hit(entry, counter)
+            self.counters["misses"] += 1
+            return None
+
+    def lookup(self, lookup):
+        """Returns the cached response or None (blocking, no deadline for the embedding)."""
+        if lookup is None:
+            return None
+        entry, candidates = self._exact(lookup)
+        if entry is not None:
+            return self._result(entry, "exact_hits")
+        return self._result(self._similar(lookup, candidates) if candidates else None, "semantic_hits")
+
+    async def find(self, lookup, deadline=None):
+        """Like lookup() for the chat: the exact key is checked inline, the semantic comparison
+        only gets `deadline` seconds (RESPONSE_CACHE_DEADLINE) before it counts as a miss."""
+        if lookup is None:
+            return None
+        entry, candidates = self._exact(lookup)
+        if entry is not None:
+            return self._result(entry, "exact_hits")
+        if candidates:
+            deadline = RESPONSE_CACHE_DEADLINE if deadline is None else deadline
+            try:
+                entry = await asyncio.wait_for(asyncio.to_thread(self._similar, lookup, candidates), deadline)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self.counters["semantic_timeouts"] += 1
+        return self._result(entry, "semantic_hits")
+
+    def _hit(self, entry, counter):
+        self.counters[counter] += 1
+        self.counters["saved_seconds"] += entry.latency
+        print(f"[CACHE] Antwort aus Cache ({entry.intent}, {counter.split('_')[0]}), ~{entry.latency:.1f}s gespart.")
+        return entry.response
+
+    def store(self, lookup, response):
+        if lookup is None or not response.strip():
+            return
+        vector = lookup["vector"] if lookup["vector"] is not None else self._embed(lookup["key"])
+        entry = CacheEntry(lookup["key"], lookup["intent"], lookup["scope"], lookup["stamp"], vector,
+                           response, time.monotonic() - lookup["start"])
+        with self._lock:
+            self._entries = [e for e in self._entries if not (e.key == entry.key and e.scope == entry.scope)]
+            self._entries.append(entry)
+            if len(self._entries) > MAX_ENTRIES:
+                self._entries.pop(0)
+            self.counters["stores"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+    def stats(self):
+        with self._lock:
+            c = dict(self.counters)
+            c["entries"] = len(self._entries)
+        hits = c["exact_hits"] + c["semantic_hits"]
+        c["hit_rate"] = round(hits / c["lookups"], 3) if c["lookups"] else 0.0
+        c["saved_seconds"] = round(c["saved_seconds"], 2)
+        return c
+
+
+# Singleton instance
+response_cache = ResponseCache()
@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+from collections import deque
+from cancellation import Cancelled, current as current_cancel
+
+# Zentrale Zugangskontrolle für LLM- und Ollama-Arbeit.
+# Auf einem 16GB-Rechner ohne GPU feuern sonst Wake-Word, Browser-Chat, Telegram,
+# Kamera-Analyse (llava), KB-Scans und die Gedächtnis-Reflexion gleichzeitig.
+# Jedes Backend hat eine feste Anzahl Plätze; wer keinen bekommt, wartet in einer
+# Prioritäts-Warteschlange: Sprache > Chat > Telegram > Hintergrund.
+# Hintergrundarbeit darf nie alle Plätze belegen (SCHED_RESERVED bleibt für Live-Anfragen frei,
+# außer das Backend hat nur einen Platz). Jede Klasse hat eine Frist; wer zu lange
+# wartet, bekommt QueueTimeout (der Router weicht dann auf den nächsten Provider aus).
+# Die Priorität hängt als ContextVar an der Anfrage (wie Trace und CancelToken).
+
+PRIORITIES = ("voice", "chat", "telegram", "background")
+
+SLOTS = {
+    "ollama": int(os.getenv("SCHED_OLLAMA_SLOTS", "1")),   # Chat/Vision-Modelle (CPU-gebunden)
+    "embed": int(os.getenv("SCHED_EMBED_SLOTS", "2")),     # Ollama-Embeddings (klein, schnell)
+    "cloud": int(os.getenv("SCHED_CLOUD_SLOTS", "4")),     # Cloud-APIs (Rate-Limits)
+}
+SCHED_RESERVED = int(os.getenv("SCHED_RESERVED", "1"))
+
+# Maximale Wartezeit in der Schlange (Sekunden, None = unbegrenzt)
+DEADLINES = {"voice": 15.0, "chat": 30.0, "telegram": 60.0, "background": None}
+
+WAIT_SAMPLES = 200
+
+_priority = contextvars.ContextVar("haruko_priority", default="chat")
+
+
+class QueueTimeout(Exception):
+    """Raised when no slot became free before the deadline of the request's priority class."""
+
+
+class _Backend:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = max(1, limit)
+        self.active = {p: 0 for p in PRIORITIES}
+        self.waiting = []   # [(rank, seq, priority)]
+        self.counters = {"granted": 0, "timeouts": 0, "cancelled": 0}
+        self.wait_ms = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITIES}
+
+    def running(self):
+        return sum(self.active.values())
+
+    def cap(self, priority):
+        if priority == "background":
+            return max(1, self.limit - SCHED_RESERVED)
+        return self.limit
+
+
+class Scheduler:
+    def __init__(self, slots=None, deadlines=None, poll=0.25):
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.deadlines = dict(DEADLINES, **(deadlines or {}))
+        self.poll = poll
+        self._backends = {name: _Backend(name, limit) for name, limit in (slots or SLOTS).items()}
+
+    # --- Priorität der aktuellen Anfrage ---
+    @contextmanager
+    def priority(self, name):
+        """Runs the block (and everything it starts: tasks, to_thread, streams) with priority `name`."""
+        if name not in PRIORITIES:
+            raise ValueError(f"Unbekannte Priorität: {name}")
+        token = _priority.set(name)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    def current_priority(self):
+        return _priority.get()
+
+    # --- Plätze ---
+    def _backend(self, name):
+        with self._cond:
+            if name not in self._backends:
+                self._backends[name] = _Backend(name, SLOTS.get(name, 1))
+            return self._backends[name]
+
+    def _eligible(self, backend, entry):
+        """True if `entry` is the best-ranked waiter that may start now."""
+        running = backend.running()
+        for other in sorted(backend.waiting):
+            if running < backend.cap(other[2]):
+                return other is entry
+        return False
+
+    def acquire(self, backend, priority=None, timeout=None):
+        """Blocks until a slot of `backend` is free. Returns the priority that holds the slot.
+
+        Raises QueueTimeout after the class deadline (or `timeout`) and Cancelled if the request is cancelled while waiting.
+        """
+        priority = priority or _priority.get()
+        b = self._backend(backend)
+        if timeout is None:
+            timeout = self.deadlines.get(priority)
+        token = current_cancel()
+        start = time.monotonic()
+        entry = (PRIORITIES.index(priority), next(self._seq), priority)
+        with self._cond:
+            b.waiting.append(entry)
+            try:
+                while not self._eligible(b, entry):
+                    if token is not None and token.cancelled:
+                        b.counters["cancelled"] += 1
+                        raise Cancelled(token.reason)
+                    remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                    if remaining is not None and remaining <= 0:
+                        b.counters["timeouts"] += 1
+                        print(f"[SCHED] {backend}: kein Platz für '{priority}' nach {timeout:.0f}s.")
+                        raise QueueTimeout(f"{backend} ausgelastet ({priority}, {timeout:.0f}s)")
+                    self._cond.wait(self.poll if remaining is None else min(self.poll, remaining))
+            finally:
+                b.waiting.remove(entry)
+                # Ein anderer Wartender kann jetzt an der Reihe sein
+                self._cond.notify_all()
+            b.active[priority] += 1
+            b.counters["granted"] += 1
+            b.wait_ms[priority].append((time.monotonic() - start) * 1000)
+        return priority
+
+    def release(self, backend, priority):
+        with self._cond:
+            b = self._backends[backend]
+            b.active[priority] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, backend, priority=None, timeout=None):
+        """Holds one slot of `backend` for the duration of the block."""
+        held = self.acquire(backend, priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(backend, held)
+
+    def stats(self):
+        def pct(ordered, q):
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1) if ordered else None
+
+        result = {}
+        with self._cond:
+            for name, b in self._backends.items():
+                queued = {p: 0 for p in PRIORITIES}
+                for _, _, p in b.waiting:
+                    queued[p] += 1
+                waits = {p: sorted(values) for p, values in b.wait_ms.items()}
+                result[name] = dict(b.counters, limit=b.limit, active=dict(b.active), queued=queued,
+                                    depth=len(b.waiting),
+                                    wait_ms={p: {"count": len(w), "p50": pct(w, 0.5), "p95": pct(w, 0.95)}
+                                             for p, w in waits.items() if w})
+        return result
+
+
+# Singleton instance
+scheduler = Scheduler()
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import requests
 import os
 from memory_db import MemoryDB
+from context_cache import context_cache, LOCATION
 
 # Sprache laden (Standard: DE)
 LANGUAGE = os.getenv("LANGUAGE", "DE").upper()
@@ -32,6 +33,10 @@ class Secretary:
                 "DE": "Fakt gelöscht: {text}",
                 "EN": "Fact deleted: {text}"
             },
+            "fact_pinned": {
+                "DE": "Fakt angepinnt (immer im Gedächtnis): {text}",
+                "EN": "Fact pinned (always remembered): {text}"
+            },
             "fact_not_found": {
                 "DE": "Fakt nicht gefunden.",
                 "EN": "Fact not found."
@@ -126,6 +131,11 @@ class Secretary:
             return self._msg("fact_deleted", text=text)
         return self._msg("fact_not_found")
 
+    def pin_fact(self, text):
+        if self.db.set_fact_pinned(text, True):
+            return self._msg("fact_pinned", text=text)
+        return self._msg("fact_not_found")
+
     def replace_all_facts(self, new_facts):
         if self.db.replace_facts(new_facts):
             return True
@@ -134,6 +144,9 @@ class Secretary:
     def get_facts(self):
         return self.db.get_facts()
 
+    def get_facts_detailed(self):
+        return self.db.get_facts_detailed()
+
     def search_memory(self, query):
         results = self.db.search_memory(query, limit=5)
         if not results:
@@ -230,6 +243,7 @@ class Secretary:
 
     def set_user_location(self, city):
         self.db.set_meta("user_location", city)
+        context_cache.bump(LOCATION)  # gecachte Wetter-Antworten gelten für die alte Stadt
         return self._msg("location_set", city=city)
 
     def get_weather(self, city=None):
@@ -0,0 +1,180 @@
+import re
+from collections import namedtuple
+
+# Inkrementeller Tag-Filter für LLM-Streams.
+# Die Modelle mischen Sprache mit Steuerbefehlen (EXECUTE:, SEARCH:, [MEMORY: ...],
+# [ACTION: ...], [MOOD: ...], [wave], tuya_control ...). Der Tokenizer erkennt diese
+# Fragmente auch wenn sie über Chunk-Grenzen verteilt sind und gibt sauberen Text
+# sofort weiter, sobald feststeht, dass er zu keinem Befehl gehört. Nur ein
+# möglicher Befehlsanfang am Chunk-Ende (z.B. "EXEC" oder "[MOO") wird zurückgehalten.
+
+TEXT = "text"
+EXECUTE = "execute"
+SEARCH = "search"
+MEMORY = "memory"
+ACTION = "action"
+MOOD = "mood"
+EMOTE = "emote"
+TUYA = "tuya"
+FLAG = "flag"
+
+# Tags, die das Frontend selbst auswertet (Avatar-Animation/Stimmung)
+CLIENT_TAGS = (ACTION, MOOD)
+
+EMOTES = {"wave", "execute", "love", "angry", "laugh", "cry", "blush", "wink"}
+MAX_BRACKET_TAG = 200  # längere "[..." sind normaler Text
+
+Event = namedtuple("Event", ["kind", "value", "raw"])
+
+# Befehle, die bis zum Zeilenende laufen (Zeilenumbruch bleibt als Text erhalten)
+_LINE_COMMANDS = {"execute:": EXECUTE, "search:": SEARCH, "--device": FLAG, "--state": FLAG}
+# SEARCH nur in Großbuchstaben (sonst trifft es "Research:" o.ä.)
+_TRIGGER_RE = re.compile(r"\[|(?i:execute:)|SEARCH:|(?i:\(?t?uya_control)|(?i:--device)|(?i:--state)")
+_TRIGGER_PREFIXES = ("[", "execute:", "SEARCH:", "(tuya_control", "tuya_control", "(uya_control",
+                     "uya_control", "--device", "--state")
+_BRACKET_RE = re.compile(r"^\s*(MEMORY|ACTION|MOOD)\s*:\s*(.*?)\s*$", re.IGNORECASE | re.DOTALL)
+_EMOJI_RE = re.compile("["
+                       "\U0001F600-\U0001F64F"  # emoticons
+                       "\U0001F300-\U0001F5FF"  # symbols & pictographs
+                       "\U0001F680-\U0001F6FF"  # transport & map symbols
+                       "\U0001F1E0-\U0001F1FF"  # flags
+                       "\U0001F900-\U0001F9FF"  # supplemental symbols
+                       "\U00002600-\U000026FF"  # misc symbols
+                       "\U00002700-\U000027BF"  # dingbats
+                       "]+")
+
+
+def _is_trigger_prefix(fragment):
+    low = fragment.lower()
+    for trigger in _TRIGGER_PREFIXES:
+        if trigger == "SEARCH:":
+            if trigger.startswith(fragment):
+                return True
+        elif trigger.startswith(low):
+            return True
+    return False
+
+
+class TagTokenizer:
+    """Incremental tokenizer: feed() chunks, get Events; flush() at end of stream."""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk):
+        if not chunk:
+            return []
+        buf = self._pending + chunk
+        events, self._pending = self._scan(buf, final=False)
+        return events
+
+    def flush(self):
+        buf, self._pending = self._pending, ""
+        if not buf:
+            return []
+        events, _ = self._scan(buf, final=True)
+        return events
+
+    def _scan(self, buf, final):
+        events = []
+        pos = 0
+        while pos < len(buf):
+            m = _TRIGGER_RE.search(buf, pos)
+            if not m:
+                # Möglichen Befehlsanfang am Ende zurückhalten
+                keep = 0 if final else self._partial_suffix(buf, pos)
+                if len(buf) - keep > pos:
+                    events.append(Event(TEXT, buf[pos:len(buf) - keep], buf[pos:len(buf) - keep]))
+                return events, buf[len(buf) - keep:]
+
+            start = m.start()
+            if start > pos:
+                events.append(Event(TEXT, buf[pos:start], buf[pos:start]))
+
+            trigger = m.group(0)
+            if trigger == "[":
+                event, end = self._bracket(buf, start, final)
+            elif trigger.lower() in _LINE_COMMANDS:
+                event, end = self._line_command(buf, start, trigger, final)
+            else:
+                event, end = self._tuya(buf, start, final)
+
+            if event is None and end is None:
+                # Unvollständig -> ab hier auf den nächsten Chunk warten
+                return events, buf[start:]
+            if event is None:
+                # Kein Befehl (z.B. "[1]") -> Zeichen als Text, weiter suchen
+                events.append(Event(TEXT, buf[start:end], buf[start:end]))
+            else:
+                events.append(event)
+            pos = end
+        return events, ""
+
+    @staticmethod
+    def _partial_suffix(buf, pos):
+        longest = max(len(t) for t in _TRIGGER_PREFIXES)
+        for size in range(min(longest, len(buf) - pos), 0, -1):
+            if _is_trigger_prefix(buf[-size:]):
+                return size
+        return 0
+
+    @staticmethod
+    def _bracket(buf, start, final):
+        close = buf.find("]", start + 1)
+        newline = buf.find("\n", start + 1)
+        if close == -1 or (newline != -1 and newline < close) or close - start > MAX_BRACKET_TAG:
+            if final or newline != -1 or len(buf) - start > MAX_BRACKET_TAG:
+                return None, start + 1
+            return None, None
+        raw = buf[start:close + 1]
+        content = buf[start + 1:close]
+        m = _BRACKET_RE.match(content)
+        if m:
+            return Event(m.group(1).lower(), m.group(2), raw), close + 1
+        if content.strip().lower() in EMOTES:
+            return Event(EMOTE, content.strip().lower(), raw), close + 1
+        return None, start + 1
+
+    @staticmethod
+    def _line_command(buf, start, trigger, final):
+        newline = buf.find("\n", start)
+        if newline == -1:
+            if not final:
+                return None, None
+            newline = len(buf)
+        kind = _LINE_COMMANDS[trigger.lower()]
+        raw = buf[start:newline]
+        value = raw if kind == FLAG else raw[len(trigger):]
+        return Event(kind, value.strip(), raw), newline
+
+    @staticmethod
+    def _tuya(buf, start, final):
+        paren = buf[start] == "("
+        ends = [i for i in (buf.find(")", start), buf.find("\n", start)) if i != -1]
+        if not ends:
+            if not final:
+                return None, None
+            end = len(buf)
+        else:
+            end = min(ends)
+        # Schließende Klammer gehört zum Befehl, Zeilenumbruch nicht
+        if end < len(buf) and buf[end] == ")" and paren:
+            end += 1
+        raw = buf[start:end]
+        return Event(TUYA, raw.strip().strip("()").strip(), raw), end
+
+
+def render(events, keep=()):
+    """Joins text events; tags whose kind is in `keep` are passed through verbatim."""
+    return "".join(e.raw for e in events if e.kind == TEXT or e.kind in keep)
+
+
+def tokenize(text):
+    """All events of a complete text."""
+    tokenizer = TagTokenizer()
+    return tokenizer.feed(text) + tokenizer.flush()
+
+
+def speech_text(text):
+    """Text for TTS: every tag and command removed, emojis stripped."""
+    return _EMOJI_RE.sub("", render(tokenize(text)))
@@ -13,7 +13,7 @@ logging.basicConfig(
 class HarukoTelegramBot:
     def __init__(self, token, llm_processor, vision_processor):
         self.token = token
-        self.llm_processor = llm_processor  # Async function: func(text, source="telegram") -> str
+        self.llm_processor = llm_processor  # Async function: func(text, source="telegram", chat_id=None) -> str
         self.vision_processor = vision_processor # Async function: func(target) -> image_path
         self.application = None
 
@@ -39,7 +39,7 @@ class HarukoTelegramBot:
 
         try:
             # Antwort vom LLM holen
-            response = await self.llm_processor(user_text, source="telegram")
+            response = await self.llm_processor(user_text, source="telegram", chat_id=chat_id)
             
             # Telegram hat ein Limit von 4096 Zeichen. Falls länger, splitten.
             if len(response) > 4000:
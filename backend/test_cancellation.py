@@ -0,0 +1,93 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cancellation import CancellationRegistry
+from llm_stream import open_stream, on_close
+
+
+def hanging_provider(closed):
+    """Blocking SDK stream: one chunk, then waits ~5s for the next one unless the connection is closed."""
+    def factory():
+        connection = threading.Event()
+        on_close(connection.set)
+        yield "Hallo"
+        if connection.wait(5.0):
+            closed.append(time.monotonic())
+            raise ConnectionError("connection closed")
+        yield "zu spät"
+    return factory
+
+
+def test_cancel_only_targets_session():
+    registry = CancellationRegistry()
+
+    async def run():
+        a = registry.open("web:a")
+        b = registry.open("web:b")
+        assert registry.cancel("web:a") == 1
+        assert a.cancelled and not b.cancelled
+        registry.close(a)
+        registry.close(b)
+
+    asyncio.run(run())
+    stats = registry.stats()
+    assert stats["cancelled"] == 1 and stats["active"] == 0
+
+
+def test_cancel_closes_upstream_promptly():
+    registry = CancellationRegistry()
+    closed = []
+
+    async def run():
+        token = registry.open("web:1")
+        parts = []
+        stream = await open_stream(hanging_provider(closed), "stub")
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.1, registry.cancel, "web:1")
+        start = time.monotonic()
+        async for part in stream:
+            parts.append(part)
+        elapsed = time.monotonic() - start
+        registry.close(token)
+        await asyncio.sleep(0.05)  # Worker-Thread beendet sich
+        return parts, elapsed
+
+    parts, elapsed = asyncio.run(run())
+    stats = registry.stats()
+    print(f"Teile: {parts}, Dauer: {elapsed:.2f}s, Stats: {stats}")
+    assert parts == ["Hallo"]
+    # Abbruch nach 0.1s, nicht nach dem 5s-Timeout des Upstreams
+    assert elapsed < 0.5
+    assert closed, "Upstream-Verbindung wurde nicht geschlossen"
+    assert stats["stop_ms"]["count"] == 1 and stats["upstream_ms"]["count"] == 1
+    assert stats["upstream_ms"]["p50"] < 200
+
+
+def test_cancelled_request_opens_no_stream():
+    registry = CancellationRegistry()
+
+    async def run():
+        token = registry.open()
+        registry.cancel_token(token, reason="disconnect")
+        try:
+            await open_stream(hanging_provider([]), "stub")
+            assert False, "Cancelled erwartet"
+        except Exception as e:
+            assert type(e).__name__ == "Cancelled"
+        registry.close(token)
+
+    asyncio.run(run())
+    assert registry.stats()["disconnects"] == 1
+
+
+if __name__ == "__main__":
+    test_cancel_only_targets_session()
+    test_cancel_closes_upstream_promptly()
+    test_cancelled_request_opens_no_stream()
+    print("Alle Abbruch-Tests erfolgreich!")
@@ -0,0 +1,72 @@
+import sys
+import os
+import asyncio
+import tempfile
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chat_sessions import SessionStore, prompt_messages
+
+
+async def fake_summary(previous, turns):
+    await asyncio.sleep(0.01)
+    topics = [t["content"] for t in turns if t["role"] == "user"]
+    return (previous + " | " if previous else "") + ", ".join(topics)
+
+
+def test_history_stays_bounded_and_summarized():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(db_file=os.path.join(tmp, "s.db"), summarize_fn=fake_summary, keep=4, batch=4)
+
+        async def run():
+            for i in range(20):
+                store.append("web:1", f"frage {i}", f"antwort {i}")
+                await asyncio.sleep(0.02)  # Hintergrund-Zusammenfassung laufen lassen
+            return store.history("web:1")
+
+        history = asyncio.run(run())
+        print(history)
+        assert history[0]["role"] == "system" and "frage 0" in history[0]["content"]
+        assert len(history) <= 1 + 4 + 4
+        assert history[-1] == {"role": "assistant", "content": "antwort 19"}
+        assert store.stats()["summaries"] >= 3
+        store.conn.close()
+
+
+def test_sessions_are_separate_and_survive_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "s.db")
+        store = SessionStore(db_file=db)
+
+        async def run():
+            store.append("telegram:42", "Ich heiße Alex", "Hallo Alex!")
+            store.append("web:1", "Wie spät ist es?", "12 Uhr.")
+
+        asyncio.run(run())
+        assert store.history("telegram:42")[0]["content"] == "Ich heiße Alex"
+        assert len(store.history("web:1")) == 2
+        store.flush()
+        store.conn.close()
+
+        restarted = SessionStore(db_file=db)
+        assert restarted.history("telegram:42")[1]["content"] == "Hallo Alex!"
+        assert restarted.stats()["restored"] == 1
+        restarted.conn.close()
+
+
+def test_summary_goes_into_the_system_prompt():
+    history = [{"role": "system", "content": "Zusammenfassung: Katze heißt Mochi"},
+               {"role": "user", "content": "Hallo"}, {"role": "bot", "content": "Hi!"}]
+    system = {"role": "system", "content": "Persona"}
+    messages = prompt_messages(system, history, {"role": "user", "content": "Wie heißt meine Katze?"})
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+    assert messages[0]["content"] == "Persona\n\nZusammenfassung: Katze heißt Mochi"
+    assert system["content"] == "Persona"
+
+
+if __name__ == "__main__":
+    test_history_stays_bounded_and_summarized()
+    test_sessions_are_separate_and_survive_restart()
+    test_summary_goes_into_the_system_prompt()
+    print("Alle Session-Tests erfolgreich!")
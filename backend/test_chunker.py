@@ -0,0 +1,133 @@
+import sys
+import os
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chunker import chunk_document, chunk_spans, fit_passages, CHARS_PER_TOKEN
+
+SENTENCES = ["Haruko steuert das Licht im Wohnzimmer.", "Die Heizung folgt dem Wochenplan!",
+             "Wer hat den Sensor im Flur zuletzt kalibriert?", "Der Akku hält etwa drei Monate."]
+
+
+def paragraph(n, offset=0):
+    return " ".join(f"Satz {offset}.{i}: " + SENTENCES[(offset + i) % len(SENTENCES)] for i in range(n))
+
+
+MARKDOWN = (f"# Haus\n\n{paragraph(6)}\n\n{paragraph(14, 1)}\n\n"
+            f"## Heizung\n\n{paragraph(3, 2)}\n\n"
+            f"## Sensoren\n\n{paragraph(30, 3)}\n")
+
+PYTHON = '''import os
+
+CONSTANT = 1
+
+
+def helper(x):
+    """Small helper."""
+    return x * 2
+
+
+@decorator
+def decorated(y):
+    total = 0
+    for i in range(y):
+        total += helper(i)
+    return total
+
+
+class Device:
+    def __init__(self, name):
+        self.name = name
+
+    # Schaltet das Gerät
+    def switch(self, on):
+        self.on = on
+        return self.name
+'''
+
+
+def test_offsets_point_into_source():
+    for start, end, text in chunk_document(MARKDOWN, "haus.md", max_tokens=80, overlap_tokens=15):
+        assert MARKDOWN[start:end] == text
+        assert len(text) <= 80 * CHARS_PER_TOKEN
+
+
+def test_prose_splits_on_headings_and_sentences():
+    chunks = chunk_document(MARKDOWN, "haus.md", max_tokens=80, overlap_tokens=0)
+    texts = [t for _, _, t in chunks]
+    # Jede Überschrift beginnt einen eigenen Chunk
+    for heading in ("# Haus", "## Heizung", "## Sensoren"):
+        assert any(t.startswith(heading) for t in texts), heading
+    assert not any("## " in t[1:] for t in texts)
+    # Geschnitten wird nur an Satzenden
+    for text in texts:
+        assert text[-1] in ".!?", text[-30:]
+
+
+def test_overlap_repeats_whole_sentences():
+    spans = chunk_spans(MARKDOWN, "haus.md", max_tokens=80, overlap_tokens=20)
+    overlapping = [(a, b) for a, b in zip(spans, spans[1:]) if b[0] < a[1]]
+    assert overlapping
+    for (_, end), (start, _) in overlapping:
+        repeated = MARKDOWN[start:end]
+        assert len(repeated) <= 20 * CHARS_PER_TOKEN
+        assert repeated.startswith("Satz ") and repeated.rstrip()[-1] in ".!?"
+    # Über Überschriften hinweg wird nicht überlappt
+    heading_starts = [s for s, _ in spans if MARKDOWN[s] == "#"]
+    assert len(heading_starts) == 3
+
+
+def test_without_overlap_chunks_are_disjoint():
+    spans = chunk_spans(MARKDOWN, "haus.md", max_tokens=80, overlap_tokens=0)
+    assert all(b[0] >= a[1] for a, b in zip(spans, spans[1:]))
+
+
+def test_code_splits_on_definitions():
+    chunks = chunk_document(PYTHON, "tools.py", max_tokens=30, overlap_tokens=5)
+    raw = [PYTHON[s:e] for s, e, _ in chunks]
+    # Top-Level-Definitionen teilen sich keinen Chunk (kleiner Kopf wie Imports darf vorne dran)
+    for r in raw:
+        assert sum(d in r for d in ("def helper", "def decorated", "class Device")) <= 1, r
+    assert any(r.startswith("class Device") for r in raw)
+    # Dekorator und Kommentar bleiben bei ihrer Definition
+    assert any(r.startswith("@decorator\ndef decorated") for r in raw)
+    assert any(r.startswith("# Schaltet das Gerät\n    def switch") for r in raw)
+    # Code wird für das Embedding mit Dateiname eingepackt, Offsets zeigen auf den Rohtext
+    start, end, text = chunks[1]
+    assert text == f"File: tools.py\n```py\n{PYTHON[start:end]}\n```"
+
+
+def test_long_unbroken_text_is_hard_split():
+    text = "x" * 1000
+    spans = chunk_spans(text, "blob.txt", max_tokens=50, overlap_tokens=10)
+    assert spans == [(0, 200), (200, 400), (400, 600), (600, 800), (800, 1000)]
+
+
+def test_small_and_empty_documents():
+    assert chunk_document("", "leer.md") == []
+    assert chunk_document("  Kurz.  \n", "kurz.txt") == [(2, 7, "Kurz.")]
+
+
+def test_rag_passages_stay_whole_within_budget():
+    chunks = [t for _, _, t in chunk_document(MARKDOWN, "haus.md", max_tokens=80, overlap_tokens=0)]
+    ranked = [chunks[2], chunks[0], chunks[1]]
+    passages = fit_passages(ranked, max_tokens=200)
+    # Ganze Chunks in Trefferreihenfolge, nichts mitten im Satz abgeschnitten
+    assert passages == ranked[:len(passages)] and len(passages) >= 2
+    assert sum(len(p) for p in passages) <= 200 * CHARS_PER_TOKEN
+    # Ein einzelner zu großer Treffer wird am letzten Satzende gekürzt
+    only = fit_passages([MARKDOWN], max_tokens=50)
+    assert len(only) == 1 and len(only[0]) <= 50 * CHARS_PER_TOKEN and only[0][-1] in ".!?"
+
+
+if __name__ == "__main__":
+    test_offsets_point_into_source()
+    test_prose_splits_on_headings_and_sentences()
+    test_overlap_repeats_whole_sentences()
+    test_without_overlap_chunks_are_disjoint()
+    test_code_splits_on_definitions()
+    test_long_unbroken_text_is_hard_split()
+    test_small_and_empty_documents()
+    test_rag_passages_stay_whole_within_budget()
+    print("Alle Chunker-Tests erfolgreich!")
@@ -0,0 +1,74 @@
+import sys
+import os
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from context_cache import ContextCache, DEVICES, HOME_STATUS, FACTS
+
+
+class Builder:
+    """Counts how often the cache had to rebuild a section."""
+
+    def __init__(self, value="text"):
+        self.calls = 0
+        self.value = value
+
+    def __call__(self):
+        self.calls += 1
+        return f"{self.value} #{self.calls}"
+
+
+def test_memoized_until_dependency_bumped():
+    cache = ContextCache()
+    build = Builder("tools")
+    assert cache.get("tools", build, deps=(DEVICES, HOME_STATUS)) == "tools #1"
+    assert cache.get("tools", build, deps=(DEVICES, HOME_STATUS)) == "tools #1"
+    assert build.calls == 1
+
+    # Fremde Abschnitte lassen den Eintrag gültig
+    cache.bump(FACTS)
+    assert cache.get("tools", build, deps=(DEVICES, HOME_STATUS)) == "tools #1"
+
+    # Neue Geräte-Config -> neu bauen
+    cache.bump(DEVICES)
+    assert cache.get("tools", build, deps=(DEVICES, HOME_STATUS)) == "tools #2"
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_key_change_rebuilds():
+    cache = ContextCache()
+    build = Builder("profil")
+    cache.get("profile", build, deps=(), key="face_1")
+    cache.get("profile", build, deps=(), key="face_1")
+    cache.get("profile", build, deps=(), key="face_2")
+    assert build.calls == 2
+
+
+def test_bump_during_build_rebuilds_next_time():
+    cache = ContextCache()
+
+    def racing_build():
+        # Config ändert sich, während der Text gebaut wird -> Ergebnis ist schon veraltet
+        cache.bump(DEVICES)
+        return "alt"
+
+    assert cache.get("tools", racing_build, deps=(DEVICES,)) == "alt"
+    assert cache.get("tools", lambda: "neu", deps=(DEVICES,)) == "neu"
+
+
+def test_stamp_tracks_versions():
+    cache = ContextCache()
+    before = cache.stamp((DEVICES, HOME_STATUS))
+    assert before == (0, 0)
+    cache.bump(HOME_STATUS)
+    assert cache.stamp((DEVICES, HOME_STATUS)) == (0, 1)
+    assert cache.version(HOME_STATUS) == 1
+
+
+if __name__ == "__main__":
+    test_memoized_until_dependency_bumped()
+    test_key_change_rebuilds()
+    test_bump_during_build_rebuilds_next_time()
+    test_stamp_tracks_versions()
+    print("Alle Context-Cache-Tests erfolgreich!")
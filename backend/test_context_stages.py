@@ -0,0 +1,74 @@
+import sys
+import os
+import time
+import asyncio
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["CONTEXT_DEADLINE_SEARCH"] = "0.2"
+os.environ["CONTEXT_DEADLINE_FACTS"] = "0.1"
+
+from context_stages import run_stages
+from fact_selector import FactSelector
+
+
+def slow(result, delay):
+    def fn():
+        time.sleep(delay)
+        return result
+    return fn
+
+
+def test_stages_run_concurrently_and_slow_stage_degrades():
+    def broken():
+        raise RuntimeError("kamera weg")
+
+    async def run():
+        start = time.time()
+        outcome = await run_stages({
+            "profile": slow(("Alex", "profil"), 0.1),
+            "rag": slow("rag", 0.1),
+            "search": slow("zu spät", 1.0),  # Deadline 0.2s
+            "vision": broken,
+            "phygital": None,
+        })
+        return outcome, time.time() - start
+
+    (results, timings), elapsed = asyncio.run(run())
+    print(f"Ergebnisse: {results} ({elapsed:.2f}s)")
+
+    assert results["profile"] == ("Alex", "profil")
+    assert results["rag"] == "rag"
+    assert results["search"] is None and timings["search"][1] == "timeout"
+    assert results["vision"] is None and timings["vision"][1].startswith("error")
+    assert results["phygital"] is None and "phygital" not in timings
+    # Parallel und durch die Such-Deadline begrenzt, nicht 0.1 + 0.1 + 1.0
+    assert elapsed < 0.5
+
+
+def test_late_facts_stage_is_not_counted():
+    def slow_embed(text):
+        time.sleep(0.3)
+        return [1.0, 0.0]
+
+    selector = FactSelector(budget=10, embed_fn=slow_embed)
+    facts = [{"text": f"Fakt Nummer {i} über irgendwas", "created_at": None, "pinned": False} for i in range(5)]
+
+    async def run():
+        context, timings = await run_stages({"facts": lambda: selector.select("Hallo", facts)})
+        # wie process_chat: Fallback ohne Embedding, nur dieser Bericht zählt
+        _, report = context["facts"] or selector.select("Hallo", facts, embed=False)
+        selector.record(report)
+        await asyncio.sleep(0.5)  # abgebrochene Stufe läuft im Thread zu Ende
+        return timings
+
+    timings = asyncio.run(run())
+    assert timings["facts"][1] == "timeout"
+    assert selector.stats()["requests"] == 1
+
+
+if __name__ == "__main__":
+    test_stages_run_concurrently_and_slow_stage_degrades()
+    test_late_facts_stage_is_not_counted()
+    print("Alle Kontext-Tests erfolgreich!")
@@ -0,0 +1,77 @@
+import sys
+import os
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fact_selector import FactSelector, estimate_tokens
+
+TOPICS = ["katze", "pizza", "auto", "musik"]
+
+
+def fake_embed(text):
+    """Bag-of-topics vector: facts about the same topic as the message score high."""
+    low = text.lower()
+    return [1.0 if t in low else 0.0 for t in TOPICS] + [0.1]
+
+
+def make_facts():
+    facts = [{"text": f"Der User mag Musik von Band Nummer {i}", "created_at": "2024-01-01 10:00:00", "pinned": False}
+             for i in range(30)]
+    facts.append({"text": "Die Katze heißt Mochi", "created_at": "2024-01-01 10:00:00", "pinned": False})
+    facts.append({"text": "Der User heißt Alex", "created_at": "2020-01-01 10:00:00", "pinned": True})
+    return facts
+
+
+def test_relevant_and_pinned_facts_within_budget():
+    selector = FactSelector(budget=60, embed_fn=fake_embed)
+    selected, report = selector.select("Wie geht es meiner Katze?", make_facts())
+    print(f"Auswahl: {selected} | {report}")
+
+    assert "Der User heißt Alex" in selected  # angepinnt, obwohl alt und irrelevant
+    assert "Die Katze heißt Mochi" in selected
+    assert report["tokens_used"] <= 60
+    assert report["tokens_saved"] > 0
+    assert report["facts_selected"] < report["facts_total"]
+
+
+def test_everything_fits_without_embedding():
+    def broken_embed(text):
+        raise AssertionError("Embedding darf nicht aufgerufen werden")
+
+    facts = make_facts()[:3]
+    budget = sum(estimate_tokens(f"- {f['text']}") for f in facts)
+    selected, report = FactSelector(budget=budget, embed_fn=broken_embed).select("Hallo", facts)
+    assert selected == [f["text"] for f in facts]
+    assert report["tokens_saved"] == 0
+    assert not FactSelector(budget=budget).needs_ranking(facts)
+    assert FactSelector(budget=budget - 1).needs_ranking(facts)
+
+
+def test_keyword_fallback_when_embedding_fails():
+    def broken_embed(text):
+        raise ConnectionError("ollama offline")
+
+    selector = FactSelector(budget=40, embed_fn=broken_embed)
+    selected, _ = selector.select("Erzähl mir was über Mochi die Katze", make_facts())
+    assert "Die Katze heißt Mochi" in selected
+
+
+def test_fallback_without_embedding_keeps_pinned_facts():
+    # Kontext-Stufe zu spät -> Auswahl ohne Ollama, angepinnte Fakten trotzdem dabei
+    def broken_embed(text):
+        raise AssertionError("Embedding darf nicht aufgerufen werden")
+
+    selector = FactSelector(budget=40, embed_fn=broken_embed)
+    selected, report = selector.select("Erzähl mir was über Mochi die Katze", make_facts(), embed=False)
+    assert selected[0] == "Der User heißt Alex"
+    assert "Die Katze heißt Mochi" in selected
+    assert report["tokens_used"] <= 40
+
+
+if __name__ == "__main__":
+    test_relevant_and_pinned_facts_within_budget()
+    test_everything_fits_without_embedding()
+    test_keyword_fallback_when_embedding_fails()
+    test_fallback_without_embedding_keeps_pinned_facts()
+    print("Alle Fakten-Tests erfolgreich!")
@@ -0,0 +1,65 @@
+import sys
+import os
+import base64
+import tempfile
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from image_pipeline import ImagePipeline, Snapshot
+
+PROFILES = {"openai": {"max_side": 1024, "quality": 85}, "ollama": {"max_side": 672, "quality": 85}}
+
+
+def fake_encoder(calls):
+    """Stands in for JPEG encoding: 'encodes' the downscaled frame shape and counts the calls."""
+    def encode(snapshot, max_side, quality):
+        calls.append((snapshot.source, max_side))
+        if snapshot.frame is None:
+            return snapshot.data
+        h, w = snapshot.frame.shape[:2]
+        scale = min(1.0, max_side / max(h, w))
+        return f"{round(w * scale)}x{round(h * scale)}".encode()
+    return encode
+
+
+def test_encode_once_per_profile():
+    calls = []
+    pipeline = ImagePipeline(encoder=fake_encoder(calls), profiles=PROFILES)
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    snapshot = Snapshot(frame=frame, source="screen")
+    assert pipeline.encode(snapshot, "openai") == b"1024x576"
+    assert pipeline.encode(snapshot, "ollama") == b"672x378"
+    # Zweiter Provider im Race / Folgeanfrage: aus dem Cache
+    assert pipeline.b64(snapshot, "openai") == base64.b64encode(b"1024x576").decode()
+    # Gleicher Inhalt in einem neuen Snapshot -> gleicher Hash
+    assert pipeline.encode(Snapshot(frame=frame.copy(), source="screen"), "openai") == b"1024x576"
+    assert len(calls) == 2
+    stats = pipeline.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2
+    assert stats["bytes_out"] == {"openai": 8, "ollama": 7}
+
+
+def test_lru_eviction_and_legacy_paths():
+    calls = []
+    pipeline = ImagePipeline(encoder=fake_encoder(calls), profiles=PROFILES, cache_size=2)
+    frames = [np.full((10, 10, 3), i, dtype=np.uint8) for i in range(3)]
+    for frame in frames:
+        pipeline.encode(Snapshot(frame=frame), "ollama")
+    pipeline.encode(Snapshot(frame=frames[0]), "ollama")
+    assert len(calls) == 4 and pipeline.stats()["cached"] == 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snap.jpg")
+        with open(path, "wb") as f:
+            f.write(b"jpeg-bytes")
+        assert pipeline.encode(path, "openai") == b"jpeg-bytes"
+        assert pipeline.encode(path, "openai") == b"jpeg-bytes"
+    assert len(calls) == 5
+
+
+if __name__ == "__main__":
+    test_encode_once_per_profile()
+    test_lru_eviction_and_legacy_paths()
+    print("Alle Bild-Pipeline-Tests erfolgreich!")
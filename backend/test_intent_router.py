@@ -0,0 +1,74 @@
+import sys
+import os
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from intent_router import IntentRouter
+
+CAMERAS = {"cam1": {"name": "Garten"}, "cam2": {"name": "Flur"}}
+
+
+def fake_embed(text):
+    """Bag-of-words embedding: 'blick' for looking at something, 'plan' for calendar/notes."""
+    text = text.lower()
+    look = sum(w in text for w in ("küche", "herd", "tür", "bildschirm", "hand", "sieh", "schau", "aussehe", "siehst"))
+    plan = sum(w in text for w in ("termine", "notizen", "wetter", "heizung", "warm", "geht", "ordnung"))
+    return [float(look), float(plan), 0.1]
+
+
+def make_router(**kwargs):
+    return IntentRouter(cameras_fn=lambda: CAMERAS, **kwargs)
+
+
+def test_sensor_question_does_not_trigger_webcam():
+    router = make_router(use_embeddings=False)
+    intent = router.route("Wie warm ist es im Wohnzimmer, ist die Heizung an?")
+    assert intent.vision is None and intent.kind == "chat"
+    # "ist" allein ist kein Kamera-Wunsch mehr
+    assert router.route("Ist das so richtig?").vision is None
+
+
+def test_vision_targets():
+    router = make_router(use_embeddings=False)
+    assert router.route("Was siehst du gerade?").vision == ("webcam", None)
+    assert router.route("Mach einen Screenshot").vision == ("screen", None)
+    assert router.route("Check mal die Küche").vision == ("screen", None)
+    assert router.route("Schau auf Kamera Garten").vision == ("camera", "cam1")
+    # Wortgrenzen: "app" in "happy" ist kein Ort
+    assert router.route("Ich bin happy").vision is None
+
+
+def test_weak_trigger_without_place_is_ignored():
+    router = make_router(use_embeddings=False)
+    assert router.route("Prüfe meine Termine").vision is None
+
+
+def test_embedding_veto():
+    router = make_router(use_embeddings=True, embed_fn=fake_embed, threshold=0.5)
+    assert router.route("Check mal die Küche").vision == ("screen", None)
+    assert router.route("Guck mal ob ich neue Notizen habe").vision is None
+    assert router.stats()["vetoed"] == 1
+    # Eindeutige Wünsche brauchen keine zweite Meinung
+    assert router.route("Was siehst du?").vision == ("webcam", None)
+    assert router.stats()["embedding_checks"] == 2
+
+
+def test_learn_search_and_stop():
+    router = make_router(use_embeddings=False)
+    intent = router.route("Lern mir Quantencomputer")
+    assert intent.kind == "learn" and intent.learn_topic == "quantencomputer"
+    assert router.route("Erstelle ein Bild über Katzen").learn_topic is None
+    intent = router.route("suche nach Rezepten für Pizza")
+    assert intent.kind == "search" and intent.search_query == "Rezepten für Pizza"
+    assert router.route(" Stopp ").kind == "stop"
+    assert router.is_stop("halt") and not router.is_stop("halt mal kurz")
+
+
+if __name__ == "__main__":
+    test_sensor_question_does_not_trigger_webcam()
+    test_vision_targets()
+    test_weak_trigger_without_place_is_ignored()
+    test_embedding_veto()
+    test_learn_search_and_stop()
+    print("Alle Intent-Tests erfolgreich!")
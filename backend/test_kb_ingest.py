@@ -0,0 +1,166 @@
+import sys
+import os
+import time
+import tempfile
+import threading
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from kb_ingest import Ingestor, chunk_ids
+from embed_cache import EmbeddingCache
+from scheduler import scheduler
+
+
+class FakeEmbedder:
+    """Records batch sizes, concurrency and the scheduler priority seen by the worker."""
+
+    def __init__(self, delay=0.0, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.batches = []
+        self.priorities = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.batches.append(len(texts))
+            self.priorities.add(scheduler.current_priority())
+        try:
+            time.sleep(self.delay)
+            if self.fail_on and any(self.fail_on in t for t in texts):
+                raise RuntimeError("Ollama weg")
+            return [[float(len(t)), 1.0, 0.0] for t in texts]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def slices(text, path, size=1500):
+    """Fixed-size chunks, so these tests do not depend on the chunker's rules."""
+    return [(i, min(i + size, len(text)), text[i:i + size]) for i in range(0, len(text), size)]
+
+
+def write_files(tmp, sizes):
+    jobs = []
+    for name, size in sizes.items():
+        path = os.path.join(tmp, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(f"{name}{k:06d}|" for k in range(size // 11 + 1))[:size])
+        jobs.append({"path": path, "doc_id": f"doc_{name}", "mtime": 1.0, "old_ids": []})
+    return jobs
+
+
+def test_chunk_ids():
+    assert chunk_ids("doc_a.md", 1) == ["doc_a.md"]
+    assert chunk_ids("doc_a.md", 3) == ["doc_a.md_part1", "doc_a.md_part2", "doc_a.md_part3"]
+
+
+def test_batches_across_files_and_commits_each_file_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = write_files(tmp, {"a.md": 1500 * 5, "b.txt": 700, "c.md": 1500 * 9 + 10})
+        embedder = FakeEmbedder(delay=0.01)
+        ingestor = Ingestor(embedder, chunk_fn=slices, batch_size=4, workers=2)
+        commits = []
+        run = ingestor.run(jobs, lambda job, chunks, vectors: commits.append((job["doc_id"], chunks, vectors)))
+
+        assert sorted(c[0] for c in commits) == ["doc_a.md", "doc_b.txt", "doc_c.md"]
+        by_id = {doc_id: (chunks, vectors) for doc_id, chunks, vectors in commits}
+        chunks, vectors = by_id["doc_c.md"]
+        assert len(chunks) == 10 and len(vectors) == 10
+        # Reihenfolge der Chunks bleibt erhalten, Vektoren sind normalisiert
+        assert chunks[-1][:2] == (13500, 13510)
+        assert np.allclose([np.linalg.norm(v) for v in vectors], 1.0)
+        assert np.allclose(vectors[-1], np.array([10, 1, 0]) / np.linalg.norm([10, 1, 0]), atol=1e-6)
+
+        assert sum(embedder.batches) == 16 and max(embedder.batches) <= 4
+        assert run["batches"] == len(embedder.batches) == 4
+        assert run["files"] == 3 and run["chunks"] == 16 and run["chunks_per_s"] > 0
+        assert embedder.max_active == 2
+
+
+def test_worker_runs_with_callers_priority():
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = write_files(tmp, {"a.md": 100})
+        embedder = FakeEmbedder()
+        with scheduler.priority("background"):
+            Ingestor(embedder, chunk_fn=slices).run(jobs, lambda *args: None)
+        assert embedder.priorities == {"background"}
+
+
+def test_failed_batch_skips_only_its_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = write_files(tmp, {"a.md": 3000, "z.md": 3000, "e.md": 0})
+        ingestor = Ingestor(FakeEmbedder(fail_on="z"), chunk_fn=slices, batch_size=2)
+        committed = []
+        run = ingestor.run(jobs, lambda job, chunks, vectors: committed.append((job["doc_id"], len(chunks))))
+        # Leere Datei wird ohne Chunks übernommen (alte Teile verschwinden), z.md bleibt unangetastet
+        assert sorted(committed) == [("doc_a.md", 2), ("doc_e.md", 0)]
+        assert run["failed_files"] == 1
+        assert ingestor.stats()["failed_files"] == 1
+
+
+def test_cache_embeds_only_changed_and_shared_chunks():
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = write_files(tmp, {"a.md": 1500 * 4})
+        cache = EmbeddingCache(os.path.join(tmp, "cache.db"), "nomic-embed-text")
+        embedder = FakeEmbedder()
+        ingestor = Ingestor(embedder, chunk_fn=slices, cache=cache, batch_size=8)
+        first = {}
+        ingestor.run(jobs, lambda job, chunks, vectors: first.update({job["doc_id"]: vectors}))
+        assert sum(embedder.batches) == 4
+
+        # Ein Absatz geändert + eine Kopie der Datei -> nur der geänderte Chunk geht an Ollama
+        with open(jobs[0]["path"], "r+", encoding="utf-8") as f:
+            f.seek(1600)
+            f.write("GEAENDERT")
+        with open(jobs[0]["path"], encoding="utf-8") as f:
+            copy = os.path.join(tmp, "kopie.md")
+            with open(copy, "w", encoding="utf-8") as out:
+                out.write(f.read())
+        jobs.append({"path": copy, "doc_id": "doc_kopie.md", "mtime": 2.0, "old_ids": []})
+        embedder.batches.clear()
+        second = {}
+        run = ingestor.run(jobs, lambda job, chunks, vectors: second.update({job["doc_id"]: vectors}))
+        assert embedder.batches == [1]
+        assert run["embedded"] == 1 and run["cached"] == 6 and run["deduped"] == 1
+        assert np.allclose(second["doc_a.md"][0], first["doc_a.md"][0])
+        assert np.allclose(second["doc_kopie.md"][1], second["doc_a.md"][1])
+
+        # Anderes Modell -> anderer Schlüssel
+        with open(copy, encoding="utf-8") as f:
+            first_chunk = slices(f.read(), copy)[0][2]
+        assert cache.get(first_chunk) is not None
+        assert EmbeddingCache(os.path.join(tmp, "cache.db"), "mxbai-embed-large").get(first_chunk) is None
+        assert cache.stats()["entries"] == 5
+
+
+def test_cache_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "cache.db"), "m", max_entries=2)
+        cache.store(["alt"], [[1.0, 0.0]])
+        time.sleep(0.01)
+        cache.store(["mittel"], [[0.0, 1.0]])
+        time.sleep(0.01)
+        assert cache.get("alt") is not None   # wieder benutzt
+        time.sleep(0.01)
+        cache.store(["neu"], [[1.0, 1.0]])
+        assert cache.get("mittel") is None
+        assert np.allclose(cache.get("alt"), [1.0, 0.0]) and cache.get("neu") is not None
+        assert cache.stats()["evicted"] == 1
+        cache.close()
+
+
+if __name__ == "__main__":
+    test_chunk_ids()
+    test_batches_across_files_and_commits_each_file_once()
+    test_worker_runs_with_callers_priority()
+    test_failed_batch_skips_only_its_files()
+    test_cache_embeds_only_changed_and_shared_chunks()
+    test_cache_evicts_least_recently_used()
+    print("Alle Ingest-Tests erfolgreich!")
@@ -0,0 +1,183 @@
+import sys
+import os
+import pickle
+import tempfile
+import subprocess
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import kb_store
+from kb_store import KBStore
+
+
+def vec(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_batch_commits_once_and_reloads():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = KBStore(tmp)
+        with store.batch():
+            for i in range(10):
+                store.put(f"doc_a_part{i+1}", f"Teil {i}", vec(1, i, 0), mtime=5, source="a.md", start=i * 10, end=i * 10 + 10)
+        assert store.counters["commits"] == 1
+        store.close()
+
+        store = KBStore(tmp)
+        ids, texts, mtimes, matrix = store.load()
+        assert ids[3] == "doc_a_part4" and texts[3] == "Teil 3" and mtimes[3] == 5
+        assert matrix.shape == (10, 3) and np.allclose(matrix[3], vec(1, 3, 0))
+        row = store.conn.execute("SELECT source, start_offset, end_offset FROM chunks WHERE id = 'doc_a_part4'").fetchone()
+        assert row == ("a.md", 30, 40)
+        assert store.span("doc_a_part4") == ("a.md", 5, 30, 40, "Teil 3")
+        assert store.span("fehlt") is None
+        store.close()
+
+
+def test_replace_delete_and_compact():
+    old_min = kb_store.COMPACT_MIN_DEAD
+    kb_store.COMPACT_MIN_DEAD = 2
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = KBStore(tmp)
+            for i in range(4):
+                store.put(f"d{i}", f"T{i}", vec(i + 1, 1))
+            store.put("d0", "T0 neu", vec(0, 1))
+            store.delete(["d2"])
+            assert store.stats()["dead_rows"] == 2
+            assert store.maybe_compact()
+            store._compacting.join()
+            assert store.stats()["dead_rows"] == 0 and store.rows == 3
+            assert os.path.getsize(store.vector_path) == 3 * 2 * 4
+            ids, texts, _, matrix = store.load()
+            assert sorted(ids) == ["d0", "d1", "d3"]
+            assert np.allclose(matrix[ids.index("d0")], vec(0, 1)) and texts[ids.index("d0")] == "T0 neu"
+            store.close()
+    finally:
+        kb_store.COMPACT_MIN_DEAD = old_min
+
+
+def test_compaction_waits_for_open_batch():
+    old_min = kb_store.COMPACT_MIN_DEAD
+    kb_store.COMPACT_MIN_DEAD = 2
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = KBStore(tmp)
+            for i in range(4):
+                store.put(f"d{i}", f"T{i}", vec(i + 1, 1))
+            store.delete(["d0", "d1"])
+            commits = store.counters["commits"]
+            with store.batch():
+                # Ein anderer Thread ist mitten in einer Datei: alte Teile gelöscht, neue noch nicht da
+                store.delete(["d2"])
+                assert store.maybe_compact()
+                store._compacting.join()
+                assert store.counters["compactions"] == 0 and store.counters["commits"] == commits
+                store.put("d2", "T2 neu", vec(5, 5))
+            # Erst nach dem Commit der Datei wird kompaktiert
+            store._compacting.join()
+            assert store.counters["compactions"] == 1
+            ids, texts, _, matrix = store.load()
+            assert sorted(ids) == ["d2", "d3"] and store.rows == 2
+            assert np.allclose(matrix[ids.index("d2")], vec(5, 5))
+            store.close()
+    finally:
+        kb_store.COMPACT_MIN_DEAD = old_min
+
+
+# Kindprozess: 4 Chunks, 2 davon tot, dann Absturz (os._exit) mitten in der Kompaktierung
+CRASH_SCRIPT = '''
+import os, sys
+sys.path.insert(0, {backend!r})
+import numpy as np
+import kb_store
+from kb_store import KBStore
+store = KBStore({tmp!r})
+for i in range(4):
+    store.put(f"d{{i}}", f"T{{i}}", np.array([i + 1, 1], dtype=np.float32))
+store.delete(["d1", "d2"])
+if {step!r} == "before_commit":
+    store._commit = lambda: os._exit(3)
+else:
+    kb_store.os.remove = lambda path: os._exit(3)
+store.compact()
+'''
+
+
+def test_compaction_survives_crash():
+    backend = os.path.dirname(os.path.abspath(__file__))
+    for step in ("before_commit", "before_delete"):
+        with tempfile.TemporaryDirectory() as tmp:
+            code = CRASH_SCRIPT.format(backend=backend, tmp=tmp, step=step)
+            assert subprocess.run([sys.executable, "-c", code]).returncode == 3
+            assert len([n for n in os.listdir(tmp) if n.endswith(".f32")]) == 2
+
+            store = KBStore(tmp)
+            ids, texts, _, matrix = store.load()
+            assert ids == ["d0", "d3"] and texts == ["T0", "T3"]
+            assert np.allclose(matrix, [[1, 1], [4, 1]])
+            # Nur noch die gültige Generation liegt im Ordner
+            assert [n for n in os.listdir(tmp) if n.endswith(".f32")] == [os.path.basename(store.vector_path)]
+            assert store.rows == (4 if step == "before_commit" else 2)
+            store.close()
+
+
+def test_uncommitted_vectors_are_cut():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = KBStore(tmp)
+        store.put("d0", "T0", vec(1, 0))
+        store.close()
+        with open(os.path.join(tmp, kb_store.VECTOR_FILE), "ab") as f:
+            f.write(vec(0, 1).tobytes())  # Absturz vor dem Commit
+        store = KBStore(tmp)
+        assert os.path.getsize(store.vector_path) == 8
+        store.put("d1", "T1", vec(0, 1))
+        ids, _, _, matrix = store.load()
+        assert ids == ["d0", "d1"] and np.allclose(matrix[1], vec(0, 1))
+        store.close()
+
+
+def test_migrates_legacy_pickle():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = [{"id": "doc_x", "text": "X", "emb": vec(1, 2, 3), "mtime": 7.0},
+                {"id": "doc_y", "text": "Y", "emb": vec(3, 2, 1)}]
+        with open(os.path.join(tmp, kb_store.LEGACY_INDEX), "wb") as f:
+            pickle.dump(docs, f)
+        store = KBStore(tmp)
+        assert store.migrate_pickle() == 2
+        assert os.path.exists(os.path.join(tmp, kb_store.LEGACY_INDEX + ".migrated"))
+        assert store.migrate_pickle() == 0
+        ids, texts, mtimes, matrix = store.load()
+        assert ids == ["doc_x", "doc_y"] and mtimes == [7.0, 0] and np.allclose(matrix[1], vec(3, 2, 1))
+        store.close()
+
+
+def test_file_chunks_by_source_and_legacy_id():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = KBStore(tmp)
+        with store.batch():
+            # Altes Id-Schema (Dateiname) aus dem Unterordner b/
+            store.put("doc_notes.md_part1", "B1", vec(1, 0), source="/k/b/notes.md")
+            store.put("doc_notes.md_part2", "B2", vec(1, 0), source="/k/b/notes.md")
+            # Aus kb_index.pkl übernommen, ohne Quelle
+            store.put("doc_alt.md", "Alt", vec(0, 1))
+            store.put("doc_alt.md.bak", "Andere Datei", vec(0, 1))
+        assert store.file_chunks("/k/b/notes.md", "doc_b/notes.md") == ["doc_notes.md_part1", "doc_notes.md_part2"]
+        # Gleicher Name, andere Quelle -> gehört nicht zu notes.md im Hauptordner
+        assert store.file_chunks("/k/notes.md", "doc_notes.md") == []
+        assert store.file_chunks("/k/alt.md", "doc_alt.md") == ["doc_alt.md"]
+        store.close()
+
+
+if __name__ == "__main__":
+    test_batch_commits_once_and_reloads()
+    test_replace_delete_and_compact()
+    test_compaction_waits_for_open_batch()
+    test_compaction_survives_crash()
+    test_uncommitted_vectors_are_cut()
+    test_migrates_legacy_pickle()
+    test_file_chunks_by_source_and_legacy_id()
+    print("Alle KB-Store-Tests erfolgreich!")
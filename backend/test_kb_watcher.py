@@ -0,0 +1,225 @@
+import sys
+import os
+import time
+import tempfile
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from kb_store import KBStore
+from kb_watcher import KBWatcher
+from kb_ingest import doc_id_for, chunk_ids
+
+
+class FakeKB:
+    """Stands in for KnowledgeBase._index_files/_remove_files; writes the manifest like the real one."""
+
+    def __init__(self, store, fail=()):
+        self.store = store
+        self.fail = set(fail)
+        self.indexed = []
+        self.removed = []
+
+    def index_fn(self, entries):
+        self.indexed.append(sorted((e["rel"], e["new"]) for e in entries))
+        for e in entries:
+            if e["rel"] not in self.fail:
+                self.store.put_file(e["rel"], e["size"], e["mtime"], e["hash"])
+        return {e["rel"] for e in entries} & self.fail
+
+    def remove_fn(self, entries):
+        self.removed.append(sorted(e["rel"] for e in entries))
+        for e in entries:
+            self.store.delete_file(e["rel"])
+
+
+class ChunkKB(FakeKB):
+    """Also writes chunks like KnowledgeBase._commit_file/_remove_files (ids from the relative path)."""
+
+    def index_fn(self, entries):
+        for e in entries:
+            with open(e["path"], encoding="utf-8") as f:
+                parts = f.read().split("\n\n")
+            doc_id = doc_id_for(e["rel"])
+            with self.store.batch():
+                self.store.delete(self.store.file_chunks(e["path"], doc_id))
+                for chunk_id, text in zip(chunk_ids(doc_id, len(parts)), parts):
+                    self.store.put(chunk_id, text, [1.0, 0.0], e["mtime"], source=e["path"])
+        return super().index_fn(entries)
+
+    def remove_fn(self, entries):
+        with self.store.batch():
+            for e in entries:
+                self.store.delete(self.store.file_chunks(e["path"], doc_id_for(e["rel"])))
+        super().remove_fn(entries)
+
+    def texts(self):
+        return sorted(self.store.load()[1])
+
+
+def write(folder, name, text, age=10.0):
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    # Älter als die Settle-Zeit, sonst wartet der Watcher noch einen Poll
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def make(tmp, **kwargs):
+    folder = os.path.join(tmp, "knowledge")
+    os.makedirs(folder)
+    store = KBStore(tmp)
+    kb = FakeKB(store, kwargs.pop("fail", ()))
+    watcher = KBWatcher(folder, store, kb.index_fn, kb.remove_fn, **kwargs)
+    return folder, store, kb, watcher
+
+
+def test_new_changed_touched_and_deleted_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, store, kb, watcher = make(tmp)
+        write(folder, "a.md", "# A")
+        write(folder, "sub/b.py", "def b(): pass")
+        write(folder, "bild.png", "kein Text")
+        assert watcher.poll() == 2
+        watcher.wait_idle()
+        assert kb.indexed == [[("a.md", True), (os.path.join("sub", "b.py"), True)]]
+        assert set(store.files()) == {"a.md", os.path.join("sub", "b.py")}
+
+        # Nichts geändert -> nur os.stat, nichts in der Queue
+        assert watcher.poll() == 0
+
+        # Nur angefasst (gleicher Inhalt) -> Manifest aktualisiert, kein Neu-Einbetten
+        stamp = time.time() - 5
+        os.utime(os.path.join(folder, "a.md"), (stamp, stamp))
+        assert watcher.poll() == 0
+        assert watcher.counters["touched"] == 1
+        assert store.files()["a.md"]["mtime"] == os.path.getmtime(os.path.join(folder, "a.md"))
+
+        # Inhalt geändert -> neu indizieren
+        write(folder, "a.md", "# A\n\nNeuer Absatz.", age=3)
+        assert watcher.poll() == 1
+        watcher.wait_idle()
+        assert kb.indexed[-1] == [("a.md", False)]
+
+        # Gelöscht -> Chunks entfernen
+        os.remove(os.path.join(folder, "sub", "b.py"))
+        watcher.poll()
+        assert kb.removed == [[os.path.join("sub", "b.py")]]
+        assert set(store.files()) == {"a.md"}
+        assert watcher.stats()["files"] == 1
+        store.close()
+
+
+def test_manifest_survives_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, store, kb, watcher = make(tmp)
+        write(folder, "a.md", "# A")
+        watcher.poll()
+        watcher.wait_idle()
+        store.close()
+
+        store = KBStore(tmp)
+        kb = FakeKB(store)
+        watcher = KBWatcher(folder, store, kb.index_fn, kb.remove_fn)
+        assert watcher.poll() == 0 and kb.indexed == []
+        store.close()
+
+
+def test_files_being_written_wait_for_settle():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, store, kb, watcher = make(tmp, settle=30)
+        write(folder, "frisch.md", "# Librarian schreibt gerade", age=0)
+        assert watcher.poll() == 0
+        # sync() ("lern mir" nach dem Schreiben) wartet nicht
+        assert watcher.sync(timeout=5)
+        assert kb.indexed == [[("frisch.md", True)]]
+        store.close()
+
+
+def test_failed_files_back_off():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, store, kb, watcher = make(tmp, fail={"kaputt.md"}, retry=60)
+        write(folder, "kaputt.md", "# Ollama war weg")
+        watcher.poll()
+        watcher.wait_idle()
+        assert watcher.counters["failed"] == 1
+        assert watcher.poll() == 0
+        watcher.retry = 0
+        watcher._retry_at["kaputt.md"] = (watcher._retry_at["kaputt.md"][0], 0)
+        kb.fail.clear()
+        assert watcher.poll() == 1
+        watcher.wait_idle()
+        assert "kaputt.md" in store.files()
+        store.close()
+
+
+def test_force_rescan_queues_unchanged_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, store, kb, watcher = make(tmp)
+        write(folder, "a.md", "# A")
+        watcher.poll()
+        watcher.wait_idle()
+        watcher.force_rescan()
+        assert watcher.poll() == 1
+        assert watcher.poll() == 0   # nur einmal
+        store.close()
+
+
+def test_background_threads_pick_up_new_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, store, kb, watcher = make(tmp, interval=0.05, settle=0.1)
+        watcher.start()
+        try:
+            write(folder, "neu.md", "# Neues Wissen", age=0)
+            deadline = time.time() + 5
+            while "neu.md" not in store.files() and time.time() < deadline:
+                time.sleep(0.05)
+            assert "neu.md" in store.files()
+            assert watcher.wait_idle(timeout=5)
+        finally:
+            watcher.stop()
+        assert not watcher.running()
+        store.close()
+
+
+def test_files_with_the_same_name_in_subfolders():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "knowledge")
+        os.makedirs(folder)
+        store = KBStore(tmp)
+        kb = ChunkKB(store)
+        watcher = KBWatcher(folder, store, kb.index_fn, kb.remove_fn)
+        write(folder, "a/notes.md", "A eins\n\nA zwei")
+        write(folder, "b/notes.md", "B eins")
+        write(folder, "notes.md", "Oben")
+        watcher.poll()
+        watcher.wait_idle()
+        # Jede Datei behält ihre eigenen Chunks
+        assert kb.texts() == ["A eins", "A zwei", "B eins", "Oben"]
+
+        # b/notes.md löschen entfernt nur deren Chunks
+        os.remove(os.path.join(folder, "b", "notes.md"))
+        watcher.poll()
+        assert kb.texts() == ["A eins", "A zwei", "Oben"]
+        assert set(store.files()) == {os.path.join("a", "notes.md"), "notes.md"}
+
+        # a/notes.md ändern ersetzt nur deren Chunks
+        write(folder, "a/notes.md", "A neu", age=3)
+        watcher.poll()
+        watcher.wait_idle()
+        assert kb.texts() == ["A neu", "Oben"]
+        store.close()
+
+
+if __name__ == "__main__":
+    test_new_changed_touched_and_deleted_files()
+    test_manifest_survives_restart()
+    test_files_being_written_wait_for_settle()
+    test_failed_files_back_off()
+    test_force_rescan_queues_unchanged_files()
+    test_background_threads_pick_up_new_files()
+    test_files_with_the_same_name_in_subfolders()
+    print("Alle Watcher-Tests erfolgreich!")
@@ -0,0 +1,52 @@
+import sys
+import os
+import asyncio
+import tempfile
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chat_sessions import SessionStore, prompt_messages
+from llm_providers import GeminiProvider
+
+
+async def fake_summary(previous, turns):
+    return "Der User hat über seine Katze Mochi gesprochen."
+
+
+def test_gemini_keeps_persona_with_session_summary():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(db_file=os.path.join(tmp, "s.db"), summarize_fn=fake_summary, keep=2, batch=2)
+
+        async def run():
+            for i in range(4):
+                store.append("web:1", f"frage {i}", f"antwort {i}")
+                await asyncio.sleep(0.02)
+            return store.history("web:1")
+
+        history = asyncio.run(run())
+        assert history[0]["role"] == "system"
+        store.conn.close()
+
+    system = {"role": "system", "content": "### PERSONA: Haruko"}
+    messages = prompt_messages(system, history, {"role": "user", "content": "Wie heißt meine Katze?"})
+    sys_instr, contents = GeminiProvider("gemini_free", "GEMINI_API_KEY")._convert(messages)
+    # Persona und Zusammenfassung stehen beide in der einen System-Anweisung
+    assert sys_instr.startswith("### PERSONA: Haruko")
+    assert "Katze Mochi" in sys_instr
+    assert [c["role"] for c in contents][-1] == "user"
+    assert all(c["role"] in ("user", "model") for c in contents)
+
+
+def test_gemini_joins_multiple_system_messages():
+    messages = [{"role": "system", "content": "A"}, {"role": "user", "content": "Hallo"},
+                {"role": "system", "content": "B"}]
+    sys_instr, contents = GeminiProvider("gemini_free", "GEMINI_API_KEY")._convert(messages)
+    assert sys_instr == "A\n\nB"
+    assert contents == [{"role": "user", "parts": ["Hallo"]}]
+
+
+if __name__ == "__main__":
+    test_gemini_keeps_persona_with_session_summary()
+    test_gemini_joins_multiple_system_messages()
+    print("Alle Provider-Tests erfolgreich!")
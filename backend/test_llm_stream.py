@@ -0,0 +1,85 @@
+import sys
+import os
+import time
+import asyncio
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from llm_stream import open_stream
+
+
+def slow_provider(name, parts=5, delay=0.05):
+    """Simulates a blocking SDK stream (like openai/genai/ollama) that sleeps between chunks."""
+    def factory():
+        time.sleep(delay)  # Verbindungsaufbau
+        for i in range(parts):
+            time.sleep(delay)
+            yield f"{name}{i}"
+    return factory
+
+
+async def consume(name, log):
+    async for part in await open_stream(slow_provider(name), name):
+        log.append(part)
+
+
+def test_streams_interleave():
+    log = []
+
+    async def run():
+        start = time.time()
+        await asyncio.gather(consume("A", log), consume("B", log))
+        return time.time() - start
+
+    elapsed = asyncio.run(run())
+    print(f"Reihenfolge: {log} ({elapsed:.2f}s)")
+
+    assert sorted(log) == sorted([f"A{i}" for i in range(5)] + [f"B{i}" for i in range(5)])
+    # Beide Streams liefern abwechselnd statt nacheinander
+    first_b = log.index("B0")
+    last_a = log.index("A4")
+    assert first_b < last_a, "Stream B hat erst nach Stream A begonnen (Event-Loop blockiert)"
+    # Parallel: ~6 * 0.05s statt ~12 * 0.05s
+    assert elapsed < 0.5
+
+
+def test_loop_stays_responsive():
+    ticks = []
+
+    async def ticker(stop):
+        while not stop.is_set():
+            ticks.append(time.time())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        stop = asyncio.Event()
+        t = asyncio.create_task(ticker(stop))
+        await consume("A", [])
+        stop.set()
+        await t
+
+    asyncio.run(run())
+    print(f"Ticks während Stream: {len(ticks)}")
+    assert len(ticks) > 10
+
+
+def test_factory_error_is_raised_on_open():
+    def broken():
+        raise ConnectionError("provider down")
+
+    async def run():
+        try:
+            await open_stream(broken, "broken")
+        except ConnectionError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_streams_interleave()
+    test_loop_stays_responsive()
+    test_factory_error_is_raised_on_open()
+    print("Alle Stream-Tests erfolgreich!")
@@ -0,0 +1,90 @@
+import sys
+import os
+import time
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["OLLAMA_MODEL"] = "llama3"
+os.environ["OLLAMA_EMBED_MODEL"] = "nomic-embed-text"
+
+from model_residency import ModelResidency
+
+
+class FakeOllama:
+    """Keeps at most `capacity` models in RAM; loading a new one evicts the oldest."""
+
+    def __init__(self, capacity=2):
+        self.capacity = capacity
+        self.loaded = []
+        self.calls = []
+
+    def _touch(self, model, keep_alive):
+        self.calls.append((model, keep_alive))
+        if model in self.loaded:
+            self.loaded.remove(model)
+        self.loaded.append(model)
+        del self.loaded[:-self.capacity]
+
+    def ps(self):
+        return {"models": [{"name": f"{m}:latest"} for m in self.loaded]}
+
+    def generate(self, model, prompt, keep_alive):
+        self._touch(model, keep_alive)
+
+    def embeddings(self, model, prompt, keep_alive):
+        self._touch(model, keep_alive)
+
+
+def make(fake, **kwargs):
+    return ModelResidency(client_fn=lambda: fake, refresh=0, **kwargs)
+
+
+def test_warmup_pins_chat_and_embed_models():
+    fake = FakeOllama()
+    residency = make(fake)
+    residency.warmup()
+    assert sorted(fake.loaded) == ["llama3", "nomic-embed-text"]
+    assert all(keep == "30m" for _, keep in fake.calls)
+    assert residency.keep_alive("llava") == "2m"
+    stats = residency.stats()
+    assert stats["loads"] == 2 and {e["reason"] for e in stats["recent_loads"]} == {"warmup"}
+
+
+def test_demand_load_and_hit():
+    fake = FakeOllama()
+    residency = make(fake)
+    residency.warmup()
+    with residency.use("llama3:latest"):
+        pass
+    with residency.use("llava") as info:
+        fake._touch("llava", "2m")
+        info["load_ns"] = 2_500_000_000  # Ollama: 2.5s Ladezeit
+    stats = residency.stats()
+    assert stats["hits"] == 1
+    assert stats["demand_loads_last_hour"] == 1
+    assert stats["recent_loads"][-1]["model"] == "llava" and stats["recent_loads"][-1]["ms"] == 2500.0
+
+
+def test_restore_after_vision_burst():
+    fake = FakeOllama()
+    residency = make(fake, restore_delay=0.1)
+    residency.warmup()
+    # Zwei Vision-Anfragen kurz hintereinander: nur ein Ladevorgang, kein Rückwechsel dazwischen
+    for _ in range(2):
+        with residency.use("llava"):
+            fake._touch("llava", "2m")
+        time.sleep(0.02)
+    assert "llama3" not in fake.loaded
+    time.sleep(0.3)
+    stats = residency.stats()
+    assert "llama3" in fake.loaded
+    assert stats["restores"] == 1
+    assert sum(1 for e in stats["recent_loads"] if e["model"] == "llava") == 1
+
+
+if __name__ == "__main__":
+    test_warmup_pins_chat_and_embed_models()
+    test_demand_load_and_hit()
+    test_restore_after_vision_burst()
+    print("Alle Residency-Tests erfolgreich!")
@@ -0,0 +1,169 @@
+import sys
+import os
+import time
+import asyncio
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from llm_stream import on_close
+from provider_router import ProviderRouter, CLOSED, OPEN, HALF_OPEN
+
+
+class FakeProvider:
+    """Minimal provider for the router: yields `parts` after `delay` seconds, records closed streams."""
+    supports_images = False
+
+    def __init__(self, name, prior_ttft=1.0, delay=0.0, parts=("hallo",), closed=None):
+        self.name = name
+        self.prior_ttft = prior_ttft
+        self.first_token_timeout = 5.0
+        self.delay = delay
+        self.parts = parts
+        self.closed = closed if closed is not None else []
+
+    def available(self):
+        return True
+
+    def factory(self, messages, options=None):
+        def open_():
+            on_close(lambda: self.closed.append(self.name))
+            time.sleep(self.delay)
+            yield from self.parts
+        return open_
+
+    def probe(self):
+        return True
+
+
+MESSAGES = [{"role": "user", "content": "Hallo"}]
+
+
+def names(router):
+    return [p.name for p in router.candidates(MESSAGES)]
+
+
+def test_ewma_ordering():
+    router = ProviderRouter([FakeProvider("a", prior_ttft=2.0), FakeProvider("b", prior_ttft=1.0)], alpha=0.3)
+    # Ohne Messwerte entscheidet die erwartete TTFT
+    assert names(router) == ["b", "a"]
+    router.record_success("a", 1.0)
+    router.record_success("a", 0.0)
+    assert abs(router.stats["a"].ttft - 0.7) < 1e-9
+    assert names(router) == ["a", "b"]
+    # Fehler verteuern den Score
+    router.record_failure("a", "kaputt")
+    assert names(router) == ["b", "a"]
+    # prefer hält Folgeantworten beim gleichen Provider
+    assert [p.name for p in router.candidates(MESSAGES, prefer="a")] == ["a", "b"]
+
+
+def test_circuit_opens_and_half_opens():
+    router = ProviderRouter([FakeProvider("a"), FakeProvider("b", prior_ttft=2.0)],
+                            failure_threshold=3, base_cooldown=10.0)
+    for _ in range(2):
+        router.record_failure("a", "Fehler")
+    assert router.stats["a"].state == CLOSED
+    router.record_failure("a", "Fehler")
+    assert router.stats["a"].state == OPEN
+    assert names(router) == ["b"]
+
+    # Nach der Pause genau ein Versuch (ohne Probe-Thread)
+    router.stats["a"].opened_at -= 10.0
+    assert names(router) == ["b", "a"]
+    assert router.stats["a"].state == HALF_OPEN
+    # Fehlschlag im Half-Open -> wieder offen, doppelte Pause
+    router.record_failure("a", "Fehler")
+    assert router.stats["a"].state == OPEN and router.stats["a"].cooldown == 20.0
+    router.stats["a"].opened_at -= 20.0
+    names(router)
+    router.record_success("a", 0.5)
+    assert router.stats["a"].state == CLOSED
+
+    # Rate-Limit öffnet sofort
+    router.record_failure("b", "Error 429: rate limit exceeded")
+    assert router.stats["b"].state == OPEN
+
+
+def test_probe_thread_closes_recovered_circuit():
+    def still_down():
+        raise ConnectionError("noch down")
+
+    broken = FakeProvider("b")
+    broken.probe = still_down
+    router = ProviderRouter([FakeProvider("a"), broken], failure_threshold=1, base_cooldown=0.0,
+                            probe_interval=0.02)
+    router.record_failure("a", "Fehler")
+    router.record_failure("b", "Fehler")
+    router.start_probing()
+    deadline = time.time() + 2
+    while router.stats["a"].state != CLOSED and time.time() < deadline:
+        time.sleep(0.01)
+    assert router.stats["a"].state == CLOSED
+    # Fehlgeschlagene Probe -> bleibt offen
+    assert router.stats["b"].state == OPEN and router.stats["b"].failures >= 2
+
+
+def test_race_keeps_winner_and_closes_loser():
+    closed = []
+    fast = FakeProvider("schnell", delay=0.0, parts=("eins", "zwei"), closed=closed)
+    slow = FakeProvider("langsam", delay=1.0, closed=closed)
+    router = ProviderRouter([fast, slow])
+
+    async def run():
+        name, stream = await router.race(MESSAGES)
+        parts = [part async for part in stream]
+        await asyncio.sleep(0.05)
+        return name, parts
+
+    name, parts = asyncio.run(run())
+    assert name == "schnell" and parts == ["eins", "zwei"]
+    assert "langsam" in closed
+    assert router.race_wins == {"schnell": 1}
+
+
+class FakeStream:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+
+def test_race_closes_loser_that_finishes_while_cancelled():
+    router = ProviderRouter([FakeProvider("a"), FakeProvider("b", prior_ttft=2.0)])
+    late = FakeStream()
+
+    async def open_first(provider, messages, options):
+        if provider.name == "a":
+            return "erstes", FakeStream()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            # wie asyncio.wait_for, wenn das erste Token gleichzeitig mit dem Abbruch ankommt
+            return "zu spät", late
+
+    router._open_first = open_first
+
+    async def run():
+        name, stream = await router.race(MESSAGES)
+        return name, [part async for part in stream]
+
+    name, parts = asyncio.run(run())
+    assert name == "a" and parts == ["erstes"]
+    assert late.closed
+
+
+if __name__ == "__main__":
+    test_ewma_ordering()
+    test_circuit_opens_and_half_opens()
+    test_probe_thread_closes_recovered_circuit()
+    test_race_keeps_winner_and_closes_loser()
+    test_race_closes_loser_that_finishes_while_cancelled()
+    print("Alle Router-Tests erfolgreich!")
@@ -0,0 +1,103 @@
+import sys
+import os
+import time
+import asyncio
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from response_cache import ResponseCache, classify
+from context_cache import context_cache, HOME_STATUS, LOCATION
+
+TOPICS = ["wohnzimmer", "warm", "temperatur", "wetter", "küche"]
+
+
+def fake_embed(text):
+    return [1.0 if t in text else 0.0 for t in TOPICS] + [0.05]
+
+
+def test_exact_and_semantic_hit():
+    cache = ResponseCache(embed_fn=fake_embed, enabled=True)
+    first = cache.prepare("Wie warm ist es im Wohnzimmer?", scope="master")
+    assert cache.lookup(first) is None
+    cache.store(first, "Im Wohnzimmer sind es 21 Grad.")
+
+    again = cache.prepare("wie warm ist es im wohnzimmer", scope="master")
+    assert cache.lookup(again) == "Im Wohnzimmer sind es 21 Grad."
+
+    similar = cache.prepare("Hey Haruko, wie warm ist es bitte gerade im Wohnzimmer?", scope="master")
+    assert cache.lookup(similar) == "Im Wohnzimmer sind es 21 Grad."
+
+    other_user = cache.prepare("Wie warm ist es im Wohnzimmer?", scope="Jenny")
+    assert cache.lookup(other_user) is None
+
+    stats = cache.stats()
+    print(f"Stats: {stats}")
+    assert stats["exact_hits"] == 1 and stats["semantic_hits"] == 1
+
+
+def test_state_change_invalidates():
+    cache = ResponseCache(embed_fn=fake_embed, enabled=True)
+    lookup = cache.prepare("Wie warm ist es in der Küche?")
+    cache.store(lookup, "19 Grad.")
+    context_cache.bump(HOME_STATUS)  # Heizung hat geschaltet
+    assert cache.lookup(cache.prepare("Wie warm ist es in der Küche?")) is None
+    assert cache.stats()["stale"] == 1
+
+
+def test_location_change_invalidates_weather():
+    cache = ResponseCache(embed_fn=fake_embed, enabled=True)
+    lookup = cache.prepare("Wie wird das Wetter morgen?")
+    assert lookup["intent"] == "weather"
+    cache.store(lookup, "In Berlin wird es sonnig.")
+    assert cache.lookup(cache.prepare("Wie wird das Wetter morgen?")) == "In Berlin wird es sonnig."
+    context_cache.bump(LOCATION)  # wie secretary.set_user_location("Hamburg")
+    assert cache.lookup(cache.prepare("Wie wird das Wetter morgen?")) is None
+
+
+def test_actions_and_smalltalk_are_not_cached():
+    cache = ResponseCache(embed_fn=fake_embed, enabled=True)
+    assert cache.prepare("Mach das Licht im Wohnzimmer an") is None
+    assert cache.prepare("Erzähl mir einen Witz") is None
+
+
+def test_classify_matches_whole_words():
+    assert classify("Regnet es morgen?") == "weather"
+    assert classify("Wie ist das Wetter?") == "weather"
+    assert classify("Kannst du mich zum Lernen anregen?") == "general"
+    assert classify("Lohnt sich das Upgrade?") == "general"
+    assert classify("Wie viel Grad hat es?") == "home"
+    assert classify("Was steht in meinen Notizen?") == "notes"
+
+
+def test_slow_embedding_falls_back_to_exact_key():
+    def slow_embed(text):
+        time.sleep(0.5)
+        return fake_embed(text)
+
+    cache = ResponseCache(embed_fn=fake_embed, enabled=True)
+    first = cache.prepare("Wie warm ist es im Wohnzimmer?", scope="master")
+    cache.store(first, "21 Grad.")
+    cache._embed_fn = slow_embed
+
+    async def run(message):
+        start = time.time()
+        result = await cache.find(cache.prepare(message, scope="master"), deadline=0.1)
+        return result, time.time() - start
+
+    # Exakter Schlüssel braucht kein Embedding
+    assert asyncio.run(run("wie warm ist es im wohnzimmer"))[0] == "21 Grad."
+    # Ähnliche Frage: Embedding zu langsam -> Fehlschlag statt Warten
+    result, elapsed = asyncio.run(run("Wie warm ist es gerade im Wohnzimmer?"))
+    assert result is None and elapsed < 0.4
+    assert cache.stats()["semantic_timeouts"] == 1
+
+
+if __name__ == "__main__":
+    test_exact_and_semantic_hit()
+    test_state_change_invalidates()
+    test_location_change_invalidates_weather()
+    test_actions_and_smalltalk_are_not_cached()
+    test_classify_matches_whole_words()
+    test_slow_embedding_falls_back_to_exact_key()
+    print("Alle Cache-Tests erfolgreich!")
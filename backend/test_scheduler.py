@@ -0,0 +1,100 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from scheduler import Scheduler, QueueTimeout
+from cancellation import CancellationRegistry, Cancelled
+
+
+def start_waiter(sched, backend, priority, order, hold=0.05):
+    def run():
+        with sched.slot(backend, priority):
+            order.append(priority)
+            time.sleep(hold)
+    t = threading.Thread(target=run)
+    t.start()
+    return t
+
+
+def test_priority_order():
+    sched = Scheduler(slots={"ollama": 1}, poll=0.01)
+    order = []
+    held = sched.acquire("ollama", "background")
+    threads = []
+    for priority in ("background", "telegram", "chat", "voice"):
+        threads.append(start_waiter(sched, "ollama", priority, order))
+        time.sleep(0.02)  # feste Ankunftsreihenfolge
+    assert sched.stats()["ollama"]["depth"] == 4
+    sched.release("ollama", held)
+    for t in threads:
+        t.join()
+    assert order == ["voice", "chat", "telegram", "background"]
+    assert sched.stats()["ollama"]["granted"] == 5
+
+
+def test_background_keeps_reserved_slot():
+    sched = Scheduler(slots={"cloud": 3}, poll=0.01)
+    sched.acquire("cloud", "background")
+    sched.acquire("cloud", "background")
+    # Zwei von drei Plätzen belegt: weitere Hintergrundarbeit wartet, Chat kommt sofort dran
+    try:
+        sched.acquire("cloud", "background", timeout=0.05)
+        assert False, "QueueTimeout erwartet"
+    except QueueTimeout:
+        pass
+    start = time.monotonic()
+    sched.acquire("cloud", "chat")
+    assert time.monotonic() - start < 0.05
+    stats = sched.stats()["cloud"]
+    assert stats["timeouts"] == 1 and stats["active"]["chat"] == 1
+
+
+def test_deadline_per_class():
+    sched = Scheduler(slots={"ollama": 1}, deadlines={"telegram": 0.05}, poll=0.01)
+    sched.acquire("ollama", "chat")
+    start = time.monotonic()
+    try:
+        sched.acquire("ollama", "telegram")
+        assert False, "QueueTimeout erwartet"
+    except QueueTimeout:
+        pass
+    assert time.monotonic() - start < 0.5
+    assert sched.stats()["ollama"]["depth"] == 0
+
+
+def test_priority_context_and_cancel():
+    sched = Scheduler(slots={"ollama": 1}, poll=0.01)
+    registry = CancellationRegistry()
+    sched.acquire("ollama", "background")
+
+    async def run():
+        token = registry.open("web:1")
+        with sched.priority("voice"):
+            assert sched.current_priority() == "voice"
+            waiter = asyncio.create_task(asyncio.to_thread(sched.acquire, "ollama"))
+            await asyncio.sleep(0.05)
+            assert sched.stats()["ollama"]["queued"]["voice"] == 1
+            registry.cancel("web:1")
+            try:
+                await waiter
+                assert False, "Cancelled erwartet"
+            except Cancelled:
+                pass
+        registry.close(token)
+        assert sched.current_priority() == "chat"
+
+    asyncio.run(run())
+    assert sched.stats()["ollama"]["cancelled"] == 1
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_background_keeps_reserved_slot()
+    test_deadline_per_class()
+    test_priority_context_and_cancel()
+    print("Alle Scheduler-Tests erfolgreich!")
@@ -0,0 +1,63 @@
+import sys
+import os
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stream_filter import TagTokenizer, render, speech_text, CLIENT_TAGS, TEXT
+
+SAMPLE = ("Hallo Master! [MOOD: happy] Ich schalte das Licht an.\n"
+          "EXECUTE: tuya_control --device 'Bett' --state 'on'\n"
+          "Fertig [wave] siehe [1]. (tuya_control --device X --state off) ok\n"
+          "SEARCH: wetter berlin\n"
+          "[MEMORY: mag Katzen] Ende")
+
+
+def run(text, chunk_size):
+    tokenizer = TagTokenizer()
+    events = []
+    for i in range(0, len(text), chunk_size):
+        events += tokenizer.feed(text[i:i + chunk_size])
+    return events + tokenizer.flush()
+
+
+def test_same_result_for_any_chunking():
+    reference = run(SAMPLE, len(SAMPLE))
+    expected_text = render(reference, keep=CLIENT_TAGS)
+    expected_tags = [(e.kind, e.value) for e in reference if e.kind != TEXT]
+    print(f"Text: {expected_text!r}\nTags: {expected_tags}")
+
+    assert "EXECUTE" not in expected_text and "tuya_control" not in expected_text
+    assert "[wave]" not in expected_text and "[MEMORY" not in expected_text and "SEARCH" not in expected_text
+    assert "[MOOD: happy]" in expected_text  # Frontend wertet MOOD/ACTION selbst aus
+    assert "[1]" in expected_text
+    assert ("execute", "tuya_control --device 'Bett' --state 'on'") in expected_tags
+    assert ("tuya", "tuya_control --device X --state off") in expected_tags
+    assert ("search", "wetter berlin") in expected_tags
+    assert ("memory", "mag Katzen") in expected_tags
+
+    for size in (1, 2, 3, 5, 8, 13):
+        events = run(SAMPLE, size)
+        assert render(events, keep=CLIENT_TAGS) == expected_text, size
+        assert [(e.kind, e.value) for e in events if e.kind != TEXT] == expected_tags, size
+
+
+def test_plain_text_is_emitted_immediately():
+    tokenizer = TagTokenizer()
+    assert render(tokenizer.feed("Hallo Master, ")) == "Hallo Master, "
+    # Möglicher Befehlsanfang wird nur bis zum nächsten Chunk zurückgehalten
+    assert render(tokenizer.feed("gleich EXEC")) == "gleich "
+    assert render(tokenizer.feed("UTE: wait --seconds 2\nweiter")) == "\nweiter"
+
+
+def test_speech_text_strips_everything():
+    spoken = speech_text(SAMPLE + " 😀")
+    assert "MOOD" not in spoken and "EXECUTE" not in spoken and "😀" not in spoken
+    assert "Fertig" in spoken and "Ende" in spoken
+
+
+if __name__ == "__main__":
+    test_same_result_for_any_chunking()
+    test_plain_text_is_emitted_immediately()
+    test_speech_text_strips_everything()
+    print("Alle Stream-Filter-Tests erfolgreich!")
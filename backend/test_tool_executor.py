@@ -0,0 +1,78 @@
+import sys
+import os
+import time
+import asyncio
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["TOOL_TIMEOUT_WEATHER"] = "0.2"
+
+from tool_executor import build_plan, run_plan, format_results
+
+
+def test_plan_groups_lanes_and_barriers():
+    plan = build_plan([
+        "tuya_control --device 'Bett' --state on",
+        "tuya_control --device 'Sofa' --state on",
+        "tuya_control --device 'Bett' --state off",
+        "wait --seconds 1",
+        "weather --city Berlin",
+    ])
+    assert len(plan) == 3  # Lampen | wait | weather
+    lanes = [[cmd for _, cmd in lane] for lane in plan[0]]
+    # Gleiches Gerät bleibt in einer Lane (Reihenfolge an -> aus)
+    assert lanes[0] == ["tuya_control --device 'Bett' --state on", "tuya_control --device 'Bett' --state off"]
+    assert len(lanes) == 2
+
+
+def test_partial_device_names_share_a_lane():
+    devices = {"wohnzimmer licht": "id-1", "flur licht": "id-2"}
+
+    def resolve(name):
+        return next((dev_id for dev, dev_id in devices.items() if name in dev), None)
+
+    commands = [
+        "tuya_control --device 'Wohnzimmer Licht' --state on",
+        "tuya_control --device 'wohnzimmer' --state off",
+        "tuya_control --device 'Flur Licht' --state on",
+        "tuya_control --device 'Garage' --state on",
+    ]
+    lanes = [[i for i, _ in lane] for lane in build_plan(commands, resolve)[0]]
+    # Beide Namen treffen dieselbe Lampe -> gleiche Lane, Reihenfolge bleibt
+    assert lanes == [[0, 1], [2], [3]]
+
+
+def test_independent_commands_run_concurrently():
+    log = []
+
+    async def execute(cmd):
+        if cmd.startswith("weather"):
+            await asyncio.sleep(1.0)  # hängt -> Timeout 0.2s
+        await asyncio.sleep(0.1)
+        log.append(cmd)
+        return f"ok {cmd}"
+
+    commands = [f"tuya_control --device 'Lampe {i}' --state off" for i in range(5)] + ["weather --city Berlin"]
+
+    async def run():
+        start = time.time()
+        results = await run_plan(build_plan(commands), execute)
+        return results, time.time() - start
+
+    results, elapsed = asyncio.run(run())
+    print(format_results(results))
+    print(f"Dauer: {elapsed:.2f}s")
+
+    assert [r.cmd for r in results] == commands  # Originalreihenfolge
+    assert all(r.status == "ok" for r in results[:5])
+    assert results[5].status == "timeout"
+    # Fünf Lampen ~ ein Roundtrip (0.1s), Wetter nach 0.2s abgebrochen
+    assert elapsed < 0.4
+
+
+if __name__ == "__main__":
+    test_plan_groups_lanes_and_barriers()
+    test_partial_device_names_share_a_lane()
+    test_independent_commands_run_concurrently()
+    print("Alle Tool-Executor-Tests erfolgreich!")
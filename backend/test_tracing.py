@@ -0,0 +1,76 @@
+import sys
+import os
+import time
+import asyncio
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tracing
+from tracing import Tracer
+from context_stages import run_stages
+
+
+def test_waterfall_spans_follow_tasks_and_threads():
+    tracer = Tracer(buffer_size=2, log=False)
+
+    async def request():
+        trace = tracer.begin("chat", chars=12)
+        try:
+            await run_stages({"rag": lambda: time.sleep(0.05) or "rag", "profile": lambda: "p"})
+            with tracing.span("llm.open") as sp:
+                await asyncio.sleep(0.02)
+                sp["provider"] = "groq"
+            tracing.mark("first_chunk")
+            with tracing.span("tool.weather"):
+                await asyncio.to_thread(time.sleep, 0.01)
+        finally:
+            tracer.finish(trace, cached=False)
+
+    asyncio.run(request())
+    trace = tracer.recent()[0]
+    print(trace)
+    names = [s["name"] for s in trace["spans"]]
+    assert {"context.rag", "context.profile", "llm.open", "first_chunk", "tool.weather"} <= set(names)
+    llm = next(s for s in trace["spans"] if s["name"] == "llm.open")
+    assert llm["provider"] == "groq" and llm["ms"] >= 15
+    assert trace["cached"] is False and trace["total_ms"] >= 80
+    assert tracing.current() is None
+
+
+def test_ring_buffer_and_histograms():
+    tracer = Tracer(buffer_size=3, log=False)
+    for i in range(5):
+        trace = tracer.begin("chat")
+        start = time.monotonic()
+        tracing.record("provider.ollama", start - 0.3, status="timeout" if i == 0 else "ok")
+        tracer.finish(trace)
+
+    assert len(tracer.recent(10)) == 3
+    hist = tracer.histograms()
+    assert hist["provider.ollama"]["count"] == 5
+    assert hist["provider.ollama"]["buckets"] == {"<=500ms": 5}
+    assert hist["chat"]["count"] == 5
+
+
+def test_span_records_errors_without_trace_side_effects():
+    tracer = Tracer(log=False)
+    with tracing.span("outside"):  # ohne Trace: kein Fehler
+        pass
+    trace = tracer.begin("chat")
+    try:
+        with tracing.span("tool.shell"):
+            raise RuntimeError("kaputt")
+    except RuntimeError:
+        pass
+    tracer.finish(trace)
+    tracing.record("late", time.monotonic())  # nach finish ignoriert
+    spans = tracer.recent()[0]["spans"]
+    assert len(spans) == 1 and spans[0]["status"] == "error (kaputt)"
+
+
+if __name__ == "__main__":
+    test_waterfall_spans_follow_tasks_and_threads()
+    test_ring_buffer_and_histograms()
+    test_span_records_errors_without_trace_side_effects()
+    print("Alle Tracing-Tests erfolgreich!")
@@ -0,0 +1,62 @@
+import sys
+import os
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from vector_index import VectorIndex
+
+
+def unit(vec):
+    vec = np.asarray(vec, dtype=np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def brute_force(docs, q, k):
+    sims = sorted(((doc_id, float(np.dot(q, emb))) for doc_id, emb in docs.items()), key=lambda x: x[1], reverse=True)
+    return [doc_id for doc_id, _ in sims[:k]]
+
+
+def test_search_matches_brute_force():
+    rng = np.random.default_rng(0)
+    index = VectorIndex(capacity=4)   # wächst mehrfach
+    docs = {}
+    for i in range(200):
+        emb = unit(rng.normal(size=32))
+        docs[f"doc_{i}"] = emb
+        index.upsert(f"doc_{i}", f"Text {i}", emb, mtime=i)
+    for _ in range(5):
+        q = unit(rng.normal(size=32))
+        result = index.search(q, top_k=5)
+        assert [r["id"] for r in result] == brute_force(docs, q, 5)
+        assert result[0]["score"] >= result[-1]["score"]
+    assert index.matrix.dtype == np.float32 and index.matrix.shape == (200, 32)
+
+
+def test_upsert_and_delete_keep_rows_consistent():
+    index = VectorIndex()
+    index.upsert("a", "A", unit([1, 0, 0]))
+    index.upsert("b", "B", unit([0, 1, 0]))
+    index.upsert("c", "C", unit([0, 0, 1]), mtime=3)
+    assert index.upsert("a", "A2", unit([0, 1, 1])) is True
+    assert index.delete("b") and not index.delete("b")
+    # "c" ist in die Lücke von "b" gerutscht
+    assert index.ids == ["a", "c"] and index.get("c") == {"id": "c", "text": "C", "mtime": 3}
+    assert [r["id"] for r in index.search(unit([0, 0, 1]), top_k=5)] == ["c", "a"]
+    assert index.search(unit([0, 1, 1]), top_k=1)[0]["text"] == "A2"
+    try:
+        index.upsert("d", "D", unit([1, 0]))
+        assert False, "ValueError erwartet"
+    except ValueError:
+        pass
+    index.clear()
+    assert index.search(unit([1, 0]), top_k=3) == []
+    index.upsert("d", "D", unit([1, 0]))
+    assert index.dim == 2
+
+
+if __name__ == "__main__":
+    test_search_matches_brute_force()
+    test_upsert_and_delete_keep_rows_consistent()
+    print("Alle Vektor-Index-Tests erfolgreich!")
@@ -0,0 +1,89 @@
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import threading
+
+# Ensure backend directory is in path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from web_search import WebSearchService
+
+
+class FakeSearch:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, query, max_results):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("ratelimit")
+        return [{"title": f"News {i}", "body": query, "href": f"https://example.org/{i}"} for i in range(max_results)]
+
+
+def make_service(tmp, fake, **kw):
+    return WebSearchService(db_file=os.path.join(tmp, "web_cache.db"), search_fn=fake, retries=1, **kw)
+
+
+def test_cache_survives_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeSearch()
+        service = make_service(tmp, fake)
+        first = service.search("Nachrichten heute")
+        assert service.search("  nachrichten   HEUTE ") == first
+        assert fake.calls == 1
+
+        restarted = make_service(tmp, fake)
+        assert restarted.search("Nachrichten heute") == first
+        assert fake.calls == 1
+        assert restarted.stats()["hits"] == 1
+        service.conn.close()
+        restarted.conn.close()
+
+
+def test_concurrent_identical_queries_are_deduplicated():
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeSearch(delay=0.3)
+        service = make_service(tmp, fake)
+
+        async def run():
+            start = time.time()
+            results = await asyncio.gather(*(service.asearch("Wetter Berlin") for _ in range(5)))
+            return results, time.time() - start
+
+        results, elapsed = asyncio.run(run())
+        print(f"Stats: {service.stats()} ({elapsed:.2f}s)")
+        assert fake.calls == 1
+        assert all(r == results[0] for r in results)
+        assert service.stats()["joined"] == 4
+        assert elapsed < 0.6
+        service.conn.close()
+
+
+def test_failure_serves_stale_result():
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeSearch()
+        service = make_service(tmp, fake, ttl=0.0)
+        first = service.search("DAX")
+        fake.fail = True
+        assert service.search("DAX") == first  # abgelaufen, aber besser als nichts
+        try:
+            service.search("Bitcoin")
+            assert False, "Fehler erwartet"
+        except RuntimeError:
+            pass
+        assert service.stats()["stale_served"] == 1
+        service.conn.close()
+
+
+if __name__ == "__main__":
+    test_cache_survives_restart()
+    test_concurrent_identical_queries_are_deduplicated()
+    test_failure_serves_stale_result()
+    print("Alle Such-Tests erfolgreich!")
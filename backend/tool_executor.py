@@ -0,0 +1,141 @@
+import os
+import re
+import time
+import asyncio
+from collections import namedtuple
+
+# Ausführungsplan für mehrere EXECUTE-Befehle einer Antwort.
+# Unabhängige Befehle (z.B. fünf Lampen + Wetter) laufen gleichzeitig, statt
+# nacheinander je einen Tuya- oder PowerShell-Roundtrip abzuwarten.
+# Regeln:
+#  - "wait" ist eine Barriere: alles davor ist fertig, bevor gewartet wird,
+#    alles danach startet erst nach der Pause.
+#  - Befehle auf dieselbe Ressource (gleiches Gerät, Lautstärke, Maus/Tastatur,
+#    Gedächtnis, Shell) bleiben in ihrer Reihenfolge ("Lane").
+#  - Jedes Tool hat ein eigenes Timeout; ein hängender Befehl blockiert die anderen nicht.
+
+DEFAULT_TIMEOUTS = {
+    "tuya_control": 8.0,
+    "weather": 10.0,
+    "camera": 90.0,   # Snapshot + Llava-Analyse
+    "wait": 65.0,
+    "shell": 20.0,
+}
+DEFAULT_TIMEOUT = 15.0
+
+ToolResult = namedtuple("ToolResult", ["cmd", "output", "seconds", "status"])
+
+
+def tool_name(cmd):
+    """Normalized tool name of a command ('shell' for plain PowerShell)."""
+    first = cmd.strip().lstrip("(\"'").split(" ", 1)[0].lower()
+    if first == "uya_control":
+        return "tuya_control"
+    known = ("tuya_control", "wait", "volume", "media", "launch", "scroll", "adb_scroll", "stats",
+             "timer", "alarm", "memory", "note", "wake", "weather", "camera")
+    for name in known:
+        if first.startswith(name):
+            return name
+    return "shell"
+
+
+def is_read_only(cmd):
+    """True for commands without side effects (their answer may be cached)."""
+    name = tool_name(cmd)
+    if name in ("weather", "stats"):
+        return True
+    return name in ("memory", "note") and "--read" in cmd
+
+
+def tool_timeout(name):
+    return float(os.getenv(f"TOOL_TIMEOUT_{name.upper()}", DEFAULT_TIMEOUTS.get(name, DEFAULT_TIMEOUT)))
+
+
+def resource_key(cmd, resolve_device=None):
+    """Commands with the same key must keep their order; None means fully independent.
+
+    `resolve_device(name)` maps a (partial) device name to the device it controls, so
+    "licht" and "Wohnzimmer Licht" share a lane when they hit the same lamp.
+    """
+    name = tool_name(cmd)
+    if name == "tuya_control":
+        dev = re.search(r'--device\s+["\']?([^"\']+?)["\']?(?:\s+--|$)', cmd.strip().rstrip(")"), re.IGNORECASE)
+        if not dev:
+            return "tuya:?"
+        device = dev.group(1).strip().lower()
+        resolved = resolve_device(device) if resolve_device else None
+        return "tuya:" + (resolved or device)
+    if name in ("volume", "media"):
+        return "audio"
+    if name in ("launch", "scroll", "adb_scroll"):
+        return "input"
+    if name in ("memory", "note", "timer", "alarm"):
+        return "secretary"
+    if name == "shell":
+        return "shell"
+    return None
+
+
+def build_plan(commands, resolve_device=None):
+    """Splits commands into stages (separated by wait barriers) of lanes that can run concurrently.
+
+    Returns a list of stages; each stage is a list of lanes; each lane is a list of (index, cmd).
+    """
+    stages = []
+    lanes = {}
+    for index, cmd in enumerate(commands):
+        if tool_name(cmd) == "wait":
+            if lanes:
+                stages.append(list(lanes.values()))
+                lanes = {}
+            stages.append([[(index, cmd)]])
+            continue
+        key = resource_key(cmd, resolve_device) or f"solo:{index}"
+        lanes.setdefault(key, []).append((index, cmd))
+    if lanes:
+        stages.append(list(lanes.values()))
+    return stages
+
+
+async def _run_one(cmd, execute):
+    name = tool_name(cmd)
+    timeout = tool_timeout(name)
+    start = time.monotonic()
+    try:
+        output = await asyncio.wait_for(execute(cmd), timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        output = f"Fehler: Zeitüberschreitung nach {timeout:g}s ({name})."
+        status = "timeout"
+    except Exception as e:
+        output = f"Fehler: {e}"
+        status = "error"
+    return ToolResult(cmd, output, time.monotonic() - start, status)
+
+
+async def run_plan(plan, execute):
+    """Executes a plan from build_plan(). `execute` is an async callable cmd -> output.
+
+    Returns the ToolResults in the original command order.
+    """
+    results = {}
+
+    async def run_lane(lane):
+        for index, cmd in lane:
+            results[index] = await _run_one(cmd, execute)
+
+    start = time.monotonic()
+    for stage in plan:
+        await asyncio.gather(*(run_lane(lane) for lane in stage))
+
+    ordered = [results[i] for i in sorted(results)]
+    if ordered:
+        serial = sum(r.seconds for r in ordered)
+        print(f"[TOOLS] {len(ordered)} Befehle in {len(plan)} Stufe(n): {time.monotonic() - start:.2f}s "
+              f"(nacheinander ~{serial:.2f}s)")
+    return ordered
+
+
+def format_results(results):
+    """Aggregated tool output for the follow-up LLM call."""
+    return "\n---\n".join(f"CMD: {r.cmd}\nRESULT: {r.output}" for r in results)
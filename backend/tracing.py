@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Leichtgewichtiges Span-Tracing für die Chat-Pipeline ("wo bleiben die Sekunden?").
+# Jede Anfrage bekommt einen Trace; Stufen (Kontext, Provider-Versuche, erstes Token,
+# Tools, Folgeantwort) hängen Spans mit Start-Offset und Dauer an. Am Ende:
+#  - eine strukturierte Log-Zeile "[TRACE] {...}",
+#  - Ablage im Ringpuffer (/debug/traces),
+#  - Latenz-Histogramme pro Stufe.
+# Der aktuelle Trace liegt in einer ContextVar und wandert so automatisch in
+# asyncio-Tasks und asyncio.to_thread-Worker mit.
+
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "100"))
+TRACE_LOG = os.getenv("TRACE_LOG", "True").lower() == "true"
+# Obergrenzen der Histogramm-Buckets in Millisekunden
+BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+SAMPLES = 500
+
+_current = contextvars.ContextVar("haruko_trace", default=None)
+
+
+class Trace:
+    def __init__(self, name, **attrs):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.attrs = attrs
+        self.wall = time.time()
+        self.start = time.monotonic()
+        self.end = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end, status="ok", **attrs):
+        """Adds a span measured in time.monotonic() seconds. Ignored once the trace is finished."""
+        with self._lock:
+            if self.end is not None:
+                return
+            span = {"name": name, "start_ms": round((start - self.start) * 1000, 1),
+                    "ms": round((end - start) * 1000, 1), "status": status}
+            if attrs:
+                span.update(attrs)
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        end = self.end if self.end is not None else time.monotonic()
+        return {"id": self.id, "name": self.name, "time": self.wall, "total_ms": round((end - self.start) * 1000, 1),
+                **self.attrs, "spans": spans}
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def span(name, **attrs):
+    """Measures the enclosed block as a span of the current trace (no-op without trace).
+
+    Yields a dict; keys set on it are stored with the span (e.g. provider name).
+    """
+    trace = _current.get()
+    extra = dict(attrs)
+    start = time.monotonic()
+    status = "ok"
+    try:
+        yield extra
+    except BaseException as e:
+        # Abbruch durch Client/Race (CancelledError, GeneratorExit) ist kein Fehler der Stufe
+        status = "cancelled" if isinstance(e, (GeneratorExit, asyncio.CancelledError)) else f"error ({e})"
+        raise
+    finally:
+        if trace is not None:
+            status = extra.pop("status", status)
+            trace.add(name, start, time.monotonic(), status, **extra)
+
+
+def record(name, start, end=None, status="ok", **attrs):
+    """Adds an externally measured span (monotonic timestamps) to the current trace."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, start, time.monotonic() if end is None else end, status, **attrs)
+
+
+def mark(name, **attrs):
+    """Point in time relative to the trace start (e.g. the first token)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, trace.start, time.monotonic(), "ok", **attrs)
+
+
+class Tracer:
+    def __init__(self, buffer_size=TRACE_BUFFER, log=TRACE_LOG):
+        self.log = log
+        self._lock = threading.Lock()
+        self._traces = deque(maxlen=buffer_size)
+        self._hist = {}
+
+    def begin(self, name, **attrs):
+        """Starts a trace and makes it current for this task (and everything it spawns)."""
+        trace = Trace(name, **attrs)
+        _current.set(trace)
+        return trace
+
+    def finish(self, trace, **attrs):
+        if trace is None or trace.end is not None:
+            return
+        trace.attrs.update(attrs)
+        with trace._lock:
+            trace.end = time.monotonic()
+        data = trace.to_dict()
+        with self._lock:
+            self._traces.append(data)
+            self._observe(trace.name, data["total_ms"])
+            for s in data["spans"]:
+                self._observe(s["name"], s["ms"])
+        if _current.get() is trace:
+            _current.set(None)
+        if self.log:
+            print(f"[TRACE] {json.dumps(data, ensure_ascii=False)}")
+
+    def _observe(self, name, ms):
+        h = self._hist.get(name)
+        if h is None:
+            h = self._hist[name] = {"count": 0, "sum_ms": 0.0, "buckets": [0] * (len(BUCKETS_MS) + 1),
+                                    "samples": deque(maxlen=SAMPLES)}
+        h["count"] += 1
+        h["sum_ms"] += ms
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        h["buckets"][index] += 1
+        h["samples"].append(ms)
+
+    def recent(self, limit=20):
+        with self._lock:
+            return list(self._traces)[-limit:][::-1]
+
+    def histograms(self):
+        def pct(ordered, q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        result = {}
+        with self._lock:
+            for name, h in sorted(self._hist.items()):
+                ordered = sorted(h["samples"])
+                result[name] = {
+                    "count": h["count"],
+                    "avg_ms": round(h["sum_ms"] / h["count"], 1),
+                    "p50_ms": pct(ordered, 0.5),
+                    "p95_ms": pct(ordered, 0.95),
+                    "buckets": {label: n for label, n in zip(labels, h["buckets"]) if n},
+                }
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+            self._hist = {}
+
+
+# Singleton instance
+tracer = Tracer()
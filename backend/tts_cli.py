@@ -5,7 +5,7 @@ import edge_tts
 import pygame
 import os
 import tempfile
-import re
+from stream_filter import speech_text
 
 async def play_audio_edge(text):
     """Generates audio using edge-tts and plays it via pygame."""
@@ -24,26 +24,9 @@ async def play_audio_edge(text):
         RATE = "+10%"
         PITCH = "+25Hz"
         
-        # Clean text: Remove EXECUTE commands and technical output carefully
-        # Do NOT split/cut off the text. Replace commands with empty string.
-        clean_text = re.sub(r'EXECUTE:\s*.*?(?=(\n|$))', '', text, flags=re.IGNORECASE)
-        clean_text = re.sub(r'\(?t?uya_control.*?(?=(\)|$|\n))', '', clean_text, flags=re.IGNORECASE)
-        # Also strip stray --device flags if they remain (e.g. from multi-line hallucinations)
-        clean_text = re.sub(r'--device\s+.*?(?=(\n|$))', '', clean_text, flags=re.IGNORECASE)
-        
-        # Remove emojis and astral plane symbols to prevent TTS reading them
-        clean_text = re.sub(r'[^\000-\177]', '', clean_text) # Simple ASCII keep, removes emojis/unicode
-        # Better regex for just emojis/symbols if we want to keep German umlauts:
-        # But for now, ensuring no emojis are read is priority.
-        # Let's use a smarter regex that keeps Umlauts but kills emojis.
-        # This regex matches common emoji ranges and symbols
-        emoji_pattern = re.compile("["
-            u"\U0001f600-\U0001f64f"  # emoticons
-            u"\U0001f300-\U0001f5ff"  # symbols & pictographs
-            u"\U0001f680-\U0001f6ff"  # transport & map symbols
-            u"\U0001f1e0-\U0001f1ff"  # flags (iOS)
-            "+]", flags=re.UNICODE)
-        clean_text = emoji_pattern.sub(r'', clean_text)
+        # Clean text: remove commands, tags and emojis (shared tokenizer with the chat stream).
+        # Commands are dropped line by line, the text around them is kept.
+        clean_text = speech_text(text).strip()
 
         if not clean_text:
             return
@@ -1,6 +1,7 @@
 import json
 import os
-import google.generativeai as genai
+from llm_clients import llm_clients
+from scheduler import scheduler
 from datetime import datetime
 
 class UserProfiler:
@@ -8,8 +9,7 @@ class UserProfiler:
         self.db = memory_db
         self.api_key = os.getenv("GEMINI_API_KEY")
         if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+            self.model = llm_clients.gemini_model(self.api_key, 'gemini-1.5-flash')
         else:
             self.model = None
 
@@ -46,7 +46,8 @@ class UserProfiler:
             JSON OUTPUT ONLY:
             """
             
-            response = self.model.generate_content(prompt)
+            with scheduler.slot("cloud", priority="background"):
+                response = self.model.generate_content(prompt)
             text = response.text.strip()
             
             # Clean JSON (remove markdown code blocks if any)
@@ -0,0 +1,144 @@
+import threading
+import numpy as np
+
+# Embedding-Index der Wissensbasis als eine zusammenhängende float32-Matrix.
+# Vorher: Liste von Dicts, pro Dokument ein np.dot in Python, danach die ganze
+# Liste sortiert, um die Top 3 zu bekommen.
+# Jetzt: Zeile i der Matrix gehört zu ids[i]/texts[i]/mtimes[i]. Suche = ein
+# Matrix-Vektor-Produkt + argpartition (nur die Top-k werden sortiert).
+# Upsert überschreibt die Zeile bzw. hängt an (Kapazität wächst in Verdopplungen),
+# Delete verschiebt die letzte Zeile in die Lücke. Kein Neuaufbau der Matrix.
+
+INITIAL_CAPACITY = 64
+
+
+class VectorIndex:
+    def __init__(self, dim=None, capacity=INITIAL_CAPACITY):
+        self.dim = dim
+        self._capacity = capacity
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32) if dim else None
+        self.ids = []
+        self.texts = []
+        self.mtimes = []
+        self._rows = {}   # id -> Zeile
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._rows
+
+    @property
+    def matrix(self):
+        """The used rows (view, no copy)."""
+        if self._matrix is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._matrix[:len(self.ids)]
+
+    def _ensure_capacity(self, dim):
+        if self._matrix is None:
+            self.dim = dim
+            self._matrix = np.zeros((self._capacity, dim), dtype=np.float32)
+        elif len(self.ids) == self._matrix.shape[0]:
+            grown = np.zeros((self._matrix.shape[0] * 2, self.dim), dtype=np.float32)
+            grown[:len(self.ids)] = self._matrix[:len(self.ids)]
+            self._matrix = grown
+
+    # --- Schreiben ---
+    def upsert(self, doc_id, text, emb, mtime=0):
+        """Inserts or replaces one row. Returns True if it replaced an existing id."""
+        emb = np.asarray(emb, dtype=np.float32).ravel()
+        with self._lock:
+            if self.dim is not None and emb.shape[0] != self.dim:
+                if self.ids:
+                    raise ValueError(f"Embedding-Dimension {emb.shape[0]} passt nicht zum Index ({self.dim})")
+                # Leerer Index, anderes Embedding-Modell -> neu anlegen
+                self._matrix = None
+            row = self._rows.get(doc_id)
+            if row is not None:
+                self._matrix[row] = emb
+                self.texts[row] = text
+                self.mtimes[row] = mtime
+                return True
+            self._ensure_capacity(emb.shape[0])
+            row = len(self.ids)
+            self._matrix[row] = emb
+            self.ids.append(doc_id)
+            self.texts.append(text)
+            self.mtimes.append(mtime)
+            self._rows[doc_id] = row
+            return False
+
+    def delete(self, doc_id):
+        """Removes one row (the last row moves into the gap). Returns False if the id is unknown."""
+        with self._lock:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                return False
+            last = len(self.ids) - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self.ids[row] = self.ids[last]
+                self.texts[row] = self.texts[last]
+                self.mtimes[row] = self.mtimes[last]
+                self._rows[self.ids[row]] = row
+            self.ids.pop()
+            self.texts.pop()
+            self.mtimes.pop()
+            return True
+
+    def load(self, ids, texts, mtimes, matrix):
+        """Replaces the contents with already aligned arrays (row i of `matrix` belongs to ids[i])."""
+        with self._lock:
+            self.ids, self.texts, self.mtimes = list(ids), list(texts), list(mtimes)
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+            if matrix is None or not len(self.ids):
+                self._matrix, self.dim = None, None
+            else:
+                self._matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+                self.dim = self._matrix.shape[1]
+
+    def clear(self):
+        with self._lock:
+            self.ids, self.texts, self.mtimes = [], [], []
+            self._rows = {}
+            self._matrix = None
+            self.dim = None
+
+    # --- Lesen ---
+    def get(self, doc_id):
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                return None
+            return self._entry(row)
+
+    def _entry(self, row, score=None):
+        entry = {"id": self.ids[row], "text": self.texts[row], "mtime": self.mtimes[row]}
+        if score is not None:
+            entry["score"] = score
+        return entry
+
+    def find(self, predicate):
+        """Ids matching `predicate(id)`."""
+        with self._lock:
+            return [doc_id for doc_id in self.ids if predicate(doc_id)]
+
+    def search(self, query, top_k=3):
+        """Top-k rows by dot product (embeddings are normalized -> cosine)."""
+        q = np.asarray(query, dtype=np.float32).ravel()
+        with self._lock:
+            n = len(self.ids)
+            if n == 0 or top_k <= 0:
+                return []
+            if q.shape[0] != self.dim:
+                raise ValueError(f"Query-Dimension {q.shape[0]} passt nicht zum Index ({self.dim})")
+            scores = self._matrix[:n] @ q
+            k = min(top_k, n)
+            if k < n:
+                top = np.argpartition(scores, n - k)[n - k:]
+            else:
+                top = np.arange(n)
+            top = top[np.argsort(scores[top])[::-1]]
+            return [self._entry(int(row), float(scores[row])) for row in top]
@@ -31,7 +31,8 @@ if not os.path.exists(KNOWN_FACES_DIR):
         os.makedirs(KNOWN_FACES_DIR)
     except: pass
 
-def capture_webcam(cam_index=0):
+def grab_webcam(cam_index=0):
+    """Webcam frame (BGR) in memory, or None."""
     print(f"[VISION] Versuche Zugriff auf Webcam {cam_index}...")
     cap = cv2.VideoCapture(cam_index)
     if not cap.isOpened():
@@ -46,15 +47,22 @@ def capture_webcam(cam_index=0):
     cap.release()
     
     if ret:
-        filename = os.path.join(TEMP_DIR, f"webcam_{int(time.time())}.jpg")
-        cv2.imwrite(filename, frame)
-        print(f"[VISION] Webcam-Bild gespeichert: {filename}")
-        return filename
-    else:
-        print("[VISION] Konnte keinen Frame lesen.")
+        return frame
+    print("[VISION] Konnte keinen Frame lesen.")
+    return None
+
+def capture_webcam(cam_index=0):
+    """Webcam image saved as JPEG (for consumers that need a file). Returns the path or None."""
+    frame = grab_webcam(cam_index)
+    if frame is None:
         return None
+    filename = os.path.join(TEMP_DIR, f"webcam_{int(time.time())}.jpg")
+    cv2.imwrite(filename, frame)
+    print(f"[VISION] Webcam-Bild gespeichert: {filename}")
+    return filename
 
-def capture_screen():
+def grab_screen():
+    """Screenshot of the primary monitor as BGR frame in memory, or None."""
     print("[VISION] Erstelle Screenshot...")
     try:
         with mss.mss() as sct:
@@ -69,15 +77,21 @@ def capture_screen():
             # Check dimensions to be safe
             if img.shape[2] == 4:
                 img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-            
-            filename = os.path.join(TEMP_DIR, f"screen_{int(time.time())}.jpg")
-            cv2.imwrite(filename, img)
-            print(f"[VISION] Screenshot gespeichert: {filename}")
-            return filename
+            return img
     except Exception as e:
         print(f"[VISION] Screenshot Fehler: {e}")
         return None
 
+def capture_screen():
+    """Screenshot saved as JPEG (for consumers that need a file). Returns the path or None."""
+    img = grab_screen()
+    if img is None:
+        return None
+    filename = os.path.join(TEMP_DIR, f"screen_{int(time.time())}.jpg")
+    cv2.imwrite(filename, img)
+    print(f"[VISION] Screenshot gespeichert: {filename}")
+    return filename
+
 def analyze_faces(image_path):
     """
     Analyzes the given image for faces and compares them with known faces.
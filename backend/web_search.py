@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+
+# Gemeinsamer Web-Such-Dienst für Chat (Vorab-Suche, SEARCH:-Tag) und Bibliothekar.
+#  - Läuft im Worker-Thread (asearch), nie direkt im Event-Loop.
+#  - Ergebnisse werden pro normalisierter Anfrage mit TTL in SQLite gespeichert
+#    und überleben damit einen Neustart ("Nachrichten heute" nicht 20x abrufen).
+#  - Single-Flight: fragen mehrere gleichzeitig dasselbe, geht nur eine Anfrage raus,
+#    die anderen warten auf deren Ergebnis.
+#  - Schlägt die Suche fehl, wird notfalls ein abgelaufener Eintrag geliefert.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(BASE_DIR, "web_cache.db")
+WEB_SEARCH_TTL = float(os.getenv("WEB_SEARCH_TTL", "1800"))
+WEB_SEARCH_RETRIES = int(os.getenv("WEB_SEARCH_RETRIES", "2"))
+# Einträge, die älter sind, werden beim Start gelöscht
+MAX_AGE = 7 * 24 * 3600
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    return _SPACE_RE.sub(" ", query.strip().strip("`\"'").lower())
+
+
+def ddgs_search(query, max_results):
+    """DuckDuckGo text search (new package name 'ddgs' first)."""
+    try:
+        from ddgs import DDGS
+    except ImportError:
+        from duckduckgo_search import DDGS
+    with DDGS() as ddgs:
+        return list(ddgs.text(query, max_results=max_results))
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class WebSearchService:
+    def __init__(self, db_file=CACHE_FILE, search_fn=None, ttl=None, retries=None):
+        self.ttl = WEB_SEARCH_TTL if ttl is None else ttl
+        self.retries = WEB_SEARCH_RETRIES if retries is None else retries
+        self._search_fn = search_fn or ddgs_search
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._init_db()
+        self.counters = {"requests": 0, "hits": 0, "misses": 0, "joined": 0, "stale_served": 0, "errors": 0}
+
+    def _init_db(self):
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    query TEXT,
+                    max_results INTEGER,
+                    results TEXT,
+                    fetched_at REAL,
+                    PRIMARY KEY (query, max_results)
+                )
+            ''')
+            self.conn.execute("DELETE FROM search_cache WHERE fetched_at < ?", (time.time() - MAX_AGE,))
+            self.conn.commit()
+
+    def _load(self, key, max_results):
+        with self._lock:
+            row = self.conn.execute("SELECT results, fetched_at FROM search_cache WHERE query = ? AND max_results = ?",
+                                    (key, max_results)).fetchone()
+        if not row:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def _save(self, key, max_results, results):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO search_cache (query, max_results, results, fetched_at) VALUES (?, ?, ?, ?)",
+                              (key, max_results, json.dumps(results, ensure_ascii=False), time.time()))
+            self.conn.commit()
+
+    def _fetch(self, query, max_results):
+        error = None
+        for attempt in range(max(1, self.retries)):
+            try:
+                return [{"title": r.get("title", ""), "body": r.get("body", ""), "href": r.get("href", "")}
+                        for r in self._search_fn(query, max_results)]
+            except Exception as e:
+                error = e
+                print(f"[SEARCH] Versuch {attempt + 1} fehlgeschlagen: {e}")
+                if attempt + 1 < self.retries:
+                    time.sleep(0.5 * (attempt + 1))
+        raise error
+
+    def search(self, query, max_results=3):
+        """Results as list of {title, body, href}. Blocking; raises if the search fails and nothing is cached."""
+        key = normalize_query(query)
+        with self._lock:
+            self.counters["requests"] += 1
+        cached, fetched_at = self._load(key, max_results)
+        if cached is not None and time.time() - fetched_at < self.ttl:
+            with self._lock:
+                self.counters["hits"] += 1
+            print(f"[SEARCH] Cache-Treffer: '{key}'")
+            return cached
+
+        with self._lock:
+            flight = self._inflight.get((key, max_results))
+            leader = flight is None
+            if leader:
+                flight = self._inflight[(key, max_results)] = _Flight()
+                self.counters["misses"] += 1
+            else:
+                self.counters["joined"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.results
+
+        try:
+            print(f"[SEARCH] Web-Suche: '{query}'")
+            flight.results = self._fetch(query, max_results)
+            self._save(key, max_results, flight.results)
+        except Exception as e:
+            with self._lock:
+                self.counters["errors"] += 1
+            if cached is not None:
+                with self._lock:
+                    self.counters["stale_served"] += 1
+                print(f"[SEARCH] Suche fehlgeschlagen, nutze älteres Ergebnis für '{key}'.")
+                flight.results = cached
+            else:
+                flight.error = e
+                raise
+        finally:
+            with self._lock:
+                self._inflight.pop((key, max_results), None)
+            flight.done.set()
+        return flight.results
+
+    async def asearch(self, query, max_results=3):
+        return await asyncio.to_thread(self.search, query, max_results)
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM search_cache")
+            self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            c = dict(self.counters)
+            c["entries"] = self.conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            c["inflight"] = len(self._inflight)
+        c["hit_rate"] = round(c["hits"] / c["requests"], 3) if c["requests"] else 0.0
+        return c
+
+
+# Singleton instance
+web_search = WebSearchService()
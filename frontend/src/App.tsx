@@ -21,12 +21,16 @@ function App() {
  const [currentMood, setCurrentMood] = useState<string>('neutral'); // Persistent Mood State
   const [isMenuOpen, setIsMenuOpen] = useState(false); // Mobile Menu State
   const lastBroadcastId = useRef<string | null>(null); // Track last broadcast ID
+  // Gesprächsverlauf liegt im Backend (chat_sessions), pro Tab eine Sitzung
+  const sessionId = useRef<string>(`web:${Date.now().toString(36)}${Math.random().toString(36).slice(2, 8)}`);
 
   // TTS Voice Settings
   const [showSettings, setShowSettings] = useState(false);
   const [wakewordEnabled, setWakewordEnabled] = useState(false);
   const [mobileVisionEnabled, setMobileVisionEnabled] = useState(false);
   const [nimEnabled, setNimEnabled] = useState(false); // NVIDIA NIM Toggle
+  // Race-Modus nur auf ausdrücklichen Wunsch, sonst entscheidet LLM_RACE_MODE im Backend
+  const [voiceRaceEnabled, setVoiceRaceEnabled] = useState(() => localStorage.getItem('voiceRace') === 'true');
   const [location, setLocation] = useState('');
   const recognitionRef = useRef<any>(null);
 
@@ -56,6 +60,12 @@ function App() {
     }
   };
 
+  const toggleVoiceRace = () => {
+    const newValue = !voiceRaceEnabled;
+    setVoiceRaceEnabled(newValue);
+    localStorage.setItem('voiceRace', String(newValue));
+  };
+
   const saveLocation = async () => {
     try {
         await axios.post(`${API_URL}/settings/location`, { city: location });
@@ -186,7 +196,7 @@ function App() {
             setTimeout(() => setStatus('Processing...'), 1000);
             
             // Send command
-            sendMessage(text);
+            sendMessage(text, true);
         }
     };
 
@@ -307,7 +317,8 @@ function App() {
     return () => clearInterval(t);
   }, []);
 
-  const sendMessage = async (overrideMsg?: string) => {
+  // isVoice: Spracheingabe -> Vorrang im Backend-Scheduler; Race-Modus (schnellstes erstes Wort), falls in den Einstellungen aktiviert
+  const sendMessage = async (overrideMsg?: string, isVoice: boolean = false) => {
     const textToSend = overrideMsg || input;
     if (!textToSend.trim()) return;
 
@@ -334,10 +345,9 @@ function App() {
         },
         body: JSON.stringify({
           message: textToSend,
-          history: messages.map(m => ({
-            role: m.role === 'bot' ? 'assistant' : m.role,
-            content: m.content
-          }))
+          race: (isVoice && voiceRaceEnabled) || undefined,
+          voice: isVoice,
+          session_id: sessionId.current
         })
       });
 
@@ -518,7 +528,7 @@ function App() {
         try {
           const resp = await axios.post(`${API_URL}/process_audio`, formData);
           if (resp.data.text) {
-            sendMessage(resp.data.text);
+            sendMessage(resp.data.text, true);
           } else {
             const errorMsg = resp.data.error || 'Unknown Error';
             console.error("Audio Process Error:", errorMsg);
@@ -623,6 +633,20 @@ function App() {
                             </button>
                         </div>
 
+                        {/* Voice Race Toggle */}
+                        <div className="flex items-center justify-between bg-black/50 p-3 rounded-lg border border-white/10">
+                            <div>
+                                <label className="block text-sm font-bold text-white">Race-Modus (Sprache)</label>
+                                <p className="text-[10px] text-gray-400">Fragt bei Spracheingabe zwei Provider parallel an, der schnellere antwortet.</p>
+                            </div>
+                            <button 
+                                onClick={toggleVoiceRace}
+                                className={`w-12 h-6 rounded-full transition-colors relative ${voiceRaceEnabled ? 'bg-yellow-600' : 'bg-gray-600'}`}
+                            >
+                                <div className={`absolute top-1 left-1 w-4 h-4 bg-white rounded-full transition-transform ${voiceRaceEnabled ? 'translate-x-6' : 'translate-x-0'}`} />
+                            </button>
+                        </div>
+
                         {/* Location Settings */}
                         <div className="bg-black/50 p-3 rounded-lg border border-white/10 space-y-2">
                             <div>
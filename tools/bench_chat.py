@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import statistics
+import urllib.request
+
+# Offline-Benchmark der Chat-Pipeline (ohne Cloud-Keys).
+# Startet tools/stub_llm_server.py als eigenen Prozess (damit die CPU-Zeit pro Turn
+# nur das Backend misst), biegt alle Provider per *_BASE_URL / OLLAMA_HOST /
+# GEMINI_BASE_URL darauf um und spielt geskriptete Gespräche durch
+# process_chat_generator. Pro Szenario: TTFT, Tokens/s, Fallback-Kosten
+# (fehlgeschlagene Provider-Versuche aus dem Tracing) und CPU-Zeit pro Turn.
+#
+#   python tools/bench_chat.py                 alle Szenarien
+#   python tools/bench_chat.py -s primary_down --repeat 3 --json bench.json
+#
+# Hinweis: main.py wird importiert und braucht die Backend-Abhängigkeiten (requirements.txt).
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(TOOLS_DIR, "..", "backend")
+
+CONVERSATION = [
+    "Hallo Haruko, wie geht es dir heute?",
+    "Erzähl mir kurz, was du über Katzen weißt.",
+    "Wie ist die Systemauslastung gerade?",
+    "Danke! Und was hatten wir vorhin über Katzen gesagt?",
+]
+
+# Stub-Antworten: Systemfrage -> Tool-Aufruf + Folgeantwort
+REPLIES = [
+    ["systemauslastung", "Moment, ich schaue nach. EXECUTE: stats"],
+    ["Resultat der Ausführung", "Die CPU langweilt sich, Master. Alles im grünen Bereich. [MOOD: happy]"],
+]
+
+OPENAI_PROVIDERS = ("nvidia_nim", "groq", "openrouter")
+
+SCENARIOS = {
+    "baseline": {},
+    # Erster Provider antwortet nicht -> Kosten des Fallbacks
+    "primary_down": {"nvidia_nim": {"fail": 1, "mode": "500"}},
+    "primary_ratelimited": {"nvidia_nim": {"fail": 1, "mode": "429"}, "gemini": {"fail": 1, "mode": "429"}},
+    "primary_slow": {"nvidia_nim": {"ttft": 3.0}},
+    "flaky_stream": {"nvidia_nim": {"fail": 0.5, "mode": "cut"}},
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def stub_call(base, path, data=None):
+    req = urllib.request.Request(base + path, data=json.dumps(data).encode("utf-8") if data is not None else None,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def start_stub(port, ttft, rate):
+    proc = subprocess.Popen([sys.executable, os.path.join(TOOLS_DIR, "stub_llm_server.py"), "--port", str(port),
+                             "--ttft", str(ttft), "--rate", str(rate), "--seed", "1"])
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(50):
+        try:
+            stub_call(base, "/_stub/stats")
+            return proc, base
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Stub-Server startet nicht.")
+
+
+def configure_env(base, cache):
+    for name in OPENAI_PROVIDERS:
+        os.environ[f"{name.upper()}_BASE_URL"] = f"{base}/openai/{name}/v1"
+    os.environ.update({
+        "NVIDIA_API_KEY": "stub", "USE_NVIDIA_NIM": "True", "GROQ_API_KEY": "stub", "OPENROUTER_API_KEY": "stub",
+        "GEMINI_API_KEY_FREE": "stub", "GEMINI_API_KEY_PAID": "stub", "GEMINI_BASE_URL": base,
+        "OLLAMA_HOST": base, "RESPONSE_CACHE": str(cache), "TRACE_LOG": "False", "LLM_RACE_MODE": "False",
+    })
+
+
+def pct(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_turn(main, tracer, message, session_id):
+    cpu = time.process_time()
+    start = time.perf_counter()
+    ttft = None
+    reply = ""
+    async for chunk in main.process_chat_generator(message, [], session_id=session_id):
+        if ttft is None and chunk.strip():
+            ttft = time.perf_counter() - start
+        reply += chunk
+    total = time.perf_counter() - start
+    trace = (tracer.recent(1) or [{}])[0]
+    attempts = [s for s in trace.get("spans", []) if s["name"].startswith("provider.")]
+    failed = [s for s in attempts if s["status"] != "ok"]
+    tokens = len(reply.split())
+    stream_time = total - (ttft or total)
+    return {
+        "ttft": ttft or total,
+        "total": total,
+        "tokens": tokens,
+        "tokens_per_s": tokens / stream_time if stream_time > 0 else 0.0,
+        "attempts": len(attempts),
+        "fallback_ms": sum(s["ms"] for s in failed),
+        "cpu_ms": (time.process_time() - cpu) * 1000,
+    }
+
+
+async def run_scenario(main, tracer, base, name, profiles, repeat):
+    from provider_router import ProviderRouter
+    # Jedes Szenario startet mit frischer Router-Statistik und Standard-Profilen
+    defaults = stub_call(base, "/_stub/stats")["default"]
+    all_profiles = {p: dict(defaults) for p in OPENAI_PROVIDERS + ("gemini", "ollama")}
+    for provider, values in profiles.items():
+        all_profiles[provider].update(values)
+    stub_call(base, "/_stub/config", {"profiles": all_profiles, "replies": REPLIES, "reset_stats": True})
+    main.llm_router = ProviderRouter(main.llm_router.providers)
+
+    turns = []
+    for r in range(repeat):
+        session_id = f"bench:{name}:{r}"
+        for message in CONVERSATION:
+            turns.append(await run_turn(main, tracer, message, session_id))
+    return turns
+
+
+def summarize(name, turns):
+    ttft = [t["ttft"] for t in turns]
+    return {
+        "scenario": name,
+        "turns": len(turns),
+        "ttft_p50": round(statistics.median(ttft), 3),
+        "ttft_p95": round(pct(ttft, 0.95), 3),
+        "tokens_per_s": round(statistics.mean(t["tokens_per_s"] for t in turns), 1),
+        "attempts_per_turn": round(statistics.mean(t["attempts"] for t in turns), 2),
+        "fallback_ms_per_turn": round(statistics.mean(t["fallback_ms"] for t in turns), 1),
+        "cpu_ms_per_turn": round(statistics.mean(t["cpu_ms"] for t in turns), 1),
+    }
+
+
+def print_table(rows):
+    cols = ["scenario", "turns", "ttft_p50", "ttft_p95", "tokens_per_s", "attempts_per_turn",
+            "fallback_ms_per_turn", "cpu_ms_per_turn"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+    print("  ".join(c.ljust(widths[c]) for c in cols))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline-Benchmark der Chat-Pipeline mit Stub-Providern")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Szenario (mehrfach möglich, Standard: alle)")
+    parser.add_argument("--repeat", type=int, default=2, help="Durchläufe des Gesprächs pro Szenario")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Stub-TTFT in Sekunden")
+    parser.add_argument("--rate", type=float, default=80.0, help="Stub-Tokenrate (Tokens/s)")
+    parser.add_argument("--cache", action="store_true", help="Antwort-Cache aktiv lassen")
+    parser.add_argument("--json", help="Ergebnisse (inkl. aller Turns) als JSON speichern")
+    args = parser.parse_args()
+
+    port = free_port()
+    stub, base = start_stub(port, args.ttft, args.rate)
+    try:
+        configure_env(base, args.cache)
+        sys.path.append(BACKEND_DIR)
+        import main as backend
+        from tracing import tracer
+
+        rows, raw = [], {}
+        for name in args.scenario or list(SCENARIOS):
+            print(f"[BENCH] Szenario '{name}'...")
+            turns = asyncio.run(run_scenario(backend, tracer, base, name, SCENARIOS[name], args.repeat))
+            raw[name] = turns
+            rows.append(summarize(name, turns))
+        print()
+        print_table(rows)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"summary": rows, "turns": raw, "stub": stub_call(base, "/_stub/stats")}, f, indent=2)
+            print(f"[BENCH] Ergebnisse gespeichert: {args.json}")
+    finally:
+        stub.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import base64
+import argparse
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+# Vergleich alter Weg (JPEG auf Platte, volle Auflösung neu lesen + base64) gegen
+# image_pipeline (im Speicher, pro Provider-Profil verkleinert, Cache nach Inhalts-Hash).
+#
+#   python tools/bench_images.py                    synthetischer 1080p-Screenshot
+#   python tools/bench_images.py --image foto.jpg   eigenes Bild
+#
+# Braucht opencv-python (requirements.txt).
+
+
+def load_frame(path, width, height):
+    import cv2
+    import numpy as np
+    if path:
+        frame = cv2.imread(path)
+        if frame is None:
+            raise SystemExit(f"Bild nicht lesbar: {path}")
+        return frame
+    # Screenshot-ähnlich: Flächen, Kanten, etwas Rauschen
+    rng = np.random.default_rng(1)
+    frame = np.full((height, width, 3), 235, dtype=np.uint8)
+    for _ in range(40):
+        x, y = rng.integers(0, width - 200), rng.integers(0, height - 100)
+        frame[y:y + rng.integers(20, 300), x:x + rng.integers(50, 600)] = rng.integers(0, 255, 3)
+    noise = rng.integers(0, 12, frame.shape, dtype=np.uint8)
+    return cv2.add(frame, noise)
+
+
+def legacy(frame, providers):
+    """Old path: imwrite once, then every provider re-reads and encodes the full-resolution file."""
+    import cv2
+    start = time.perf_counter()
+    sent = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "screen.jpg")
+        cv2.imwrite(path, frame)
+        for _ in providers:
+            with open(path, "rb") as f:
+                sent += len(base64.b64encode(f.read()))
+    return sent, (time.perf_counter() - start) * 1000
+
+
+def pipelined(frame, providers):
+    from image_pipeline import ImagePipeline, Snapshot
+    pipeline = ImagePipeline()
+    start = time.perf_counter()
+    snapshot = Snapshot(frame=frame, source="bench")
+    sent = sum(len(pipeline.b64(snapshot, profile)) for profile in providers)
+    return sent, (time.perf_counter() - start) * 1000, pipeline.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload-Bytes und Kodierzeit pro Vision-Turn")
+    parser.add_argument("--image", help="Bilddatei statt synthetischem Screenshot")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    frame = load_frame(args.image, args.width, args.height)
+    # Race-Modus: NIM + Groq (beide OpenAI-Profil), dazu Gemini, Ollama als Fallback
+    providers = ["openai", "openai", "gemini", "ollama"]
+    old_bytes, old_ms = legacy(frame, providers)
+    new_bytes, new_ms, stats = pipelined(frame, providers)
+
+    print(f"Bild: {frame.shape[1]}x{frame.shape[0]}, Provider-Aufrufe: {len(providers)}")
+    print(f"  alt:      {old_bytes / 1024:8.1f} KiB base64, {old_ms:7.1f} ms")
+    print(f"  pipeline: {new_bytes / 1024:8.1f} KiB base64, {new_ms:7.1f} ms "
+          f"(Cache: {stats['hits']} Treffer, {stats['misses']} Kodierungen)")
+    print(f"  Ersparnis: {100 * (1 - new_bytes / old_bytes):.0f}% Bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
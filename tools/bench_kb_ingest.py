@@ -0,0 +1,103 @@
+import io
+import os
+import sys
+import time
+import contextlib
+import argparse
+import tempfile
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from kb_ingest import Ingestor, extract_text
+
+# KB-Einlesen: alter Weg (ein Embedding-Aufruf pro Chunk, streng nacheinander) gegen
+# die Pipeline aus kb_ingest (Batches über /api/embed, mehrere Batches unterwegs).
+#
+#   python tools/bench_kb_ingest.py                      simuliertes Ollama, 200 Dateien à 6 Chunks
+#   python tools/bench_kb_ingest.py --dir ../knowledge --ollama   echter Ordner, echtes Ollama
+#
+# Simuliertes Ollama: ein Request nach dem anderen (wie OLLAMA_NUM_PARALLEL=1),
+# feste Kosten pro Aufruf (HTTP, Tokenizer, Scheduling) + Kosten pro Text.
+
+
+class SimulatedOllama:
+    def __init__(self, call_ms, text_ms, dim=768):
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+        self.dim = dim
+        self.calls = 0
+        self._busy = threading.Lock()
+
+    def __call__(self, texts):
+        with self._busy:
+            self.calls += 1
+            time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        return [[1.0] + [0.0] * (self.dim - 1) for _ in texts]
+
+
+def make_folder(tmp, files, chunks_per_file):
+    for n in range(files):
+        with open(os.path.join(tmp, f"notiz_{n}.md"), "w", encoding="utf-8") as f:
+            # Jeder Chunk eindeutig, sonst greift die Duplikat-Erkennung der Pipeline
+            f.write("".join((f"Notiz {n}.{c}: " + "Lorem ipsum dolor sit amet. " * 54)[:1500]
+                            for c in range(chunks_per_file)))
+    return tmp
+
+
+def jobs_for(directory):
+    return [{"path": os.path.join(root, name), "doc_id": f"doc_{name}", "mtime": 0, "old_ids": []}
+            for root, _, names in os.walk(directory) for name in names]
+
+
+def fixed_chunks(text, path=""):
+    # Gleiche 1500-Zeichen-Stücke wie früher, damit nur die Pipeline verglichen wird
+    return [(i, min(i + 1500, len(text)), text[i:i + 1500]) for i in range(0, len(text), 1500)]
+
+
+def legacy(jobs, embed_fn):
+    start = time.perf_counter()
+    chunks = 0
+    for job in jobs:
+        text = extract_text(job["path"])
+        for _, _, chunk in fixed_chunks(text) if text.strip() else []:
+            embed_fn([chunk])
+            chunks += 1
+    elapsed = time.perf_counter() - start
+    return chunks, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunks/s beim Einlesen der Wissensbasis")
+    parser.add_argument("--dir", help="Ordner statt synthetischer Markdown-Dateien")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=6, help="Chunks pro synthetischer Datei")
+    parser.add_argument("--call-ms", type=float, default=25.0, help="Simuliert: feste Kosten pro Aufruf")
+    parser.add_argument("--text-ms", type=float, default=8.0, help="Simuliert: Kosten pro Text")
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--ollama", action="store_true", help="Echtes Ollama (OLLAMA_HOST, OLLAMA_EMBED_MODEL)")
+    args = parser.parse_args()
+
+    if args.ollama:
+        from kb_ingest import ollama_embed_batch
+        embed_fn = ollama_embed_batch
+    else:
+        embed_fn = SimulatedOllama(args.call_ms, args.text_ms)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = jobs_for(args.dir or make_folder(tmp, args.files, args.chunks))
+        with contextlib.redirect_stdout(io.StringIO()):
+            old_chunks, old_s = legacy(jobs, embed_fn)
+            run = Ingestor(embed_fn, chunk_fn=fixed_chunks, batch_size=args.batch,
+                           workers=args.workers).run(jobs, lambda *a: None)
+
+    print(f"Dateien: {len(jobs)}, Chunks: {old_chunks}")
+    print(f"  alt:      {old_s:7.1f} s  {old_chunks / old_s:8.1f} Chunks/s")
+    print(f"  pipeline: {run['seconds']:7.1f} s  {run['chunks_per_s']:8.1f} Chunks/s  ({run['batches']} Batches)")
+    print(f"  Faktor:   {old_s / max(run['seconds'], 1e-3):.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import numpy as np
+from vector_index import VectorIndex
+
+# KB-Suche: alte Python-Schleife (np.dot pro Dokument + komplettes Sortieren)
+# gegen VectorIndex (ein Matrix-Vektor-Produkt + argpartition).
+#
+#   python tools/bench_kb_search.py                 1k, 10k, 100k Chunks, 768 Dimensionen
+#   python tools/bench_kb_search.py --sizes 1000 5000 --dim 384
+#
+# 100k x 768 float32 sind ~300 MB.
+
+
+def legacy_search(docs, q, top_k):
+    sims = []
+    for d in docs:
+        sims.append((d, float(np.dot(q, d["emb"]))))
+    sims.sort(key=lambda x: x[1], reverse=True)
+    return [item[0] for item in sims[:top_k]]
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def bench(size, dim, queries, top_k, rng):
+    embs = rng.standard_normal((size, dim), dtype=np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    index = VectorIndex()
+    for i in range(size):
+        index.upsert(f"doc_{i}", f"Chunk {i}", embs[i])
+    build_ms = (time.perf_counter() - start) * 1000
+    # Alte Struktur: Liste von Dicts, ein Vektor pro Dokument
+    docs = [{"id": f"doc_{i}", "text": f"Chunk {i}", "emb": embs[i]} for i in range(size)]
+
+    qs = rng.standard_normal((queries, dim), dtype=np.float32)
+    qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+    for q in qs[:3]:
+        assert [d["id"] for d in legacy_search(docs, q, top_k)] == [r["id"] for r in index.search(q, top_k)]
+
+    it = iter(range(10 ** 9))
+    legacy_ms = timed(lambda: legacy_search(docs, qs[next(it) % queries], top_k), queries)
+    it = iter(range(10 ** 9))
+    matrix_ms = timed(lambda: index.search(qs[next(it) % queries], top_k), queries)
+
+    upsert_ms = timed(lambda: index.upsert("doc_0", "neu", embs[1]), 50)
+    delete_ms = timed(lambda: (index.delete("doc_0"), index.upsert("doc_0", "neu", embs[0])), 50)
+    return {"chunks": size, "legacy_ms": legacy_ms, "matrix_ms": matrix_ms, "speedup": legacy_ms / matrix_ms,
+            "build_ms": build_ms, "upsert_ms": upsert_ms, "delete_upsert_ms": delete_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark der KB-Vektorsuche")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=768, help="Embedding-Dimension (nomic-embed-text: 768)")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("-k", "--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'chunks':>8}  {'alt ms':>9}  {'matrix ms':>9}  {'faktor':>7}  {'aufbau ms':>9}  {'upsert ms':>9}  {'del+ins ms':>10}")
+    for size in args.sizes:
+        r = bench(size, args.dim, args.queries, args.top_k, rng)
+        print(f"{r['chunks']:>8}  {r['legacy_ms']:>9.2f}  {r['matrix_ms']:>9.3f}  {r['speedup']:>6.0f}x  "
+              f"{r['build_ms']:>9.0f}  {r['upsert_ms']:>9.4f}  {r['delete_upsert_ms']:>10.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
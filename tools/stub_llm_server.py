@@ -0,0 +1,339 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# Lokale Stand-in-Server für die LLM-Provider (ohne Cloud-Keys, ohne GPU).
+# Ein Port, mehrere Dialekte:
+#   /openai/<provider>/v1/chat/completions    OpenAI-kompatibel (NIM, Groq, OpenRouter), SSE-Stream
+#   /api/chat, /api/embeddings, /api/embed,   Ollama
+#   /api/tags, /api/ps
+#   /v1beta/models/<model>:streamGenerateContent   Gemini (REST, JSON-Array-Stream)
+# Pro Provider einstellbar: TTFT, Token-Rate, Fehler-Injektion (500, 429, hang, cut).
+# Laufzeit-Konfiguration: POST /_stub/config, Zähler: GET /_stub/stats.
+#
+# Beispiel:
+#   python tools/stub_llm_server.py --port 8900 --profile groq:ttft=0.2,rate=300 --profile nvidia_nim:fail=1,mode=500
+# Backend darauf zeigen lassen:
+#   GROQ_BASE_URL=http://127.0.0.1:8900/openai/groq/v1  OLLAMA_HOST=http://127.0.0.1:8900
+#   GEMINI_BASE_URL=http://127.0.0.1:8900
+
+DEFAULT_REPLY = ("Natürlich, Master. Ich habe das kurz überprüft und alles sieht gut aus. "
+                 "Wenn du noch etwas brauchst, sag einfach Bescheid. [MOOD: happy]")
+EMBED_DIM = 768
+
+
+class Profile:
+    def __init__(self, ttft=0.3, rate=50.0, fail=0.0, mode="500"):
+        self.ttft = ttft      # Sekunden bis zum ersten Token
+        self.rate = rate      # Tokens pro Sekunde danach
+        self.fail = fail      # Fehlerwahrscheinlichkeit 0..1
+        self.mode = mode      # 500 | 429 | hang | cut
+
+    def update(self, values):
+        for key, value in values.items():
+            if key == "mode":
+                self.mode = str(value)
+            elif hasattr(self, key):
+                setattr(self, key, float(value))
+
+    def to_dict(self):
+        return {"ttft": self.ttft, "rate": self.rate, "fail": self.fail, "mode": self.mode}
+
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.default = Profile()
+        self.profiles = {}
+        # [Teilstring der letzten User-Nachricht, Antwort] - erste Übereinstimmung gewinnt
+        self.replies = []
+        self.stats = {}
+
+    def profile(self, name):
+        with self.lock:
+            return self.profiles.get(name, self.default)
+
+    def configure(self, data):
+        with self.lock:
+            if "default" in data:
+                self.default.update(data["default"])
+            for name, values in data.get("profiles", {}).items():
+                self.profiles.setdefault(name, Profile(**self.default.to_dict())).update(values)
+            if "replies" in data:
+                self.replies = [tuple(r) for r in data["replies"]]
+            if data.get("reset_stats"):
+                self.stats = {}
+
+    def count(self, name, key):
+        with self.lock:
+            s = self.stats.setdefault(name, {"requests": 0, "failures": 0, "tokens": 0})
+            s[key] += 1
+
+    def reply_for(self, messages):
+        last = ""
+        for m in reversed(messages):
+            if m.get("role") == "user":
+                last = m.get("content") if isinstance(m.get("content"), str) else json.dumps(m.get("content"))
+                break
+        with self.lock:
+            for needle, reply in self.replies:
+                if needle.lower() in last.lower():
+                    return reply
+        return DEFAULT_REPLY
+
+    def snapshot(self):
+        with self.lock:
+            return {"default": self.default.to_dict(),
+                    "profiles": {n: p.to_dict() for n, p in self.profiles.items()},
+                    "stats": json.loads(json.dumps(self.stats))}
+
+
+STATE = StubState()
+
+
+def tokens(text):
+    """Splits into word tokens that keep their whitespace (joined = original text)."""
+    out, current = [], ""
+    for ch in text:
+        current += ch
+        if ch == " ":
+            out.append(current)
+            current = ""
+    if current:
+        out.append(current)
+    return out
+
+
+def embed(text):
+    """Deterministic bag-of-words vector (similar texts -> similar vectors)."""
+    vec = [0.0] * EMBED_DIM
+    for word in text.lower().split():
+        h = int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16)
+        vec[h % EMBED_DIM] += 1.0 if (h >> 12) % 2 else -1.0
+    return vec
+
+
+class Handler(BaseHTTPRequestHandler):
+    # HTTP/1.0: Verbindung endet mit der Antwort -> Streams ohne Content-Length
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write(self, text):
+        self.wfile.write(text.encode("utf-8"))
+        self.wfile.flush()
+
+    def _injected_failure(self, name, profile):
+        """Returns 'cut' if the stream should break mid-way, True if the request was already failed."""
+        if profile.fail <= 0 or random.random() >= profile.fail:
+            return False
+        STATE.count(name, "failures")
+        if profile.mode == "cut":
+            return "cut"
+        if profile.mode == "hang":
+            time.sleep(600)
+            return True
+        status = 429 if profile.mode == "429" else 500
+        self._send_json({"error": {"message": f"stub {status}", "code": status}}, status=status)
+        return True
+
+    def _stream(self, name, profile, text, emit, cut):
+        time.sleep(profile.ttft)
+        parts = tokens(text)
+        if cut:
+            parts = parts[:max(1, len(parts) // 3)]
+        delay = 1.0 / profile.rate if profile.rate > 0 else 0.0
+        for i, tok in enumerate(parts):
+            if i:
+                time.sleep(delay)
+            emit(tok)
+            STATE.count(name, "tokens")
+        if cut:
+            # Verbindung ohne sauberes Ende abbrechen
+            self.close_connection = True
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return False
+        return True
+
+    # --- Routing ---
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/_stub/stats":
+            return self._send_json(STATE.snapshot())
+        if path == "/api/tags":
+            return self._send_json({"models": [{"name": "llama3:latest", "model": "llama3:latest", "size": 1,
+                                                "digest": "stub", "details": {}}]})
+        if path == "/api/ps":
+            return self._send_json({"models": []})
+        self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        try:
+            data = self._json_body()
+        except ValueError:
+            return self._send_json({"error": "invalid json"}, status=400)
+        if path == "/_stub/config":
+            STATE.configure(data)
+            return self._send_json(STATE.snapshot())
+        if path.startswith("/openai/") and path.endswith("/chat/completions"):
+            return self._openai(path.split("/")[2], data)
+        if path == "/api/chat":
+            return self._ollama_chat(data)
+        if path in ("/api/embeddings", "/api/embed"):
+            return self._ollama_embed(path, data)
+        if path.startswith("/v1beta/models/") and ":" in path:
+            return self._gemini(path, data)
+        self._send_json({"error": "not found"}, status=404)
+
+    # --- OpenAI-kompatibel ---
+    def _openai(self, name, data):
+        STATE.count(name, "requests")
+        profile = STATE.profile(name)
+        cut = self._injected_failure(name, profile)
+        if cut is True:
+            return
+        text = STATE.reply_for(data.get("messages", []))
+        model = data.get("model", "stub")
+        if not data.get("stream"):
+            time.sleep(profile.ttft)
+            return self._send_json({"id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                                    "choices": [{"index": 0, "finish_reason": "stop",
+                                                 "message": {"role": "assistant", "content": text}}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def emit(tok):
+            chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}]}
+            self._write(f"data: {json.dumps(chunk)}\n\n")
+
+        if self._stream(name, profile, text, emit, cut):
+            self._write("data: [DONE]\n\n")
+
+    # --- Ollama ---
+    def _ollama_chat(self, data):
+        STATE.count("ollama", "requests")
+        profile = STATE.profile("ollama")
+        cut = self._injected_failure("ollama", profile)
+        if cut is True:
+            return
+        text = STATE.reply_for(data.get("messages", []))
+        model = data.get("model", "llama3")
+        if data.get("stream") is False:
+            time.sleep(profile.ttft)
+            return self._send_json({"model": model, "created_at": "2024-01-01T00:00:00Z", "done": True,
+                                    "message": {"role": "assistant", "content": text}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        def emit(tok):
+            self._write(json.dumps({"model": model, "created_at": "2024-01-01T00:00:00Z",
+                                    "message": {"role": "assistant", "content": tok}, "done": False}) + "\n")
+
+        if self._stream("ollama", profile, text, emit, cut):
+            self._write(json.dumps({"model": model, "created_at": "2024-01-01T00:00:00Z",
+                                    "message": {"role": "assistant", "content": ""}, "done": True}) + "\n")
+
+    def _ollama_embed(self, path, data):
+        STATE.count("ollama_embed", "requests")
+        if path == "/api/embed":
+            inputs = data.get("input", "")
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            return self._send_json({"model": data.get("model", ""), "embeddings": [embed(t) for t in inputs]})
+        self._send_json({"embedding": embed(data.get("prompt", ""))})
+
+    # --- Gemini (REST) ---
+    def _gemini(self, path, data):
+        name = os.getenv("STUB_GEMINI_PROFILE", "gemini")
+        STATE.count(name, "requests")
+        profile = STATE.profile(name)
+        cut = self._injected_failure(name, profile)
+        if cut is True:
+            return
+        messages = [{"role": c.get("role", "user"),
+                     "content": " ".join(p.get("text", "") for p in c.get("parts", []))}
+                    for c in data.get("contents", [])]
+        text = STATE.reply_for(messages)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        first = [True]
+
+        def emit(tok):
+            chunk = {"candidates": [{"index": 0, "content": {"role": "model", "parts": [{"text": tok}]}}]}
+            self._write(("[" if first[0] else ",\n") + json.dumps(chunk))
+            first[0] = False
+
+        if self._stream(name, profile, text, emit, cut):
+            self._write("]" if not first[0] else "[]")
+
+
+def parse_profile(spec):
+    """'groq:ttft=0.2,rate=300,fail=0.1,mode=429' -> ('groq', {...})"""
+    name, _, options = spec.partition(":")
+    values = dict(item.split("=", 1) for item in options.split(",") if "=" in item)
+    return name, values
+
+
+def serve(port=8900, host="127.0.0.1"):
+    """Starts the stub server in a background thread and returns it (server.shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub-LLM-Server für Offline-Benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Standard-TTFT in Sekunden")
+    parser.add_argument("--rate", type=float, default=50.0, help="Standard-Tokenrate (Tokens/s)")
+    parser.add_argument("--profile", action="append", default=[],
+                        help="provider:ttft=..,rate=..,fail=..,mode=500|429|hang|cut (mehrfach)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    STATE.configure({"default": {"ttft": args.ttft, "rate": args.rate},
+                     "profiles": dict(parse_profile(p) for p in args.profile)})
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"[STUB] LLM-Stub läuft auf http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())